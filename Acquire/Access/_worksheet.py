@@ -218,6 +218,9 @@ class WorkSheet:
 
         self._output_loc = output_drive.metadata().location()
         self._status = "awaiting (paid, have drive)"
+
+        # save immediately, so that the drive and cheques are recorded
+        # even if the submission below fails
         self.save()
 
         from Acquire.Client import PAR as _PAR
@@ -241,8 +244,10 @@ class WorkSheet:
 
         print(response)
 
+        # nothing is lost if this save is discarded with the request,
+        # so it can be written at the end of the request
         self._status = "submitted"
-        self.save()
+        self.save(defer=True)
 
         # the service user will log out automatically on destruction, but
         # let us make sure!
@@ -259,8 +264,13 @@ class WorkSheet:
         else:
             return self._output_loc
 
-    def save(self):
-        """Save this WorkSheet to the object store
+    def save(self, defer=False):
+        """Save this WorkSheet to the object store. If 'defer' is True
+           then the save is buffered in the unit of work of the current
+           request, and only written (once) at the end of the request
+
+            Args:
+                defer (bool, default=False): Whether to defer the save
             Returns:
                 None
         """
@@ -280,7 +290,8 @@ class WorkSheet:
         from Acquire.ObjectStore import ObjectStore as _ObjectStore
 
         key = "worksheet/%s" % self.uid()
-        _ObjectStore.set_object_from_json(bucket, key, self.to_data())
+        _ObjectStore.set_object_from_json(bucket, key, self.to_data(),
+                                          defer=defer)
 
     @staticmethod
     def load(uid):
@@ -1,4 +1,6 @@
 
+from Acquire.ObjectStore import ObjectStoreCache as _ObjectStoreCache
+
 __all__ = ["Account"]
 
 
@@ -6,6 +8,11 @@ def _account_root():
     return "accounting/accounts"
 
 
+# transaction line items are written once and never changed, so
+# can be cached without revalidation
+_ObjectStoreCache.add_immutable_prefix("%s/*/txns/" % _account_root())
+
+
 def _get_last_day(datetime):
     """Return the start of the day before 'datetime', e.g.
        _get_last_day(April 1st) will return March 31st
@@ -294,6 +301,17 @@ class Account:
         # make sure that this is saved to the object store
         self._save_account(bucket)
 
+        # the account starts with a zero balance at the beginning of
+        # time, so that its first balance never needs a search
+        from Acquire.Accounting import Balance as _Balance
+        from Acquire.ObjectStore import datetime_to_datetime \
+            as _datetime_to_datetime
+        import datetime as _datetime
+        self._update_checkpoint(
+            hourly_key=self._get_balance_key(
+                now=_datetime_to_datetime(_datetime.datetime.fromordinal(1))),
+            hourly_balance=_Balance(), bucket=bucket)
+
     def _get_transactions_between(self, start_datetime, end_datetime,
                                   bucket=None):
         """Return all of the object store keys for transactions in this
@@ -312,70 +330,43 @@ class Account:
         start_datetime = _datetime_to_datetime(start_datetime)
         end_datetime = _datetime_to_datetime(end_datetime)
 
-        # get the day for each time
-        start_day = start_datetime.toordinal()
-        end_day = end_datetime.toordinal()
+        from Acquire.ObjectStore import date_to_string as _date_to_string
 
         if end_datetime.time() == _datetime.time():
             # this ends on midnight of the first day - do not
             # include this last day as nothing will match
-            end_day -= 1
+            end_day = _date_to_string(end_datetime -
+                                      _datetime.timedelta(days=1))
+        else:
+            end_day = _date_to_string(end_datetime)
 
-        from Acquire.ObjectStore import string_to_datetime \
-            as _string_to_datetime
-        from Acquire.ObjectStore import date_to_string as _date_to_string
         from Acquire.ObjectStore import ObjectStore as _ObjectStore
         from Acquire.Accounting import TransactionInfo as _TransactionInfo
 
         bucket = self._get_account_bucket()
 
-        num_days = end_day - start_day
-
-        if num_days < 7:
-            # sufficiently few days that a day-by-day search is enough
-            transactions = []
-            for day in range(start_day, end_day+1):
-                day_date = _datetime.datetime.fromordinal(day)
-                day_string = _date_to_string(day_date)
-
-                prefix = "%s/%s" % (self._transactions_key(), day_string)
-
-                try:
-                    keys = _ObjectStore.get_all_object_names(bucket=bucket,
-                                                             prefix=prefix)
-                except:
-                    keys = []
-
-                for key in keys:
-                    transaction = _TransactionInfo.from_key(key)
-                    datetime = transaction.datetime()
-                    if datetime > start_datetime and datetime <= end_datetime:
-                        transactions.append(transaction)
-
-            return transactions
-
-        # elif num_days < 300:  Try a better algorithm for weeks and months
+        # transaction keys start with the isoformat datetime of the
+        # transaction, so are listed in date order. We can thus scan
+        # lazily from the start of the first day, and stop as soon as
+        # we reach a key after the last day
+        prefix = "%s/" % self._transactions_key()
+        prefix_len = len(prefix)
+        start_after = "%s%s" % (prefix, _date_to_string(start_datetime))
 
-        else:
-            # likely more than years - easier to just scan all transactions
-            # on the account
-            prefix = self._transactions_key()
+        transactions = []
 
-            try:
-                keys = _ObjectStore.get_all_object_names(bucket=bucket,
-                                                         prefix=prefix)
-            except:
-                keys = []
-
-            transactions = []
+        for key in _ObjectStore.iter_object_names(bucket=bucket,
+                                                  prefix=prefix,
+                                                  start_after=start_after):
+            if key[prefix_len:prefix_len+10] > end_day:
+                break
 
-            for key in keys:
-                transaction = _TransactionInfo.from_key(key)
-                datetime = transaction.datetime()
-                if datetime > start_datetime and datetime <= end_datetime:
-                    transactions.append(transaction)
+            transaction = _TransactionInfo.from_key(key)
+            datetime = transaction.datetime()
+            if datetime > start_datetime and datetime <= end_datetime:
+                transactions.append(transaction)
 
-            return transactions
+        return transactions
 
     def _get_balance_key(self, now=None):
         """Return the balance key for the passed time. This is the key
@@ -390,9 +381,72 @@ class Account:
             return _get_key_from_hour(start=self._balance_key(),
                                       datetime=self._get_now(now))
 
+    def _get_checkpoint(self, bucket=None):
+        """Return the key and balance of the latest hourly balance
+           recorded in the checkpoint of this account, i.e. the
+           tuple (key, balance), or (None, None) if there is no
+           checkpoint
+        """
+        from Acquire.Accounting import Balance as _Balance
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+        bucket = self._get_account_bucket(bucket)
+
+        try:
+            data = _ObjectStore.get_object_from_json(
+                                    bucket, self._checkpoint_key())
+            return (data["key"], _Balance.from_data(data["balance"]))
+        except:
+            return (None, None)
+
+    def _update_checkpoint(self, hourly_key, hourly_balance, bucket=None):
+        """Move the checkpoint of this account forward to the hourly
+           balance 'hourly_balance' at 'hourly_key'. This is a
+           compare-and-swap, so the checkpoint is only ever moved
+           forward in time, even if several processes update it at
+           once. A checkpoint that is left behind (e.g. because the
+           update failed) is still correct, as the balance is
+           calculated forward from it. A checkpoint that can't be read
+           is replaced
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+        bucket = self._get_account_bucket(bucket)
+        key = self._checkpoint_key()
+        hourly_time = _get_hour_from_key(hourly_key)
+
+        data = {"key": hourly_key, "balance": hourly_balance.to_data()}
+
+        for _ in range(0, 5):
+            try:
+                (checkpoint, etag) = \
+                    _ObjectStore.get_object_from_json_and_etag(bucket, key)
+            except:
+                # there is no checkpoint yet
+                if _ObjectStore.set_object_from_json_if_absent(bucket, key,
+                                                               data):
+                    return
+
+                continue
+
+            try:
+                checkpoint_time = _get_hour_from_key(checkpoint["key"])
+            except:
+                # the checkpoint is corrupt, so it is overwritten
+                checkpoint_time = None
+
+            if checkpoint_time is not None and checkpoint_time >= hourly_time:
+                # someone has already moved it forward
+                return
+            elif _ObjectStore.set_object_from_json_if_match(bucket, key,
+                                                            data, etag):
+                return
+
     def _find_last_balance_key(self, now=None, bucket=None):
         """Return the key containing the last hourly balance update before
-           'now' (defaults to actual now if not set)
+           'now' (defaults to actual now if not set). This searches
+           through the balance keys, so is only used if there is no
+           checkpoint before 'now' (see '_get_hourly_balance')
         """
         from Acquire.ObjectStore import ObjectStore as _ObjectStore
         now = self._get_now(now)
@@ -507,21 +561,33 @@ class Account:
         hourly_now_time = _get_hourly_datetime(now)
 
         if hourly_balance is None:
-            # look for the last balance key...
-            last_balance_key = self._find_last_balance_key(now=now,
-                                                           bucket=bucket)
+            # start from the checkpoint, if it is before now
+            (last_balance_key, last_balance) = self._get_checkpoint(bucket)
+
+            if last_balance_key is not None:
+                last_balance_time = _get_hour_from_key(last_balance_key)
+
+                if last_balance_time > hourly_now_time:
+                    last_balance_key = None
 
             if last_balance_key is None:
-                from Acquire.Accounting import AccountError
-                raise AccountError(
-                    "The first balance of the account %s has not been set?"
-                    % str(self))
+                # the checkpoint is missing (or is after now), so
+                # search for the last balance key...
+                last_balance_key = self._find_last_balance_key(
+                                                now=now, bucket=bucket)
 
-            data = _ObjectStore.get_object_from_json(bucket=bucket,
-                                                     key=last_balance_key)
+                if last_balance_key is None:
+                    from Acquire.Accounting import AccountError
+                    raise AccountError(
+                        "The first balance of the account %s has not been "
+                        "set?" % str(self))
+
+                data = _ObjectStore.get_object_from_json(
+                                            bucket=bucket,
+                                            key=last_balance_key)
 
-            last_balance = _Balance.from_data(data)
-            last_balance_time = _get_hour_from_key(last_balance_key)
+                last_balance = _Balance.from_data(data)
+                last_balance_time = _get_hour_from_key(last_balance_key)
 
             transactions = self._get_transactions_between(
                                         start_datetime=last_balance_time,
@@ -530,11 +596,19 @@ class Account:
             total = _sum_transactions(transactions)
 
             hourly_balance = last_balance + total
+            is_new = True
+        else:
+            is_new = False
 
         _ObjectStore.set_object_from_json(bucket=bucket,
                                           key=hourly_key,
                                           data=hourly_balance.to_data())
 
+        if is_new:
+            self._update_checkpoint(hourly_key=hourly_key,
+                                    hourly_balance=hourly_balance,
+                                    bucket=bucket)
+
         self._last_update[hourly_key] = \
             {"hourly_balance": hourly_balance,
              "last_update_time": hourly_now_time,
@@ -786,7 +860,9 @@ class Account:
         l = _LineItem(debit_note.uid(), refund.authorisation())
 
         bucket = self._get_account_bucket()
-        _ObjectStore.set_object_from_json(bucket, item_key, l.to_data())
+        _ObjectStore.set_object_from_json(
+                    bucket, item_key, l.to_data(),
+                    codec=_ObjectStore.get_record_codec("LineItem"))
 
         return (uid, now)
 
@@ -846,7 +922,9 @@ class Account:
                 # we have not moved into the next hour
                 break
 
-        _ObjectStore.set_object_from_json(bucket, item_key, l.to_data())
+        _ObjectStore.set_object_from_json(
+                    bucket, item_key, l.to_data(),
+                    codec=_ObjectStore.get_record_codec("LineItem"))
 
         return (uid, now)
 
@@ -918,7 +996,9 @@ class Account:
                 # we have not moved into another hour
                 break
 
-        _ObjectStore.set_object_from_json(bucket, item_key, l.to_data())
+        _ObjectStore.set_object_from_json(
+                    bucket, item_key, l.to_data(),
+                    codec=_ObjectStore.get_record_codec("LineItem"))
 
         return (uid, now)
 
@@ -979,7 +1059,9 @@ class Account:
                 # we are safely in the same hour
                 break
 
-        _ObjectStore.set_object_from_json(bucket, item_key, l.to_data())
+        _ObjectStore.set_object_from_json(
+                    bucket, item_key, l.to_data(),
+                    codec=_ObjectStore.get_record_codec("LineItem"))
 
         return (uid, now)
 
@@ -1051,13 +1133,16 @@ class Account:
         # original transaction in the transaction record
         l = _LineItem(debit_note.uid(), debit_note.authorisation())
 
-        _ObjectStore.set_object_from_json(bucket, item_key, l.to_data())
+        _ObjectStore.set_object_from_json(
+                    bucket, item_key, l.to_data(),
+                    codec=_ObjectStore.get_record_codec("LineItem"))
 
         return (uid, now)
 
     def _debit(self, transaction, authorisation,
                is_provisional, receipt_by,
-               authorisation_resource=None, bucket=None):
+               authorisation_resource=None, bucket=None,
+               is_locked=False):
         """Debit the value of the passed transaction from this account based
            on the authorisation contained
            in 'authorisation'. This will create a unique ID (UID) for
@@ -1078,6 +1163,10 @@ class Account:
            Note that this function is private as it should only be called
            by the DebitNote class
 
+           If 'is_locked' is True then the caller holds the mutex on this
+           account, so no other debit can take place at the same time, and
+           the balance does not need to be checked again after the debit
+
             Args:
                 transaction (Transaction): Holds the value to be debited
                 from this account
@@ -1089,6 +1178,8 @@ class Account:
                 should be receipted
                 TODO - improve bucket docs
                 bucket (dict, default=None): Bucket to load data from
+                is_locked (bool, default=False): Whether the caller holds
+                the mutex on this account
 
             Returns:
                 tuple (str, datetime, datetime): uid, now, receipt_by
@@ -1193,8 +1284,14 @@ class Account:
                 # record the transaction
                 break
 
-        _ObjectStore.set_object_from_json(bucket=bucket, key=item_key,
-                                          data=line_item.to_data())
+        _ObjectStore.set_object_from_json(
+                    bucket=bucket, key=item_key, data=line_item.to_data(),
+                    codec=_ObjectStore.get_record_codec("LineItem"))
+
+        if is_locked:
+            # no-one else can have debited this account since we
+            # checked the balance
+            return (uid, now, receipt_by)
 
         balance = self.balance(bucket=bucket)
 
@@ -1213,8 +1310,9 @@ class Account:
             item_key = "%s/%s" % (self._transactions_key(),
                                   info.to_key())
 
-            _ObjectStore.set_object_from_json(bucket=bucket, key=item_key,
-                                              data=line_item.to_data())
+            _ObjectStore.set_object_from_json(
+                    bucket=bucket, key=item_key, data=line_item.to_data(),
+                    codec=_ObjectStore.get_record_codec("LineItem"))
 
             raise InsufficientFundsError(
                 "You cannot debit '%s' from account %s as there "
@@ -1294,6 +1392,15 @@ class Account:
         else:
             return "%s/%s" % (_account_root(), self.uid())
 
+    def _mutex_key(self):
+        """Return the key of the mutex that is held by ledger operations
+           that debit this account
+        """
+        if self.is_null():
+            return None
+        else:
+            return self._key()
+
     def _transactions_key(self):
         """Return the root key for the transactions for this account
            in the object store
@@ -1303,6 +1410,15 @@ class Account:
         else:
             return "%s/txns" % self._key()
 
+    def _checkpoint_key(self):
+        """Return the key for the checkpoint of this account in the
+           object store. This records the latest hourly balance
+        """
+        if self.is_null():
+            return None
+        else:
+            return "%s/checkpoint" % self._key()
+
     def _balance_key(self):
         """Return the root key for the balances for this account
            in this object store
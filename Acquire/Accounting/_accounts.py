@@ -318,7 +318,8 @@ class Accounts:
 
         # make sure that no-one has created this account before
         from Acquire.ObjectStore import Mutex as _Mutex
-        m = _Mutex(account_key, timeout=600, lease_time=600, bucket=bucket)
+        m = _Mutex(account_key, timeout=600, lease_time=10, bucket=bucket,
+                   heartbeat=True)
 
         try:
             account_uid = _ObjectStore.get_string_object(bucket, account_key)
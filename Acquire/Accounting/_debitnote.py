@@ -9,7 +9,7 @@ class DebitNote:
     def __init__(self, transaction=None, account=None, authorisation=None,
                  is_provisional=False, receipt_by=None,
                  receipt=None, refund=None, authorisation_resource=None,
-                 bucket=None):
+                 account_is_locked=False, bucket=None):
         """Create a debit note for the passed transaction will debit value
            from the passed account. The note will create a unique ID (uid)
            for the debit, plus the datetime of the time that value was drawn
@@ -20,7 +20,8 @@ class DebitNote:
            of the transaction will be held until the corresponding CreditNote
            has been receipted. This must be receipted before 'receipt_by',
            else the value will be returned to the DebitNote account
-           (it will be automatically refunded)
+           (it will be automatically refunded). Pass 'account_is_locked'
+           if the caller holds the mutex on the account
         """
         self._transaction = None
 
@@ -46,7 +47,8 @@ class DebitNote:
                         authorisation=authorisation,
                         authorisation_resource=authorisation_resource,
                         is_provisional=is_provisional,
-                        receipt_by=receipt_by, bucket=bucket)
+                        receipt_by=receipt_by,
+                        account_is_locked=account_is_locked, bucket=bucket)
 
     def __str__(self):
         if self.is_null():
@@ -322,7 +324,8 @@ class DebitNote:
 
     def _create_from_transaction(self, transaction, account, authorisation,
                                  authorisation_resource,
-                                 is_provisional, receipt_by, bucket):
+                                 is_provisional, receipt_by, bucket,
+                                 account_is_locked=False):
         """Function used to construct a debit note by extracting the
            specified transaction value from the passed account. This
            is authorised using the passed authorisation, and can be
@@ -341,6 +344,8 @@ class DebitNote:
                 receipt_by (datetime): Datetime by which debit must be
                 receipted
                 bucket (dict): Bucket to read data from
+                account_is_locked (bool): Whether the caller holds the
+                mutex on the account
         """
         from Acquire.Accounting import Transaction as _Transaction
         from Acquire.Accounting import Account as _Account
@@ -369,7 +374,8 @@ class DebitNote:
                         authorisation=authorisation,
                         authorisation_resource=authorisation_resource,
                         is_provisional=is_provisional,
-                        receipt_by=receipt_by, bucket=bucket)
+                        receipt_by=receipt_by, bucket=bucket,
+                        is_locked=account_is_locked)
 
         from Acquire.ObjectStore import datetime_to_datetime \
             as _datetime_to_datetime
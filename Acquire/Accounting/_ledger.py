@@ -75,9 +75,9 @@ class Ledger:
 
             from Acquire.ObjectStore import ObjectStore as _ObjectStore
 
-            _ObjectStore.set_object_from_json(bucket,
-                                              Ledger.get_key(record.uid()),
-                                              record.to_data())
+            _ObjectStore.set_object_from_json(
+                bucket, Ledger.get_key(record.uid()), record.to_data(),
+                codec=_ObjectStore.get_record_codec("TransactionRecord"))
 
     @staticmethod
     def refund(refund, bucket=None):
@@ -90,9 +90,6 @@ class Ledger:
         """
         from Acquire.Accounting import Refund as _Refund
         from Acquire.Accounting import Account as _Account
-        from Acquire.Accounting import DebitNote as _DebitNote
-        from Acquire.Accounting import CreditNote as _CreditNote
-        from Acquire.Accounting import PairedNote as _PairedNote
         from Acquire.Accounting import TransactionRecord as _TransactionRecord
 
         if not isinstance(refund, _Refund):
@@ -112,6 +109,28 @@ class Ledger:
         credit_account = _Account(uid=refund.credit_account_uid(),
                                   bucket=bucket)
 
+        # a refund can take the credit account below its limit, so it
+        # must hold the same mutexes as 'perform', which only checks
+        # the balance of a locked account once
+        mutexes = Ledger._lock_accounts([debit_account, credit_account],
+                                        bucket=bucket)
+
+        try:
+            return Ledger._refund(refund, debit_account, credit_account,
+                                  bucket)
+        finally:
+            Ledger._unlock_accounts(mutexes)
+
+    @staticmethod
+    def _refund(refund, debit_account, credit_account, bucket):
+        """Internal function used by 'refund' to apply the passed refund
+           while holding the mutexes on both accounts
+        """
+        from Acquire.Accounting import DebitNote as _DebitNote
+        from Acquire.Accounting import CreditNote as _CreditNote
+        from Acquire.Accounting import PairedNote as _PairedNote
+        from Acquire.Accounting import TransactionRecord as _TransactionRecord
+
         # remember that a refund debits from the original credit account...
         # (and can only refund completed (DIRECT) transactions)
         debit_note = _DebitNote(refund=refund, account=credit_account,
@@ -192,10 +211,7 @@ class Ledger:
         """
         from Acquire.Accounting import Receipt as _Receipt
         from Acquire.Accounting import Account as _Account
-        from Acquire.Accounting import DebitNote as _DebitNote
-        from Acquire.Accounting import CreditNote as _CreditNote
         from Acquire.Accounting import TransactionRecord as _TransactionRecord
-        from Acquire.Accounting import PairedNote as _PairedNote
 
         if not isinstance(receipt, _Receipt):
             raise TypeError("The Receipt must be of type Receipt")
@@ -214,6 +230,25 @@ class Ledger:
         credit_account = _Account(uid=receipt.credit_account_uid(),
                                   bucket=bucket)
 
+        mutexes = Ledger._lock_accounts([debit_account, credit_account],
+                                        bucket=bucket)
+
+        try:
+            return Ledger._receipt(receipt, debit_account, credit_account,
+                                   bucket)
+        finally:
+            Ledger._unlock_accounts(mutexes)
+
+    @staticmethod
+    def _receipt(receipt, debit_account, credit_account, bucket):
+        """Internal function used by 'receipt' to apply the passed receipt
+           while holding the mutexes on both accounts
+        """
+        from Acquire.Accounting import DebitNote as _DebitNote
+        from Acquire.Accounting import CreditNote as _CreditNote
+        from Acquire.Accounting import TransactionRecord as _TransactionRecord
+        from Acquire.Accounting import PairedNote as _PairedNote
+
         debit_note = _DebitNote(receipt=receipt, account=debit_account,
                                 bucket=bucket)
 
@@ -312,10 +347,7 @@ class Ledger:
         """
         from Acquire.Accounting import Account as _Account
         from Acquire.Identity import Authorisation as _Authorisation
-        from Acquire.Accounting import DebitNote as _DebitNote
-        from Acquire.Accounting import CreditNote as _CreditNote
         from Acquire.Accounting import Transaction as _Transaction
-        from Acquire.Accounting import PairedNote as _PairedNote
 
         if not isinstance(debit_account, _Account):
             raise TypeError("The Debit Account must be of type Account")
@@ -355,6 +387,60 @@ class Ledger:
                 as _get_service_account_bucket
             bucket = _get_service_account_bucket()
 
+        # lock the debit and credit accounts, so that no other ledger
+        # operation can debit them at the same time. This means that the
+        # balance only needs to be checked once for each debit
+        mutexes = Ledger._lock_accounts([debit_account, credit_account],
+                                        bucket=bucket)
+
+        try:
+            return Ledger._perform(transactions, debit_account,
+                                   credit_account, authorisation,
+                                   authorisation_resource, is_provisional,
+                                   receipt_by, bucket)
+        finally:
+            Ledger._unlock_accounts(mutexes)
+
+    @staticmethod
+    def _lock_accounts(accounts, bucket):
+        """Lock the passed accounts, so that no other ledger operation
+           can change their balances at the same time. Every ledger
+           operation that debits an account (perform, refund and
+           receipt) must hold these mutexes, as 'perform' only checks
+           the balance of a locked account once. This returns the
+           held MutexSet
+        """
+        from Acquire.ObjectStore import MutexSet as _MutexSet
+
+        try:
+            return _MutexSet([account._mutex_key() for account in accounts],
+                             timeout=60, lease_time=10, heartbeat=True,
+                             bucket=bucket)
+        except Exception as e:
+            from Acquire.Accounting import LedgerError
+            raise LedgerError("Cannot secure the mutexes on the accounts "
+                              "for this transaction. Error = %s" % str(e))
+
+    @staticmethod
+    def _unlock_accounts(mutexes):
+        """Release the mutexes held by '_lock_accounts'"""
+        try:
+            mutexes.fully_unlock()
+        except:
+            # the transactions have already been recorded
+            pass
+
+    @staticmethod
+    def _perform(transactions, debit_account, credit_account, authorisation,
+                 authorisation_resource, is_provisional, receipt_by, bucket):
+        """Internal function used by 'perform' to perform the passed
+           transactions between 'debit_account' and 'credit_account'
+           while holding the mutexes on both accounts
+        """
+        from Acquire.Accounting import DebitNote as _DebitNote
+        from Acquire.Accounting import CreditNote as _CreditNote
+        from Acquire.Accounting import PairedNote as _PairedNote
+
         # first, try to debit all of the transactions. If any fail (e.g.
         # because there is insufficient balance) then they are all
         # immediately refunded
@@ -367,7 +453,8 @@ class Ledger:
                     authorisation=authorisation,
                     authorisation_resource=authorisation_resource,
                     is_provisional=is_provisional,
-                    receipt_by=receipt_by, bucket=bucket))
+                    receipt_by=receipt_by,
+                    account_is_locked=True, bucket=bucket))
 
                 # ensure the receipt_by date for all notes is the same
                 if is_provisional and (receipt_by is None):
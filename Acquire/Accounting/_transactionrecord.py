@@ -413,8 +413,11 @@ class TransactionRecord:
         from Acquire.Accounting import Ledger as _Ledger
         from Acquire.ObjectStore import Mutex as _Mutex
 
+        lease_time = 10
+
         try:
-            mutex = _Mutex(uid, timeout=600, lease_time=600)
+            mutex = _Mutex(uid, timeout=600, lease_time=lease_time,
+                           heartbeat=True)
         except Exception as e:
             raise LedgerError("Cannot secure a Ledger mutex for transaction "
                               "'%s'. Error = %s" % (uid, str(e)))
@@ -437,9 +440,10 @@ class TransactionRecord:
         if expected_state == new_state:
             return transaction
 
-        # make sure we have enough time remaining on the lease to be
-        # able to write this result back to the object store...
-        if mutex.seconds_remaining_on_lease() < 100:
+        # make sure that we still hold the mutex, with enough time left
+        # on the lease to save the transaction (the heartbeat renews
+        # the lease, but this could have been lost)...
+        if mutex.seconds_remaining_on_lease() < lease_time / 2:
             try:
                 mutex.fully_unlock()
             except:
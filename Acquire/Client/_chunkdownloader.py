@@ -91,13 +91,14 @@ class ChunkDownloader:
 
         return self._downloaded_filename
 
-    def download_next_chunk(self):
-        """Download the next chunk. Returns 'True' if something was
-           downloaded, else it returns 'False'
+    def _download_chunk(self, chunk_index, meta_only=False):
+        """Download the chunk at index 'chunk_index', returning the
+           tuple of the validated and uncompressed chunk data, the
+           chunk metadata and the number of chunks (if known). The
+           data and metadata are None if there is no chunk at this
+           index. If 'meta_only' is True then only the metadata
+           is downloaded
         """
-        if not self.is_open():
-            return False
-
         service = self.service()
 
         if service is None:
@@ -109,21 +110,30 @@ class ChunkDownloader:
         secret = _Hash.multi_md5(self._secret,
                                  "%s%s%d" % (self._drive_uid,
                                              self._file_uid,
-                                             self._next_index))
+                                             chunk_index))
 
         args = {}
         args["uid"] = self._uid
         args["drive_uid"] = self._drive_uid
         args["file_uid"] = self._file_uid
-        args["chunk_index"] = self._next_index
+        args["chunk_index"] = chunk_index
         args["secret"] = secret
 
+        if meta_only:
+            args["meta_only"] = True
+
         response = service.call_function(function="download_chunk",
                                          args=args)
 
+        chunk = None
+        meta = None
+        num_chunks = None
+
         if "meta" in response:
             import json as _json
             meta = _json.loads(response["meta"])
+
+        if "chunk" in response:
             checksum = meta["checksum"]
 
             from Acquire.ObjectStore import string_to_bytes \
@@ -141,21 +151,96 @@ class ChunkDownloader:
 
             import bz2 as _bz2
             chunk = _bz2.decompress(chunk)
+
+        if "num_chunks" in response:
+            num_chunks = int(response["num_chunks"])
+
+        return (chunk, meta, num_chunks)
+
+    def download_next_chunk(self):
+        """Download the next chunk. Returns 'True' if something was
+           downloaded, else it returns 'False'
+        """
+        if not self.is_open():
+            return False
+
+        (chunk, meta, num_chunks) = self._download_chunk(self._next_index)
+
+        if meta is not None:
             self._FILE.write(chunk)
             self._FILE.flush()
             chunk = None
 
             self._next_index = self._next_index + 1
 
-        if "num_chunks" in response:
-            num_chunks = int(response["num_chunks"])
-
+        if num_chunks is not None:
             if self._next_index >= num_chunks:
                 # nothing more to download
                 self.close()
 
         return True
 
+    def read_range(self, offset, length=None):
+        """Return up to 'length' bytes (or all remaining bytes if
+           'length' is None) of the file, starting from byte 'offset'.
+           The range is mapped onto the indices of the chunks that
+           hold it, so only those chunks are downloaded (chunks before
+           the range are skipped using their metadata, if this records
+           their size)
+        """
+        if self.is_null():
+            raise PermissionError(
+                "Cannot download a chunk using a null downloader!")
+
+        offset = int(offset)
+
+        if length is None:
+            end = None
+        else:
+            end = offset + int(length)
+
+        if offset < 0 or (end is not None and end < offset):
+            raise ValueError("Invalid range: offset=%s, length=%s" %
+                             (offset, length))
+
+        parts = []
+        position = 0
+        chunk_index = 0
+
+        while end is None or position < end:
+            size = None
+
+            if position < offset:
+                (chunk, meta, _num_chunks) = self._download_chunk(
+                                                chunk_index, meta_only=True)
+
+                if meta is None:
+                    break
+
+                size = meta.get("size", None)
+
+            if size is None or position + size > offset:
+                (chunk, meta, _num_chunks) = self._download_chunk(
+                                                                chunk_index)
+
+                if meta is None:
+                    break
+
+                size = len(chunk)
+
+                if position + size > offset:
+                    chunk_start = max(0, offset - position)
+
+                    if end is None:
+                        parts.append(chunk[chunk_start:])
+                    else:
+                        parts.append(chunk[chunk_start:end - position])
+
+            position += size
+            chunk_index += 1
+
+        return b"".join(parts)
+
     def download(self, filename=None, dir=None):
         """Download as much of the file as possible to 'filename'. You
            can call this repeatedly with the same filename (or with
@@ -179,16 +264,20 @@ class ChunkDownloader:
         """Return whether or not the file is open (has been written to)"""
         return self._next_index is not None
 
+    def _close_downloader(self):
+        """Tell the service that this downloader is no longer needed"""
+        args = {"uid": self._uid,
+                "drive_uid": self._drive_uid,
+                "file_uid": self._file_uid,
+                "secret": self._secret}
+
+        self.service().call_function(function="close_downloader",
+                                     args=args)
+
     def close(self):
         """Close the downloader"""
         if self.is_open():
-            args = {"uid": self._uid,
-                    "drive_uid": self._drive_uid,
-                    "file_uid": self._file_uid,
-                    "secret": self._secret}
-
-            self.service().call_function(function="close_downloader",
-                                         args=args)
+            self._close_downloader()
 
             self._FILE.close()
             self._last_filename = None
@@ -63,6 +63,9 @@ class ChunkUploader:
         if isinstance(chunk, str):
             chunk = chunk.encode("utf-8")
 
+        # record the uncompressed size, so that a range of the file
+        # can later be mapped onto the chunks that hold it
+        size = len(chunk)
         chunk = _bz2.compress(chunk)
         md5 = _Hash.md5(chunk)
         chunk = _bytes_to_string(chunk)
@@ -84,6 +87,7 @@ class ChunkUploader:
         args["secret"] = secret
         args["data"] = chunk
         args["checksum"] = md5
+        args["size"] = size
 
         service.call_function(function="upload_chunk", args=args)
 
@@ -279,38 +279,15 @@ class File:
 
         return downloader
 
-    def download(self, filename=None, version=None,
-                 dir=None, force_par=False):
-        """Download this file into the local directory
-           the local directory, or 'dir' if specified,
-           calling the file 'filename' (or whatever it is called
-           on the Drive if not specified). If a local
-           file exists with this name, then a new, unique filename
-           will be used. This returns the local filename of the
-           downloaded file (with full absolute path)
-
-           Note that this only downloads files for which you
-           have read-access. If the file is not readable then
-           an exception is raised and nothing is returned
-
-           If 'version' is specified then download a specific version
-           of the file. Otherwise download the version associated
-           with this file object
+    def _call_download(self, version=None, force_par=False):
+        """Internal function used to call the 'download' function of
+           the storage service for this file (or for the specified
+           'version'). This returns the tuple of the response, the
+           private key that decrypts the returned PAR or downloader,
+           and the storage service
         """
-        if self.is_null():
-            raise PermissionError("Cannot download a null File!")
-
-        if self._creds is None:
-            raise PermissionError("We have not properly opened the file!")
-
-        if filename is None:
-            filename = self._metadata.name()
-
         drive_uid = self._metadata.drive().uid()
 
-        from Acquire.Client import create_new_file as \
-            _create_new_file
-
         if self._creds.is_user():
             privkey = self._creds.user().session_key()
         else:
@@ -349,6 +326,126 @@ class File:
         response = storage_service.call_function(
                                 function="download", args=args)
 
+        return (response, privkey, storage_service)
+
+    def read_range(self, offset, length=None, version=None):
+        """Return up to 'length' bytes (or all remaining bytes if
+           'length' is None) of this file, starting from byte 'offset',
+           e.g. to read the header of a large file, or one frame of
+           a trajectory. Only the requested bytes are downloaded for
+           uncompressed files (using a ranged read via a PAR) and for
+           chunked files (by downloading only the chunks that hold
+           the range). Files that are stored compressed as a whole
+           must be downloaded in full before the range is extracted
+
+           If 'version' is specified then read from a specific version
+           of the file. Otherwise read from the version associated
+           with this file object
+        """
+        if self.is_null():
+            raise PermissionError("Cannot read from a null File!")
+
+        if self._creds is None:
+            raise PermissionError("We have not properly opened the file!")
+
+        offset = int(offset)
+
+        if length is not None:
+            length = int(length)
+
+        if offset < 0 or (length is not None and length < 0):
+            raise ValueError("Invalid range: offset=%s, length=%s" %
+                             (offset, length))
+
+        # small files are returned inline anyway, so only ask for a
+        # PAR if the file is large enough to benefit from a ranged read
+        filesize = self._metadata.filesize()
+        force_par = (filesize is None) or (filesize > 1048576)
+
+        (response, privkey, storage_service) = self._call_download(
+                                                    version=version,
+                                                    force_par=force_par)
+
+        from Acquire.Client import FileMeta as _FileMeta
+        filemeta = _FileMeta.from_data(response["filemeta"])
+
+        if "downloader" in response:
+            from Acquire.Client import ChunkDownloader as _ChunkDownloader
+            downloader = _ChunkDownloader.from_data(response["downloader"],
+                                                    privkey=privkey,
+                                                    service=storage_service)
+
+            try:
+                return downloader.read_range(offset, length)
+            finally:
+                downloader._close_downloader()
+
+        if "filedata" in response:
+            from Acquire.ObjectStore import string_to_bytes \
+                as _string_to_bytes
+            filedata = _string_to_bytes(response["filedata"])
+            filemeta.assert_correct_data(filedata)
+        elif "download_par" in response:
+            from Acquire.ObjectStore import OSPar as _OSPar
+            par = _OSPar.from_data(response["download_par"])
+
+            try:
+                if not filemeta.is_compressed():
+                    return par.read(privkey).read_range(offset, length)
+
+                filedata = par.read(privkey).get_object()
+            finally:
+                par.close(privkey)
+
+            filemeta.assert_correct_data(filedata)
+        else:
+            raise PermissionError("Unable to download the file!")
+
+        if filemeta.is_compressed():
+            from Acquire.Client import uncompress as _uncompress
+            filedata = _uncompress(
+                            inputdata=filedata,
+                            compression_type=filemeta.compression_type())
+
+        if length is None:
+            return filedata[offset:]
+        else:
+            return filedata[offset:offset + length]
+
+    def download(self, filename=None, version=None,
+                 dir=None, force_par=False):
+        """Download this file into the local directory
+           the local directory, or 'dir' if specified,
+           calling the file 'filename' (or whatever it is called
+           on the Drive if not specified). If a local
+           file exists with this name, then a new, unique filename
+           will be used. This returns the local filename of the
+           downloaded file (with full absolute path)
+
+           Note that this only downloads files for which you
+           have read-access. If the file is not readable then
+           an exception is raised and nothing is returned
+
+           If 'version' is specified then download a specific version
+           of the file. Otherwise download the version associated
+           with this file object
+        """
+        if self.is_null():
+            raise PermissionError("Cannot download a null File!")
+
+        if self._creds is None:
+            raise PermissionError("We have not properly opened the file!")
+
+        if filename is None:
+            filename = self._metadata.name()
+
+        from Acquire.Client import create_new_file as \
+            _create_new_file
+
+        (response, privkey, storage_service) = self._call_download(
+                                                    version=version,
+                                                    force_par=force_par)
+
         from Acquire.Client import FileMeta as _FileMeta
         filemeta = _FileMeta.from_data(response["filemeta"])
 
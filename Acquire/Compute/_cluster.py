@@ -347,16 +347,24 @@ class Cluster:
                 from Acquire.ObjectStore import get_datetime_now_to_string \
                     as _get_datetime_now_to_string
 
+                # claim the job atomically, so that if several pollers
+                # try to move the same job, only one will succeed
+                end_key = "compute/%s/%s" % (end_state.value, uid)
+
                 try:
-                    data = _ObjectStore.take_object_from_json(bucket=bucket,
-                                                              key=key)
-                    data[end_state.value] = _get_datetime_now_to_string()
-                    key = "compute/%s/%s" % (end_state.value, uid)
-                    _ObjectStore.set_object_from_json(bucket=bucket, key=key,
-                                                      data=data)
+                    data = _ObjectStore.claim_object_from_json(
+                                                    bucket=bucket,
+                                                    src_key=key,
+                                                    dst_key=end_key)
                 except:
                     data = None
 
+                if data is not None:
+                    data[end_state.value] = _get_datetime_now_to_string()
+                    _ObjectStore.set_object_from_json(bucket=bucket,
+                                                      key=end_key,
+                                                      data=data)
+
             if data is None:
                 raise KeyError(
                     "There is no job with UID %s in state %s" %
@@ -260,8 +260,9 @@ class LoginSession:
 
         self._status = status
         key = self._get_key()
-        _ObjectStore.set_object_from_json(bucket=bucket, key=key,
-                                          data=self.to_data())
+        _ObjectStore.set_object_from_json(
+                        bucket=bucket, key=key, data=self.to_data(),
+                        codec=_ObjectStore.get_record_codec("LoginSession"))
         key = "%s/status/%s" % (_sessions_key, self._uid)
         _ObjectStore.set_string_object(bucket=bucket, key=key,
                                        string_data=status)
@@ -452,8 +453,9 @@ class LoginSession:
         bucket = _get_service_account_bucket()
         key = self._get_key()
 
-        _ObjectStore.set_object_from_json(bucket=bucket, key=key,
-                                          data=self.to_data())
+        _ObjectStore.set_object_from_json(
+                        bucket=bucket, key=key, data=self.to_data(),
+                        codec=_ObjectStore.get_record_codec("LoginSession"))
 
     def _localise(self, scope, permissions):
         """Localise this session for the specified scope and permissions.
@@ -527,24 +529,33 @@ class LoginSession:
 
         prefix = "%s/%s/%s/" % (_sessions_key, status, short_uid)
 
-        try:
-            keys = _ObjectStore.get_all_objects_from_json(bucket=bucket,
-                                                          prefix=prefix)
-        except:
-            keys = {}
-
         sessions = []
-
-        for data in keys.values():
+        errors = {}
+
+        # sessions are fetched in parallel and processed as they arrive.
+        # Any that can't be read are skipped, and are reported if no
+        # valid session is found
+        for (key, data) in _ObjectStore.iter_objects_from_json(
+                                    bucket=bucket, prefix=prefix,
+                                    errors=errors):
             try:
                 session = LoginSession.from_data(data)
                 session._localise(scope=scope, permissions=permissions)
                 sessions.append(session)
-            except:
-                pass
+            except Exception as e:
+                errors[key] = e
 
         if len(sessions) == 0:
             from Acquire.Identity import LoginSessionError
+
+            if len(errors) > 0:
+                raise LoginSessionError(
+                    "There is no valid session with short UID %s in "
+                    "state %s. These sessions could not be read: %s" %
+                    (short_uid, status,
+                     ", ".join("%s (%s)" % (key, error)
+                               for (key, error) in errors.items())))
+
             raise LoginSessionError(
                 "There is no valid session with short UID %s "
                 "in state %s" % (short_uid, status))
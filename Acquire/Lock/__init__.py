@@ -0,0 +1,34 @@
+"""
+Acquire: (C) Christopher Woods 2019
+
+This module provides everything needed to implement an Acquire Lock
+Service. The Lock Service holds short-lived leases on keys in memory,
+so that services can lock a Mutex using a single short call, rather
+than with several round trips to the object store
+"""
+
+from ._errors import *
+from ._lock_manager import *
+from ._lock_request import *
+from ._lock_service import *
+from ._local_lock_service import *
+
+try:
+    if __IPYTHON__:
+        def _set_printer(C):
+            """Function to tell ipython to use __str__ if available"""
+            get_ipython().display_formatter.formatters['text/plain'].for_type(
+                C,
+                lambda obj, p, cycle: p.text(str(obj) if not cycle else '...')
+                )
+
+        import sys as _sys
+        import inspect as _inspect
+
+        _clsmembers = _inspect.getmembers(_sys.modules[__name__],
+                                          _inspect.isclass)
+
+        for _clsmember in _clsmembers:
+            _set_printer(_clsmember[1])
+except:
+    pass
@@ -0,0 +1,8 @@
+
+from Acquire.Service import ServiceError as _ServiceError
+
+__all__ = ["LockServiceError"]
+
+
+class LockServiceError(_ServiceError):
+    pass
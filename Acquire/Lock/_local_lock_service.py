@@ -0,0 +1,43 @@
+
+__all__ = ["LocalLockService"]
+
+
+class LocalLockService:
+    """This is an in-process stand-in for a LockService. It has the
+       same interface, but calls a LockManager directly rather than
+       calling a remote service. It is used for testing, and by
+       single-node deployments where all of the processes that lock
+       the same keys share this process
+    """
+    def __init__(self, manager=None):
+        """Construct the stand-in to use the passed LockManager. If
+           this is None then the LockManager of this process is used
+        """
+        if manager is None:
+            from Acquire.Lock import get_lock_manager as _get_lock_manager
+            manager = _get_lock_manager()
+
+        self._manager = manager
+
+    def __str__(self):
+        return "LocalLockService(%s)" % self._manager
+
+    def acquire(self, key, owner, lease_time=None, wait=None):
+        """Acquire the lease on 'key' for 'owner', waiting for up to
+           'wait' seconds. See LockManager.acquire
+        """
+        return self._manager.acquire(key=key, owner=owner,
+                                     lease_time=lease_time, wait=wait)
+
+    def renew(self, key, owner, lease_time=None):
+        """Renew the lease on 'key' held by 'owner'.
+           See LockManager.renew
+        """
+        return self._manager.renew(key=key, owner=owner,
+                                   lease_time=lease_time)
+
+    def release(self, key, owner):
+        """Release the lease on 'key' held by 'owner'.
+           See LockManager.release
+        """
+        return self._manager.release(key=key, owner=owner)
@@ -0,0 +1,334 @@
+
+import threading as _threading
+import time as _time
+from collections import deque as _deque
+
+__all__ = ["LockManager", "get_lock_manager"]
+
+# the longest time (in seconds) that a single call to 'acquire' will
+# wait for a lease. This is kept below the timeout of the service
+# function, so that waiters poll again rather than being cut off
+_max_wait = 15.0
+
+# the longest lease (in seconds) that can be granted
+_max_lease_time = 3600.0
+
+# expired leases are swept from memory once every this many operations
+_sweep_interval = 1024
+
+# the key of the mutex in the object store that is held by the running
+# instance of the lock service, and the minimum lease (in seconds) on it
+_instance_key = "lock_service/instance"
+_instance_lease_time = 60.0
+
+_lock_manager = None
+
+_lock_manager_lock = _threading.Lock()
+
+
+def get_lock_manager(single_instance=False):
+    """Return the LockManager that holds all of the leases of this
+       process, creating it if necessary. If 'single_instance' is True
+       then the manager will refuse to grant leases while another
+       instance of the lock service is running
+       (see LockManager.require_single_instance)
+    """
+    global _lock_manager
+
+    if _lock_manager is None:
+        with _lock_manager_lock:
+            if _lock_manager is None:
+                _lock_manager = LockManager()
+
+    if single_instance:
+        _lock_manager.require_single_instance()
+
+    return _lock_manager
+
+
+def _get_lease_time(lease_time):
+    """Return the passed lease time as a validated number of seconds"""
+    if lease_time is None:
+        return 10.0
+
+    lease_time = float(lease_time)
+
+    if lease_time <= 0 or lease_time > _max_lease_time:
+        from Acquire.Lock import LockServiceError
+        raise LockServiceError(
+            "Cannot grant a lease of %s seconds. Leases must be longer "
+            "than zero and no longer than %s seconds" %
+            (lease_time, _max_lease_time))
+
+    return lease_time
+
+
+class LockManager:
+    """This class holds leases on keys in memory. A lease is held by
+       an 'owner' (the secret of a Mutex) until it is released, or
+       until it expires, after which it is granted to the next waiter.
+
+       Waiters are queued per key and are granted the lease in the
+       order in which they asked for it. Every lease that is granted
+       is given a fencing token, which is larger than the token of any
+       lease granted before it. A holder can pass its token with any
+       writes it makes while it holds the lease, so that writes made
+       by a holder whose lease has expired can be detected and rejected
+
+       As the leases are held in memory, only one instance of the lock
+       service may run at a time. If 'require_single_instance' has been
+       called then the manager registers itself by holding a mutex in
+       the object store in 'bucket'. The lease on this mutex always
+       lasts longer than any lease granted by the manager, so another
+       instance cannot register (and so grant leases) until all of the
+       leases granted by this instance have expired
+    """
+    def __init__(self, bucket=None):
+        self._condition = _threading.Condition()
+
+        # the leases currently held, as key => [owner, token, expires],
+        # where 'expires' is measured using time.monotonic
+        self._leases = {}
+
+        # the queues of waiters for each key
+        self._queues = {}
+
+        # start the tokens from the current time (in microseconds) so
+        # that they keep increasing if the manager is restarted
+        self._last_token = int(_time.time() * 1000000)
+        self._operations = 0
+
+        # the mutex held to show that this is the running instance
+        self._bucket = bucket
+        self._single_instance = False
+        self._instance = None
+        self._instance_lock = _threading.Lock()
+
+    def __str__(self):
+        with self._condition:
+            return "LockManager(num_leases=%d, num_waiting=%d)" % (
+                len(self._leases),
+                sum(len(queue) for queue in self._queues.values()))
+
+    def require_single_instance(self):
+        """Require that this is the only running instance of the lock
+           service. Leases will only be granted or renewed while this
+           manager is registered as the running instance
+        """
+        self._single_instance = True
+
+    def _assert_single_instance(self, seconds):
+        """Assert that this manager is registered as the only running
+           instance of the lock service, and will stay registered for
+           at least another 'seconds' seconds. This raises a
+           LockServiceError if another instance is registered
+        """
+        if not self._single_instance:
+            return
+
+        # leave a margin for the time taken to reply to the caller
+        seconds = float(seconds) + 1.0
+
+        with self._instance_lock:
+            mutex = self._instance
+
+            if mutex is not None and \
+                    mutex.seconds_remaining_on_lease() >= seconds:
+                return
+
+            if mutex is None:
+                # the instance mutex must be in the object store, as
+                # the lock service can't be used to lock itself
+                from Acquire.ObjectStore import Mutex as _Mutex
+                mutex = _Mutex(key=_instance_key, bucket=self._bucket,
+                               acquire=False, use_lock_service=False)
+
+            if not mutex.try_lock(lease_time=max(seconds,
+                                                 _instance_lease_time)):
+                from Acquire.Lock import LockServiceError
+                raise LockServiceError(
+                    "Cannot use this instance of the lock service as "
+                    "another instance is running. Only a single instance "
+                    "of the lock service may run at a time")
+
+            self._instance = mutex
+
+    def _next_token(self):
+        """Return the next fencing token"""
+        self._last_token += 1
+        return self._last_token
+
+    def _sweep(self, now):
+        """Remove expired leases from memory. This is only done once
+           every '_sweep_interval' operations
+        """
+        self._operations += 1
+
+        if self._operations < _sweep_interval:
+            return
+
+        self._operations = 0
+
+        for key in [key for (key, lease) in self._leases.items()
+                    if lease[2] <= now and key not in self._queues]:
+            del self._leases[key]
+
+    def acquire(self, key, owner, lease_time=None, wait=None):
+        """Try to acquire the lease on 'key' for 'owner', for a
+           maximum of 'lease_time' seconds, waiting in the queue for
+           the key for up to 'wait' seconds. If 'owner' already holds
+           the lease then it is renewed.
+
+           This returns a dictionary containing whether or not the
+           lease was acquired, its fencing token, the number of
+           seconds remaining on the lease, whether or not it was taken
+           from a holder whose lease had expired, and the number of
+           seconds spent waiting. If the lease was not acquired then
+           the seconds remaining are those on the lease of the
+           current holder
+
+           Args:
+                key (str): Key to lease
+                owner (str): Secret that identifies the holder
+                lease_time (float): Number of seconds to hold the lease
+                wait (float): Number of seconds to wait for the lease
+           Returns:
+                dict: The result of the acquisition
+        """
+        key = str(key)
+        owner = str(owner)
+        lease_time = _get_lease_time(lease_time)
+
+        if wait is None:
+            wait = 0.0
+        else:
+            wait = min(max(0.0, float(wait)), _max_wait)
+
+        self._assert_single_instance(lease_time + wait)
+
+        with self._condition:
+            now = _time.monotonic()
+            start = now
+            deadline = now + wait
+            self._sweep(now)
+
+            lease = self._leases.get(key, None)
+
+            if lease is not None and lease[0] == owner:
+                lease[2] = now + lease_time
+                return {"acquired": True, "token": lease[1],
+                        "seconds_remaining": lease_time, "stolen": False,
+                        "waited": 0.0}
+
+            queue = self._queues.get(key, None)
+
+            if queue is None:
+                queue = _deque()
+                self._queues[key] = queue
+
+            waiter = object()
+            queue.append(waiter)
+
+            try:
+                while True:
+                    lease = self._leases.get(key, None)
+
+                    if queue[0] is waiter and \
+                            (lease is None or lease[2] <= now):
+                        queue.popleft()
+                        token = self._next_token()
+                        self._leases[key] = [owner, token, now + lease_time]
+                        return {"acquired": True, "token": token,
+                                "seconds_remaining": lease_time,
+                                "stolen": lease is not None,
+                                "waited": now - start}
+
+                    if lease is None:
+                        remaining = 0.0
+                    else:
+                        remaining = max(0.0, lease[2] - now)
+
+                    if now >= deadline:
+                        return {"acquired": False, "token": None,
+                                "seconds_remaining": remaining,
+                                "stolen": False, "waited": now - start}
+
+                    if lease is None:
+                        self._condition.wait(deadline - now)
+                    else:
+                        # wake up when the lease expires so that it
+                        # can be taken by the first waiter
+                        self._condition.wait(min(deadline - now,
+                                                 remaining + 0.001))
+
+                    now = _time.monotonic()
+            finally:
+                try:
+                    queue.remove(waiter)
+                except ValueError:
+                    pass
+
+                if len(queue) == 0 and self._queues.get(key, None) is queue:
+                    del self._queues[key]
+
+                # the next waiter may now be at the front of the queue
+                self._condition.notify_all()
+
+    def renew(self, key, owner, lease_time=None):
+        """Renew the lease on 'key' held by 'owner' for another
+           'lease_time' seconds. The lease is renewed only if 'owner'
+           still holds it, i.e. it has not been granted to someone else
+           after it expired. The fencing token is not changed.
+
+           Args:
+                key (str): Key that is leased
+                owner (str): Secret that identifies the holder
+                lease_time (float): Number of seconds to hold the lease
+           Returns:
+                dict: Whether or not the lease was renewed, its fencing
+                      token, and the seconds remaining on the lease
+        """
+        key = str(key)
+        owner = str(owner)
+        lease_time = _get_lease_time(lease_time)
+
+        self._assert_single_instance(lease_time)
+
+        with self._condition:
+            lease = self._leases.get(key, None)
+
+            if lease is None or lease[0] != owner:
+                return {"renewed": False, "token": None,
+                        "seconds_remaining": 0.0}
+
+            lease[2] = _time.monotonic() + lease_time
+
+            return {"renewed": True, "token": lease[1],
+                    "seconds_remaining": lease_time}
+
+    def release(self, key, owner):
+        """Release the lease on 'key' if it is held by 'owner'. This
+           returns whether or not the lease was released, and whether
+           or not it had already expired
+
+           Args:
+                key (str): Key that is leased
+                owner (str): Secret that identifies the holder
+           Returns:
+                dict: Whether or not the lease was released, and whether
+                      or not it had expired
+        """
+        key = str(key)
+        owner = str(owner)
+
+        with self._condition:
+            lease = self._leases.get(key, None)
+
+            if lease is None or lease[0] != owner:
+                return {"released": False, "expired": True}
+
+            del self._leases[key]
+            self._condition.notify_all()
+
+            return {"released": True,
+                    "expired": lease[2] < _time.monotonic()}
@@ -0,0 +1,95 @@
+
+__all__ = ["sign_lock_request", "verify_lock_request"]
+
+# the maximum age (in seconds) of a signed call to the lock service.
+# Older calls are rejected so that they cannot be replayed later
+_max_request_age = 60
+
+
+def sign_lock_request(function, args):
+    """Return the arguments for a call to 'function' on the lock
+       service, signed by this service so that the lock service
+       can verify that the call came from a service that it trusts
+
+       Args:
+            function (str): Name of the lock service function
+            args (dict): Arguments to the function
+       Returns:
+            dict: The signed arguments
+    """
+    from Acquire.Service import get_this_service as _get_this_service
+    from Acquire.ObjectStore import get_datetime_now_to_string \
+        as _get_datetime_now_to_string
+
+    service = _get_this_service(need_private_access=True)
+
+    request = dict(args)
+    request["function"] = function
+    request["signed_at"] = _get_datetime_now_to_string()
+
+    return {"request": service.sign_data(request)}
+
+
+def verify_lock_request(function, args):
+    """Verify that the passed arguments for a call to 'function' were
+       signed (recently) by a service that this lock service trusts,
+       returning the verified arguments. The owner of the lease is
+       prefixed with the UID of the calling service, so that services
+       cannot renew or release each other's leases. Only services that
+       have been explicitly trusted may call the lock service
+
+       Args:
+            function (str): Name of the lock service function
+            args (dict): Signed arguments to the function
+       Returns:
+            dict: The verified arguments
+    """
+    from Acquire.Lock import LockServiceError
+
+    try:
+        signed = args["request"]
+        service_uid = str(signed["service_uid"])
+    except:
+        raise LockServiceError(
+            "Calls to the lock service must be signed by a trusted service")
+
+    try:
+        from Acquire.Service import get_trusted_service \
+            as _get_trusted_service
+        service = _get_trusted_service(service_uid=service_uid,
+                                       autofetch=False)
+        request = service.verify_data(signed)
+    except Exception as e:
+        raise LockServiceError(
+            "Cannot verify that the call to the lock service came from "
+            "a trusted service: %s" % str(e))
+
+    if request.get("function", None) != function:
+        raise LockServiceError(
+            "The call to the lock service was signed for the function "
+            "'%s', not '%s'" % (request.get("function", None), function))
+
+    from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
+    from Acquire.ObjectStore import string_to_datetime \
+        as _string_to_datetime
+
+    try:
+        signed_at = _string_to_datetime(request["signed_at"])
+        age = (_get_datetime_now() - signed_at).total_seconds()
+    except:
+        age = None
+
+    if age is None or abs(age) > _max_request_age:
+        raise LockServiceError(
+            "The call to the lock service has expired. Calls must be "
+            "made within %s seconds of being signed" % _max_request_age)
+
+    del request["function"]
+    del request["signed_at"]
+
+    try:
+        request["owner"] = "%s/%s" % (service_uid, request["owner"])
+    except KeyError:
+        raise LockServiceError("The call to the lock service has no owner")
+
+    return request
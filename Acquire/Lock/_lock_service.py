@@ -0,0 +1,66 @@
+
+from Acquire.Service import Service as _Service
+
+__all__ = ["LockService"]
+
+
+class LockService(_Service):
+    """This is a specialisation of Service for Lock Services. A Lock
+       Service holds leases on keys in memory, and is used by Mutex
+       to lock a key using a single call to the service. Every call
+       is signed by the calling service, and the lock service only
+       accepts calls from the services that it trusts
+    """
+    def __init__(self, other=None):
+        if isinstance(other, _Service):
+            from copy import copy as _copy
+            self.__dict__ = _copy(other.__dict__)
+
+            if not self.is_lock_service():
+                from Acquire.Lock import LockServiceError
+                raise LockServiceError(
+                    "Cannot construct a LockService from "
+                    "a service which is not a lock service!")
+        else:
+            _Service.__init__(self)
+
+    def _call_local_function(self, function, args):
+        """Internal function called to short-cut local 'remote'
+           function calls
+        """
+        from lock.route import lock_functions as _lock_functions
+        from admin.handler import create_handler as _create_handler
+        handler = _create_handler(_lock_functions)
+        return handler(function=function, args=args)
+
+    def _call_signed(self, function, args):
+        """Call 'function' on the lock service, passing 'args' signed
+           by this service (see sign_lock_request)
+        """
+        from Acquire.Lock import sign_lock_request as _sign_lock_request
+        return self.call_function(function=function,
+                                  args=_sign_lock_request(function, args))
+
+    def acquire(self, key, owner, lease_time=None, wait=None):
+        """Ask the service to acquire the lease on 'key' for 'owner',
+           waiting for up to 'wait' seconds. See LockManager.acquire
+        """
+        return self._call_signed(function="acquire",
+                                 args={"key": key, "owner": owner,
+                                       "lease_time": lease_time,
+                                       "wait": wait})
+
+    def renew(self, key, owner, lease_time=None):
+        """Ask the service to renew the lease on 'key' held by 'owner'.
+           See LockManager.renew
+        """
+        return self._call_signed(function="renew",
+                                 args={"key": key, "owner": owner,
+                                       "lease_time": lease_time})
+
+    def release(self, key, owner):
+        """Ask the service to release the lease on 'key' held by
+           'owner'. See LockManager.release
+        """
+        return self._call_signed(function="release",
+                                 args={"key": key, "owner": owner})
@@ -8,11 +8,19 @@ by most of the other modules.
 """
 
 from ._objstore import *
+from ._objstore_cache import *
+from ._objstore_metrics import *
+from ._unit_of_work import *
+from ._async_objstore import *
+from ._simulated_objstore import *
+from ._diskcache_objstore import *
 from ._ospar import *
 from ._osparregistry import *
 from ._encoding import *
 from ._function import *
 from ._mutex import *
+from ._mutexset import *
+from ._readwritemutex import *
 from ._errors import *
 
 try:
@@ -0,0 +1,346 @@
+
+import asyncio as _asyncio
+import functools as _functools
+import threading as _threading
+
+__all__ = ["AsyncObjectStore"]
+
+_lock = _threading.Lock()
+
+# the dedicated pool of threads used to run blocking object store
+# calls, so that they do not block the event loop
+_executor = None
+
+# the number of threads in that pool
+_max_workers = 16
+
+# the default maximum number of objects fetched at once by the
+# bulk functions
+_default_max_concurrency = 32
+
+
+def _get_executor():
+    """Return the dedicated I/O thread pool, creating it if needed"""
+    global _executor
+
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                from concurrent.futures import ThreadPoolExecutor \
+                    as _ThreadPoolExecutor
+                _executor = _ThreadPoolExecutor(
+                                max_workers=_max_workers,
+                                thread_name_prefix="objstore_io")
+
+    return _executor
+
+
+def _is_nonblocking():
+    """Return whether or not the object store backend never blocks
+       (i.e. it holds all objects in memory), in which case calls
+       are made directly on the event loop rather than via a thread
+    """
+    from . import _objstore
+    from ._memory_objstore import Memory_ObjectStore
+
+    return _objstore._objstore_backend is Memory_ObjectStore
+
+
+async def _run(function, *args, **kwargs):
+    """Internal function that awaits 'function(*args, **kwargs)',
+       running it in the dedicated I/O thread pool
+    """
+    if _is_nonblocking():
+        return function(*args, **kwargs)
+
+    loop = _asyncio.get_event_loop()
+
+    # the I/O thread acts on behalf of the current request
+    from ._unit_of_work import _bind
+    from ._objstore_metrics import _bind as _bind_metrics
+
+    return await loop.run_in_executor(
+                            _get_executor(),
+                            _bind_metrics(_bind(_functools.partial(
+                                                function, *args, **kwargs))))
+
+
+async def _gather(function, bucket, keys, max_concurrency=None):
+    """Internal function that awaits 'function(bucket, key)' for all
+       of the passed keys, with up to 'max_concurrency' calls in flight
+       at once, and returns the list of (key, result, error) tuples
+       in the same order as 'keys'
+    """
+    if max_concurrency is None:
+        max_concurrency = _default_max_concurrency
+
+    semaphore = _asyncio.Semaphore(max(1, int(max_concurrency)))
+
+    async def _call(key):
+        async with semaphore:
+            try:
+                return (key, await _run(function, bucket, key), None)
+            except Exception as e:
+                return (key, None, e)
+
+    return await _asyncio.gather(*[_call(key) for key in keys])
+
+
+class AsyncObjectStore:
+    """This is an asyncio version of the ObjectStore facade. Every
+       function is a coroutine that makes the equivalent ObjectStore
+       call without blocking the event loop. Blocking backends (e.g.
+       the OCI SDK) are called from a dedicated pool of I/O threads,
+       while the in-memory backend is called directly.
+
+       As calls go through ObjectStore, they share the same
+       ObjectStoreCache, ObjectStoreUnitOfWork, codecs, compression
+       and ObjectStoreMetrics as synchronous code.
+
+       Use 'gather_objects' (or asyncio.gather with these functions)
+       to overlap the I/O of fan-out code, e.g.
+
+       objects = await AsyncObjectStore.gather_objects(
+                            bucket, keys, from_json=True)
+    """
+    @staticmethod
+    def set_max_workers(max_workers):
+        """Set the number of threads in the I/O thread pool. Calls
+           that are already running are allowed to finish
+        """
+        global _executor, _max_workers
+
+        with _lock:
+            _max_workers = max(1, int(max_workers))
+            old = _executor
+            _executor = None
+
+        if old is not None:
+            old.shutdown(wait=False)
+
+    @staticmethod
+    async def run(function, *args, **kwargs):
+        """Await 'function(*args, **kwargs)', running it in the I/O
+           thread pool. Use this to overlap any blocking code that
+           reads from the object store, e.g. calculating the balance
+           of several accounts
+        """
+        return await _run(function, *args, **kwargs)
+
+    @staticmethod
+    async def get_object(bucket, key):
+        """Return the binary data contained in the key 'key'"""
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        return await _run(_ObjectStore.get_object, bucket, key)
+
+    @staticmethod
+    async def get_object_and_etag(bucket, key):
+        """Return the tuple (data, etag) for the key 'key'"""
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        return await _run(_ObjectStore.get_object_and_etag, bucket, key)
+
+    @staticmethod
+    async def get_object_range(bucket, key, start, length=None):
+        """Return up to 'length' bytes of the object at 'key',
+           starting from byte 'start'
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        return await _run(_ObjectStore.get_object_range, bucket, key,
+                          start, length)
+
+    @staticmethod
+    async def get_string_object(bucket, key):
+        """Return the string in 'bucket' associated with 'key'"""
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        return await _run(_ObjectStore.get_string_object, bucket, key)
+
+    @staticmethod
+    async def get_object_from_json(bucket, key):
+        """Return the json-deserialised object at 'key'"""
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        return await _run(_ObjectStore.get_object_from_json, bucket, key)
+
+    @staticmethod
+    async def set_object(bucket, key, data, defer=False):
+        """Set the value of 'key' in 'bucket' to binary 'data'"""
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        await _run(_ObjectStore.set_object, bucket, key, data, defer=defer)
+
+    @staticmethod
+    async def set_string_object(bucket, key, string_data, defer=False):
+        """Set the value of 'key' in 'bucket' to the string 'string_data'"""
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        await _run(_ObjectStore.set_string_object, bucket, key,
+                   string_data, defer=defer)
+
+    @staticmethod
+    async def set_object_from_json(bucket, key, data, defer=False,
+                                   codec=None):
+        """Set the value of 'key' in 'bucket' to the json-serialised
+           version of 'data'
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        await _run(_ObjectStore.set_object_from_json, bucket, key, data,
+                   defer=defer, codec=codec)
+
+    @staticmethod
+    async def set_object_if_absent(bucket, key, data):
+        """Set 'key' to 'data' only if there is no object at 'key',
+           returning whether or not the object was written
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        return await _run(_ObjectStore.set_object_if_absent,
+                          bucket, key, data)
+
+    @staticmethod
+    async def set_object_if_match(bucket, key, data, etag):
+        """Set 'key' to 'data' only if the object at 'key' has the
+           passed 'etag', returning whether or not it was written
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        return await _run(_ObjectStore.set_object_if_match,
+                          bucket, key, data, etag)
+
+    @staticmethod
+    async def take_object(bucket, key):
+        """Take (delete) the object at 'key', returning its data"""
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        return await _run(_ObjectStore.take_object, bucket, key)
+
+    @staticmethod
+    async def claim_object(bucket, src_key, dst_key):
+        """Claim the object at 'src_key' by moving it to 'dst_key',
+           returning its data, or None if it could not be claimed
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        return await _run(_ObjectStore.claim_object,
+                          bucket, src_key, dst_key)
+
+    @staticmethod
+    async def get_all_object_names(bucket, prefix=None,
+                                   without_prefix=False):
+        """Return the names of all objects in the passed bucket"""
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        return await _run(_ObjectStore.get_all_object_names, bucket,
+                          prefix=prefix, without_prefix=without_prefix)
+
+    @staticmethod
+    async def iter_object_names(bucket, prefix=None, start_after=None,
+                                page_size=1000):
+        """Asynchronous generator that yields the names of all objects
+           in the passed bucket that start with 'prefix', fetching
+           them one page at a time
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+        while True:
+            (names, start_after) = await _run(
+                                        _ObjectStore.get_object_names_page,
+                                        bucket, prefix=prefix,
+                                        start_after=start_after,
+                                        page_size=page_size)
+
+            for name in names:
+                yield name
+
+            if start_after is None:
+                return
+
+    @staticmethod
+    async def list_children(bucket, prefix=None, delimiter="/"):
+        """Return the tuple (names, prefixes) of the immediate
+           children of 'prefix'
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        return await _run(_ObjectStore.list_children, bucket,
+                          prefix=prefix, delimiter=delimiter)
+
+    @staticmethod
+    async def delete_object(bucket, key):
+        """Remove the object at 'key' from the passed bucket"""
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        await _run(_ObjectStore.delete_object, bucket, key)
+
+    @staticmethod
+    async def delete_objects(bucket, keys, max_concurrency=None,
+                             errors=None):
+        """Delete the objects at all of the passed 'keys', running up
+           to 'max_concurrency' deletes at once. This returns the
+           number of objects deleted. Errors are handled as for
+           ObjectStore.delete_objects
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        from ._objstore import _handle_fetch_error
+
+        results = await _gather(_ObjectStore.delete_object, bucket, keys,
+                                max_concurrency)
+
+        ndeleted = 0
+
+        for (key, _result, error) in results:
+            if error is not None:
+                _handle_fetch_error(key, error, errors, action="delete")
+            else:
+                ndeleted += 1
+
+        return ndeleted
+
+    @staticmethod
+    async def gather_objects(bucket, keys, from_json=False,
+                             max_concurrency=None, errors=None):
+        """Fetch the objects at all of the passed 'keys' concurrently,
+           with up to 'max_concurrency' fetches in flight at once, and
+           return them as a list in the same order as 'keys'. If
+           'from_json' is True then the json-deserialised objects
+           are returned.
+
+           If 'errors' is a dictionary then the objects that could not
+           be fetched are returned as None and the exception is
+           recorded in 'errors'. Otherwise, the first failure is
+           raised as an ObjectStoreError
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        from ._objstore import _handle_fetch_error
+
+        if from_json:
+            function = _ObjectStore.get_object_from_json
+        else:
+            function = _ObjectStore.get_object
+
+        results = await _gather(function, bucket, keys, max_concurrency)
+
+        objects = []
+
+        for (key, data, error) in results:
+            if error is not None:
+                _handle_fetch_error(key, error, errors)
+
+            objects.append(data)
+
+        return objects
+
+    @staticmethod
+    async def get_objects(bucket, keys, from_json=False,
+                          max_concurrency=None, errors=None):
+        """Return a dictionary of the objects at all of the passed
+           'keys', in the same order as 'keys', fetched as for
+           'gather_objects'. Objects that could not be fetched are
+           left out of the result
+        """
+        keys = list(keys)
+
+        if errors is None:
+            failed = None
+        else:
+            failed = {}
+
+        objects = await AsyncObjectStore.gather_objects(
+                                    bucket, keys, from_json=from_json,
+                                    max_concurrency=max_concurrency,
+                                    errors=failed)
+
+        if failed:
+            errors.update(failed)
+
+        return {key: data for (key, data) in zip(keys, objects)
+                if failed is None or key not in failed}
@@ -0,0 +1,197 @@
+
+import json as _json
+
+# the registered codecs, indexed by name. Each is a tuple of
+# (header, encode, decode), where 'header' is the single byte that is
+# written before the encoded data (or None for codecs that write plain
+# json), 'encode' converts a json-serialisable object into bytes,
+# and 'decode' converts those bytes back into the object
+_codecs = {}
+
+# the codecs that write a header, indexed by their header byte
+_headers = {}
+
+# the name of the codec used when no codec is specified
+_default_codec = "json"
+
+# the codecs chosen by individual record types, indexed by type name
+_record_codecs = {}
+
+# the first bytes of valid (possibly whitespace-prefixed) json, plus
+# the first byte of the header of compressed objects. These cannot be
+# used as headers, so that existing objects are always auto-detected
+_reserved = b' \t\r\n{["-0123456789tfn\x1f'
+
+
+def _encode_json(data):
+    return _json.dumps(data).encode("utf-8")
+
+
+def _decode_json(data):
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode("utf-8")
+
+    return _json.loads(data)
+
+
+# the optional modules used by the codecs, which are None if they
+# are not installed, or False if this has not yet been checked
+_orjson = False
+_msgpack = False
+
+
+def _get_orjson():
+    """Return the orjson module, or None if it is not installed"""
+    global _orjson
+
+    if _orjson is False:
+        try:
+            import orjson
+            _orjson = orjson
+        except ImportError:
+            _orjson = None
+
+    return _orjson
+
+
+def _get_msgpack():
+    """Return the msgpack module, or None if it is not installed"""
+    global _msgpack
+
+    if _msgpack is False:
+        try:
+            import msgpack
+            _msgpack = msgpack
+        except ImportError:
+            _msgpack = None
+
+    return _msgpack
+
+
+def _encode_orjson(data):
+    try:
+        return _get_orjson().dumps(data)
+    except TypeError:
+        # orjson is stricter than json, e.g. it does not support
+        # non-string dictionary keys or integers above 64 bits
+        return _encode_json(data)
+
+
+def _decode_orjson(data):
+    orjson = _get_orjson()
+
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        # e.g. NaN or an integer above 64 bits
+        return _decode_json(data)
+
+
+def _encode_msgpack(data):
+    return _get_msgpack().packb(data, use_bin_type=True)
+
+
+def _decode_msgpack(data):
+    msgpack = _get_msgpack()
+
+    if msgpack is None:
+        from Acquire.ObjectStore import ObjectStoreError
+        raise ObjectStoreError(
+            "Cannot decode an object that was encoded using msgpack as "
+            "msgpack is not installed. Please install it, e.g. "
+            "'pip install msgpack'")
+
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+def _is_available(name):
+    """Return whether or not the codec 'name' can be used to encode"""
+    if name == "orjson":
+        return _get_orjson() is not None
+    elif name == "msgpack":
+        return _get_msgpack() is not None
+    else:
+        return name in _codecs
+
+
+def _register(name, encode, decode, header=None):
+    """Register the codec 'name'. See ObjectStore.register_codec"""
+    if header is not None:
+        if isinstance(header, str):
+            header = header.encode("utf-8")
+
+        header = bytes(header)
+
+        if len(header) != 1 or header in _reserved:
+            from Acquire.ObjectStore import ObjectStoreError
+            raise ObjectStoreError(
+                "Codec headers must be a single byte that cannot start "
+                "a json document or compressed object, so '%s' is "
+                "not allowed" % header)
+
+        other = _headers.get(header, None)
+
+        if other is not None and other != name:
+            from Acquire.ObjectStore import ObjectStoreError
+            raise ObjectStoreError(
+                "The header '%s' is already used by the '%s' codec" %
+                (header, other))
+
+        _headers[header] = name
+
+    _codecs[name] = (header, encode, decode)
+
+
+def _get_codec_name(codec=None):
+    """Return the name of the codec that should be used to encode,
+       falling back to json if the requested codec is not available
+    """
+    if codec is None:
+        codec = _default_codec
+
+    if codec not in _codecs:
+        from Acquire.ObjectStore import ObjectStoreError
+        raise ObjectStoreError("There is no codec called '%s'. Available "
+                               "codecs are %s" % (codec, list(_codecs)))
+
+    if not _is_available(codec):
+        # this is an optional codec whose module is not installed
+        return "json"
+
+    return codec
+
+
+def _encode(data, codec=None):
+    """Encode the passed json-serialisable object into bytes using
+       'codec' (or the default codec), adding the codec's header
+    """
+    (header, encode, _decode) = _codecs[_get_codec_name(codec)]
+
+    if header is None:
+        return encode(data)
+    else:
+        return header + encode(data)
+
+
+def _decode(data):
+    """Decode the passed bytes into an object, auto-detecting the
+       codec from the header (after decompressing the data if it
+       was compressed). Data without a header is json
+    """
+    from ._compression import _decompress
+    data = _decompress(data)
+
+    name = _headers.get(bytes(data[0:1]), None)
+
+    if name is None:
+        if _get_orjson() is None:
+            return _decode_json(data)
+        else:
+            return _decode_orjson(data)
+
+    return _codecs[name][2](memoryview(data)[1:])
+
+
+_register("json", _encode_json, _decode_json)
+_register("orjson", _encode_orjson, _decode_orjson)
+_register("msgpack", _encode_msgpack, _decode_msgpack, header=b"\x01")
@@ -0,0 +1,262 @@
+
+import threading as _threading
+import zlib as _zlib
+
+# the magic header written before all compressed objects. This is
+# followed by a single byte identifying the algorithm. 0x1f cannot
+# start a json document, and is reserved so that it is not used as
+# the header of a codec
+_magic = b"\x1fC"
+
+_algorithm_tags = {"zstd": b"s", "zlib": b"z"}
+
+# the compression rules, indexed by (bucket ID, prefix), where the
+# bucket ID is None for rules that apply to all buckets. Each rule
+# is a tuple of (algorithm, level, dictionary name)
+_rules = {}
+
+# trained zstd dictionaries, indexed by name, and their names
+# indexed by the zstd dictionary ID
+_dictionaries = {}
+_dictionary_names = {}
+
+# objects smaller than this are never compressed
+_min_size = 128
+
+# per-thread cache of zstd compressors and decompressors, as these
+# are expensive to create (especially with a dictionary) and are
+# not thread-safe
+_local = _threading.local()
+
+
+# the zstandard module, None if it is not installed, or False if
+# this has not yet been checked
+_zstd = False
+
+
+def _get_zstd():
+    """Return the zstandard module, or None if it is not installed"""
+    global _zstd
+
+    if _zstd is False:
+        try:
+            import zstandard as _zstandard
+            _zstd = _zstandard
+        except ImportError:
+            _zstd = None
+
+    return _zstd
+
+
+def _get_rule(bucket, key):
+    """Return the compression rule (algorithm, level, dictionary)
+       for 'key' in 'bucket'. This is the rule with the longest
+       matching prefix, with rules for the bucket preferred over
+       rules for all buckets. This returns None if there is no rule
+    """
+    if len(_rules) == 0 or key is None:
+        return None
+
+    from ._objstore_cache import _get_bucket_id
+    bucket_id = _get_bucket_id(bucket)
+
+    best = None
+    best_score = None
+
+    for ((rule_bucket, prefix), rule) in list(_rules.items()):
+        if rule_bucket is not None and rule_bucket != bucket_id:
+            continue
+
+        if not key.startswith(prefix):
+            continue
+
+        score = (len(prefix), rule_bucket is not None)
+
+        if best_score is None or score > best_score:
+            best = rule
+            best_score = score
+
+    return best
+
+
+def _get_compressor(level, dictionary):
+    """Return this thread's zstd compressor for the passed level
+       and dictionary name
+    """
+    cache = getattr(_local, "compressors", None)
+
+    if cache is None:
+        cache = {}
+        _local.compressors = cache
+
+    compressor = cache.get((level, dictionary), None)
+
+    if compressor is None:
+        zstd = _get_zstd()
+
+        if dictionary is None:
+            compressor = zstd.ZstdCompressor(level=level)
+        else:
+            compressor = zstd.ZstdCompressor(
+                                level=level,
+                                dict_data=_dictionaries[dictionary])
+
+        cache[(level, dictionary)] = compressor
+
+    return compressor
+
+
+def _get_decompressor(dictionary):
+    """Return this thread's zstd decompressor for the passed
+       dictionary name
+    """
+    cache = getattr(_local, "decompressors", None)
+
+    if cache is None:
+        cache = {}
+        _local.decompressors = cache
+
+    decompressor = cache.get(dictionary, None)
+
+    if decompressor is None:
+        zstd = _get_zstd()
+
+        if dictionary is None:
+            decompressor = zstd.ZstdDecompressor()
+        else:
+            decompressor = zstd.ZstdDecompressor(
+                                dict_data=_dictionaries[dictionary])
+
+        cache[dictionary] = decompressor
+
+    return decompressor
+
+
+def _compress(bucket, key, data):
+    """Compress the passed data that will be written to 'key' in
+       'bucket', according to the compression rules. The data is
+       returned unchanged if there is no rule for this key, or if
+       compression would not make it smaller
+    """
+    rule = _get_rule(bucket, key)
+
+    if rule is None or len(data) < _min_size:
+        return data
+
+    (algorithm, level, dictionary) = rule
+
+    if algorithm == "zstd" and _get_zstd() is None:
+        # fall back to zlib if zstd is not installed
+        algorithm = "zlib"
+        dictionary = None
+
+    if algorithm == "zstd":
+        if dictionary not in _dictionaries:
+            dictionary = None
+
+        if level is None:
+            level = 3
+
+        compressed = _get_compressor(level, dictionary).compress(data)
+    elif algorithm == "zlib":
+        if level is None:
+            level = 6
+
+        compressed = _zlib.compress(data, level)
+    else:
+        return data
+
+    if len(compressed) + len(_magic) + 1 >= len(data):
+        return data
+
+    return _magic + _algorithm_tags[algorithm] + compressed
+
+
+def _decompress(data):
+    """Return the decompressed version of the passed data, or the
+       data unchanged if it does not start with the magic header
+    """
+    if bytes(data[0:len(_magic)]) != _magic:
+        return data
+
+    tag = bytes(data[len(_magic):len(_magic) + 1])
+    payload = memoryview(data)[len(_magic) + 1:]
+
+    from Acquire.ObjectStore import ObjectStoreError
+
+    if tag == _algorithm_tags["zlib"]:
+        return _zlib.decompress(payload)
+    elif tag != _algorithm_tags["zstd"]:
+        raise ObjectStoreError(
+            "Unrecognised compression algorithm '%s'" % tag)
+
+    zstd = _get_zstd()
+
+    if zstd is None:
+        raise ObjectStoreError(
+            "Cannot decompress an object that was compressed using zstd "
+            "as zstandard is not installed. Please install it, e.g. "
+            "'pip install zstandard'")
+
+    dict_id = zstd.get_frame_parameters(payload).dict_id
+    dictionary = None
+
+    if dict_id != 0:
+        dictionary = _dictionary_names.get(dict_id, None)
+
+        if dictionary is None:
+            raise ObjectStoreError(
+                "Cannot decompress an object that was compressed using "
+                "the zstd dictionary with ID %d as this dictionary has "
+                "not been loaded" % dict_id)
+
+    return _get_decompressor(dictionary).decompress(payload)
+
+
+def _set_dictionary(name, data):
+    """Load the zstd dictionary 'data' and register it as 'name'"""
+    zstd = _get_zstd()
+
+    if zstd is None:
+        from Acquire.ObjectStore import ObjectStoreError
+        raise ObjectStoreError(
+            "Cannot load compression dictionaries as zstandard is "
+            "not installed. Please install it, e.g. "
+            "'pip install zstandard'")
+
+    dictionary = zstd.ZstdCompressionDict(bytes(data))
+
+    _dictionaries[name] = dictionary
+    _dictionary_names[dictionary.dict_id()] = name
+
+    # make sure that no thread uses a compressor with the old dictionary
+    global _local
+    _local = _threading.local()
+
+
+def _train_dictionary(name, samples, size):
+    """Train a zstd dictionary of 'size' bytes from the passed samples,
+       register it as 'name' and return its data
+    """
+    zstd = _get_zstd()
+
+    if zstd is None:
+        from Acquire.ObjectStore import ObjectStoreError
+        raise ObjectStoreError(
+            "Cannot train compression dictionaries as zstandard is "
+            "not installed. Please install it, e.g. "
+            "'pip install zstandard'")
+
+    try:
+        dictionary = zstd.train_dictionary(int(size), list(samples))
+    except Exception as e:
+        from Acquire.ObjectStore import ObjectStoreError
+        raise ObjectStoreError(
+            "Unable to train the compression dictionary '%s'. Make sure "
+            "that there are enough samples (at least several hundred "
+            "typical objects): %s" % (name, str(e)))
+
+    data = dictionary.as_bytes()
+    _set_dictionary(name, data)
+
+    return data
@@ -0,0 +1,571 @@
+
+import hashlib as _hashlib
+import io as _io
+import json as _json
+import os as _os
+import threading as _threading
+import time as _time
+import uuid as _uuid
+
+__all__ = ["DiskCacheObjectStore"]
+
+# the write policies that can be set for a key prefix. Writes to
+# "write-through" prefixes update the cache, while writes to
+# "write-around" prefixes remove the key from the cache, so that it is
+# only cached again when it is next read
+_policies = ["write-through", "write-around"]
+
+# the prefixes of the objects of a service that are cached by default.
+# Only immutable objects are cached by default (old service keys are
+# written once, under the datetime they were replaced), as a node with
+# a stale copy of a mutable object, such as the current service key,
+# would never see the changes made by other nodes
+_default_prefixes = {"_service_key/oldkeys/": "write-through"}
+
+# the default maximum size of the cache (in bytes)
+_default_max_size = 256 * 1024 * 1024
+
+# the default size (in bytes) of the largest object that will be cached
+_default_max_object_size = 4 * 1024 * 1024
+
+# once the cache is over its maximum size, objects are evicted until
+# it has shrunk to this fraction of the maximum size
+_low_water_mark = 0.8
+
+
+def _get_default_directory():
+    """Return the default directory for the cache, which is shared
+       by all processes on this node
+    """
+    import tempfile as _tempfile
+    return _os.path.join(_tempfile.gettempdir(), "acquire_objstore_cache")
+
+
+def _hash(data):
+    return _hashlib.sha256(data).hexdigest()
+
+
+def _remove(filename):
+    """Remove 'filename', ignoring errors if it has already gone"""
+    try:
+        _os.unlink(filename)
+    except OSError:
+        pass
+
+
+class DiskCacheObjectStore:
+    """This wraps an object store backend with a cache of objects that
+       is held on local disk. The cache is shared by all processes
+       (e.g. function containers) on a node, so that hot, immutable
+       objects, such as old service keys, are only fetched over the
+       network once per node, rather than once per cold start.
+
+       Only keys that start with one of the passed 'prefixes' are
+       cached. This is a dictionary of the write policy for each
+       prefix, which is either "write-through" (writes update the
+       cache) or "write-around" (writes remove the key from the cache,
+       so that it is re-read from the backend). The policy of the
+       longest matching prefix is used.
+
+       The cache is content-addressed, with each object stored once
+       in a file named after the SHA256 of its data, plus an index
+       file per key. All files are written atomically (via a rename),
+       so concurrent readers never see partial writes. Every read is
+       validated against the size and checksum in the index, with
+       invalid entries discarded and re-read from the backend. Objects
+       are evicted in least-recently-used order once the cache grows
+       beyond 'max_size' bytes.
+
+       Writes made on other nodes are not seen until the object is
+       evicted, so only cache objects that are immutable, unless
+       'max_age' is set. Then, entries that are older than 'max_age'
+       seconds are revalidated against the size and checksum of the
+       object in the backend before being used. Objects that are read
+       and then written back under a Mutex (e.g. the current service
+       key) must never be cached.
+
+       Use this as the object store backend, e.g.
+
+       set_object_store_backend(DiskCacheObjectStore(OCI_ObjectStore))
+    """
+    def __init__(self, backend, directory=None, max_size=None,
+                 prefixes=None, max_object_size=None, max_age=None):
+        if directory is None:
+            directory = _get_default_directory()
+
+        if max_size is None:
+            max_size = _default_max_size
+
+        if max_object_size is None:
+            max_object_size = _default_max_object_size
+
+        if prefixes is None:
+            prefixes = _default_prefixes
+
+        for (prefix, policy) in prefixes.items():
+            if policy not in _policies:
+                from Acquire.ObjectStore import ObjectStoreError
+                raise ObjectStoreError(
+                    "Invalid write policy '%s' for prefix '%s'. Valid "
+                    "policies are %s" % (policy, prefix, _policies))
+
+        self._backend = backend
+        self._directory = _os.path.abspath(directory)
+        self._max_size = int(max_size)
+        self._max_object_size = min(int(max_object_size), self._max_size)
+        self._max_age = max_age
+
+        # longest first, so that the first match is the longest
+        self._prefixes = sorted(prefixes.items(),
+                                key=lambda item: len(item[0]),
+                                reverse=True)
+
+        for subdir in ["objects", "index", "tmp"]:
+            _os.makedirs(_os.path.join(self._directory, subdir),
+                         exist_ok=True)
+
+        self._lock = _threading.Lock()
+
+        # the number of bytes added to the cache by this process since
+        # the size of the cache was last checked. None means that the
+        # size has not yet been checked
+        self._added = None
+
+        self._statistics = {"hits": 0, "misses": 0, "invalid": 0,
+                            "stores": 0, "evictions": 0}
+
+    @staticmethod
+    def from_environment(backend):
+        """Return 'backend' wrapped in a DiskCacheObjectStore if the
+           'OBJSTORE_CACHE_DIR' environment variable is set, using
+           the directory and (optionally) the maximum size (in MB) set
+           by 'OBJSTORE_CACHE_MB'. Otherwise 'backend' is returned
+        """
+        directory = _os.getenv("OBJSTORE_CACHE_DIR")
+
+        if directory is None or len(directory) == 0:
+            return backend
+
+        max_size = _os.getenv("OBJSTORE_CACHE_MB")
+
+        if max_size:
+            max_size = int(float(max_size) * 1024 * 1024)
+        else:
+            max_size = None
+
+        return DiskCacheObjectStore(backend, directory=directory,
+                                    max_size=max_size)
+
+    def get_statistics(self):
+        """Return a dictionary of the number of hits, misses, invalid
+           entries, stored objects and evicted objects of this cache
+           in this process
+        """
+        with self._lock:
+            return dict(self._statistics)
+
+    def reset_statistics(self):
+        """Reset all of the statistics to zero"""
+        with self._lock:
+            for key in self._statistics:
+                self._statistics[key] = 0
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._statistics[name] += n
+
+    def _get_policy(self, key):
+        """Return the write policy for 'key', or None if 'key' is
+           not cached
+        """
+        for (prefix, policy) in self._prefixes:
+            if key.startswith(prefix):
+                return policy
+
+        return None
+
+    def _get_index_file(self, bucket, key):
+        from ._objstore_cache import _get_bucket_id
+        from ._objstore_utils import _clean_key
+
+        name = _hash(("%s\x00%s" % (_get_bucket_id(bucket),
+                                    _clean_key(key))).encode("utf-8"))
+
+        return _os.path.join(self._directory, "index", name[0:2], name)
+
+    def _get_object_file(self, digest):
+        return _os.path.join(self._directory, "objects", digest[0:2],
+                             digest)
+
+    def _write_atomic(self, filename, data):
+        """Atomically write 'data' to 'filename', by writing to a
+           temporary file and then renaming it into place
+        """
+        tmpfile = _os.path.join(self._directory, "tmp",
+                                "%s.tmp" % _uuid.uuid4().hex)
+
+        try:
+            with open(tmpfile, "wb") as FILE:
+                FILE.write(data)
+
+            try:
+                _os.replace(tmpfile, filename)
+            except FileNotFoundError:
+                # the parent directory has not yet been created
+                _os.makedirs(_os.path.dirname(filename), exist_ok=True)
+                _os.replace(tmpfile, filename)
+        except:
+            _remove(tmpfile)
+            raise
+
+    def _read(self, bucket, key):
+        """Return the cached data for 'key', or None if it is not
+           in the cache or the cached entry is not valid
+        """
+        index_file = self._get_index_file(bucket, key)
+
+        try:
+            with open(index_file, "rb") as FILE:
+                entry = _json.loads(FILE.read())
+
+            object_file = self._get_object_file(entry["digest"])
+
+            with open(object_file, "rb") as FILE:
+                data = FILE.read()
+        except Exception:
+            # not cached, or evicted by another process
+            self._count("misses")
+            return None
+
+        if len(data) != entry["size"] or _hash(data) != entry["digest"]:
+            # the object file has been truncated or corrupted
+            _remove(object_file)
+            _remove(index_file)
+            self._count("invalid")
+            return None
+
+        if self._max_age is not None and \
+                _time.time() - entry["time"] > self._max_age:
+            try:
+                checksum = self._backend.get_size_and_checksum(bucket, key)
+            except Exception:
+                checksum = None
+
+            if checksum is None or \
+                    tuple(checksum) != (entry["size"], entry["md5"]):
+                _remove(index_file)
+                self._count("misses")
+                return None
+
+            entry["time"] = _time.time()
+
+            try:
+                self._write_atomic(index_file,
+                                   _json.dumps(entry).encode("utf-8"))
+            except OSError:
+                pass
+
+        try:
+            # the modification time records when the object was last
+            # used, so that the least recently used are evicted first
+            _os.utime(object_file)
+        except OSError:
+            pass
+
+        self._count("hits")
+        return data
+
+    def _store(self, bucket, key, data):
+        """Add 'data' to the cache as the object at 'key'"""
+        if data is None:
+            data = b""
+
+        data = bytes(data)
+
+        if len(data) > self._max_object_size:
+            self._invalidate(bucket, key)
+            return
+
+        digest = _hash(data)
+        entry = {"digest": digest, "size": len(data),
+                 "md5": _hashlib.md5(data).hexdigest(),
+                 "time": _time.time()}
+
+        try:
+            object_file = self._get_object_file(digest)
+
+            if _os.path.exists(object_file):
+                # the same data is already cached for another key
+                _os.utime(object_file)
+            else:
+                self._write_atomic(object_file, data)
+
+            self._write_atomic(self._get_index_file(bucket, key),
+                               _json.dumps(entry).encode("utf-8"))
+        except OSError:
+            # the cache is best effort, e.g. the disk may be full
+            self._invalidate(bucket, key)
+            return
+
+        self._count("stores")
+        self._added_bytes(len(data))
+
+    def _invalidate(self, bucket, key):
+        """Remove 'key' from the cache"""
+        _remove(self._get_index_file(bucket, key))
+
+    def _added_bytes(self, nbytes):
+        """Record that 'nbytes' have been added to the cache, evicting
+           objects if this may have pushed the cache over its size
+        """
+        with self._lock:
+            if self._added is None:
+                # always check the size the first time, as other
+                # processes will have filled the cache
+                check = True
+                self._added = 0
+            else:
+                self._added += nbytes
+                check = self._added > (1.0 - _low_water_mark) * \
+                    self._max_size
+
+            if check:
+                self._added = 0
+
+        if check:
+            self.evict()
+
+    def evict(self):
+        """Evict the least recently used objects until the cache is
+           below its maximum size, returning the number of evicted
+           objects. This is called automatically as objects are added
+        """
+        lockfile = _os.path.join(self._directory, "evict.lock")
+
+        try:
+            import fcntl as _fcntl
+        except ImportError:
+            _fcntl = None
+
+        with open(lockfile, "a") as LOCK:
+            if _fcntl is not None:
+                try:
+                    _fcntl.flock(LOCK, _fcntl.LOCK_EX | _fcntl.LOCK_NB)
+                except OSError:
+                    # another process is already evicting
+                    return 0
+
+            objects = []
+            total = 0
+
+            for (dirpath, _dirnames, filenames) in \
+                    _os.walk(_os.path.join(self._directory, "objects")):
+                for filename in filenames:
+                    filename = _os.path.join(dirpath, filename)
+
+                    try:
+                        stat = _os.stat(filename)
+                    except OSError:
+                        continue
+
+                    objects.append((stat.st_mtime, stat.st_size, filename))
+                    total += stat.st_size
+
+            if total <= self._max_size:
+                return 0
+
+            objects.sort()
+            target = _low_water_mark * self._max_size
+            nevicted = 0
+
+            for (_mtime, size, filename) in objects:
+                if total <= target:
+                    break
+
+                _remove(filename)
+                total -= size
+                nevicted += 1
+
+            self._remove_dangling()
+
+        self._count("evictions", nevicted)
+        return nevicted
+
+    def _remove_dangling(self):
+        """Remove the index entries whose objects have been evicted,
+           plus any temporary files abandoned by crashed processes
+        """
+        for (dirpath, _dirnames, filenames) in \
+                _os.walk(_os.path.join(self._directory, "index")):
+            for filename in filenames:
+                filename = _os.path.join(dirpath, filename)
+
+                try:
+                    with open(filename, "rb") as FILE:
+                        digest = _json.loads(FILE.read())["digest"]
+                except Exception:
+                    continue
+
+                if not _os.path.exists(self._get_object_file(digest)):
+                    _remove(filename)
+
+        tmpdir = _os.path.join(self._directory, "tmp")
+        too_old = _time.time() - 3600
+
+        for filename in _os.listdir(tmpdir):
+            filename = _os.path.join(tmpdir, filename)
+
+            try:
+                if _os.stat(filename).st_mtime < too_old:
+                    _remove(filename)
+            except OSError:
+                pass
+
+    def clear(self):
+        """Remove all objects from the cache"""
+        for subdir in ["index", "objects"]:
+            for (dirpath, _dirnames, filenames) in \
+                    _os.walk(_os.path.join(self._directory, subdir)):
+                for filename in filenames:
+                    _remove(_os.path.join(dirpath, filename))
+
+    def __getattr__(self, name):
+        """Pass all of the other functions through to the backend"""
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        return getattr(self._backend, name)
+
+    # The functions below read from, or keep up to date, the cache
+
+    def get_object(self, bucket, key):
+        if self._get_policy(key) is None:
+            return self._backend.get_object(bucket, key)
+
+        data = self._read(bucket, key)
+
+        if data is None:
+            data = self._backend.get_object(bucket, key)
+            self._store(bucket, key, data)
+
+        return data
+
+    def get_object_and_etag(self, bucket, key):
+        # this is used for compare-and-swap, so must always read the
+        # latest version from the backend
+        (data, etag) = self._backend.get_object_and_etag(bucket, key)
+
+        if self._get_policy(key) is not None:
+            self._store(bucket, key, data)
+
+        return (data, etag)
+
+    def get_object_range(self, bucket, key, start, length=None):
+        if self._get_policy(key) is not None:
+            data = self._read(bucket, key)
+
+            if data is not None:
+                if length is None:
+                    return data[start:]
+                else:
+                    return data[start:start + length]
+
+        return self._backend.get_object_range(bucket, key, start, length)
+
+    def open_object(self, bucket, key):
+        if self._get_policy(key) is not None:
+            data = self._read(bucket, key)
+
+            if data is not None:
+                return _io.BytesIO(data)
+
+        return self._backend.open_object(bucket, key)
+
+    def _written(self, bucket, key, data):
+        """Update the cache after 'data' has been written to 'key'"""
+        policy = self._get_policy(key)
+
+        if policy == "write-through":
+            self._store(bucket, key, data)
+        elif policy is not None:
+            self._invalidate(bucket, key)
+
+    def set_object(self, bucket, key, data):
+        policy = self._get_policy(key)
+
+        if policy is not None:
+            # remove first, so that a failed write cannot leave the
+            # old value in the cache
+            self._invalidate(bucket, key)
+
+        self._backend.set_object(bucket, key, data)
+        self._written(bucket, key, data)
+
+    def set_object_if_absent(self, bucket, key, data):
+        written = self._backend.set_object_if_absent(bucket, key, data)
+
+        if written:
+            self._written(bucket, key, data)
+
+        return written
+
+    def set_object_if_match(self, bucket, key, data, etag):
+        policy = self._get_policy(key)
+
+        if policy is not None:
+            self._invalidate(bucket, key)
+
+        written = self._backend.set_object_if_match(bucket, key, data, etag)
+
+        if written:
+            self._written(bucket, key, data)
+
+        return written
+
+    def commit_multipart_upload(self, bucket, key, upload_id, parts):
+        if self._get_policy(key) is not None:
+            self._invalidate(bucket, key)
+
+        return self._backend.commit_multipart_upload(bucket, key,
+                                                     upload_id, parts)
+
+    def delete_object(self, bucket, key):
+        if self._get_policy(key) is not None:
+            self._invalidate(bucket, key)
+
+        self._backend.delete_object(bucket, key)
+
+    def delete_object_if_match(self, bucket, key, etag):
+        if self._get_policy(key) is not None:
+            self._invalidate(bucket, key)
+
+        return self._backend.delete_object_if_match(bucket, key, etag)
+
+    def take_object(self, bucket, key):
+        if self._get_policy(key) is not None:
+            self._invalidate(bucket, key)
+
+        return self._backend.take_object(bucket, key)
+
+    def claim_object(self, bucket, src_key, dst_key):
+        for key in [src_key, dst_key]:
+            if self._get_policy(key) is not None:
+                self._invalidate(bucket, key)
+
+        return self._backend.claim_object(bucket, src_key, dst_key)
+
+    def delete_all_objects(self, bucket, prefix=None):
+        if prefix is None:
+            prefix = ""
+
+        for (cached, _policy) in self._prefixes:
+            if cached.startswith(prefix) or prefix.startswith(cached):
+                names = self._backend.get_all_object_names(bucket, prefix)
+
+                for name in names:
+                    if self._get_policy(name) is not None:
+                        self._invalidate(bucket, name)
+
+                break
+
+        self._backend.delete_all_objects(bucket, prefix)
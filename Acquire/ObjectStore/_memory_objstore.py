@@ -0,0 +1,689 @@
+
+import io as _io
+import os as _os
+import bisect as _bisect
+import datetime as _datetime
+import uuid as _uuid
+import threading as _threading
+
+from ._objstore_utils import _get_driver_details_from_par, \
+    _get_driver_details_from_data, _get_etag, _clean_key, _get_prefix_end
+
+__all__ = ["Memory_ObjectStore"]
+
+# all of the buckets in this process, indexed by name
+_buckets = {}
+
+_buckets_lock = _threading.Lock()
+
+
+class _MemoryBucket:
+    """The contents of a single in-memory bucket. The objects are held
+       in a dictionary, with a sorted list of keys used as the index
+       for listing. Each bucket has its own lock, so operations on
+       different buckets never contend
+    """
+    def __init__(self):
+        self.lock = _threading.RLock()
+        self.objects = {}
+        self.keys = []
+        self.uploads = {}
+
+    def set(self, key, data):
+        if key not in self.objects:
+            _bisect.insort(self.keys, key)
+
+        if data is None:
+            data = b""
+
+        self.objects[key] = (bytes(data), _get_etag(data))
+
+    def remove(self, key):
+        value = self.objects.pop(key, None)
+
+        if value is not None:
+            i = _bisect.bisect_left(self.keys, key)
+            del self.keys[i]
+
+        return value
+
+    def get_range(self, prefix, start_after=None):
+        """Return the indexes in 'keys' of the first key that starts
+           with 'prefix' (and is after 'start_after') and of the key
+           after the last key that starts with 'prefix'
+        """
+        if prefix is None:
+            prefix = ""
+
+        start = _bisect.bisect_left(self.keys, prefix)
+
+        if start_after is not None:
+            start = max(start, _bisect.bisect_right(self.keys, start_after))
+
+        end = _get_prefix_end(prefix)
+
+        if end is None:
+            end = len(self.keys)
+        else:
+            end = _bisect.bisect_left(self.keys, end)
+
+        return (start, end)
+
+
+def _get_bucket(bucket, create_if_needed=False):
+    """Return the _MemoryBucket called 'bucket'"""
+    with _buckets_lock:
+        b = _buckets.get(bucket, None)
+
+        if b is None and create_if_needed:
+            b = _MemoryBucket()
+            _buckets[bucket] = b
+
+    return b
+
+
+def _no_object(key):
+    from Acquire.ObjectStore import ObjectStoreError
+    return ObjectStoreError("No object at key '%s'" % key)
+
+
+def _get_value(bucket, key):
+    """Return the (data, etag) of the object at 'key' in 'bucket'"""
+    b = _get_bucket(bucket)
+    value = None
+
+    if b is not None:
+        with b.lock:
+            value = b.objects.get(key, None)
+
+    if value is None:
+        raise _no_object(key)
+
+    return value
+
+
+def _split_url(url):
+    """Split the passed 'memory://' PAR url into the bucket and key"""
+    path = url[9:]
+
+    with _buckets_lock:
+        names = list(_buckets.keys())
+
+    # find the longest bucket name that matches the url
+    for bucket in sorted(names, key=len, reverse=True):
+        if path == bucket:
+            return (bucket, "")
+        elif path.startswith("%s/" % bucket):
+            return (bucket, path[len(bucket) + 1:])
+
+    from Acquire.ObjectStore import ObjectStoreError
+    raise ObjectStoreError("There is no bucket for the URL '%s'" % url)
+
+
+class Memory_ObjectStore:
+    """This is an object store that holds all objects in memory, in
+       this process. Each bucket keeps a sorted index of its keys,
+       so listings are bisections of the index rather than walks of
+       a filesystem. This is intended for fast tests and benchmarks
+       (e.g. behind a SimulatedObjectStore), and not for any data
+       that must outlive the process
+    """
+    @staticmethod
+    def create_bucket(bucket, bucket_name, compartment=None):
+        """Create and return a new bucket in the object store called
+           'bucket_name', optionally placing it into the compartment
+           identified by 'compartment'. This will raise an
+           ObjectStoreError if this bucket already exists
+        """
+        bucket_name = str(bucket_name)
+
+        if compartment is not None:
+            if compartment.endswith("/"):
+                bucket = compartment
+            else:
+                bucket = "%s/" % compartment
+
+        full_name = _os.path.join(_os.path.split(bucket)[0], bucket_name)
+
+        with _buckets_lock:
+            if full_name in _buckets:
+                from Acquire.ObjectStore import ObjectStoreError
+                raise ObjectStoreError(
+                    "CANNOT CREATE NEW BUCKET '%s': EXISTS!" % bucket_name)
+
+            _buckets[full_name] = _MemoryBucket()
+
+        return full_name
+
+    @staticmethod
+    def get_bucket(bucket, bucket_name, compartment=None,
+                   create_if_needed=True):
+        """Find and return a new bucket in the object store called
+           'bucket_name', optionally placing it into the compartment
+           identified by 'compartment'. If 'create_if_needed' is True
+           then the bucket will be created if it doesn't exist. Otherwise,
+           if the bucket does not exist then an exception will be raised.
+        """
+        bucket_name = str(bucket_name)
+
+        if compartment is not None:
+            if compartment.endswith("/"):
+                bucket = compartment
+            else:
+                bucket = "%s/" % compartment
+
+        full_name = _os.path.join(_os.path.split(bucket)[0], bucket_name)
+
+        if _get_bucket(full_name, create_if_needed) is None:
+            from Acquire.ObjectStore import ObjectStoreError
+            raise ObjectStoreError(
+                "There is no bucket available called '%s' in "
+                "compartment '%s'" % (bucket_name, compartment))
+
+        return full_name
+
+    @staticmethod
+    def get_bucket_name(bucket):
+        """Return the name of the passed bucket"""
+        return _os.path.split(bucket)[1]
+
+    @staticmethod
+    def is_bucket_empty(bucket):
+        """Return whether or not the passed bucket is empty"""
+        b = _get_bucket(bucket)
+
+        if b is None:
+            return True
+
+        with b.lock:
+            return len(b.keys) == 0 and len(b.uploads) == 0
+
+    @staticmethod
+    def delete_bucket(bucket, force=False):
+        """Delete the passed bucket. This should be used with caution.
+           Normally you can only delete a bucket if it is empty. If
+           'force' is True then it will remove all objects/pars from
+           the bucket first, and then delete the bucket. This
+           can cause a LOSS OF DATA!
+        """
+        if not (force or Memory_ObjectStore.is_bucket_empty(bucket)):
+            raise PermissionError(
+                "You cannot delete the bucket %s as it is not empty" %
+                Memory_ObjectStore.get_bucket_name(bucket=bucket))
+
+        with _buckets_lock:
+            _buckets.pop(bucket, None)
+
+    @staticmethod
+    def create_par(bucket, encrypt_key, key=None, readable=True,
+                   writeable=False, duration=3600, cleanup_function=None):
+        """Create a pre-authenticated request for the passed bucket and
+           key (if key is None then the request is for the entire bucket).
+           This will return a PAR object that will contain a URL that can
+           be used to access the object/bucket. If writeable is true, then
+           the URL will also allow the object/bucket to be written to.
+           PARs are time-limited. Set the lifetime in seconds by passing
+           in 'duration' (by default this is one hour). Note that you must
+           pass in a public key that will be used to encrypt this PAR. This is
+           necessary as the PAR grants access to anyone who can decrypt
+           the URL
+        """
+        from Acquire.Crypto import PublicKey as _PublicKey
+
+        if not isinstance(encrypt_key, _PublicKey):
+            from Acquire.Client import PARError
+            raise PARError(
+                "You must supply a valid PublicKey to encrypt the "
+                "returned PAR")
+
+        if key is not None:
+            key = _clean_key(key)
+
+            try:
+                _get_value(bucket, key)
+            except:
+                from Acquire.Client import PARError
+                raise PARError(
+                    "The object '%s' in bucket '%s' does not exist!" %
+                    (key, bucket))
+        elif _get_bucket(bucket) is None:
+            from Acquire.Client import PARError
+            raise PARError("The bucket '%s' does not exist!" % bucket)
+
+        url = "memory://%s" % bucket
+
+        if key:
+            url = "%s/%s" % (url, key)
+
+        # get the time this PAR was created
+        from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
+        created_datetime = _get_datetime_now()
+
+        # get the UTC datetime when this PAR should expire
+        expires_datetime = created_datetime + \
+            _datetime.timedelta(seconds=duration)
+
+        # mimic limitations of OCI - cannot have a bucket PAR with
+        # read permissions!
+        if (key is None) and readable:
+            from Acquire.Client import PARError
+            raise PARError(
+                "You cannot create a Bucket PAR that has read permissions "
+                "due to a limitation in the underlying platform")
+
+        from Acquire.ObjectStore import OSPar as _OSPar
+        from Acquire.ObjectStore import OSParRegistry as _OSParRegistry
+
+        url_checksum = _OSPar.checksum(url)
+
+        driver_details = {"driver": "memory_objstore",
+                          "bucket": bucket,
+                          "created_datetime": created_datetime}
+
+        par = _OSPar(url=url, key=key, encrypt_key=encrypt_key,
+                     expires_datetime=expires_datetime,
+                     is_readable=readable, is_writeable=writeable,
+                     driver_details=driver_details)
+
+        _OSParRegistry.register(par=par, url_checksum=url_checksum,
+                                details_function=_get_driver_details_from_par,
+                                cleanup_function=cleanup_function)
+
+        return par
+
+    @staticmethod
+    def close_par(par=None, par_uid=None, url_checksum=None):
+        """Close the passed PAR, which provides access to data in the
+           passed bucket
+        """
+        from Acquire.ObjectStore import OSParRegistry as _OSParRegistry
+
+        if par is None:
+            par = _OSParRegistry.get(
+                        par_uid=par_uid,
+                        url_checksum=url_checksum,
+                        details_function=_get_driver_details_from_data)
+
+        from Acquire.ObjectStore import OSPar as _OSPar
+        if not isinstance(par, _OSPar):
+            raise TypeError("The PAR must be of type OSPar")
+
+        if par.driver() != "memory_objstore":
+            raise ValueError("Cannot delete a PAR that was not created "
+                             "by the in-memory object store")
+
+        # close the PAR - this will trigger any close_function(s)
+        _OSParRegistry.close(par=par)
+
+    @staticmethod
+    def get_object(bucket, key):
+        """Return the binary data contained in the key 'key' in the
+           passed bucket"""
+        return _get_value(bucket, _clean_key(key))[0]
+
+    @staticmethod
+    def get_object_range(bucket, key, start, length=None):
+        """Return up to 'length' bytes (or all remaining bytes if
+           'length' is None) of the object at 'key' in the passed
+           bucket, starting from byte 'start'
+        """
+        data = _get_value(bucket, _clean_key(key))[0]
+
+        if length is None:
+            return bytes(data[start:])
+        else:
+            return bytes(data[start:start + length])
+
+    @staticmethod
+    def open_object(bucket, key):
+        """Open and return a read-only file-like object that streams
+           the binary data contained in the key 'key' in the passed
+           bucket
+        """
+        return _io.BytesIO(_get_value(bucket, _clean_key(key))[0])
+
+    @staticmethod
+    def get_object_and_etag(bucket, key):
+        """Return the binary data contained in the key 'key' in the
+           passed bucket, together with the entity tag (etag) of the
+           object. The etag can be passed to 'set_object_if_match'
+        """
+        return _get_value(bucket, _clean_key(key))
+
+    @staticmethod
+    def take_object(bucket, key):
+        """Take (delete) the object from the object store, returning
+           the object
+        """
+        key = _clean_key(key)
+        b = _get_bucket(bucket)
+        value = None
+
+        if b is not None:
+            with b.lock:
+                value = b.remove(key)
+
+        if value is None:
+            raise _no_object(key)
+
+        return value[0]
+
+    @staticmethod
+    def claim_object(bucket, src_key, dst_key):
+        """Atomically move the object at 'src_key' to 'dst_key', but
+           only if the object at 'src_key' exists and there is no
+           object at 'dst_key'. This returns the data of the claimed
+           object, or None if someone else claimed it first
+        """
+        src_key = _clean_key(src_key)
+        dst_key = _clean_key(dst_key)
+        b = _get_bucket(bucket)
+
+        if b is None:
+            return None
+
+        with b.lock:
+            if src_key not in b.objects or dst_key in b.objects:
+                return None
+
+            value = b.remove(src_key)
+            b.set(dst_key, value[0])
+
+        return value[0]
+
+    @staticmethod
+    def get_all_object_names(bucket, prefix=None, without_prefix=False):
+        """Returns the names of all objects in the passed bucket"""
+        b = _get_bucket(bucket)
+
+        if b is None:
+            return []
+
+        with b.lock:
+            (start, end) = b.get_range(prefix)
+            names = b.keys[start:end]
+
+        if without_prefix:
+            prefix_len = len(prefix)
+            stripped = []
+
+            for name in names:
+                name = name[prefix_len:]
+                while name.startswith("/"):
+                    name = name[1:]
+
+                if len(name) > 0:
+                    stripped.append(name)
+
+            names = stripped
+
+        return names
+
+    @staticmethod
+    def list_children(bucket, prefix=None, delimiter="/"):
+        """Return the names of the objects that are the direct
+           children of 'prefix' in the passed bucket, together with
+           the sub-prefixes (ending with 'delimiter') that contain
+           the deeper objects. Each sub-prefix is skipped with a
+           single bisection of the index. This returns the tuple of
+           the sorted list of names and the sorted list of prefixes
+        """
+        if prefix is None:
+            prefix = ""
+
+        names = []
+        prefixes = []
+
+        b = _get_bucket(bucket)
+
+        if b is None:
+            return (names, prefixes)
+
+        with b.lock:
+            (i, end) = b.get_range(prefix)
+
+            while i < end:
+                name = b.keys[i]
+                idx = name.find(delimiter, len(prefix))
+
+                if idx == -1:
+                    names.append(name)
+                    i += 1
+                else:
+                    child = name[0:idx + len(delimiter)]
+                    prefixes.append(child)
+
+                    child_end = _get_prefix_end(child)
+
+                    if child_end is None:
+                        break
+
+                    i = _bisect.bisect_left(b.keys, child_end, i, end)
+
+        return (names, prefixes)
+
+    @staticmethod
+    def get_object_names_page(bucket, prefix=None, start_after=None,
+                              limit=1000):
+        """Return a page of up to 'limit' object names from the passed
+           bucket that start with 'prefix', in lexicographic order,
+           starting after the name 'start_after'. This returns a tuple
+           of the list of names and the continuation token to pass
+           as 'start_after' to get the next page (None if there are
+           no more names)
+        """
+        b = _get_bucket(bucket)
+
+        if b is None:
+            return ([], None)
+
+        with b.lock:
+            (start, end) = b.get_range(prefix, start_after)
+            names = b.keys[start:min(end, start + limit)]
+
+        if start + limit < end:
+            return (names, names[-1])
+        else:
+            return (names, None)
+
+    @staticmethod
+    def set_object(bucket, key, data):
+        """Set the value of 'key' in 'bucket' to binary 'data'"""
+        b = _get_bucket(bucket, create_if_needed=True)
+
+        with b.lock:
+            b.set(_clean_key(key), data)
+
+    @staticmethod
+    def set_object_if_absent(bucket, key, data):
+        """Set the value of 'key' in 'bucket' to binary 'data' if (and
+           only if) there is no object already at this key. This
+           returns whether or not the object was set
+        """
+        key = _clean_key(key)
+        b = _get_bucket(bucket, create_if_needed=True)
+
+        with b.lock:
+            if key in b.objects:
+                return False
+
+            b.set(key, data)
+
+        return True
+
+    @staticmethod
+    def set_object_if_match(bucket, key, data, etag):
+        """Set the value of 'key' in 'bucket' to binary 'data' if (and
+           only if) the entity tag of the current object at this key
+           is equal to 'etag'. This returns whether or not the object
+           was set
+        """
+        key = _clean_key(key)
+        b = _get_bucket(bucket, create_if_needed=True)
+
+        with b.lock:
+            value = b.objects.get(key, None)
+
+            if value is None or value[1] != etag:
+                return False
+
+            b.set(key, data)
+
+        return True
+
+    @staticmethod
+    def create_multipart_upload(bucket, key):
+        """Start a new multipart upload of the object at 'key' in the
+           passed bucket, returning the ID of the upload
+        """
+        upload_id = str(_uuid.uuid4())
+        b = _get_bucket(bucket, create_if_needed=True)
+
+        with b.lock:
+            b.uploads[upload_id] = (_clean_key(key), {})
+
+        return upload_id
+
+    @staticmethod
+    def _get_upload(b, key, upload_id):
+        """Internal function that returns the parts of the multipart
+           upload 'upload_id' of 'key'
+        """
+        upload = None
+
+        if b is not None:
+            upload = b.uploads.get(upload_id, None)
+
+        if upload is None or upload[0] != _clean_key(key):
+            from Acquire.ObjectStore import ObjectStoreError
+            raise ObjectStoreError(
+                "There is no multipart upload '%s' for key '%s'" %
+                (upload_id, key))
+
+        return upload[1]
+
+    @staticmethod
+    def upload_part(bucket, key, upload_id, part_number, data):
+        """Upload the binary 'data' as part 'part_number' (counting
+           from 1) of the multipart upload 'upload_id'. This returns
+           the etag of the uploaded part
+        """
+        b = _get_bucket(bucket)
+        etag = _get_etag(data)
+
+        with b.lock:
+            parts = Memory_ObjectStore._get_upload(b, key, upload_id)
+            parts[int(part_number)] = (bytes(data), etag)
+
+        return etag
+
+    @staticmethod
+    def list_uploaded_parts(bucket, key, upload_id):
+        """Return the parts that have already been uploaded to the
+           multipart upload 'upload_id', as a dictionary mapping the
+           part number to a tuple of the etag, size and MD5 checksum
+           of each part
+        """
+        b = _get_bucket(bucket)
+
+        with b.lock:
+            parts = Memory_ObjectStore._get_upload(b, key, upload_id)
+
+            return {part_number: (etag, len(data), etag)
+                    for (part_number, (data, etag)) in parts.items()}
+
+    @staticmethod
+    def commit_multipart_upload(bucket, key, upload_id, parts):
+        """Commit the multipart upload 'upload_id', assembling the
+           passed 'parts' (a dictionary mapping part number to etag)
+           into the object at 'key'
+        """
+        b = _get_bucket(bucket)
+
+        with b.lock:
+            uploaded = Memory_ObjectStore._get_upload(b, key, upload_id)
+
+            data = []
+
+            for part_number in sorted(parts.keys()):
+                part = uploaded.get(part_number, None)
+
+                if part is None or part[1] != parts[part_number]:
+                    from Acquire.ObjectStore import ObjectStoreError
+                    raise ObjectStoreError(
+                        "Cannot commit the multipart upload '%s' as "
+                        "part %d is missing or does not match" %
+                        (upload_id, part_number))
+
+                data.append(part[0])
+
+            b.set(_clean_key(key), b"".join(data))
+            del b.uploads[upload_id]
+
+    @staticmethod
+    def abort_multipart_upload(bucket, key, upload_id):
+        """Abort the multipart upload 'upload_id', discarding any
+           parts that have been uploaded
+        """
+        b = _get_bucket(bucket)
+
+        if b is not None:
+            with b.lock:
+                b.uploads.pop(upload_id, None)
+
+    @staticmethod
+    def delete_all_objects(bucket, prefix=None):
+        """Deletes all objects whose keys start with 'prefix' (or all
+           objects if 'prefix' is None)
+        """
+        b = _get_bucket(bucket)
+
+        if b is None:
+            return
+
+        with b.lock:
+            (start, end) = b.get_range(prefix)
+
+            for key in b.keys[start:end]:
+                del b.objects[key]
+
+            del b.keys[start:end]
+
+    @staticmethod
+    def delete_object(bucket, key):
+        """Removes the object at 'key'"""
+        b = _get_bucket(bucket)
+
+        if b is not None:
+            with b.lock:
+                b.remove(_clean_key(key))
+
+    @staticmethod
+    def delete_object_if_match(bucket, key, etag):
+        """Remove the object at 'key' if (and only if) its entity tag
+           is equal to 'etag'. This returns whether or not the object
+           was removed
+        """
+        key = _clean_key(key)
+        b = _get_bucket(bucket)
+
+        if b is None:
+            return False
+
+        with b.lock:
+            value = b.objects.get(key, None)
+
+            if value is None or value[1] != etag:
+                return False
+
+            b.remove(key)
+
+        return True
+
+    @staticmethod
+    def get_size_and_checksum(bucket, key):
+        """Return the object size (in bytes) and checksum of the
+           object in the passed bucket at the specified key
+        """
+        (data, etag) = _get_value(bucket, _clean_key(key))
+        return (len(data), etag)
@@ -1,10 +1,144 @@
 
 import uuid
 import datetime as _datetime
+import random as _random
+import threading as _threading
 import time as _time
+import weakref as _weakref
 
 __all__ = ["Mutex"]
 
+# the first and maximum delays (in seconds) between attempts to lock
+# a mutex that is held by someone else. The delay doubles after each
+# attempt, with a random jitter so that waiters don't retry in lockstep
+_backoff_base = 0.02
+_backoff_cap = 1.0
+
+# the number of times the lease is renewed per lease period by
+# mutexes that use a heartbeat
+_heartbeats_per_lease = 3
+
+# the maximum number of key families that are tracked. Mutexes of any
+# other families are counted against "other"
+_max_families = 256
+
+# the contention statistics of each family of mutex keys
+_stats = {}
+
+_stats_lock = _threading.Lock()
+
+# the lock service used to lock mutexes, if any (see
+# Mutex.set_lock_service). If this has not been set then it is read
+# from the LOCK_SERVICE environment variable when it is first needed
+_lock_service = None
+_lock_service_is_set = False
+
+
+def _get_key_family(key):
+    """Return the family of the passed mutex key, using the same
+       prefix families as ObjectStoreMetrics, e.g. "accounting/ledger"
+       for "mutexes/accounting/ledger/<uid>". Mutexes that are named
+       only by a UID are all in the "mutexes" family
+    """
+    from ._objstore_metrics import _get_family
+
+    if key.startswith("mutexes/"):
+        key = key[8:]
+
+    family = _get_family(key)
+
+    if len(family) == 0:
+        return "mutexes"
+    else:
+        return family
+
+
+def _record(family, **kwargs):
+    """Add the passed counts to the statistics of 'family'"""
+    with _stats_lock:
+        stats = _stats.get(family, None)
+
+        if stats is None:
+            if len(_stats) >= _max_families:
+                family = "other"
+                stats = _stats.get(family, None)
+
+            if stats is None:
+                stats = {"acquired": 0, "attempts": 0, "timeouts": 0,
+                         "steals": 0, "wait_seconds": 0.0,
+                         "max_wait_seconds": 0.0, "renewals": 0,
+                         "lost": 0, "service_errors": 0}
+                _stats[family] = stats
+
+        for (key, value) in kwargs.items():
+            if key == "wait_seconds":
+                stats["max_wait_seconds"] = max(stats["max_wait_seconds"],
+                                                value)
+
+            stats[key] += value
+
+
+def _resolve_lock_service(service):
+    """Return the lock service described by 'service', which is either
+       None, "local" (for a LocalLockService), a LockService or
+       LocalLockService, or the URL of a trusted lock service
+    """
+    if service is None:
+        return None
+    elif not isinstance(service, str):
+        return service
+
+    service = service.strip()
+
+    if len(service) == 0 or service.lower() == "none":
+        return None
+    elif service.lower() == "local":
+        from Acquire.Lock import LocalLockService as _LocalLockService
+        return _LocalLockService()
+    else:
+        from Acquire.Service import get_trusted_service \
+            as _get_trusted_service
+        return _get_trusted_service(service_url=service,
+                                    service_type="lock")
+
+
+def _get_lock_service():
+    """Return the lock service used to lock mutexes, or None if
+       mutexes are locked in the object store. The service named by
+       the LOCK_SERVICE environment variable is looked up on first
+       use. If it cannot be found then the error is raised (so that
+       mutexes are not locked in the object store instead), and it is
+       looked up again the next time
+    """
+    global _lock_service, _lock_service_is_set
+
+    if _lock_service_is_set:
+        return _lock_service
+
+    import os as _os
+
+    service = _resolve_lock_service(_os.getenv("LOCK_SERVICE"))
+
+    _lock_service = service
+    _lock_service_is_set = True
+
+    return service
+
+
+def _heartbeat(mutex_ref, stop, interval):
+    """Run in a background thread to renew the lease of the mutex
+       every 'interval' seconds until 'stop' is set. Only a weak
+       reference is held so that the mutex can still be garbage
+       collected (and so released) if its holder forgets it
+    """
+    while not stop.wait(interval):
+        mutex = mutex_ref()
+
+        if mutex is None or not mutex._renew():
+            return
+
+        mutex = None
+
 
 class Mutex:
     """This class implements a mutex that sits in the object store.
@@ -12,8 +146,22 @@ class Mutex:
        if it has successfully written its secret to this key. If
        not, then another thread must hold the mutex, and we have
        to wait...
+
+       Waiters retry with an exponential backoff (with jitter). The
+       number of attempts, time spent waiting, and leases stolen after
+       they expired are recorded per key family, and can be read
+       using 'Mutex.get_statistics'
+
+       If a lock service has been set (see 'Mutex.set_lock_service')
+       then the mutex is leased from that service, using a single call,
+       rather than from the object store. If the service cannot be
+       reached then the call is retried until the timeout, after which
+       a MutexTimeoutError is raised. The mutex never falls back to
+       the object store, as that lock would not exclude holders of
+       leases from the service
     """
-    def __init__(self, key=None, timeout=10, lease_time=10, bucket=None):
+    def __init__(self, key=None, timeout=10, lease_time=10, bucket=None,
+                 heartbeat=False, acquire=True, use_lock_service=True):
         """Create the mutex. The immediately tries to lock the mutex
            for key 'key' and will block until a lock is successfully
            obtained (or until 'timeout' seconds has been reached, and an
@@ -23,6 +171,18 @@ class Mutex:
            'lease_time' seconds. After this time the mutex will be
            automatically unlocked and made available to lock by
            others. You can renew the lease by re-locking the mutex.
+
+           If 'heartbeat' is True then a background thread renews the
+           lease while the mutex is held. This lets long-running
+           holders use a short 'lease_time', so that the mutex is
+           quickly released if the holder crashes.
+
+           If 'acquire' is False then the mutex is created unlocked,
+           and must be locked by calling 'lock' or 'try_lock'
+
+           If 'use_lock_service' is False then the mutex is always
+           locked in the object store, even if a lock service has been
+           set. This is needed by code that reads the mutex's object
         """
         if key is None:
             key = "mutexes/none"
@@ -37,9 +197,25 @@ class Mutex:
 
         self._bucket = bucket
         self._key = key
+        self._family = _get_key_family(key)
         self._secret = str(uuid.uuid4())
         self._is_locked = 0
-        self.lock(timeout, lease_time)
+        self._use_heartbeat = heartbeat
+        self._heartbeat = None
+        self._heartbeat_lock = _threading.RLock()
+        self._lockstring = None
+        self._end_lease = None
+        self._lease_time = None
+        self._use_lock_service = use_lock_service
+
+        # the lock service that leased us the mutex, and the fencing
+        # token of the lease
+        self._service = None
+        self._token = None
+        self._service_error = None
+
+        if acquire:
+            self.lock(timeout, lease_time)
 
     def __del__(self):
         """Release the mutex if it is held"""
@@ -61,6 +237,76 @@ class Mutex:
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    @staticmethod
+    def get_statistics():
+        """Return a copy of the contention statistics of each family
+           of mutex keys. These are the number of times the mutex was
+           acquired, the number of attempts to lock it, the number of
+           timeouts, the number of expired leases that were stolen,
+           the total and maximum time spent waiting (in seconds), the
+           number of heartbeat renewals and leases that were lost
+           while held, and the number of failed calls to the lock
+           service
+        """
+        with _stats_lock:
+            return {family: dict(stats)
+                    for (family, stats) in _stats.items()}
+
+    @staticmethod
+    def reset_statistics():
+        """Reset all of the contention statistics to zero"""
+        with _stats_lock:
+            _stats.clear()
+
+    @staticmethod
+    def set_lock_service(service):
+        """Set the lock service used to lock all mutexes in this
+           process. This is either None (to lock mutexes in the object
+           store), "local" (to use a LocalLockService in this process),
+           a LockService or LocalLockService, or the URL of a trusted
+           lock service. If this is not called then the service is
+           read from the LOCK_SERVICE environment variable.
+
+           Note that a lease held in the lock service does not exclude
+           a mutex locked in the object store, so all of the processes
+           that lock the same keys must use the same lock service. For
+           this reason mutexes are never locked in the object store
+           when the service cannot be reached.
+
+           Args:
+                service: The lock service to use
+           Returns:
+                None
+        """
+        global _lock_service, _lock_service_is_set
+
+        _lock_service = _resolve_lock_service(service)
+        _lock_service_is_set = True
+
+    @staticmethod
+    def get_lock_service():
+        """Return the lock service used to lock mutexes, or None if
+           they are locked in the object store. This raises an
+           exception if the service in LOCK_SERVICE can't be found
+        """
+        return _get_lock_service()
+
+    def fencing_token(self):
+        """Return the fencing token of the lease on this mutex. This
+           is larger than the token of any earlier lease on any key
+           from the same lock service, so can be passed with writes
+           made while holding the mutex to detect writes from holders
+           whose lease expired. This is None if the mutex is not held,
+           or if it was locked in the object store
+
+           Returns:
+                int: The fencing token, or None
+        """
+        if self.is_locked():
+            return self._token
+        else:
+            return None
+
     def is_locked(self):
         """Return whether or not this mutex is locked
 
@@ -120,18 +366,33 @@ class Mutex:
         if self._is_locked == 0:
             return
 
+        self._stop_heartbeat()
+
         from Acquire.ObjectStore import ObjectStore as _ObjectStore
         from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
 
-        try:
-            holder = _ObjectStore.get_string_object(self._bucket, self._key)
-        except:
-            holder = None
+        if self._service is not None:
+            try:
+                self._service.release(key=self._key, owner=self._secret)
+            except:
+                # the lease will expire by itself
+                pass
+        else:
+            try:
+                (holder, etag) = _ObjectStore.get_object_and_etag(
+                                                    self._bucket, self._key)
+                holder = holder.decode("utf-8")
+            except:
+                holder = None
 
-        if holder == self._lockstring:
-            # we hold the mutex - delete the key
-            _ObjectStore.delete_object(self._bucket, self._key)
+            if holder == self._lockstring:
+                # we hold the mutex - delete the key, but only if no-one
+                # else has taken over the mutex since we read it
+                _ObjectStore.delete_object_if_match(self._bucket, self._key,
+                                                    etag)
 
+        self._service = None
+        self._token = None
         self._lockstring = None
         self._is_locked = 0
 
@@ -161,6 +422,135 @@ class Mutex:
             self.assert_not_expired()
             self._is_locked -= 1
 
+    def _start_heartbeat(self):
+        """Start the thread that renews the lease while the mutex is
+           held, if this mutex uses a heartbeat
+        """
+        if not self._use_heartbeat:
+            return
+
+        stop = _threading.Event()
+        interval = self._lease_time / _heartbeats_per_lease
+
+        thread = _threading.Thread(target=_heartbeat,
+                                   args=(_weakref.ref(self), stop, interval),
+                                   name="mutex_heartbeat", daemon=True)
+        self._heartbeat = (thread, stop)
+        thread.start()
+
+    def _stop_heartbeat(self):
+        """Stop the heartbeat thread, waiting for any renewal that
+           is in progress to finish
+        """
+        heartbeat = self._heartbeat
+        self._heartbeat = None
+
+        if heartbeat is None:
+            return
+
+        (thread, stop) = heartbeat
+        stop.set()
+
+        if thread is not _threading.current_thread():
+            thread.join()
+
+    def _renew(self):
+        """Called by the heartbeat thread to renew the lease. This
+           only renews the lease if we still hold the mutex, returning
+           whether or not the lease was renewed
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
+        from Acquire.ObjectStore import datetime_to_string \
+            as _datetime_to_string
+
+        with self._heartbeat_lock:
+            if self._is_locked == 0:
+                return False
+            elif self._service is not None:
+                renewed = self._renew_with_service(self._lease_time)
+                return self._renewed(renewed)
+
+            try:
+                (holder, etag) = _ObjectStore.get_object_and_etag(
+                                                self._bucket, self._key)
+                holder = holder.decode("utf-8")
+            except:
+                holder = None
+
+            renewed = False
+
+            if holder == self._lockstring:
+                end_lease = _get_datetime_now() + \
+                    _datetime.timedelta(seconds=self._lease_time)
+                lockstring = "%s{}%s" % (self._secret,
+                                         _datetime_to_string(end_lease))
+
+                try:
+                    renewed = _ObjectStore.set_object_if_match(
+                                    self._bucket, self._key,
+                                    lockstring.encode("utf-8"), etag)
+                except:
+                    renewed = False
+
+                if renewed:
+                    self._end_lease = end_lease
+                    self._lockstring = lockstring
+
+        return self._renewed(renewed)
+
+    def _renewed(self, renewed):
+        """Record whether or not a heartbeat renewed the lease"""
+        if renewed:
+            _record(self._family, renewals=1)
+        else:
+            # the lease expired and someone else took the mutex. The
+            # holder will see this as a MutexTimeoutError on unlock
+            _record(self._family, lost=1)
+
+        return renewed
+
+    def _renew_with_service(self, lease_time):
+        """Renew the lease from the lock service for another
+           'lease_time' seconds, returning whether or not it was renewed
+        """
+        from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
+
+        now = _get_datetime_now()
+
+        try:
+            response = self._service.renew(key=self._key, owner=self._secret,
+                                           lease_time=lease_time)
+        except:
+            return False
+
+        if response["renewed"]:
+            self._end_lease = now + _datetime.timedelta(seconds=lease_time)
+            return True
+        else:
+            return False
+
+    def _clear_reads(self):
+        """Called when the mutex is acquired to make sure that any
+           data read while it is held is fresh, and not from a read
+           made by this request before the mutex was acquired
+        """
+        from Acquire.ObjectStore import ObjectStoreUnitOfWork \
+            as _ObjectStoreUnitOfWork
+        _ObjectStoreUnitOfWork.clear_reads()
+
+    def _acquired(self, start, attempts, stolen=False):
+        """Called when the mutex has been acquired, after 'attempts'
+           attempts starting at 'start' (from time.monotonic)
+        """
+        self._is_locked = 1
+        self._clear_reads()
+        self._start_heartbeat()
+
+        _record(self._family, acquired=1, attempts=attempts,
+                steals=1 if stolen else 0,
+                wait_seconds=_time.monotonic() - start)
+
     def lock(self, timeout=None, lease_time=None):
         """Lock the mutex, blocking until the mutex is held, or until
            'timeout' seconds have passed. If we time out, then an exception is
@@ -186,11 +576,11 @@ class Mutex:
         else:
             lease_time = float(lease_time)
 
+        self._lease_time = lease_time
+
         from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
         from Acquire.ObjectStore import datetime_to_string \
             as _datetime_to_string
-        from Acquire.ObjectStore import string_to_datetime \
-            as _string_to_datetime
         from Acquire.ObjectStore import ObjectStore as _ObjectStore
 
         if self.is_locked():
@@ -201,82 +591,217 @@ class Mutex:
             if (now > self._end_lease) or (now - self._end_lease).seconds < 1:
                 self.fully_unlock()
                 self.lock(timeout, lease_time)
+            elif self._service is not None:
+                with self._heartbeat_lock:
+                    if not self._renew_with_service(lease_time):
+                        self.fully_unlock()
+                        self.lock(timeout, lease_time)
+                        return
+
+                    self._is_locked += 1
             else:
-                self._end_lease = now + _datetime.timedelta(seconds=lease_time)
+                with self._heartbeat_lock:
+                    self._end_lease = now + \
+                        _datetime.timedelta(seconds=lease_time)
 
-                self._lockstring = "%s{}%s" % (
-                    self._secret, _datetime_to_string(self._end_lease))
+                    self._lockstring = "%s{}%s" % (
+                        self._secret, _datetime_to_string(self._end_lease))
 
-                _ObjectStore.set_string_object(self._bucket, self._key,
-                                               self._lockstring)
+                    _ObjectStore.set_string_object(self._bucket, self._key,
+                                                   self._lockstring)
 
-                self._is_locked += 1
+                    self._is_locked += 1
 
             return
 
         now = _get_datetime_now()
         endtime = now + _datetime.timedelta(seconds=timeout)
+        start = _time.monotonic()
+        attempts = 0
 
         # This is the first time we are trying to get a lock
         while now < endtime:
-            # does anyone else hold the lock?
-            try:
-                holder = _ObjectStore.get_string_object(self._bucket,
-                                                        self._key)
-            except:
-                holder = None
-
-            is_held = True
-
-            if holder is None:
-                is_held = False
-            else:
-                end_lease = _string_to_datetime(holder.split("{}")[-1])
-                if now > end_lease:
-                    # the lease from the other holder has expired :-)
-                    is_held = False
+            attempts += 1
+            (acquired, end_lease) = self._try_acquire(
+                    now, lease_time, wait=(endtime - now).total_seconds())
 
-            if not is_held:
-                # no-one holds this mutex - try to hold it now
-                self._end_lease = now + _datetime.timedelta(seconds=lease_time)
+            if acquired:
+                self._acquired(start, attempts,
+                               stolen=(end_lease is not None))
+                return
 
-                self._lockstring = "%s{}%s" % (
-                    self._secret, _datetime_to_string(self._end_lease))
+            if end_lease is not None:
+                # back off before trying again, but don't sleep past
+                # the timeout, or past the end of the holder's lease
+                delay = _random.uniform(
+                            0, min(_backoff_cap,
+                                   _backoff_base * 2**min(attempts, 16)))
 
-                _ObjectStore.set_string_object(self._bucket, self._key,
-                                               self._lockstring)
+                delay = min(delay, (endtime - now).total_seconds())
 
-                holder = _ObjectStore.get_string_object(self._bucket,
-                                                        self._key)
-            else:
-                self._lockstring = None
+                if end_lease > now:
+                    delay = min(delay,
+                                (end_lease - now).total_seconds() + 0.001)
 
-            if holder == self._lockstring:
-                # it looks like we are the holder - read and write again
-                # just to make sure
-                holder = _ObjectStore.get_string_object(self._bucket,
-                                                        self._key)
+                _time.sleep(max(0.0, delay))
 
-                if holder == self._lockstring:
-                    # write again just to make sure
-                    _ObjectStore.set_string_object(self._bucket, self._key,
-                                                   self._lockstring)
+            now = _get_datetime_now()
 
-                    holder = _ObjectStore.get_string_object(self._bucket,
-                                                            self._key)
+        self._lockstring = None
 
-            if holder == self._lockstring:
-                # we have read and written our secret to the object store
-                # three times. While a race condition is still possible,
-                # I'd hope it is now highly unlikely - we now hold the mutex
-                self._is_locked = 1
-                return
+        _record(self._family, attempts=attempts, timeouts=1,
+                wait_seconds=_time.monotonic() - start)
 
-            # only try the lock 4 times a second
-            _time.sleep(0.25)
+        from Acquire.ObjectStore import MutexTimeoutError
 
-            now = _get_datetime_now()
+        if self._service_error is not None:
+            raise MutexTimeoutError(
+                "Cannot acquire a mutex lock on the key '%s' as the lock "
+                "service could not be reached: %s" %
+                (self._key, self._service_error))
 
-        from Acquire.ObjectStore import MutexTimeoutError
         raise MutexTimeoutError("Cannot acquire a mutex lock on the "
                                 "key '%s'" % self._key)
+
+    def try_lock(self, lease_time=None):
+        """Make a single attempt to lock the mutex, without waiting,
+           returning whether or not the mutex is now held. If it is
+           held then it is held for a maximum of 'lease_time' seconds
+
+           Args:
+                lease_time (int): Number of seconds to hold the lock
+           Returns:
+                bool: True if the mutex is now held, else False
+        """
+        if self.is_locked():
+            self.lock(lease_time=lease_time)
+            return True
+
+        if lease_time is None:
+            lease_time = 10.0
+        else:
+            lease_time = float(lease_time)
+
+        self._lease_time = lease_time
+
+        from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
+
+        start = _time.monotonic()
+        (acquired, end_lease) = self._try_acquire(_get_datetime_now(),
+                                                  lease_time)
+
+        if acquired:
+            self._acquired(start, 1, stolen=(end_lease is not None))
+        else:
+            self._lockstring = None
+            _record(self._family, attempts=1)
+
+        return acquired
+
+    def _try_acquire(self, now, lease_time, wait=0):
+        """Make a single attempt to acquire the mutex at time 'now'.
+           This returns the tuple (acquired, end_lease), where
+           'end_lease' is the end of the lease of the other holder
+           (or None if there was no other holder). If the mutex was
+           acquired and 'end_lease' is not None then the expired lease
+           of the other holder was stolen.
+
+           If the mutex is leased from a lock service then the service
+           queues us for up to 'wait' seconds. If the service cannot
+           be reached then the mutex is not acquired, and the caller
+           should back off until the end of the returned lease before
+           trying again. The mutex is never locked in the object store
+           instead, as that would not exclude holders of leases from
+           the service
+        """
+        self._service_error = None
+
+        if self._use_lock_service:
+            try:
+                # this raises if a lock service is named but can't be
+                # found, as then we must not lock in the object store
+                service = _get_lock_service()
+
+                if service is not None:
+                    return self._try_acquire_with_service(service, now,
+                                                          lease_time, wait)
+            except Exception as e:
+                self._service = None
+                self._token = None
+                self._service_error = str(e)
+                _record(self._family, service_errors=1)
+
+                return (False, now + _datetime.timedelta(
+                                        seconds=_backoff_cap))
+
+        from Acquire.ObjectStore import datetime_to_string \
+            as _datetime_to_string
+        from Acquire.ObjectStore import string_to_datetime \
+            as _string_to_datetime
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+        self._end_lease = now + _datetime.timedelta(seconds=lease_time)
+
+        self._lockstring = "%s{}%s" % (
+            self._secret, _datetime_to_string(self._end_lease))
+
+        lockdata = self._lockstring.encode("utf-8")
+
+        # try to create the key - this atomically succeeds only
+        # if no-one else holds the mutex
+        if _ObjectStore.set_object_if_absent(self._bucket, self._key,
+                                             lockdata):
+            return (True, None)
+
+        # does anyone else hold the lock?
+        try:
+            (holder, etag) = _ObjectStore.get_object_and_etag(
+                                            self._bucket, self._key)
+            holder = holder.decode("utf-8")
+        except:
+            # the holder released the mutex - try again immediately
+            return (False, None)
+
+        end_lease = _string_to_datetime(holder.split("{}")[-1])
+
+        if now > end_lease:
+            # the lease from the other holder has expired :-).
+            # Swap in our secret, but only if no-one else has
+            # beaten us to it
+            if _ObjectStore.set_object_if_match(self._bucket, self._key,
+                                                lockdata, etag):
+                return (True, end_lease)
+
+        return (False, end_lease)
+
+    def _try_acquire_with_service(self, service, now, lease_time, wait):
+        """Make a single attempt to lease the mutex from the lock
+           service, waiting in its queue for up to 'wait' seconds.
+           This returns the same as '_try_acquire'
+        """
+        response = service.acquire(key=self._key, owner=self._secret,
+                                   lease_time=lease_time, wait=wait)
+
+        if response["acquired"]:
+            self._service = service
+            self._token = response["token"]
+            self._lockstring = None
+
+            # the lease started after we had waited in the queue, but
+            # don't count the time the reply took to reach us, so that
+            # our lease always ends before the service's
+            self._end_lease = now + _datetime.timedelta(
+                                seconds=lease_time + response["waited"])
+
+            if response["stolen"]:
+                return (True, now)
+            else:
+                return (True, None)
+        elif response["seconds_remaining"] > 0:
+            from Acquire.ObjectStore import get_datetime_now \
+                as _get_datetime_now
+            return (False, _get_datetime_now() + _datetime.timedelta(
+                                seconds=response["seconds_remaining"]))
+        else:
+            # we were queued behind others - try again immediately
+            return (False, None)
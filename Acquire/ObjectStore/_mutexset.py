@@ -0,0 +1,231 @@
+
+import time as _time
+
+__all__ = ["MutexSet"]
+
+
+class MutexSet:
+    """This class holds the mutexes for several keys at once, e.g.
+       the debit and credit accounts of a transaction. The mutexes
+       are either all held, or none of them are.
+
+       To avoid deadlock, the mutexes are always waited for in the
+       same (canonical, sorted) order of their keys, so two MutexSets
+       that share keys can never each hold a mutex that the other is
+       waiting for. To avoid paying one round trip per key, the first
+       attempt to lock is made for all keys at once, in parallel.
+       Any mutexes acquired after the first key that could not be
+       locked are then released, and the remaining keys are waited
+       for one by one, in order
+    """
+    def __init__(self, keys, timeout=10, lease_time=10, bucket=None,
+                 heartbeat=False):
+        """Create the set of mutexes for all of the passed 'keys', and
+           immediately lock them all, blocking until they are all held
+           or until 'timeout' seconds have passed, in which case none
+           of them are held and a MutexTimeoutError is raised. The
+           other arguments are as for Mutex
+        """
+        from Acquire.ObjectStore import Mutex as _Mutex
+
+        if bucket is None:
+            from Acquire.Service import get_service_account_bucket as \
+                                       _get_service_account_bucket
+
+            bucket = _get_service_account_bucket()
+
+        if isinstance(keys, str):
+            keys = [keys]
+
+        mutexes = {}
+
+        for key in keys:
+            mutex = _Mutex(key=key, bucket=bucket, heartbeat=heartbeat,
+                           acquire=False)
+            mutexes[mutex._key] = mutex
+
+        self._mutexes = [mutexes[key] for key in sorted(mutexes.keys())]
+        self.lock(timeout, lease_time)
+
+    def __del__(self):
+        """Release the mutexes if they are held"""
+        try:
+            self.fully_unlock()
+        except:
+            pass
+
+    def __str__(self):
+        return "MutexSet(%s, is_locked=%s)" % (
+            ", ".join(mutex._key for mutex in self._mutexes),
+            self.is_locked())
+
+    def keys(self):
+        """Return the keys of the mutexes, in the order in which they
+           are locked
+
+           Returns:
+                list: The keys of the mutexes
+        """
+        return [mutex._key for mutex in self._mutexes]
+
+    def is_locked(self):
+        """Return whether or not all of the mutexes are locked
+
+           Returns:
+                bool: True if all mutexes are locked, else False
+        """
+        for mutex in self._mutexes:
+            if not mutex.is_locked():
+                return False
+
+        return len(self._mutexes) > 0
+
+    def expired(self):
+        """Return whether or not the lease on any of the mutexes
+           has expired
+
+           Returns:
+                bool: True if any lease has expired, else False
+        """
+        for mutex in self._mutexes:
+            if mutex.expired():
+                return True
+
+        return False
+
+    def assert_not_expired(self):
+        """Function that asserts that none of the mutexes has expired"""
+        for mutex in self._mutexes:
+            mutex.assert_not_expired()
+
+    def seconds_remaining_on_lease(self):
+        """Return the smallest number of seconds remaining on the
+           leases of the mutexes
+
+           Returns:
+                int: Seconds remaining on the shortest lease
+        """
+        if len(self._mutexes) == 0:
+            return 0
+
+        return min(mutex.seconds_remaining_on_lease()
+                   for mutex in self._mutexes)
+
+    def _release(self, mutexes):
+        """Release all of the passed mutexes, in reverse order. This
+           returns the first MutexTimeoutError raised because a lease
+           had expired, or None
+        """
+        error = None
+
+        for mutex in reversed(mutexes):
+            try:
+                mutex.fully_unlock()
+            except Exception as e:
+                if error is None:
+                    error = e
+
+        return error
+
+    def fully_unlock(self):
+        """Fully unlock all of the mutexes. This raises a
+           MutexTimeoutError if any of the leases expired before
+           the mutexes were unlocked
+
+           Returns:
+                None
+        """
+        error = self._release(self._mutexes)
+
+        if error is not None:
+            raise error
+
+    def unlock(self):
+        """Unlock all of the mutexes by one level of recursion. This
+           raises a MutexTimeoutError if any of the leases expired
+           before the mutexes were unlocked
+
+           Returns:
+                None
+        """
+        error = None
+
+        for mutex in reversed(self._mutexes):
+            try:
+                mutex.unlock()
+            except Exception as e:
+                if error is None:
+                    error = e
+
+        if error is not None:
+            raise error
+
+    def lock(self, timeout=None, lease_time=None):
+        """Lock all of the mutexes, blocking until they are all held,
+           or until 'timeout' seconds have passed. If we time out then
+           none of the mutexes are held and an exception is raised.
+           The mutexes are held for a maximum of 'lease_time' seconds
+
+           Args:
+                timeout (int): Number of seconds to block
+                lease_time (int): Number of seconds to hold the locks
+           Returns:
+                None
+        """
+        if timeout is None:
+            timeout = 10.0
+        else:
+            timeout = float(timeout)
+
+        if self.is_locked():
+            # renew all of the leases
+            for mutex in self._mutexes:
+                mutex.lock(timeout, lease_time)
+
+            return
+
+        endtime = _time.monotonic() + timeout
+        mutexes = self._mutexes
+
+        # try to lock all of the mutexes at once
+        if len(mutexes) > 1:
+            from ._objstore import _iter_in_pool
+
+            def _try_lock(mutex):
+                return mutex.try_lock(lease_time)
+
+            held = [(result is True) for (_mutex, result, _error)
+                    in _iter_in_pool(_try_lock, mutexes,
+                                     max_workers=len(mutexes))]
+        else:
+            held = [False] * len(mutexes)
+
+        try:
+            first = held.index(False)
+        except ValueError:
+            # we got them all
+            return
+
+        # release the mutexes after the first one that we didn't get,
+        # so that we only ever hold mutexes earlier in the order than
+        # the one we are waiting for
+        self._release([mutex for (mutex, is_held)
+                       in zip(mutexes[first:], held[first:]) if is_held])
+
+        for i in range(first, len(mutexes)):
+            try:
+                mutexes[i].lock(max(0.0, endtime - _time.monotonic()),
+                                lease_time)
+            except Exception as e:
+                # all or nothing - release the mutexes that we hold
+                self._release(mutexes[0:i])
+
+                from Acquire.ObjectStore import MutexTimeoutError
+
+                if isinstance(e, MutexTimeoutError):
+                    raise MutexTimeoutError(
+                        "Cannot acquire the mutex locks on all of the keys "
+                        "%s, as the lock on '%s' is held by someone else" %
+                        (self.keys(), mutexes[i]._key))
+                else:
+                    raise
@@ -2,15 +2,124 @@
 import io as _io
 import datetime as _datetime
 import uuid as _uuid
-import json as _json
 import os as _os
 
 __all__ = ["ObjectStore", "set_object_store_backend",
            "use_testing_object_store_backend",
+           "use_sqlite_object_store_backend",
+           "use_memory_object_store_backend",
            "use_oci_object_store_backend"]
 
 _objstore_backend = None
 
+# the default number of threads used to fetch objects in parallel
+_default_max_workers = 8
+
+# the default size of each part of a multipart upload. Files that are
+# no larger than this are uploaded in a single request. Note that
+# OCI requires that all but the last part are at least 10 MiB
+_default_part_size = 16 * 1024 * 1024
+
+
+def _iter_in_pool(function, keys, max_workers=None):
+    """Generator that calls 'function(key)' for each key in 'keys'
+       using a bounded pool of 'max_workers' threads, yielding
+       the tuple (key, result, error) for each key, in the same
+       order as 'keys'. 'error' is None if the call succeeded, else
+       it is the exception that was raised (and 'result' is None).
+       'keys' can be a lazy iterator - only a bounded window of keys
+       is consumed ahead of the results that have been yielded
+    """
+    from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+    from collections import deque as _deque
+
+    if max_workers is None:
+        max_workers = _default_max_workers
+
+    max_workers = max(1, int(max_workers))
+    max_pending = 2 * max_workers
+
+    # the workers act on behalf of the current request
+    from ._unit_of_work import _bind
+    from ._objstore_metrics import _bind as _bind_metrics
+    function = _bind_metrics(_bind(function))
+
+    pending = _deque()
+
+    def _pop():
+        (key, future) = pending.popleft()
+
+        try:
+            return (key, future.result(), None)
+        except Exception as e:
+            return (key, None, e)
+
+    pool = _ThreadPoolExecutor(max_workers=max_workers)
+
+    try:
+        for key in keys:
+            pending.append((key, pool.submit(function, key)))
+
+            if len(pending) >= max_pending:
+                yield _pop()
+
+        while len(pending) > 0:
+            yield _pop()
+    finally:
+        # cancel anything not yet started if the caller stopped early
+        for (_key, future) in pending:
+            future.cancel()
+
+        pool.shutdown(wait=True)
+
+
+def _handle_fetch_error(key, error, errors, action="get"):
+    """Internal function used to record the passed per-key 'error' into
+       the 'errors' dictionary, or to raise it as an ObjectStoreError
+       if 'errors' is None
+    """
+    if errors is not None:
+        errors[key] = error
+        return
+
+    from Acquire.ObjectStore import ObjectStoreError
+
+    if isinstance(error, ObjectStoreError):
+        raise error
+
+    raise ObjectStoreError("Unable to %s the object at key '%s': %s" %
+                           (action, key, str(error)))
+
+
+def _measured(operation, key, function, *args, **kwargs):
+    """Internal function that calls 'function' with the passed arguments,
+       recording the time taken and the number of bytes written and
+       read against 'operation' on 'key' in the ObjectStoreMetrics
+    """
+    from Acquire.ObjectStore import ObjectStoreMetrics as _ObjectStoreMetrics
+    from ._objstore_metrics import _get_bytes
+    from time import perf_counter as _perf_counter
+
+    start = _perf_counter()
+
+    try:
+        result = function(*args, **kwargs)
+    except:
+        _ObjectStoreMetrics.record(operation, key, _perf_counter() - start,
+                                   bytes_in=_get_bytes(args), error=True)
+        raise
+
+    if isinstance(result, tuple):
+        bytes_out = _get_bytes(result)
+    else:
+        bytes_out = _get_bytes([result])
+
+    _ObjectStoreMetrics.record(operation, key, _perf_counter() - start,
+                               bytes_in=_get_bytes(args),
+                               bytes_out=bytes_out)
+
+    return result
+
 
 def use_testing_object_store_backend(backend):
     from ._testing_objstore import Testing_ObjectStore as _Testing_ObjectStore
@@ -26,9 +135,49 @@ def use_testing_object_store_backend(backend):
     return bucket
 
 
+def use_sqlite_object_store_backend(backend):
+    from ._sqlite_objstore import SQLite_ObjectStore as _SQLite_ObjectStore
+    set_object_store_backend(_SQLite_ObjectStore)
+    bucket = "%s/sqlite_objstore" % backend
+
+    try:
+        # make sure that this directory exists if it doesn't already
+        _os.mkdir(bucket)
+    except:
+        pass
+
+    return bucket
+
+
+def use_memory_object_store_backend(backend):
+    from ._memory_objstore import Memory_ObjectStore as _Memory_ObjectStore
+
+    # keep any SimulatedObjectStore that already wraps the memory store
+    if getattr(_objstore_backend, "_backend", None) is not \
+            _Memory_ObjectStore:
+        set_object_store_backend(_Memory_ObjectStore)
+
+    bucket = "%s/memory_objstore" % backend
+
+    # make sure that this bucket exists if it doesn't already
+    from ._memory_objstore import _get_bucket
+    _get_bucket(bucket, create_if_needed=True)
+
+    return bucket
+
+
 def use_oci_object_store_backend():
     from ._oci_objstore import OCI_ObjectStore as _OCI_ObjectStore
-    set_object_store_backend(_OCI_ObjectStore)
+
+    # keep any DiskCacheObjectStore that already wraps the OCI store
+    if getattr(_objstore_backend, "_backend", None) is _OCI_ObjectStore:
+        return
+
+    # cache hot objects on local disk if OBJSTORE_CACHE_DIR is set
+    from ._diskcache_objstore import DiskCacheObjectStore as \
+        _DiskCacheObjectStore
+    set_object_store_backend(
+        _DiskCacheObjectStore.from_environment(_OCI_ObjectStore))
 
 
 class ObjectStore:
@@ -93,6 +242,8 @@ class ObjectStore:
            the bucket first, and then delete the bucket. This
            can cause a LOSS OF DATA!
         """
+        from Acquire.ObjectStore import ObjectStoreCache as _ObjectStoreCache
+        _ObjectStoreCache.invalidate(bucket)
         return _objstore_backend.delete_bucket(bucket=bucket, force=force)
 
     @staticmethod
@@ -134,17 +285,144 @@ class ObjectStore:
     @staticmethod
     def get_object(bucket, key):
         """Return the binary data contained in the key 'key' in the
-           passed bucket"""
-        return _objstore_backend.get_object(bucket, key)
+           passed bucket. This reads through the identity map of the
+           current ObjectStoreUnitOfWork and the ObjectStoreCache"""
+        from ._unit_of_work import _get, _put
+
+        data = _get(bucket, key)
+
+        if data is not None:
+            return data
+
+        from Acquire.ObjectStore import ObjectStoreCache as _ObjectStoreCache
+        data = _measured("get", key, _ObjectStoreCache.get_object,
+                         _objstore_backend, bucket, key)
+
+        _put(bucket, key, data)
+
+        return data
+
+    @staticmethod
+    def get_object_and_etag(bucket, key):
+        """Return the binary data contained in the key 'key' in the
+           passed bucket, together with the entity tag (etag) of that
+           object. The etag can be passed to 'set_object_if_match'
+           to perform a compare-and-swap
+        """
+        from ._unit_of_work import _flush_pending
+        _flush_pending(bucket, key)
+        return _measured("get", key, _objstore_backend.get_object_and_etag,
+                         bucket, key)
+
+    @staticmethod
+    def get_object_from_json_and_etag(bucket, key):
+        """Return the object constructed from json stored at 'key' in
+           the passed bucket, together with the entity tag (etag) of
+           the stored object, for use with 'set_object_from_json_if_match'.
+           If the stored object cannot be decoded then the object is
+           returned as None, so that it can still be replaced using
+           the etag
+        """
+        (data, etag) = ObjectStore.get_object_and_etag(bucket, key)
+
+        from ._codec import _decode
+
+        try:
+            return (_decode(data), etag)
+        except:
+            return (None, etag)
+
+    @staticmethod
+    def get_object_range(bucket, key, start, length=None):
+        """Return up to 'length' bytes of the binary data contained in
+           the key 'key' in the passed bucket, starting from byte
+           'start' (or all of the data from 'start' if 'length' is
+           None). Fewer bytes are returned if the object ends before
+           the end of the range. Only the requested bytes are read
+           from the object store, e.g. to read the header of a large
+           file. Note that the range is of the stored bytes, so this
+           should not be used for compressed json objects
+        """
+        start = int(start)
+
+        if length is not None:
+            length = int(length)
+
+        if start < 0 or (length is not None and length < 0):
+            from Acquire.ObjectStore import ObjectStoreError
+            raise ObjectStoreError(
+                "Invalid range (start=%s, length=%s) for key '%s'" %
+                (start, length, key))
+
+        from ._unit_of_work import _get, _flush_pending
+
+        data = _get(bucket, key)
+
+        if data is not None:
+            if length is None:
+                return bytes(data[start:])
+            else:
+                return bytes(data[start:start + length])
+
+        _flush_pending(bucket, key)
+        return _measured("get", key, _objstore_backend.get_object_range,
+                         bucket, key, start, length)
+
+    @staticmethod
+    def open_object(bucket, key):
+        """Open and return a read-only file-like object that streams
+           the binary data contained in the key 'key' in the passed
+           bucket. This should be used as a context manager, e.g.
+
+           with ObjectStore.open_object(bucket, key) as reader:
+               header = reader.read(1024)
+
+           Chunked objects are streamed chunk by chunk, so large
+           objects are never held in memory
+        """
+        from ._unit_of_work import _flush_pending
+        _flush_pending(bucket, key)
+        return _measured("get", key, _objstore_backend.open_object,
+                         bucket, key)
+
+    @staticmethod
+    def get_object_into(bucket, key, buffer):
+        """Read the binary data contained in the key 'key' in the passed
+           bucket into the passed preallocated 'buffer' (e.g. a
+           bytearray or writable memoryview), without any intermediate
+           copies. This returns the number of bytes read. This raises an
+           ObjectStoreError if the object is larger than the buffer
+        """
+        view = memoryview(buffer).cast("B")
+        nbytes = 0
+
+        with ObjectStore.open_object(bucket, key) as reader:
+            while nbytes < len(view):
+                nread = reader.readinto(view[nbytes:])
+
+                if not nread:
+                    return nbytes
+
+                nbytes += nread
+
+            if len(reader.read(1)) > 0:
+                from Acquire.ObjectStore import ObjectStoreError
+                raise ObjectStoreError(
+                    "The object at key '%s' is larger than the passed "
+                    "buffer (%d bytes)" % (key, len(view)))
+
+        return nbytes
 
     @staticmethod
     def get_object_as_file(bucket, key, filename):
         """Get the object contained in the key 'key' in the passed 'bucket'
-           and writing this to the file called 'filename'"""
-        data = ObjectStore.get_object(bucket, key)
+           and writing this to the file called 'filename'. The data is
+           streamed directly to the file"""
+        import shutil as _shutil
 
-        with open(filename, "wb") as FILE:
-            FILE.write(data)
+        with ObjectStore.open_object(bucket, key) as reader:
+            with open(filename, "wb") as FILE:
+                _shutil.copyfileobj(reader, FILE, 1024 * 1024)
 
     @staticmethod
     def get_string_object(bucket, key):
@@ -155,18 +433,27 @@ class ObjectStore:
     @staticmethod
     def get_object_from_json(bucket, key):
         """Return an object constructed from json stored at 'key' in
-           the passed bucket. This returns None if there is no data
-           at this key
+           the passed bucket. The codec used to encode the object is
+           detected automatically (see 'register_codec')
         """
-        data = ObjectStore.get_string_object(bucket, key)
-        return _json.loads(data)
+        from ._codec import _decode
+        return _decode(ObjectStore.get_object(bucket, key))
 
     @staticmethod
     def take_object(bucket, key):
         """Take (delete) the object from the object store, returning
-           the object
+           the object. This is atomic, so if several callers try to
+           take the same object then only one will succeed. The others
+           will raise an ObjectStoreError
         """
-        return _objstore_backend.take_object(bucket, key)
+        from ._unit_of_work import _flush_pending, _invalidate
+        _flush_pending(bucket, key)
+        _invalidate(bucket, key)
+
+        from Acquire.ObjectStore import ObjectStoreCache as _ObjectStoreCache
+        _ObjectStoreCache.invalidate(bucket, key)
+        return _measured("take", key, _objstore_backend.take_object,
+                         bucket, key)
 
     @staticmethod
     def take_string_object(bucket, key):
@@ -192,39 +479,212 @@ class ObjectStore:
         """Take (delete) the object from the object store, returning
            the json-deserialised object
         """
-        data = ObjectStore.take_string_object(bucket, key)
-        return _json.loads(data)
+        from ._codec import _decode
+        return _decode(ObjectStore.take_object(bucket, key))
+
+    @staticmethod
+    def claim_object(bucket, src_key, dst_key):
+        """Atomically move the object at 'src_key' to 'dst_key' in the
+           passed bucket, but only if the object exists, there is no
+           object at 'dst_key', and no-one else has claimed it first.
+           This returns the data of the claimed object, or None if it
+           could not be claimed. This can be used by many consumers to
+           safely take work items from a queue, e.g.
+
+           data = ObjectStore.claim_object(bucket, "queue/pending/1",
+                                           "queue/running/1")
+        """
+        from ._unit_of_work import _flush_pending, _invalidate
+        from Acquire.ObjectStore import ObjectStoreCache as _ObjectStoreCache
+
+        for key in (src_key, dst_key):
+            _flush_pending(bucket, key)
+            _invalidate(bucket, key)
+            _ObjectStoreCache.invalidate(bucket, key)
+
+        return _measured("take", src_key, _objstore_backend.claim_object,
+                         bucket, src_key, dst_key)
+
+    @staticmethod
+    def claim_object_from_json(bucket, src_key, dst_key):
+        """Claim the object at 'src_key' by moving it to 'dst_key'
+           (see 'claim_object'), returning the json-deserialised
+           object, or None if it could not be claimed
+        """
+        data = ObjectStore.claim_object(bucket, src_key, dst_key)
+
+        if data is None:
+            return None
+
+        from ._codec import _decode
+        return _decode(data)
 
     @staticmethod
     def get_all_object_names(bucket, prefix=None, without_prefix=False):
         """Returns the names of all objects in the passed bucket"""
-        return _objstore_backend.get_all_object_names(bucket, prefix,
-                                                      without_prefix)
+        from ._unit_of_work import _flush_pending
+        _flush_pending(bucket, prefix=prefix)
+        return _measured("list", prefix,
+                         _objstore_backend.get_all_object_names,
+                         bucket, prefix, without_prefix)
 
     @staticmethod
-    def get_all_objects(bucket, prefix=None):
-        """Return all of the objects in the passed bucket"""
+    def get_object_names_page(bucket, prefix=None, start_after=None,
+                              page_size=1000):
+        """Return a single page of up to 'page_size' object names
+           in the passed bucket that start with 'prefix', in
+           lexicographic order, starting after the name 'start_after'.
+           This returns a tuple of the list of names and the
+           continuation token that should be passed as 'start_after'
+           to get the next page. The token is None when there are
+           no more names
+        """
+        from ._unit_of_work import _flush_pending
+        _flush_pending(bucket, prefix=prefix)
+        return _measured("list", prefix,
+                         _objstore_backend.get_object_names_page,
+                         bucket, prefix=prefix, start_after=start_after,
+                         limit=page_size)
+
+    @staticmethod
+    def iter_object_names(bucket, prefix=None, start_after=None,
+                          page_size=1000, without_prefix=False):
+        """Generator that yields the names of all objects in the
+           passed bucket that start with 'prefix', in lexicographic
+           order, starting after the name 'start_after'. Names are
+           fetched lazily, one page of 'page_size' names at a time.
+           Any yielded (full) name can be passed back as 'start_after'
+           to continue the listing from that point
+        """
+        if without_prefix:
+            prefix_len = len(prefix)
+
+        while True:
+            (names, start_after) = ObjectStore.get_object_names_page(
+                                                bucket, prefix=prefix,
+                                                start_after=start_after,
+                                                page_size=page_size)
+
+            for name in names:
+                if without_prefix:
+                    name = name[prefix_len:]
+
+                    while name.startswith("/"):
+                        name = name[1:]
+
+                    if len(name) == 0:
+                        continue
+
+                yield name
+
+            if start_after is None:
+                return
+
+    @staticmethod
+    def list_children(bucket, prefix=None, delimiter="/"):
+        """Return the direct children of 'prefix' in the passed
+           bucket, i.e. the objects whose names contain no 'delimiter'
+           after 'prefix', and the sub-prefixes (up to and including
+           the next 'delimiter') that hold all of the deeper objects.
+           This returns the tuple of the sorted list of object names
+           and the sorted list of sub-prefixes. Only one level is
+           listed, so this does not need to enumerate every object
+           beneath 'prefix'
+        """
+        from ._unit_of_work import _flush_pending
+        _flush_pending(bucket, prefix=prefix)
+        return _measured("list", prefix, _objstore_backend.list_children,
+                         bucket, prefix=prefix, delimiter=delimiter)
+
+    @staticmethod
+    def iter_objects(bucket, keys, max_workers=None, errors=None):
+        """Generator that fetches the objects at all of the passed
+           'keys' in parallel, using up to 'max_workers' threads, and
+           yields the tuple (key, data) for each, in the same order as
+           'keys'. Objects are yielded as soon as they (and all objects
+           before them) have been fetched. 'keys' can be a lazy iterator,
+           e.g. from 'iter_object_names'.
+
+           If 'errors' is a dictionary then any keys that could not be
+           fetched are skipped and the exception is recorded in 'errors'.
+           Otherwise, the first failure is raised as an ObjectStoreError
+        """
+        def _get_object(key):
+            return ObjectStore.get_object(bucket, key)
+
+        for (key, data, error) in _iter_in_pool(_get_object, keys,
+                                                max_workers=max_workers):
+            if error is not None:
+                _handle_fetch_error(key, error, errors)
+            else:
+                yield (key, data)
+
+    @staticmethod
+    def get_objects(bucket, keys, max_workers=None, errors=None):
+        """Return a dictionary of the objects at all of the passed 'keys',
+           in the same order as 'keys'. The objects are fetched in
+           parallel using up to 'max_workers' threads. If 'errors' is
+           a dictionary then any keys that could not be fetched are
+           left out of the result and the exception is recorded in
+           'errors'. Otherwise, the first failure is raised as an
+           ObjectStoreError
+        """
         objects = {}
-        names = ObjectStore.get_all_object_names(bucket, prefix)
 
-        for name in names:
-            objects[name] = ObjectStore.get_object(bucket, name)
+        for (key, data) in ObjectStore.iter_objects(bucket, keys,
+                                                    max_workers=max_workers,
+                                                    errors=errors):
+            objects[key] = data
 
         return objects
 
+    @staticmethod
+    def iter_objects_from_json(bucket, prefix=None, keys=None,
+                               max_workers=None, errors=None):
+        """Generator that yields the tuple (key, object) for the
+           json-deserialised objects at the passed 'keys' (or, if 'keys'
+           is None, at all keys in the bucket that start with 'prefix').
+           Objects are fetched in parallel using up to 'max_workers'
+           threads and are yielded in key order as soon as they are
+           ready. Errors (including invalid json) are handled as
+           for 'iter_objects'
+        """
+        if keys is None:
+            keys = ObjectStore.iter_object_names(bucket, prefix)
+
+        def _get_object_from_json(key):
+            return ObjectStore.get_object_from_json(bucket, key)
+
+        for (key, data, error) in _iter_in_pool(_get_object_from_json, keys,
+                                                max_workers=max_workers):
+            if error is not None:
+                _handle_fetch_error(key, error, errors)
+            else:
+                yield (key, data)
+
+    @staticmethod
+    def get_all_objects(bucket, prefix=None, max_workers=None):
+        """Return all of the objects in the passed bucket. The objects
+           are fetched in parallel using up to 'max_workers' threads
+        """
+        names = ObjectStore.iter_object_names(bucket, prefix)
+        return ObjectStore.get_objects(bucket, names,
+                                       max_workers=max_workers)
+
     @staticmethod
     def get_all_objects_from_json(bucket, prefix=None):
         """Return all of the objects in the passed bucket as
            json-deserialised objects
         """
+        from ._codec import _decode
+
         objects = ObjectStore.get_all_objects(bucket, prefix)
 
         names = list(objects.keys())
 
         for name in names:
             try:
-                s = objects[name].decode("utf-8")
-                objects[name] = _json.loads(s)
+                objects[name] = _decode(objects[name])
             except:
                 del objects[name]
 
@@ -247,19 +707,167 @@ class ObjectStore:
         return objects
 
     @staticmethod
-    def set_object(bucket, key, data):
-        """Set the value of 'key' in 'bucket' to binary 'data'"""
-        _objstore_backend.set_object(bucket, key, data)
+    def set_object(bucket, key, data, defer=False):
+        """Set the value of 'key' in 'bucket' to binary 'data'. If
+           'defer' is True and there is an active ObjectStoreUnitOfWork,
+           then the write is buffered and only made when the unit of
+           work ends. Only pass 'defer' for writes that can safely be
+           lost if the request crashes
+        """
+        from ._unit_of_work import _defer, _invalidate
+
+        if defer and _defer(bucket, key, data):
+            return
+
+        _invalidate(bucket, key)
+
+        from Acquire.ObjectStore import ObjectStoreCache as _ObjectStoreCache
+        _ObjectStoreCache.invalidate(bucket, key)
+        _measured("set", key, _objstore_backend.set_object,
+                  bucket, key, data)
 
     @staticmethod
-    def set_object_from_file(bucket, key, filename):
+    def set_object_from_file(bucket, key, filename, part_size=None,
+                             max_workers=None, upload_id=None):
         """Set the value of 'key' in 'bucket' to equal the contents
-           of the file located by 'filename'"""
-        ObjectStore.set_object(bucket, key,
-                               open(filename, 'rb').read())
+           of the file located by 'filename'. Files larger than
+           'part_size' are streamed from disk using a multipart upload,
+           with up to 'max_workers' parts uploaded in parallel.
+
+           To be able to resume an upload after a failure, create the
+           upload using 'create_multipart_upload' and pass its ID as
+           'upload_id'. Calling this function again with the same
+           'upload_id' will then only upload the parts that are
+           missing. If 'upload_id' is not passed then a failed
+           upload is aborted
+        """
+        import os as _os
+
+        if part_size is None:
+            part_size = _default_part_size
+
+        part_size = int(part_size)
+        filesize = _os.path.getsize(filename)
+
+        if filesize <= part_size and upload_id is None:
+            with open(filename, "rb") as FILE:
+                ObjectStore.set_object(bucket, key, FILE.read())
+
+            return
+
+        nparts = max(1, int((filesize + part_size - 1) / part_size))
+
+        if upload_id is None:
+            is_resumable = False
+            upload_id = ObjectStore.create_multipart_upload(bucket, key)
+            uploaded = {}
+        else:
+            is_resumable = True
+            uploaded = ObjectStore.list_uploaded_parts(bucket, key,
+                                                       upload_id)
+
+        def _read_part(part_number):
+            with open(filename, "rb") as FILE:
+                FILE.seek((part_number - 1) * part_size)
+                return FILE.read(part_size)
+
+        def _upload_part(part_number):
+            data = _read_part(part_number)
+
+            if part_number in uploaded:
+                # skip parts that were uploaded by a previous attempt
+                (etag, size, md5sum) = uploaded[part_number]
+
+                from hashlib import md5 as _md5
+                if size == len(data) and md5sum == _md5(data).hexdigest():
+                    return etag
+
+            return ObjectStore.upload_part(bucket, key, upload_id,
+                                           part_number, data)
+
+        parts = {}
+
+        try:
+            for (part_number, etag, error) in _iter_in_pool(
+                                                _upload_part,
+                                                range(1, nparts + 1),
+                                                max_workers=max_workers):
+                if error is not None:
+                    raise error
+
+                parts[part_number] = etag
+
+            ObjectStore.commit_multipart_upload(bucket, key, upload_id,
+                                                parts)
+        except Exception as e:
+            if not is_resumable:
+                ObjectStore.abort_multipart_upload(bucket, key, upload_id)
+
+            from Acquire.ObjectStore import ObjectStoreError
+
+            if is_resumable:
+                raise ObjectStoreError(
+                    "Multipart upload '%s' of '%s' to key '%s' failed. "
+                    "Call again with the same upload_id to resume: %s" %
+                    (upload_id, filename, key, str(e)))
+            else:
+                raise ObjectStoreError(
+                    "Multipart upload of '%s' to key '%s' failed: %s" %
+                    (filename, key, str(e)))
 
     @staticmethod
-    def set_ins_object_from_json(bucket, key, data):
+    def create_multipart_upload(bucket, key):
+        """Start a new multipart upload of the object at 'key' in the
+           passed bucket, returning the ID of the upload
+        """
+        return _measured("set", key,
+                         _objstore_backend.create_multipart_upload,
+                         bucket, key)
+
+    @staticmethod
+    def upload_part(bucket, key, upload_id, part_number, data):
+        """Upload the binary 'data' as part 'part_number' (counting
+           from 1) of the multipart upload 'upload_id', returning the
+           etag of the part. Parts can be uploaded in any order
+           and in parallel
+        """
+        return _measured("set", key, _objstore_backend.upload_part,
+                         bucket, key, upload_id, part_number, data)
+
+    @staticmethod
+    def list_uploaded_parts(bucket, key, upload_id):
+        """Return the parts already uploaded to the multipart upload
+           'upload_id', as a dictionary mapping the part number to
+           a tuple of the etag, size and MD5 checksum of each part
+        """
+        return _measured("list", key, _objstore_backend.list_uploaded_parts,
+                         bucket, key, upload_id)
+
+    @staticmethod
+    def commit_multipart_upload(bucket, key, upload_id, parts):
+        """Commit the multipart upload 'upload_id', atomically setting
+           the object at 'key' to the passed 'parts' (a dictionary
+           mapping part number to the etag returned by 'upload_part')
+           joined in part-number order
+        """
+        from ._unit_of_work import _invalidate
+        _invalidate(bucket, key)
+
+        from Acquire.ObjectStore import ObjectStoreCache as _ObjectStoreCache
+        _ObjectStoreCache.invalidate(bucket, key)
+        _measured("set", key, _objstore_backend.commit_multipart_upload,
+                  bucket, key, upload_id, parts)
+
+    @staticmethod
+    def abort_multipart_upload(bucket, key, upload_id):
+        """Abort the multipart upload 'upload_id', discarding any
+           parts that have been uploaded
+        """
+        _measured("delete", key, _objstore_backend.abort_multipart_upload,
+                  bucket, key, upload_id)
+
+    @staticmethod
+    def set_ins_object_from_json(bucket, key, data, codec=None):
         """Set the value of 'key' in 'bucket' to equal to contents
            of 'data', which has been encoded to json, if (and only if)
            this key has not already been set (ins = 'if not set').
@@ -267,25 +875,14 @@ class ObjectStore:
            (either the set object or the value that was previously
            set
         """
-        from Acquire.ObjectStore import Mutex as _Mutex
-        m = _Mutex(bucket=bucket, key=key)
-
-        try:
-            old_data = ObjectStore.get_object_from_json(bucket, key)
-        except:
-            old_data = None
-
-        if old_data is not None:
-            m.unlock()
-            return old_data
-        else:
-            try:
-                ObjectStore.set_object_from_json(bucket, key, data)
-            except:
-                m.unlock()
-                raise
+        from ._codec import _encode
+        from ._compression import _compress
 
+        if ObjectStore.set_object_if_absent(
+                bucket, key, _compress(bucket, key, _encode(data, codec))):
             return data
+        else:
+            return ObjectStore.get_object_from_json(bucket, key)
 
     @staticmethod
     def set_ins_string_object(bucket, key, string_data):
@@ -295,72 +892,354 @@ class ObjectStore:
            key after the operation (either the set string, or the value
            that was previously set)
         """
-        from Acquire.ObjectStore import Mutex as _Mutex
-        m = _Mutex(bucket=bucket, key=key)
+        if ObjectStore.set_object_if_absent(bucket, key,
+                                            string_data.encode("utf-8")):
+            return string_data
+        else:
+            return ObjectStore.get_string_object(bucket, key)
 
-        try:
-            val = ObjectStore.get_string_object(bucket, key)
-        except:
-            val = None
+    @staticmethod
+    def set_object_if_absent(bucket, key, data):
+        """Atomically set the value of 'key' in 'bucket' to binary
+           'data' if (and only if) there is no object at this key.
+           This returns whether or not the object was set
+        """
+        from ._unit_of_work import _flush_pending, _invalidate
+        _flush_pending(bucket, key)
+        _invalidate(bucket, key)
 
-        if val is not None:
-            m.unlock()
-            return val
-        else:
-            try:
-                ObjectStore.set_string_object(bucket, key, string_data)
-            except:
-                m.unlock()
-                raise
+        from Acquire.ObjectStore import ObjectStoreCache as _ObjectStoreCache
+        _ObjectStoreCache.invalidate(bucket, key)
+        return _measured("set", key, _objstore_backend.set_object_if_absent,
+                         bucket, key, data)
 
-            return string_data
+    @staticmethod
+    def set_object_if_match(bucket, key, data, etag):
+        """Atomically set the value of 'key' in 'bucket' to binary
+           'data' if (and only if) the current object at this key has
+           the entity tag 'etag' (as returned by 'get_object_and_etag').
+           This returns whether or not the object was set
+        """
+        from ._unit_of_work import _flush_pending, _invalidate
+        _flush_pending(bucket, key)
+        _invalidate(bucket, key)
+
+        from Acquire.ObjectStore import ObjectStoreCache as _ObjectStoreCache
+        _ObjectStoreCache.invalidate(bucket, key)
+        return _measured("set", key, _objstore_backend.set_object_if_match,
+                         bucket, key, data, etag)
+
+    @staticmethod
+    def set_object_from_json_if_absent(bucket, key, data, codec=None):
+        """Atomically set the value of 'key' in 'bucket' to 'data',
+           encoded to json (as in 'set_object_from_json'), if (and only
+           if) there is no object at this key. This returns whether or
+           not the object was set
+        """
+        from ._codec import _encode
+        from ._compression import _compress
+        return ObjectStore.set_object_if_absent(
+                    bucket, key, _compress(bucket, key, _encode(data, codec)))
+
+    @staticmethod
+    def set_object_from_json_if_match(bucket, key, data, etag, codec=None):
+        """Atomically set the value of 'key' in 'bucket' to 'data',
+           encoded to json (as in 'set_object_from_json'), if (and only
+           if) the current object at this key has the entity tag 'etag'.
+           This returns whether or not the object was set
+        """
+        from ._codec import _encode
+        from ._compression import _compress
+        return ObjectStore.set_object_if_match(
+                    bucket, key, _compress(bucket, key, _encode(data, codec)),
+                    etag)
 
     @staticmethod
-    def set_string_object(bucket, key, string_data):
+    def set_string_object(bucket, key, string_data, defer=False):
         """Set the value of 'key' in 'bucket' to the string 'string_data'"""
         ObjectStore.set_object(bucket, key,
-                               string_data.encode("utf-8"))
+                               string_data.encode("utf-8"), defer=defer)
 
     @staticmethod
-    def set_object_from_json(bucket, key, data):
+    def set_object_from_json(bucket, key, data, defer=False, codec=None):
         """Set the value of 'key' in 'bucket' to equal to contents
-           of 'data', which has been encoded to json"""
-        ObjectStore.set_string_object(bucket, key, _json.dumps(data))
+           of 'data', which has been encoded to json. The object is
+           encoded using 'codec' (or the default codec if this is None),
+           and is compressed if 'set_compression' has been used to
+           enable compression for this key
+        """
+        from ._codec import _encode
+        from ._compression import _compress
+        ObjectStore.set_object(bucket, key,
+                               _compress(bucket, key, _encode(data, codec)),
+                               defer=defer)
+
+    @staticmethod
+    def register_codec(name, encode, decode, header=None):
+        """Register a new codec called 'name' that can be used to
+           encode objects in 'set_object_from_json'. 'encode' must
+           convert a json-serialisable object into bytes, and 'decode'
+           must convert those bytes back. 'header' is the single byte
+           that is written before the encoded data so that the codec
+           can be detected when the object is read. This must not be
+           a byte that can start a json document. The built-in codecs
+           are "json" (the default), "orjson" (fast json, if orjson
+           is installed) and "msgpack" (compact binary, if msgpack is
+           installed). Codecs that are not installed fall back to json
+        """
+        from ._codec import _register
+        _register(name, encode, decode, header=header)
+
+    @staticmethod
+    def get_codecs():
+        """Return the names of all of the codecs that are registered
+           and available to encode objects
+        """
+        from ._codec import _codecs, _is_available
+        return [name for name in _codecs.keys() if _is_available(name)]
+
+    @staticmethod
+    def set_default_codec(codec):
+        """Set the codec used by 'set_object_from_json' when no codec
+           is specified
+        """
+        from . import _codec
+        _codec._get_codec_name(codec)
+        _codec._default_codec = codec
+
+    @staticmethod
+    def set_record_codec(record_type, codec):
+        """Opt the record type called 'record_type' (e.g. "LineItem",
+           "TransactionRecord", "FileInfo" or "LoginSession") in to
+           being stored using 'codec' (e.g. "msgpack"). Pass None to
+           use the default codec again. Objects are decoded based on
+           their header, so this can be changed at any time
+        """
+        from . import _codec
+
+        if codec is None:
+            _codec._record_codecs.pop(record_type, None)
+        else:
+            _codec._get_codec_name(codec)
+            _codec._record_codecs[record_type] = codec
+
+    @staticmethod
+    def set_compression(prefix=None, bucket=None, algorithm="zstd",
+                        level=None, dictionary=None):
+        """Enable transparent compression of the objects written by
+           'set_object_from_json' whose keys start with 'prefix' (all
+           keys if this is None) in 'bucket' (all buckets if this is
+           None). 'algorithm' is "zstd" (which falls back to "zlib" if
+           zstandard is not installed) or "zlib", or None to disable
+           compression for this prefix. 'level' is the compression
+           level, and 'dictionary' is the name of a zstd dictionary
+           (see 'train_compression_dictionary') that will be used
+           if it has been loaded. The rule with the longest matching
+           prefix is used, e.g.
+
+           ObjectStore.set_compression("accounting/transactions/",
+                                       dictionary="TransactionRecord")
+
+           Compressed objects start with a magic header, so objects
+           are decompressed automatically when they are read, and
+           existing uncompressed objects can still be read
+        """
+        if algorithm not in [None, "zstd", "zlib"]:
+            from Acquire.ObjectStore import ObjectStoreError
+            raise ObjectStoreError(
+                "Unsupported compression algorithm '%s'. Supported "
+                "algorithms are 'zstd' and 'zlib'" % algorithm)
+
+        from ._objstore_cache import _get_bucket_id
+        from ._compression import _rules
+
+        if prefix is None:
+            prefix = ""
+
+        if bucket is not None:
+            bucket = _get_bucket_id(bucket)
+
+        _rules[(bucket, prefix)] = (algorithm, level, dictionary)
+
+    @staticmethod
+    def clear_compression():
+        """Remove all of the compression rules, so that no new
+           objects are compressed
+        """
+        from ._compression import _rules
+        _rules.clear()
+
+    @staticmethod
+    def train_compression_dictionary(name, samples, size=16384):
+        """Train a zstd compression dictionary of up to 'size' bytes
+           from the passed 'samples' (typical objects of a single
+           record type, as bytes or json-serialisable objects), and
+           load it under 'name'. This returns the dictionary data.
+           Save this data and load it using 'set_compression_dictionary'
+           in every process that reads the objects, as these cannot
+           be decompressed without it
+        """
+        from ._codec import _encode
+        from ._compression import _train_dictionary
+
+        samples = [sample if isinstance(sample, bytes) else _encode(sample)
+                   for sample in samples]
+
+        return _train_dictionary(name, samples, size)
+
+    @staticmethod
+    def set_compression_dictionary(name, data):
+        """Load the zstd compression dictionary 'data' (as returned by
+           'train_compression_dictionary') under 'name'
+        """
+        from ._compression import _set_dictionary
+        _set_dictionary(name, data)
+
+    @staticmethod
+    def get_record_codec(record_type):
+        """Return the codec to use to store records of type
+           'record_type', or None if the default codec should be used
+        """
+        from ._codec import _record_codecs
+        return _record_codecs.get(record_type, None)
 
     @staticmethod
     def delete_all_objects(bucket, prefix=None):
         """Deletes all objects..."""
-        _objstore_backend.delete_all_objects(bucket, prefix)
+        from ._unit_of_work import _invalidate
+        _invalidate(bucket, prefix=prefix)
+
+        from Acquire.ObjectStore import ObjectStoreCache as _ObjectStoreCache
+        _ObjectStoreCache.invalidate(bucket, prefix=prefix)
+        _measured("delete", prefix, _objstore_backend.delete_all_objects,
+                  bucket, prefix)
 
     @staticmethod
     def delete_object(bucket, key):
         """Removes the object at 'key'"""
-        _objstore_backend.delete_object(bucket, key)
+        from ._unit_of_work import _invalidate
+        _invalidate(bucket, key)
+
+        from Acquire.ObjectStore import ObjectStoreCache as _ObjectStoreCache
+        _ObjectStoreCache.invalidate(bucket, key)
+        _measured("delete", key, _objstore_backend.delete_object,
+                  bucket, key)
 
     @staticmethod
-    def clear_all_except(bucket, keys):
-        """Removes all objects from the passed 'bucket' except those
-           whose keys are or start with any key in 'keys'
+    def delete_object_if_match(bucket, key, etag):
+        """Atomically remove the object at 'key' if (and only if) it
+           has the entity tag 'etag' (as returned by
+           'get_object_and_etag'). This returns whether or not the
+           object was removed
         """
-        names = ObjectStore.get_all_object_names(bucket)
+        from ._unit_of_work import _flush_pending, _invalidate
+        _flush_pending(bucket, key)
+        _invalidate(bucket, key)
 
-        for name in names:
-            remove = True
+        from Acquire.ObjectStore import ObjectStoreCache as _ObjectStoreCache
+        _ObjectStoreCache.invalidate(bucket, key)
+        return _measured("delete", key,
+                         _objstore_backend.delete_object_if_match,
+                         bucket, key, etag)
+
+    @staticmethod
+    def delete_objects(bucket, keys, max_workers=None, errors=None):
+        """Delete the objects at all of the passed 'keys', using a pool
+           of up to 'max_workers' threads to run the deletes in parallel.
+           'keys' can be a lazy iterator, e.g. from 'iter_object_names'.
+           This returns the number of objects deleted.
+
+           If 'errors' is a dictionary then any keys that could not be
+           deleted are skipped and the exception is recorded in 'errors'.
+           Otherwise, the first failure is raised as an ObjectStoreError
+        """
+        def _delete_object(key):
+            ObjectStore.delete_object(bucket, key)
+
+        ndeleted = 0
 
-            for key in keys:
-                if name.startswith(key):
-                    remove = False
-                    break
+        for (key, _result, error) in _iter_in_pool(_delete_object, keys,
+                                                   max_workers=max_workers):
+            if error is not None:
+                _handle_fetch_error(key, error, errors, action="delete")
+            else:
+                ndeleted += 1
 
-            if remove:
-                ObjectStore.delete_object(bucket, key)
+        return ndeleted
+
+    @staticmethod
+    def purge_prefix(bucket, prefix, keep_prefixes=None, max_workers=None,
+                     progress=None, errors=None):
+        """Delete all of the objects in the passed bucket whose keys
+           start with 'prefix' (all objects if 'prefix' is None), except
+           those whose keys start with any of 'keep_prefixes'. The
+           listing is streamed into a bounded pool of up to 'max_workers'
+           parallel deletes, so the full listing is never held in memory.
+
+           Progress is recorded in the 'progress' dictionary as the
+           number of objects "deleted" and the "last_key" up to which
+           every object has been processed. Passing the same (e.g. saved
+           and reloaded) dictionary to a later call resumes the purge
+           from that point. "complete" is set to True once everything
+           has been purged. This returns the progress dictionary.
+
+           'errors' is used as for 'delete_objects'
+        """
+        if progress is None:
+            progress = {}
+
+        if keep_prefixes is None:
+            keep_prefixes = []
+        elif isinstance(keep_prefixes, str):
+            keep_prefixes = [keep_prefixes]
+
+        progress["deleted"] = progress.get("deleted", 0)
+        progress["complete"] = False
+
+        names = ObjectStore.iter_object_names(
+                                    bucket, prefix=prefix,
+                                    start_after=progress.get("last_key", None))
+
+        def _purge_object(name):
+            for keep_prefix in keep_prefixes:
+                if name.startswith(keep_prefix):
+                    return False
+
+            ObjectStore.delete_object(bucket, name)
+            return True
+
+        # results come back in listing order, so every key up to
+        # "last_key" has been dealt with, even if this is interrupted
+        for (name, deleted, error) in _iter_in_pool(_purge_object, names,
+                                                    max_workers=max_workers):
+            if error is not None:
+                _handle_fetch_error(name, error, errors, action="delete")
+            elif deleted:
+                progress["deleted"] += 1
+
+            progress["last_key"] = name
+
+        progress["complete"] = True
+
+        return progress
+
+    @staticmethod
+    def clear_all_except(bucket, keys):
+        """Removes all objects from the passed 'bucket' except those
+           whose keys are or start with any key in 'keys'
+        """
+        ObjectStore.purge_prefix(bucket, None, keep_prefixes=keys)
 
     @staticmethod
     def get_size_and_checksum(bucket, key):
         """Return the object size (in bytes) and checksum of the
            object in the passed bucket at the specified key
         """
-        return _objstore_backend.get_size_and_checksum(bucket, key)
+        from ._unit_of_work import _flush_pending
+        _flush_pending(bucket, key)
+        return _measured("get", key,
+                         _objstore_backend.get_size_and_checksum,
+                         bucket, key)
 
 
 def set_object_store_backend(backend):
@@ -0,0 +1,265 @@
+import threading as _threading
+
+__all__ = ["ObjectStoreCache"]
+
+_rlock = _threading.RLock()
+
+# the cache of object data - this is created on first use
+_cache = None
+
+# the total number of bytes of object data that can be cached
+_max_bytes = 16 * 1024 * 1024
+
+# objects larger than this will never be cached
+_max_object_size = 1024 * 1024
+
+# optional number of seconds after which entries will expire
+_ttl = None
+
+# whether or not mutable objects are cached (with revalidation)
+_cache_mutable = False
+
+# regular expressions matching the keys of immutable objects
+_immutable_prefixes = {}
+
+# incremented on every invalidation so that data fetched while
+# an object was being changed is never added to the cache
+_generation = 0
+
+_statistics = {"hits": 0, "misses": 0, "revalidations": 0,
+               "stale": 0, "invalidations": 0}
+
+
+def _get_bucket_id(bucket):
+    """Return a hashable ID for the passed bucket that is unique
+       for the bucket across all of the object store backends
+    """
+    if isinstance(bucket, str):
+        return bucket
+
+    try:
+        return "%s/%s" % (bucket["namespace"], bucket["bucket_name"])
+    except:
+        return str(bucket)
+
+
+def _get_cache():
+    """Return the cache, creating it if needed"""
+    global _cache
+
+    if _cache is None:
+        from cachetools import LRUCache as _LRUCache
+        from cachetools import TTLCache as _TTLCache
+
+        def _getsizeof(entry):
+            return max(1, len(entry[0]))
+
+        if _ttl is None:
+            _cache = _LRUCache(maxsize=_max_bytes, getsizeof=_getsizeof)
+        else:
+            _cache = _TTLCache(maxsize=_max_bytes, ttl=_ttl,
+                               getsizeof=_getsizeof)
+
+    return _cache
+
+
+def _get_checksum(data):
+    """Return the MD5 checksum of the passed data, which can be compared
+       to the checksum returned by 'get_size_and_checksum'
+    """
+    from hashlib import md5 as _md5
+    return _md5(data).hexdigest()
+
+
+class ObjectStoreCache:
+    """This is a bounded, in-process read-through cache that sits
+       in front of ObjectStore.get_object. Objects whose keys match
+       a prefix that has been marked as immutable (written once and
+       never changed) are served directly from the cache. Other
+       (mutable) objects are only cached if 'cache_mutable' is set,
+       and are revalidated against the size and checksum of the
+       object in the object store before they are returned.
+       The cache is bounded by the total number of bytes, with the
+       least recently used objects evicted first
+    """
+    @staticmethod
+    def configure(max_bytes=None, max_object_size=None, ttl=None,
+                  cache_mutable=None):
+        """Configure the cache. 'max_bytes' is the total size of data
+           that can be held (0 disables the cache), 'max_object_size'
+           is the size of the largest object that will be cached,
+           'ttl' is the optional number of seconds after which entries
+           expire, and 'cache_mutable' sets whether or not mutable
+           objects are cached. Only the passed values are changed.
+           This clears the cache
+        """
+        global _max_bytes, _max_object_size, _ttl, _cache_mutable, _cache
+
+        with _rlock:
+            if max_bytes is not None:
+                _max_bytes = int(max_bytes)
+
+            if max_object_size is not None:
+                _max_object_size = int(max_object_size)
+
+            if ttl is not None:
+                if ttl <= 0:
+                    _ttl = None
+                else:
+                    _ttl = float(ttl)
+
+            if cache_mutable is not None:
+                _cache_mutable = bool(cache_mutable)
+
+            _cache = None
+
+    @staticmethod
+    def add_immutable_prefix(prefix):
+        """Mark all objects whose keys start with 'prefix' as immutable,
+           meaning that they can be cached without revalidation. The
+           prefix can contain '*' wildcards, each of which matches
+           any characters within a single part of the key, e.g.
+           'accounting/accounts/*/txns/'
+        """
+        import re as _re
+
+        pattern = "".join(["[^/]*" if part == "*" else _re.escape(part)
+                           for part in _re.split(r"(\*)", prefix)])
+
+        with _rlock:
+            _immutable_prefixes[prefix] = _re.compile(pattern)
+
+    @staticmethod
+    def is_immutable(key):
+        """Return whether or not the object at 'key' is immutable"""
+        for regexp in list(_immutable_prefixes.values()):
+            if regexp.match(key):
+                return True
+
+        return False
+
+    @staticmethod
+    def get_object(backend, bucket, key):
+        """Return the binary data contained in the key 'key' in the
+           passed bucket, reading through the cache to the passed
+           object store 'backend'
+        """
+        if _max_bytes <= 0:
+            return backend.get_object(bucket, key)
+
+        is_immutable = ObjectStoreCache.is_immutable(key)
+
+        if not (is_immutable or _cache_mutable):
+            return backend.get_object(bucket, key)
+
+        cache_key = (_get_bucket_id(bucket), key)
+
+        with _rlock:
+            entry = _get_cache().get(cache_key, None)
+            generation = _generation
+
+        if entry is not None:
+            if is_immutable:
+                with _rlock:
+                    _statistics["hits"] += 1
+
+                return entry[0]
+
+            try:
+                (size, checksum) = backend.get_size_and_checksum(bucket, key)
+                is_valid = (size == len(entry[0]) and checksum == entry[1])
+            except:
+                is_valid = False
+
+            if is_valid:
+                with _rlock:
+                    _statistics["hits"] += 1
+                    _statistics["revalidations"] += 1
+
+                return entry[0]
+
+            with _rlock:
+                _statistics["stale"] += 1
+                _get_cache().pop(cache_key, None)
+
+        with _rlock:
+            _statistics["misses"] += 1
+
+        data = backend.get_object(bucket, key)
+
+        if data is not None and len(data) <= min(_max_object_size,
+                                                 _max_bytes):
+            if is_immutable:
+                checksum = None
+            else:
+                checksum = _get_checksum(data)
+
+            with _rlock:
+                # don't cache if the object was changed during the fetch
+                if generation == _generation:
+                    _get_cache()[cache_key] = (data, checksum)
+
+        return data
+
+    @staticmethod
+    def invalidate(bucket, key=None, prefix=None):
+        """Invalidate the cached copy of the object at 'key' in the
+           passed bucket. If 'prefix' is passed then all objects whose
+           keys start with 'prefix' are invalidated. If neither is
+           passed then all objects in the bucket are invalidated.
+           This should be called whenever an object is changed
+        """
+        global _generation
+
+        with _rlock:
+            _generation += 1
+            _statistics["invalidations"] += 1
+
+            if _cache is None or len(_cache) == 0:
+                return
+
+            bucket_id = _get_bucket_id(bucket)
+
+            if key is not None:
+                _cache.pop((bucket_id, key), None)
+                return
+
+            for cache_key in list(_cache.keys()):
+                if cache_key[0] == bucket_id:
+                    if prefix is None or cache_key[1].startswith(prefix):
+                        _cache.pop(cache_key, None)
+
+    @staticmethod
+    def clear():
+        """Remove all objects from the cache"""
+        global _generation
+
+        with _rlock:
+            _generation += 1
+
+            if _cache is not None:
+                _cache.clear()
+
+    @staticmethod
+    def get_statistics():
+        """Return a dictionary of the hit/miss counters of the cache,
+           plus the number of objects and bytes currently cached
+        """
+        with _rlock:
+            stats = dict(_statistics)
+
+            if _cache is None:
+                stats["objects"] = 0
+                stats["bytes"] = 0
+            else:
+                stats["objects"] = len(_cache)
+                stats["bytes"] = _cache.currsize
+
+        return stats
+
+    @staticmethod
+    def reset_statistics():
+        """Reset all of the hit/miss counters to zero"""
+        with _rlock:
+            for key in _statistics.keys():
+                _statistics[key] = 0
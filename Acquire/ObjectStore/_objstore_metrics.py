@@ -0,0 +1,215 @@
+
+import bisect as _bisect
+import threading as _threading
+
+__all__ = ["ObjectStoreMetrics"]
+
+_lock = _threading.Lock()
+
+# the upper bounds (in seconds) of the buckets of the latency histograms.
+# The last bucket of each histogram counts everything slower than this
+_latency_buckets = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05,
+                    0.1, 0.2, 0.5, 1.0, 2.0, 5.0]
+
+# the number of leading path segments of a key that identify its
+# prefix family, e.g. "accounting/accounts" for
+# "accounting/accounts/<uid>/<datetime>/<uid>"
+_family_depth = 2
+
+# the maximum number of families that are tracked. Operations on any
+# other families are counted against "other"
+_max_families = 256
+
+# the process-wide metrics
+_metrics = {"operations": {}, "families": {}}
+
+# each thread holds the metrics of the request that it is processing
+# (as 'request'), or None if per-request accounting is not active.
+# Worker threads that are started on behalf of a request count
+# against that request (see '_bind')
+_local = _threading.local()
+
+
+def _bind(function):
+    """Return a wrapper of 'function' that runs it with the request
+       metrics of the calling thread. This is used to count the
+       operations made by a worker thread against the current request
+    """
+    request = getattr(_local, "request", None)
+
+    if request is None:
+        return function
+
+    def _run_bound(*args, **kwargs):
+        old_request = getattr(_local, "request", None)
+        _local.request = request
+
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _local.request = old_request
+
+    return _run_bound
+
+
+def _get_bytes(values):
+    """Return the total size of all of the binary data in 'values'"""
+    size = 0
+
+    for value in values:
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            size += len(value)
+
+    return size
+
+
+def _get_family(key):
+    """Return the prefix family of the passed key (or listing prefix).
+       This is the first '_family_depth' segments of the key, not
+       counting the name of the object itself
+    """
+    if key is None:
+        return ""
+
+    parts = key.lstrip("/").split("/")[0:-1]
+
+    return "/".join(parts[0:_family_depth])
+
+
+def _new_stats():
+    return {"calls": 0, "errors": 0, "seconds": 0.0,
+            "bytes_in": 0, "bytes_out": 0,
+            "histogram": [0] * (len(_latency_buckets) + 1)}
+
+
+def _add(metrics, operation, family, seconds, bytes_in, bytes_out, error):
+    """Add the passed measurement to 'metrics'. This must be called
+       while holding '_lock'
+    """
+    families = metrics["families"]
+
+    if family not in families:
+        if len(families) >= _max_families:
+            family = "other"
+
+        if family not in families:
+            families[family] = {}
+
+    index = _bisect.bisect_left(_latency_buckets, seconds)
+
+    for operations in (metrics["operations"], families[family]):
+        stats = operations.get(operation, None)
+
+        if stats is None:
+            stats = _new_stats()
+            operations[operation] = stats
+
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        stats["bytes_in"] += bytes_in
+        stats["bytes_out"] += bytes_out
+        stats["histogram"][index] += 1
+
+        if error:
+            stats["errors"] += 1
+
+
+def _copy(metrics):
+    """Return a deep copy of the passed metrics"""
+    def _copy_operations(operations):
+        copy = {}
+
+        for (operation, stats) in operations.items():
+            stats = dict(stats)
+            stats["histogram"] = list(stats["histogram"])
+            copy[operation] = stats
+
+        return copy
+
+    return {"operations": _copy_operations(metrics["operations"]),
+            "families": {family: _copy_operations(operations)
+                         for (family, operations)
+                         in metrics["families"].items()},
+            "latency_buckets": list(_latency_buckets)}
+
+
+class ObjectStoreMetrics:
+    """This records the number of calls, errors, time taken, bytes
+       written (in) and read (out), and a latency histogram of every
+       operation made through the ObjectStore facade. Operations are
+       grouped by type ("get", "set", "list", "delete" and "take"),
+       both in total and per prefix family of the key, so that
+       patterns such as one read per listed object are easy to spot.
+
+       Metrics are collected for the whole process, and can also be
+       collected for a single request between calls to
+       'start_request' and 'end_request'. These are per thread, so
+       concurrent requests are counted separately
+    """
+    @staticmethod
+    def record(operation, key, seconds, bytes_in=0, bytes_out=0,
+               error=False):
+        """Record that the operation 'operation' on 'key' took
+           'seconds', writing 'bytes_in' and reading 'bytes_out'
+           bytes, and whether or not it raised an error
+        """
+        family = _get_family(key)
+        request = getattr(_local, "request", None)
+
+        with _lock:
+            _add(_metrics, operation, family, seconds,
+                 bytes_in, bytes_out, error)
+
+            if request is not None:
+                _add(request, operation, family, seconds,
+                     bytes_in, bytes_out, error)
+
+    @staticmethod
+    def get_metrics():
+        """Return a copy of the process-wide metrics. This is a
+           dictionary holding the statistics of each operation type
+           ("operations"), of each operation type in each prefix family
+           ("families"), and the upper bounds of the buckets of
+           the latency histograms ("latency_buckets")
+        """
+        with _lock:
+            return _copy(_metrics)
+
+    @staticmethod
+    def reset_metrics():
+        """Reset all of the process-wide metrics to zero"""
+        global _metrics
+
+        with _lock:
+            _metrics = {"operations": {}, "families": {}}
+
+    @staticmethod
+    def set_family_depth(depth):
+        """Set the number of leading path segments of each key that
+           identify its prefix family
+        """
+        global _family_depth
+        _family_depth = max(1, int(depth))
+
+    @staticmethod
+    def start_request():
+        """Start collecting the metrics of a single request in this
+           thread. This discards the metrics of any request that was
+           not ended
+        """
+        _local.request = {"operations": {}, "families": {}}
+
+    @staticmethod
+    def end_request():
+        """Stop collecting the metrics of the current request, and
+           return them (in the same format as 'get_metrics'). This
+           returns None if no request was started
+        """
+        request = getattr(_local, "request", None)
+        _local.request = None
+
+        if request is None:
+            return None
+
+        with _lock:
+            return _copy(request)
@@ -0,0 +1,85 @@
+
+import os as _os
+
+__all__ = []
+
+# private helpers that are shared by the local object store backends
+# (testing, SQLite and memory)
+
+
+def _get_driver_details_from_par(par):
+    from Acquire.ObjectStore import datetime_to_string \
+        as _datetime_to_string
+
+    import copy as _copy
+    details = _copy.copy(par._driver_details)
+
+    if details is None:
+        return {}
+    else:
+        # fix any non-string/number objects
+        details["created_datetime"] = _datetime_to_string(
+                                        details["created_datetime"])
+
+    return details
+
+
+def _get_driver_details_from_data(data):
+    from Acquire.ObjectStore import string_to_datetime \
+        as _string_to_datetime
+
+    import copy as _copy
+    details = _copy.copy(data)
+
+    if "created_datetime" in details:
+        details["created_datetime"] = _string_to_datetime(
+                                            details["created_datetime"])
+
+    return details
+
+
+def _get_etag(data):
+    """Return the entity tag for the passed data. This is the MD5 of
+       the data, which mirrors the ETag of (non-multipart) objects in
+       most cloud object stores, and matches the checksum of
+       'get_size_and_checksum'
+    """
+    import hashlib as _hashlib
+
+    if data is None:
+        data = b""
+
+    return _hashlib.md5(data).hexdigest()
+
+
+def _clean_key(key):
+    """Clean the passed key so that it matches the key that the posix
+       and OCI object stores would use, e.g. removing double slashes
+    """
+    key = _os.path.normpath(key)
+
+    while key.startswith("/"):
+        key = key[1:]
+
+    return key
+
+
+def _get_prefix_end(prefix):
+    """Return the smallest string that is greater than every string
+       that starts with 'prefix', or None if there is no such string.
+       Keys starting with 'prefix' are then all in the index range
+       prefix <= key < end
+    """
+    while len(prefix) > 0:
+        c = ord(prefix[-1]) + 1
+
+        if 0xD800 <= c <= 0xDFFF:
+            # surrogates cannot be encoded into the database
+            c = 0xE000
+
+        if c <= 0x10FFFF:
+            return prefix[0:-1] + chr(c)
+
+        prefix = prefix[0:-1]
+
+    return None
@@ -120,6 +120,114 @@ def _get_driver_details_from_data(data):
     return details
 
 
+def _is_precondition_failure(e):
+    """Internal function used to return whether or not the passed
+       exception was raised by OCI because a conditional (If-Match or
+       If-None-Match) request failed its precondition
+
+       Args:
+            e (Exception): Exception raised by the OCI client
+       Returns:
+            bool: True if this was a failed precondition, else False
+    """
+    status = getattr(e, "status", None)
+    return status in [409, 412]
+
+
+class _OCI_ObjectReader(_io.RawIOBase):
+    """Internal class that provides a read-only file-like stream of
+       the data of an object in the OCI object store. If the object
+       is chunked (stored as 'key/1', 'key/2' etc.) then each chunk
+       is streamed in turn, so the chunks are never concatenated
+       in memory
+    """
+    def __init__(self, bucket, key, response, is_chunked):
+        super().__init__()
+        self._bucket = bucket
+        self._key = key
+        self._raw = response.data.raw
+        self._is_chunked = is_chunked
+        self._next_chunk = 2
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        """Read data into the passed buffer, returning the number
+           of bytes read (0 at the end of the object)
+        """
+        while self._raw is not None:
+            nread = self._raw.readinto(b)
+
+            if nread:
+                return nread
+
+            self._raw.release_conn()
+            self._raw = None
+
+            if self._is_chunked:
+                # move on to the next chunk (if there is one)
+                try:
+                    response = self._bucket["client"].get_object(
+                                        self._bucket["namespace"],
+                                        self._bucket["bucket_name"],
+                                        "%s/%d" % (self._key,
+                                                   self._next_chunk))
+                    self._raw = response.data.raw
+                    self._next_chunk += 1
+                except:
+                    self._raw = None
+
+        return 0
+
+    def close(self):
+        if self._raw is not None:
+            try:
+                self._raw.release_conn()
+            except:
+                pass
+
+            self._raw = None
+
+        super().close()
+
+
+def _get_range(bucket, key, start, length=None):
+    """Internal function used to download up to 'length' bytes (or all
+       remaining bytes if 'length' is None) of the single object at
+       'key', starting from byte 'start', using a HTTP Range request.
+       This returns an empty string if the range starts after the end
+       of the object, and raises the OCI error if the object is missing
+    """
+    if length is None:
+        byte_range = "bytes=%d-" % start
+    else:
+        byte_range = "bytes=%d-%d" % (start, start + length - 1)
+
+    try:
+        response = bucket["client"].get_object(bucket["namespace"],
+                                               bucket["bucket_name"],
+                                               key, range=byte_range)
+    except Exception as e:
+        if getattr(e, "status", None) == 416:
+            # the range is not satisfiable as it starts after the end
+            return b""
+
+        raise
+
+    data = b"".join(response.data.raw.stream(1024 * 1024,
+                                             decode_content=False))
+
+    if response.status == 200 and (start > 0 or length is not None):
+        # the whole object was returned, rather than just the range
+        if length is None:
+            data = data[start:]
+        else:
+            data = data[start:start + length]
+
+    return data
+
+
 class OCI_ObjectStore:
     """This is the backend that abstracts using the Oracle Cloud
        Infrastructure object store
@@ -310,6 +418,9 @@ class OCI_ObjectStore:
                     "You cannot delete the bucket %s as it is not empty" %
                     OCI_ObjectStore.get_bucket_name(bucket=bucket))
 
+        if force:
+            OCI_ObjectStore._abort_all_multipart_uploads(bucket)
+
         # the bucket is empty - delete it
         client = bucket["client"]
         namespace = client.get_namespace().data
@@ -543,18 +654,18 @@ class OCI_ObjectStore:
         _OSParRegistry.close(par=par)
 
     @staticmethod
-    def get_object(bucket, key):
-        """Return the binary data contained in the key 'key' in the
-           passed bucket
+    def open_object(bucket, key):
+        """Open and return a read-only file-like object that streams
+           the binary data contained in the key 'key' in the passed
+           bucket. Chunked objects are streamed chunk by chunk
 
            Args:
                 bucket (dict): Bucket containing data
                 key (str): Key for data in bucket
            Returns:
-                bytes: Binary data
+                io.BufferedReader: Stream of the binary data
 
         """
-
         key = _clean_key(key)
 
         try:
@@ -577,39 +688,148 @@ class OCI_ObjectStore:
                 from Acquire.ObjectStore import ObjectStoreError
                 raise ObjectStoreError("No data at key '%s'" % key)
 
-        data = None
+        return _io.BufferedReader(
+                    _OCI_ObjectReader(bucket=bucket, key=key,
+                                      response=response,
+                                      is_chunked=is_chunked),
+                    buffer_size=1024 * 1024)
 
-        for chunk in response.data.raw.stream(1024 * 1024,
-                                              decode_content=False):
-            if not data:
-                data = chunk
-            else:
-                data += chunk
+    @staticmethod
+    def get_object(bucket, key):
+        """Return the binary data contained in the key 'key' in the
+           passed bucket
+
+           Args:
+                bucket (dict): Bucket containing data
+                key (str): Key for data in bucket
+           Returns:
+                bytes: Binary data
 
-        if is_chunked:
-            # keep going through to find more chunks
-            next_chunk = 1
+        """
+        # collect the pieces and join them once at the end, rather than
+        # repeatedly appending (which would copy the data every time)
+        parts = []
 
+        with OCI_ObjectStore.open_object(bucket, key) as reader:
             while True:
-                next_chunk += 1
+                part = reader.read(1024 * 1024)
 
-                try:
-                    response = bucket["client"].get_object(
-                                        bucket["namespace"],
-                                        bucket["bucket_name"],
-                                        "%s/%d" % (key, next_chunk))
-                except:
-                    response = None
+                if not part:
                     break
 
-                for chunk in response.data.raw.stream(1024 * 1024,
-                                                      decode_content=False):
-                    if not data:
-                        data = chunk
-                    else:
-                        data += chunk
+                parts.append(part)
 
-        return data
+        if len(parts) == 0:
+            return None
+        elif len(parts) == 1:
+            return parts[0]
+        else:
+            return b"".join(parts)
+
+    @staticmethod
+    def get_object_range(bucket, key, start, length=None):
+        """Return up to 'length' bytes (or all remaining bytes if
+           'length' is None) of the object at 'key' in the passed
+           bucket, starting from byte 'start'. This uses a HTTP Range
+           request, so only the requested bytes are downloaded. For
+           chunked objects, only the chunks that overlap the range
+           are downloaded
+
+           Args:
+                bucket (dict): Bucket containing data
+                key (str): Key for data in bucket
+                start (int): Offset of the first byte to read
+                length (int, default=None): Maximum number of bytes
+                to read
+           Returns:
+                bytes: Binary data
+        """
+        key = _clean_key(key)
+
+        if length is not None and length <= 0:
+            # still make sure that the object exists
+            OCI_ObjectStore.get_size_and_checksum(bucket, key)
+            return b""
+
+        try:
+            return _get_range(bucket, key, start, length)
+        except Exception as e:
+            if getattr(e, "status", None) != 404:
+                from Acquire.ObjectStore import ObjectStoreError
+                raise ObjectStoreError(
+                    "Unable to read the range of the object at key "
+                    "'%s': %s" % (key, str(e)))
+
+        # this may be a chunked object, stored as 'key/1', 'key/2' etc.
+        parts = []
+        position = 0
+        chunk = 1
+
+        if length is None:
+            end = None
+        else:
+            end = start + length
+
+        while end is None or position < end:
+            chunk_key = "%s/%d" % (key, chunk)
+
+            try:
+                response = bucket["client"].head_object(
+                                                bucket["namespace"],
+                                                bucket["bucket_name"],
+                                                chunk_key)
+            except:
+                break
+
+            size = int(response.headers["Content-Length"])
+
+            if position + size > start:
+                chunk_start = max(0, start - position)
+
+                if end is None:
+                    chunk_length = None
+                else:
+                    chunk_length = min(size, end - position) - chunk_start
+
+                parts.append(_get_range(bucket, chunk_key,
+                                        chunk_start, chunk_length))
+
+            position += size
+            chunk += 1
+
+        if chunk == 1:
+            from Acquire.ObjectStore import ObjectStoreError
+            raise ObjectStoreError("No data at key '%s'" % key)
+
+        return b"".join(parts)
+
+    @staticmethod
+    def get_object_and_etag(bucket, key):
+        """Return the binary data contained in the key 'key' in the
+           passed bucket, together with the entity tag (etag) of the
+           object. The etag can be passed to 'set_object_if_match'.
+           Note that this does not support chunked objects
+
+           Args:
+                bucket (dict): Bucket containing data
+                key (str): Key for data in bucket
+           Returns:
+                tuple (bytes, str): Binary data and etag
+        """
+        key = _clean_key(key)
+
+        try:
+            response = bucket["client"].get_object(bucket["namespace"],
+                                                   bucket["bucket_name"],
+                                                   key)
+        except:
+            from Acquire.ObjectStore import ObjectStoreError
+            raise ObjectStoreError("No data at key '%s'" % key)
+
+        data = b"".join(response.data.raw.stream(1024 * 1024,
+                                                 decode_content=False))
+
+        return (data, response.headers["etag"])
 
     @staticmethod
     def take_object(bucket, key):
@@ -623,63 +843,198 @@ class OCI_ObjectStore:
            Returns:
                 bytes: Binary data
         """
-        # ideally the get and delete should be atomic... would like this API
-        data = OCI_ObjectStore.get_object(bucket, key)
+        # the take is made atomic by only deleting the object if it is
+        # still the version that was read. If this fails then someone
+        # else has changed or taken the object, so try again (this
+        # raises an ObjectStoreError once the object has gone)
+        while True:
+            (data, etag) = OCI_ObjectStore.get_object_and_etag(bucket, key)
+
+            if OCI_ObjectStore.delete_object_if_match(bucket, key, etag):
+                return data
 
+    @staticmethod
+    def claim_object(bucket, src_key, dst_key):
+        """Move the object at 'src_key' to 'dst_key', but only if the
+           object at 'src_key' exists, there is no object at 'dst_key',
+           and no-one else claims the object first. The object is
+           copied to 'dst_key' and then the source is deleted only if
+           it has not changed. If this conditional delete fails then
+           someone else has claimed the object, so the copy is removed
+
+           Args:
+                bucket (dict): Bucket containing data
+                src_key (str): Key of the object to claim
+                dst_key (str): Key to move the object to
+           Returns:
+                bytes: Binary data of the claimed object, or None if
+                the object could not be claimed
+        """
         try:
-            OCI_ObjectStore.delete_object(bucket, key)
+            (data, etag) = OCI_ObjectStore.get_object_and_etag(bucket,
+                                                               src_key)
         except:
-            pass
+            return None
+
+        if not OCI_ObjectStore.set_object_if_absent(bucket, dst_key, data):
+            return None
 
-        return data
+        if OCI_ObjectStore.delete_object_if_match(bucket, src_key, etag):
+            return data
+
+        OCI_ObjectStore.delete_object(bucket, dst_key)
+        return None
 
     @staticmethod
-    def get_all_object_names(bucket, prefix=None, without_prefix=False):
-        """Returns the names of all objects in the passed bucket
+    def get_object_names_page(bucket, prefix=None, start_after=None,
+                              limit=1000):
+        """Return a page of up to 'limit' object names from the passed
+           bucket that start with 'prefix', in lexicographic order,
+           starting after the name 'start_after'
 
            Args:
                 bucket (dict): Bucket containing data
-                prefix (str): Prefix for data
+                prefix (str, default=None): Prefix for data
+                start_after (str, default=None): Only return names
+                that come after this name
+                limit (int, default=1000): Maximum number of names
            Returns:
-                list: List of all objects in bucket
-
+                tuple (list, str): List of names, plus the continuation
+                token to pass as 'start_after' to get the next page
+                (None if there are no more names)
         """
         if prefix is not None:
             prefix = _clean_key(prefix)
 
         objects = bucket["client"].list_objects(bucket["namespace"],
                                                 bucket["bucket_name"],
-                                                prefix=prefix).data
+                                                prefix=prefix,
+                                                start_after=start_after,
+                                                limit=limit).data
 
         names = []
-
-        if without_prefix:
-            prefix_len = len(prefix)
+        last_name = None
 
         for obj in objects.objects:
-            if prefix:
-                if obj.name.startswith(prefix):
-                    name = obj.name
-            else:
-                name = obj.name
+            last_name = obj.name
+            name = obj.name
 
             while name.endswith("/"):
                 name = name[0:-1]
 
-            while name.startswith("/"):
-                name = name[1:]
+            if len(name) > 0:
+                names.append(name)
+
+        if objects.next_start_with is None:
+            last_name = None
+
+        return (names, last_name)
 
-            if without_prefix:
-                name = name[prefix_len:]
+    @staticmethod
+    def get_all_object_names(bucket, prefix=None, without_prefix=False):
+        """Returns the names of all objects in the passed bucket. This
+           follows the pagination of the listing, so will return
+           every name, however many pages this needs
 
+           Args:
+                bucket (dict): Bucket containing data
+                prefix (str): Prefix for data
+           Returns:
+                list: List of all objects in bucket
+
+        """
+        if prefix is not None:
+            prefix = _clean_key(prefix)
+
+        names = []
+
+        if without_prefix:
+            prefix_len = len(prefix)
+
+        start_after = None
+
+        while True:
+            (page, start_after) = OCI_ObjectStore.get_object_names_page(
+                                            bucket, prefix=prefix,
+                                            start_after=start_after)
+
+            for name in page:
                 while name.startswith("/"):
                     name = name[1:]
 
-            if len(name) > 0:
-                names.append(name)
+                if without_prefix:
+                    name = name[prefix_len:]
+
+                    while name.startswith("/"):
+                        name = name[1:]
+
+                if len(name) > 0:
+                    names.append(name)
+
+            if start_after is None:
+                break
 
         return names
 
+    @staticmethod
+    def list_children(bucket, prefix=None, delimiter="/"):
+        """Return the names of the objects that are the direct
+           children of 'prefix' in the passed bucket, together with
+           the sub-prefixes that contain the deeper objects. This
+           uses the 'delimiter' option of the listing, so the object
+           store returns each sub-prefix once, rather than every
+           object beneath it
+
+           Args:
+                bucket (dict): Bucket containing data
+                prefix (str, default=None): Prefix for data
+                delimiter (str, default="/"): Delimiter between the
+                parts of the key
+           Returns:
+                tuple (list, list): Sorted list of the names of the
+                child objects, and sorted list of the sub-prefixes
+                (each ending with 'delimiter')
+        """
+        if prefix is not None:
+            clean_prefix = _clean_key(prefix)
+
+            # cleaning removes the trailing delimiter, which is needed
+            # so that only the children of the prefix are listed
+            if prefix.endswith(delimiter) and \
+                    not clean_prefix.endswith(delimiter):
+                clean_prefix += delimiter
+
+            prefix = clean_prefix
+
+        names = []
+        prefixes = []
+        start = None
+
+        while True:
+            objects = bucket["client"].list_objects(bucket["namespace"],
+                                                    bucket["bucket_name"],
+                                                    prefix=prefix,
+                                                    delimiter=delimiter,
+                                                    start=start,
+                                                    limit=1000).data
+
+            for obj in objects.objects:
+                if len(obj.name) > 0:
+                    names.append(obj.name)
+
+            if objects.prefixes is not None:
+                prefixes += objects.prefixes
+
+            start = objects.next_start_with
+
+            if start is None:
+                break
+
+        names.sort()
+        prefixes = sorted(set(prefixes))
+
+        return (names, prefixes)
+
     @staticmethod
     def set_object(bucket, key, data):
         """Set the value of 'key' in 'bucket' to binary 'data'
@@ -703,21 +1058,353 @@ class OCI_ObjectStore:
                                     key, f)
 
     @staticmethod
-    def delete_all_objects(bucket, prefix=None):
-        """Deletes all objects...
+    def set_object_if_absent(bucket, key, data):
+        """Set the value of 'key' in 'bucket' to binary 'data' if (and
+           only if) there is no object already at this key. This uses
+           an 'If-None-Match: *' conditional put, so is atomic
+
+           Args:
+                bucket (dict): Bucket containing data
+                key (str): Key for data in bucket
+                data (bytes): Binary data to store in bucket
+
+           Returns:
+                bool: True if the object was set, else False
+        """
+        if data is None:
+            data = b'0'
+
+        f = _io.BytesIO(data)
+
+        key = _clean_key(key)
+
+        try:
+            bucket["client"].put_object(bucket["namespace"],
+                                        bucket["bucket_name"],
+                                        key, f, if_none_match="*")
+        except Exception as e:
+            if _is_precondition_failure(e):
+                return False
+
+            from Acquire.ObjectStore import ObjectStoreError
+            raise ObjectStoreError(
+                "Unable to set the object at key '%s': %s" % (key, str(e)))
+
+        return True
+
+    @staticmethod
+    def set_object_if_match(bucket, key, data, etag):
+        """Set the value of 'key' in 'bucket' to binary 'data' if (and
+           only if) the entity tag of the current object at this key
+           is equal to 'etag'. This uses an 'If-Match' conditional put,
+           so is atomic
 
            Args:
                 bucket (dict): Bucket containing data
-                prefix (str, default=None): Prefix for data,
-                currently unused
+                key (str): Key for data in bucket
+                data (bytes): Binary data to store in bucket
+                etag (str): Entity tag that the current object must have
+
+           Returns:
+                bool: True if the object was set, else False
+        """
+        if data is None:
+            data = b'0'
+
+        f = _io.BytesIO(data)
+
+        key = _clean_key(key)
+
+        try:
+            bucket["client"].put_object(bucket["namespace"],
+                                        bucket["bucket_name"],
+                                        key, f, if_match=etag)
+        except Exception as e:
+            if _is_precondition_failure(e) or \
+                    getattr(e, "status", None) == 404:
+                return False
+
+            from Acquire.ObjectStore import ObjectStoreError
+            raise ObjectStoreError(
+                "Unable to set the object at key '%s': %s" % (key, str(e)))
+
+        return True
+
+    @staticmethod
+    def create_multipart_upload(bucket, key):
+        """Start a new multipart upload of the object at 'key' in the
+           passed bucket, returning the ID of the upload
+
+           Args:
+                bucket (dict): Bucket to upload to
+                key (str): Key of the object that will be created
+           Returns:
+                str: ID of the multipart upload
+        """
+        try:
+            from oci.object_storage.models import \
+                CreateMultipartUploadDetails as _CreateMultipartUploadDetails
+        except:
+            raise ImportError(
+                "Cannot import OCI. Please install OCI, e.g. via "
+                "'pip install oci' so that you can connect to the "
+                "Oracle Cloud Infrastructure")
+
+        key = _clean_key(key)
+
+        request = _CreateMultipartUploadDetails()
+        request.object = key
+
+        try:
+            response = bucket["client"].create_multipart_upload(
+                                            bucket["namespace"],
+                                            bucket["bucket_name"],
+                                            request)
+        except Exception as e:
+            from Acquire.ObjectStore import ObjectStoreError
+            raise ObjectStoreError(
+                "Unable to create a multipart upload for key '%s': %s" %
+                (key, str(e)))
+
+        return response.data.upload_id
+
+    @staticmethod
+    def upload_part(bucket, key, upload_id, part_number, data):
+        """Upload the binary 'data' as part 'part_number' (counting
+           from 1) of the multipart upload 'upload_id'. This returns
+           the etag of the uploaded part
+
+           Args:
+                bucket (dict): Bucket to upload to
+                key (str): Key of the object that will be created
+                upload_id (str): ID of the multipart upload
+                part_number (int): Number of this part
+                data (bytes): Binary data of this part
+           Returns:
+                str: Etag of the uploaded part
+        """
+        key = _clean_key(key)
+
+        try:
+            response = bucket["client"].upload_part(bucket["namespace"],
+                                                    bucket["bucket_name"],
+                                                    key, upload_id,
+                                                    int(part_number),
+                                                    _io.BytesIO(data))
+        except Exception as e:
+            from Acquire.ObjectStore import ObjectStoreError
+            raise ObjectStoreError(
+                "Unable to upload part %s of key '%s': %s" %
+                (part_number, key, str(e)))
+
+        return response.headers["etag"]
+
+    @staticmethod
+    def list_uploaded_parts(bucket, key, upload_id):
+        """Return the parts that have already been uploaded to the
+           multipart upload 'upload_id', as a dictionary mapping the
+           part number to a tuple of the etag, size and MD5 checksum
+           of each part
+
+           Args:
+                bucket (dict): Bucket to upload to
+                key (str): Key of the object that will be created
+                upload_id (str): ID of the multipart upload
+           Returns:
+                dict: Part number to (etag, size, md5) for each part
+        """
+        import binascii as _binascii
+        import base64 as _base64
+
+        key = _clean_key(key)
+
+        parts = {}
+        page = None
+
+        while True:
+            try:
+                response = bucket["client"].list_multipart_upload_parts(
+                                            bucket["namespace"],
+                                            bucket["bucket_name"],
+                                            key, upload_id, page=page)
+            except Exception as e:
+                from Acquire.ObjectStore import ObjectStoreError
+                raise ObjectStoreError(
+                    "Unable to list the parts of the multipart upload "
+                    "'%s': %s" % (upload_id, str(e)))
+
+            for part in response.data:
+                md5sum = _binascii.hexlify(
+                            _base64.b64decode(part.md5)).decode("utf-8")
+                parts[int(part.part_number)] = (part.etag, int(part.size),
+                                                md5sum)
+
+            page = response.headers.get("opc-next-page", None)
+
+            if page is None:
+                break
+
+        return parts
+
+    @staticmethod
+    def commit_multipart_upload(bucket, key, upload_id, parts):
+        """Commit the multipart upload 'upload_id', assembling the
+           passed 'parts' (a dictionary mapping part number to etag)
+           into the object at 'key'
+
+           Args:
+                bucket (dict): Bucket to upload to
+                key (str): Key of the object that will be created
+                upload_id (str): ID of the multipart upload
+                parts (dict): Part number to etag of all parts
+           Returns:
+                None
+        """
+        try:
+            from oci.object_storage.models import \
+                CommitMultipartUploadDetails as \
+                _CommitMultipartUploadDetails
+            from oci.object_storage.models import \
+                CommitMultipartUploadPartDetails as \
+                _CommitMultipartUploadPartDetails
+        except:
+            raise ImportError(
+                "Cannot import OCI. Please install OCI, e.g. via "
+                "'pip install oci' so that you can connect to the "
+                "Oracle Cloud Infrastructure")
+
+        key = _clean_key(key)
+
+        request = _CommitMultipartUploadDetails()
+        request.parts_to_commit = []
+
+        for part_number in sorted(parts.keys()):
+            part = _CommitMultipartUploadPartDetails()
+            part.part_num = int(part_number)
+            part.etag = parts[part_number]
+            request.parts_to_commit.append(part)
+
+        try:
+            bucket["client"].commit_multipart_upload(bucket["namespace"],
+                                                     bucket["bucket_name"],
+                                                     key, upload_id,
+                                                     request)
+        except Exception as e:
+            from Acquire.ObjectStore import ObjectStoreError
+            raise ObjectStoreError(
+                "Unable to commit the multipart upload '%s' to key "
+                "'%s': %s" % (upload_id, key, str(e)))
+
+    @staticmethod
+    def abort_multipart_upload(bucket, key, upload_id):
+        """Abort the multipart upload 'upload_id', discarding any
+           parts that have been uploaded
+
+           Args:
+                bucket (dict): Bucket to upload to
+                key (str): Key of the object that would be created
+                upload_id (str): ID of the multipart upload
+           Returns:
+                None
+        """
+        key = _clean_key(key)
+
+        try:
+            bucket["client"].abort_multipart_upload(bucket["namespace"],
+                                                    bucket["bucket_name"],
+                                                    key, upload_id)
+        except:
+            pass
+
+    @staticmethod
+    def delete_all_objects(bucket, prefix=None, max_workers=None):
+        """Deletes all objects whose names start with 'prefix' (or all
+           objects if 'prefix' is None). Each page of the listing is
+           fed into a bounded pool of parallel deletes, as OCI has no
+           bulk delete
+
+           Args:
+                bucket (dict): Bucket containing data
+                prefix (str, default=None): Prefix for data
+                max_workers (int, default=None): Number of deletes
+                to run in parallel
             Returns:
                 None
         """
+        from ._objstore import _iter_in_pool
 
-        for obj in OCI_ObjectStore.get_all_object_names(bucket):
-            bucket["client"].delete_object(bucket["namespace"],
-                                           bucket["bucket_name"],
-                                           obj)
+        if prefix is not None:
+            prefix = _clean_key(prefix)
+
+        def _iter_raw_names():
+            # use the raw names, as these are the names to delete
+            start = None
+
+            while True:
+                objects = bucket["client"].list_objects(
+                                            bucket["namespace"],
+                                            bucket["bucket_name"],
+                                            prefix=prefix, start=start,
+                                            limit=1000).data
+
+                for obj in objects.objects:
+                    yield obj.name
+
+                start = objects.next_start_with
+
+                if start is None:
+                    return
+
+        def _delete_object(name):
+            try:
+                bucket["client"].delete_object(bucket["namespace"],
+                                               bucket["bucket_name"],
+                                               name)
+            except Exception as e:
+                # the object may have already been deleted
+                if getattr(e, "status", None) != 404:
+                    raise
+
+        failed = []
+
+        for (name, _result, error) in _iter_in_pool(_delete_object,
+                                                    _iter_raw_names(),
+                                                    max_workers=max_workers):
+            if error is not None:
+                failed.append((name, str(error)))
+
+        if len(failed) > 0:
+            from Acquire.ObjectStore import ObjectStoreError
+            raise ObjectStoreError(
+                "Unable to delete %d objects, e.g. '%s': %s" %
+                (len(failed), failed[0][0], failed[0][1]))
+
+    @staticmethod
+    def _abort_all_multipart_uploads(bucket):
+        """Abort all of the in-progress multipart uploads in the passed
+           bucket, as a bucket cannot be deleted while these exist
+        """
+        page = None
+
+        while True:
+            response = bucket["client"].list_multipart_uploads(
+                                            bucket["namespace"],
+                                            bucket["bucket_name"],
+                                            page=page)
+
+            for upload in response.data:
+                try:
+                    bucket["client"].abort_multipart_upload(
+                                            bucket["namespace"],
+                                            bucket["bucket_name"],
+                                            upload.object, upload.upload_id)
+                except:
+                    pass
+
+            page = response.headers.get("opc-next-page", None)
+
+            if page is None:
+                return
 
     @staticmethod
     def delete_object(bucket, key):
@@ -737,6 +1424,37 @@ class OCI_ObjectStore:
         except:
             pass
 
+    @staticmethod
+    def delete_object_if_match(bucket, key, etag):
+        """Remove the object at 'key' if (and only if) its entity tag
+           is equal to 'etag'. This uses an 'If-Match' conditional
+           delete, so is atomic
+
+           Args:
+                bucket (dict): Bucket containing data
+                key (str): Key for data
+                etag (str): Entity tag that the object must have
+           Returns:
+                bool: True if the object was removed, else False
+        """
+        key = _clean_key(key)
+
+        try:
+            bucket["client"].delete_object(bucket["namespace"],
+                                           bucket["bucket_name"],
+                                           key, if_match=etag)
+        except Exception as e:
+            if _is_precondition_failure(e) or \
+                    getattr(e, "status", None) == 404:
+                return False
+
+            from Acquire.ObjectStore import ObjectStoreError
+            raise ObjectStoreError(
+                "Unable to delete the object at key '%s': %s" %
+                (key, str(e)))
+
+        return True
+
     @staticmethod
     def get_size_and_checksum(bucket, key):
         """Return the object size (in bytes) and MD5 checksum of the
@@ -751,10 +1469,11 @@ class OCI_ObjectStore:
         """
         key = _clean_key(key)
 
+        # only the headers are needed, so don't download the object
         try:
-            response = bucket["client"].get_object(bucket["namespace"],
-                                                   bucket["bucket_name"],
-                                                   key)
+            response = bucket["client"].head_object(bucket["namespace"],
+                                                    bucket["bucket_name"],
+                                                    key)
         except:
             from Acquire.ObjectStore import ObjectStoreError
             raise ObjectStoreError("No data at key '%s'" % key)
@@ -550,6 +550,33 @@ class OSPar:
         return par
 
 
+def _is_local(url):
+    """Internal function used to return whether or not the passed url
+       refers to a local object store (posix files, SQLite or memory)
+    """
+    return url.startswith("file://") or url.startswith("sqlite://") or \
+        url.startswith("memory://")
+
+
+def _get_local_store(url):
+    """Internal function used to return the backend, bucket and key of
+       the passed SQLite or in-memory object store url, or None if
+       this is a posix file url
+    """
+    if url.startswith("sqlite://"):
+        from ._sqlite_objstore import SQLite_ObjectStore as _backend
+        from ._sqlite_objstore import _split_url
+    elif url.startswith("memory://"):
+        from ._memory_objstore import Memory_ObjectStore as _backend
+        from ._memory_objstore import _split_url
+    else:
+        return None
+
+    (bucket, key) = _split_url(url)
+
+    return (_backend, bucket, key)
+
+
 def _url_to_filepath(url):
     """Internal function used to strip the "file://" from the beginning
        of a file url
@@ -571,10 +598,90 @@ def _read_local(url):
        Returns:
             bytes: Data read from file
     """
+    store = _get_local_store(url)
+
+    if store is not None:
+        (backend, bucket, key) = store
+        return backend.get_object(bucket, key)
+
     with open("%s._data" % _url_to_filepath(url), "rb") as FILE:
         return FILE.read()
 
 
+def _read_local_range(url, start, length=None):
+    """Internal function used to read up to 'length' bytes (or all
+       remaining bytes if 'length' is None) from a local URL,
+       starting from byte 'start'
+
+       Args:
+            url (str): URL from which to read data
+            start (int): Offset of the first byte to read
+            length (int, default=None): Maximum number of bytes to read
+       Returns:
+            bytes: Binary data
+    """
+    store = _get_local_store(url)
+
+    if store is not None:
+        (backend, bucket, key) = store
+        return backend.get_object_range(bucket, key, start, length)
+
+    with open("%s._data" % _url_to_filepath(url), "rb") as FILE:
+        FILE.seek(start)
+
+        if length is None:
+            return FILE.read()
+        else:
+            return FILE.read(length)
+
+
+def _read_remote_range(url, start, length=None):
+    """Internal function used to read up to 'length' bytes (or all
+       remaining bytes if 'length' is None) from a remote URL,
+       starting from byte 'start', using a HTTP Range request
+
+       Args:
+            url (str): Remote URL from which to read data
+            start (int): Offset of the first byte to read
+            length (int, default=None): Maximum number of bytes to read
+       Returns:
+            bytes: Binary data
+    """
+    if length is None:
+        byte_range = "bytes=%d-" % start
+    else:
+        byte_range = "bytes=%d-%d" % (start, start + length - 1)
+
+    try:
+        from Acquire.Stubs import requests as _requests
+        response = _requests.get(url, headers={"Range": byte_range})
+        status_code = response.status_code
+    except Exception as e:
+        from Acquire.Client import PARReadError
+        raise PARReadError(
+            "Cannot read the remote OSPar URL '%s' because of a possible "
+            "nework issue: %s" % (url, str(e)))
+
+    output = response.content
+
+    if status_code == 206:
+        return output
+    elif status_code == 416:
+        # the range starts after the end of the object
+        return b""
+    elif status_code == 200:
+        # the server ignored the range and returned the whole object
+        if length is None:
+            return output[start:]
+        else:
+            return output[start:start + length]
+
+    from Acquire.Client import PARReadError
+    raise PARReadError(
+        "Failed to read data from the OSPar URL. HTTP status code = %s, "
+        "returned output: %s" % (status_code, output))
+
+
 def _read_remote(url):
     """Internal function used to read data from a remote URL
 
@@ -616,6 +723,17 @@ def _list_local(url):
        Returns:
             list: List of object keys
     """
+    store = _get_local_store(url)
+
+    if store is not None:
+        (backend, bucket, prefix) = store
+
+        if len(prefix) == 0:
+            return backend.get_all_object_names(bucket)
+
+        return backend.get_all_object_names(bucket, "%s/" % prefix,
+                                            without_prefix=True)
+
     local_dir = _url_to_filepath(url)
 
     keys = []
@@ -658,6 +776,13 @@ def _write_local(url, data):
        Returns:
             None
     """
+    store = _get_local_store(url)
+
+    if store is not None:
+        (backend, bucket, key) = store
+        backend.set_object(bucket, key, data)
+        return
+
     filename = "%s._data" % _url_to_filepath(url)
 
     try:
@@ -769,7 +894,7 @@ class BucketReader:
         else:
             url = "%s/%s" % (url, key)
 
-        if url.startswith("file://"):
+        if _is_local(url):
             return _read_local(url)
         else:
             return _read_remote(url)
@@ -810,14 +935,14 @@ class BucketReader:
            the passed bucket. This raises an exception if there is no
            data or the OSPar has expired
         """
-        data = self.get_string_object(key)
-        return _json.loads(data)
+        from ._codec import _decode
+        return _decode(self.get_object(key))
 
     def get_all_object_names(self, prefix=None):
         """Returns the names of all objects in the passed bucket"""
         (url, part) = _join_bucket_and_prefix(self._url, prefix)
 
-        if url.startswith("file://"):
+        if _is_local(url):
             objnames = _list_local(url)
         else:
             objnames = _list_remote(url)
@@ -840,19 +965,28 @@ class BucketReader:
 
         return matches
 
-    def get_all_objects(self, prefix=None):
-        """Return all of the objects in the passed bucket"""
+    def get_all_objects(self, prefix=None, max_workers=None):
+        """Return all of the objects in the passed bucket. The objects
+           are fetched in parallel using up to 'max_workers' threads
+        """
+        from ._objstore import _iter_in_pool
+
         names = self.get_all_object_names(prefix)
 
+        def _get_object(name):
+            if prefix:
+                return self.get_object("%s/%s" % (prefix, name))
+            else:
+                return self.get_object(name)
+
         objects = {}
 
-        if prefix:
-            for name in names:
-                objects[name] = self.get_object(
-                                    "%s/%s" % (prefix, name))
-        else:
-            for name in names:
-                objects[name] = self.get_object(name)
+        for (name, data, error) in _iter_in_pool(_get_object, names,
+                                                 max_workers=max_workers):
+            if error is not None:
+                raise error
+
+            objects[name] = data
 
         return objects
 
@@ -912,7 +1046,7 @@ class BucketWriter:
         else:
             url = "%s/%s" % (url, key)
 
-        if url.startswith("file://"):
+        if _is_local(url):
             return _write_local(url, data)
         else:
             return _write_remote(url, data)
@@ -964,11 +1098,39 @@ class ObjectReader:
 
         url = self._url
 
-        if url.startswith("file://"):
+        if _is_local(url):
             return _read_local(url)
         else:
             return _read_remote(url)
 
+    def read_range(self, offset, length=None):
+        """Return up to 'length' bytes (or all remaining bytes if
+           'length' is None) of the object behind this OSPar, starting
+           from byte 'offset'. Only the requested bytes are downloaded
+        """
+        if self._par is None:
+            from Acquire.Client import PARError
+            raise PARError("You cannot read data from an empty OSPar")
+
+        offset = int(offset)
+
+        if length is not None:
+            length = int(length)
+
+            if length == 0:
+                return b""
+
+        if offset < 0 or (length is not None and length < 0):
+            raise ValueError("Invalid range: offset=%s, length=%s" %
+                             (offset, length))
+
+        url = self._url
+
+        if _is_local(url):
+            return _read_local_range(url, offset, length)
+        else:
+            return _read_remote_range(url, offset, length)
+
     def get_object_as_file(self, filename):
         """Get the object contained in this OSPar and write this to
            the file called 'filename'"""
@@ -994,8 +1156,8 @@ class ObjectReader:
            this OSPar. This raises an exception if there is no data
            or the OSPar has expired
         """
-        data = self.get_string_object()
-        return _json.loads(data)
+        from ._codec import _decode
+        return _decode(self.get_object())
 
 
 class ObjectWriter(ObjectReader):
@@ -1032,7 +1194,7 @@ class ObjectWriter(ObjectReader):
 
         url = self._url
 
-        if url.startswith("file://"):
+        if _is_local(url):
             return _write_local(url, data)
         else:
             return _write_remote(url, data)
@@ -3,6 +3,107 @@ __all__ = ["OSParRegistry"]
 
 _registry_key = "registry/pars"
 
+# the number of seconds after which an expired PAR that was claimed by
+# a sweeper that has not finished is returned to the expire index
+_sweep_lease = 600
+
+
+def _is_registered(bucket, par_uid):
+    """Return whether or not there is a registration for the PAR
+       with UID 'par_uid'
+    """
+    from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+    names = _ObjectStore.get_all_object_names(
+                    bucket, "%s/uid/%s/" % (_registry_key, par_uid))
+
+    return len(names) > 0
+
+
+def _sweep_entry(bucket, index_key, expire_string, par_uid):
+    """Internal function used to close the expired PAR with UID
+       'par_uid' whose entry in the expire index is 'index_key'.
+       The entry is first claimed (moved into the 'sweeping' index,
+       together with the time of the claim) so that only one sweeper
+       closes each PAR. This returns "closed" or "dangling" (if the
+       PAR had already been closed), or None if another sweeper
+       claimed the entry first
+    """
+    from Acquire.ObjectStore import ObjectStore as _ObjectStore
+    from Acquire.ObjectStore import datetime_to_string \
+        as _datetime_to_string
+    from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
+
+    sweep_key = "%s/sweeping/%s/%s/%s" % (
+                    _registry_key, _datetime_to_string(_get_datetime_now()),
+                    expire_string, par_uid)
+
+    if _ObjectStore.claim_object(bucket, index_key, sweep_key) is None:
+        return None
+
+    if not _is_registered(bucket, par_uid):
+        _ObjectStore.delete_object(bucket, sweep_key)
+        return "dangling"
+
+    try:
+        # this closes the PAR in the backend and then calls
+        # OSParRegistry.close to run the cleanup function
+        _ObjectStore.close_par(par_uid=par_uid)
+    except:
+        if _is_registered(bucket, par_uid):
+            # nothing was cleaned up, so return the entry to the
+            # expire index so that it is retried by the next sweep
+            _ObjectStore.claim_object(bucket, sweep_key, index_key)
+        else:
+            _ObjectStore.delete_object(bucket, sweep_key)
+
+        raise
+
+    _ObjectStore.delete_object(bucket, sweep_key)
+    return "closed"
+
+
+def _recover_stale(bucket, lease, limit):
+    """Internal function used to return up to 'limit' entries that
+       were claimed more than 'lease' seconds ago by sweepers that
+       did not finish (e.g. because they crashed) back to the expire
+       index. This returns the number of entries recovered
+    """
+    import datetime as _datetime
+    from Acquire.ObjectStore import ObjectStore as _ObjectStore
+    from Acquire.ObjectStore import datetime_to_string \
+        as _datetime_to_string
+    from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
+
+    stale_string = _datetime_to_string(
+                _get_datetime_now() - _datetime.timedelta(seconds=lease))
+
+    prefix = "%s/sweeping/" % _registry_key
+
+    (names, _token) = _ObjectStore.get_object_names_page(
+                                    bucket, prefix, page_size=limit)
+
+    nrecovered = 0
+
+    for name in names:
+        parts = name[len(prefix):].split("/")
+
+        if len(parts) != 3:
+            continue
+
+        (claim_string, expire_string, par_uid) = parts
+
+        if claim_string >= stale_string:
+            break
+
+        index_key = "%s/expire/%s/%s" % (_registry_key, expire_string,
+                                         par_uid)
+
+        if _ObjectStore.claim_object(bucket, name, index_key) is not None:
+            nrecovered += 1
+
+    return nrecovered
+
 
 class OSParRegistry:
     """This is a OSPar registry that is used
@@ -188,3 +289,107 @@ class OSParRegistry:
         if "cleanup_function" in data:
             cleanup_function = _Function.from_data(data["cleanup_function"])
             cleanup_function(par=par)
+
+    @staticmethod
+    def sweep_expired(now=None, batch_size=100, max_batches=None,
+                      max_workers=None, lease=None, errors=None):
+        """Close all of the registered PARs that expired before 'now'
+           (by default, the current time), calling their cleanup
+           functions. The expire index is scanned in time order in
+           batches of 'batch_size' entries, with the PARs in each
+           batch closed in parallel using up to 'max_workers' threads.
+           At most 'max_batches' batches are swept (all, if this is
+           None), so that this can be called regularly, e.g. via the
+           "admin/sweep_pars" function or from a periodic trigger.
+
+           This is safe to run on several instances at once, as each
+           entry is claimed atomically before it is closed. Entries
+           that fail to close are returned to the index to be retried,
+           and their errors are recorded in 'errors' (if this is a
+           dictionary, indexed by PAR UID). Entries claimed more than
+           'lease' seconds ago by sweepers that did not finish are
+           also returned to the index.
+
+           This returns a dictionary of the number of PARs 'closed',
+           the number of 'dangling' entries whose PARs had already
+           been closed, the number that 'failed', the number of stale
+           claims that were 'recovered', and whether or not all of the
+           expired PARs have been swept ('complete')
+        """
+        from Acquire.Service import is_running_service as _is_running_service
+
+        if not _is_running_service():
+            return None
+
+        from Acquire.Service import get_service_account_bucket \
+            as _get_service_account_bucket
+
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        from Acquire.ObjectStore import datetime_to_string \
+            as _datetime_to_string
+        from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
+        from ._objstore import _iter_in_pool
+
+        if now is None:
+            now = _get_datetime_now()
+
+        if lease is None:
+            lease = _sweep_lease
+
+        batch_size = max(1, int(batch_size))
+        now_string = _datetime_to_string(now)
+
+        bucket = _get_service_account_bucket()
+
+        result = {"closed": 0, "dangling": 0, "failed": 0,
+                  "recovered": _recover_stale(bucket, lease, batch_size),
+                  "complete": False}
+
+        def _sweep(entry):
+            return _sweep_entry(bucket, *entry)
+
+        prefix = "%s/expire/" % _registry_key
+        start_after = None
+        nbatches = 0
+
+        while max_batches is None or nbatches < max_batches:
+            (names, start_after) = _ObjectStore.get_object_names_page(
+                                            bucket, prefix,
+                                            start_after=start_after,
+                                            page_size=batch_size)
+
+            nbatches += 1
+            entries = []
+
+            for name in names:
+                parts = name[len(prefix):].split("/")
+
+                if len(parts) != 2:
+                    continue
+
+                (expire_string, par_uid) = parts
+
+                # the datetime strings sort in time order, so all
+                # remaining entries have not yet expired
+                if expire_string > now_string:
+                    start_after = None
+                    break
+
+                entries.append((name, expire_string, par_uid))
+
+            for (entry, outcome, error) in _iter_in_pool(
+                                        _sweep, entries,
+                                        max_workers=max_workers):
+                if error is not None:
+                    result["failed"] += 1
+
+                    if errors is not None:
+                        errors[entry[2]] = error
+                elif outcome is not None:
+                    result[outcome] += 1
+
+            if start_after is None:
+                result["complete"] = True
+                break
+
+        return result
@@ -0,0 +1,536 @@
+
+import datetime as _datetime
+import random as _random
+import threading as _threading
+import time as _time
+import uuid as _uuid
+import weakref as _weakref
+
+__all__ = ["ReadWriteMutex"]
+
+
+def _get_datetime(timestamp):
+    """Return the datetime for the passed (string) timestamp"""
+    return _datetime.datetime.fromtimestamp(float(timestamp),
+                                            tz=_datetime.timezone.utc)
+
+
+class ReadWriteMutex:
+    """This class implements a shared/exclusive (reader-writer) lock
+       that sits in the object store. Any number of readers can hold
+       the lock at the same time, while a writer holds it exclusively.
+       As for Mutex, the lock is really a lease, which is held for a
+       maximum of 'lease_time' seconds (renewed by a background thread
+       if 'heartbeat' is True).
+
+       Each reader registers its own lease under the key's prefix,
+       with the end of the lease encoded in the name, so a writer can
+       see all readers with a single listing. A writer first takes
+       the (exclusive) writer Mutex, which stops new readers from
+       registering, and then waits for the existing readers to drain.
+       Readers check for a writer both before and after registering,
+       so a reader and a writer can never both believe that they
+       hold the lock. This relies on the object store having strongly
+       consistent listings (as OCI does).
+
+       Use 'reading' or 'writing' as context managers, e.g.
+
+       with ReadWriteMutex("drives/1234").reading():
+           ...read the objects...
+    """
+    def __init__(self, key=None, timeout=10, lease_time=10, bucket=None,
+                 heartbeat=False):
+        """Create the reader-writer lock for key 'key'. This is created
+           unlocked. The default 'timeout' and 'lease_time' are used
+           by 'read_lock' and 'write_lock' if these are not passed
+        """
+        if key is None:
+            key = "none"
+        else:
+            key = str(key).replace(" ", "_")
+
+        if bucket is None:
+            from Acquire.Service import get_service_account_bucket as \
+                                       _get_service_account_bucket
+
+            bucket = _get_service_account_bucket()
+
+        self._bucket = bucket
+        self._key = key
+        self._readers_key = "mutexes/%s/readers/" % key
+        self._timeout = timeout
+        self._lease_time = lease_time
+        self._use_heartbeat = heartbeat
+        self._secret = str(_uuid.uuid4())
+
+        # the key of our reader lease, if we hold a read lock
+        self._reader_key = None
+        self._end_lease = None
+        self._held_lease_time = None
+
+        # the writer Mutex, if we hold (or are acquiring) a write lock
+        self._writer = None
+
+        self._heartbeat = None
+        self._heartbeat_lock = _threading.RLock()
+
+    def __del__(self):
+        """Release the lock if it is held"""
+        try:
+            self.unlock()
+        except:
+            pass
+
+    def __str__(self):
+        if self.is_write_locked():
+            state = "write_locked"
+        elif self.is_read_locked():
+            state = "read_locked"
+        else:
+            state = "unlocked"
+
+        return "ReadWriteMutex(%s, %s)" % (self._key, state)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Release the lock. If the lease expired while it was held
+           then this raises a MutexTimeoutError, unless another
+           exception is already being raised
+        """
+        try:
+            self.unlock()
+        except:
+            if exc_type is None:
+                raise
+
+    def reading(self, timeout=None, lease_time=None):
+        """Acquire a shared (read) lock and return this ReadWriteMutex,
+           so that it can be used as a context manager that releases
+           the lock on exit
+        """
+        self.read_lock(timeout, lease_time)
+        return self
+
+    def writing(self, timeout=None, lease_time=None):
+        """Acquire an exclusive (write) lock and return this
+           ReadWriteMutex, so that it can be used as a context manager
+           that releases the lock on exit
+        """
+        self.write_lock(timeout, lease_time)
+        return self
+
+    def is_read_locked(self):
+        """Return whether or not we hold a read lock
+
+           Returns:
+                bool: True if a read lock is held, else False
+        """
+        return self._reader_key is not None and not self.expired()
+
+    def is_write_locked(self):
+        """Return whether or not we hold a write lock
+
+           Returns:
+                bool: True if a write lock is held, else False
+        """
+        writer = self._writer
+        return writer is not None and writer.is_locked()
+
+    def is_locked(self):
+        """Return whether or not we hold either a read or write lock
+
+           Returns:
+                bool: True if a lock is held, else False
+        """
+        return self.is_read_locked() or self.is_write_locked()
+
+    def expired(self):
+        """Return whether or not the lease on the lock has expired
+
+           Returns:
+                bool: True if the lease has expired, else False
+        """
+        writer = self._writer
+
+        if writer is not None:
+            return writer.expired()
+        elif self._reader_key is not None:
+            from Acquire.ObjectStore import get_datetime_now as \
+                _get_datetime_now
+            return self._end_lease < _get_datetime_now()
+        else:
+            return False
+
+    def assert_not_expired(self):
+        """Function that asserts that the lease has not expired"""
+        if self.expired():
+            from Acquire.ObjectStore import MutexTimeoutError
+            raise MutexTimeoutError("The lease on this lock expired before "
+                                    "this lock was unlocked!")
+
+    def seconds_remaining_on_lease(self):
+        """Return the number of seconds remaining on the lease
+
+           Returns:
+                int: Seconds remaining on the lease
+        """
+        writer = self._writer
+
+        if writer is not None:
+            return writer.seconds_remaining_on_lease()
+        elif self.is_read_locked():
+            from Acquire.ObjectStore import get_datetime_now as \
+                _get_datetime_now
+            return max(0, (self._end_lease - _get_datetime_now()).seconds)
+        else:
+            return 0
+
+    def _get_defaults(self, timeout, lease_time):
+        if timeout is None:
+            timeout = self._timeout
+
+        if lease_time is None:
+            lease_time = self._lease_time
+
+        return (float(timeout), float(lease_time))
+
+    def _assert_unlocked(self):
+        if self._reader_key is not None or self._writer is not None:
+            from Acquire.ObjectStore import ObjectStoreError
+            raise ObjectStoreError(
+                "The lock on '%s' is already held. Unlock it before "
+                "locking it again" % self._key)
+
+    def _get_writer_lease(self):
+        """Return the end of the lease of the writer, or None if
+           there is no writer
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        from Acquire.ObjectStore import string_to_datetime \
+            as _string_to_datetime
+
+        try:
+            (holder, _etag) = _ObjectStore.get_object_and_etag(
+                                            self._bucket, self._writer_key())
+            holder = holder.decode("utf-8")
+            return _string_to_datetime(holder.split("{}")[-1])
+        except:
+            return None
+
+    def _writer_key(self):
+        return "mutexes/%s/writer" % self._key
+
+    def _new_reader_key(self, end_lease):
+        """Return the key for our reader lease, which ends at
+           'end_lease'. The end of the lease is encoded in the key
+           so that writers only need to list the readers
+        """
+        return "%s%.6f/%s" % (self._readers_key, end_lease.timestamp(),
+                              self._secret)
+
+    def _get_reader_leases(self, now):
+        """Return the keys of the (unexpired) reader leases, removing
+           any leases that have expired
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+        readers = []
+
+        for name in _ObjectStore.get_all_object_names(self._bucket,
+                                                      self._readers_key):
+            key = name
+
+            if not key.startswith(self._readers_key):
+                key = self._readers_key + key
+
+            try:
+                end_lease = _get_datetime(
+                                key[len(self._readers_key):].split("/")[0])
+            except:
+                continue
+
+            if end_lease < now:
+                # the reader crashed or forgot to unlock
+                try:
+                    _ObjectStore.delete_object(self._bucket, key)
+                except:
+                    pass
+            else:
+                readers.append((key, end_lease))
+
+        return readers
+
+    def _backoff(self, attempts, endtime, wakeup=None):
+        """Sleep before the next attempt, with an exponential backoff
+           (with jitter), but don't sleep past 'endtime' (or 'wakeup')
+        """
+        from ._mutex import _backoff_base, _backoff_cap
+
+        delay = _random.uniform(
+                    0, min(_backoff_cap, _backoff_base * 2**min(attempts, 16)))
+
+        delay = min(delay, endtime - _time.monotonic())
+
+        if wakeup is not None:
+            delay = min(delay, wakeup + 0.001)
+
+        _time.sleep(max(0.0, delay))
+
+    def read_lock(self, timeout=None, lease_time=None):
+        """Acquire a shared (read) lock, blocking until there is no
+           writer, or until 'timeout' seconds have passed. If we time
+           out, then an exception is raised. The lock is held for a
+           maximum of 'lease_time' seconds.
+
+           Args:
+                timeout (int): Number of seconds to block
+                lease_time (int): Number of seconds to hold the lock
+           Returns:
+                None
+        """
+        (timeout, lease_time) = self._get_defaults(timeout, lease_time)
+        self._assert_unlocked()
+
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
+        from ._mutex import _record, _get_key_family
+
+        # readers are counted in the same family as the writer mutex
+        family = _get_key_family(self._writer_key())
+        start = _time.monotonic()
+        endtime = start + timeout
+        attempts = 0
+
+        while True:
+            attempts += 1
+            now = _get_datetime_now()
+            writer = self._get_writer_lease()
+
+            if writer is None or writer < now:
+                end_lease = now + _datetime.timedelta(seconds=lease_time)
+                reader_key = self._new_reader_key(end_lease)
+
+                _ObjectStore.set_object(self._bucket, reader_key, b"")
+
+                # check again, in case a writer arrived while we were
+                # registering (the writer will have seen our lease)
+                writer = self._get_writer_lease()
+
+                if writer is None or writer < now:
+                    self._reader_key = reader_key
+                    self._end_lease = end_lease
+                    self._held_lease_time = lease_time
+                    self._start_heartbeat()
+
+                    _record(family, acquired=1, attempts=attempts,
+                            wait_seconds=_time.monotonic() - start)
+                    return
+
+                _ObjectStore.delete_object(self._bucket, reader_key)
+
+            if _time.monotonic() >= endtime:
+                break
+
+            self._backoff(attempts, endtime,
+                          (writer - now).total_seconds())
+
+        _record(family, attempts=attempts, timeouts=1,
+                wait_seconds=_time.monotonic() - start)
+
+        from Acquire.ObjectStore import MutexTimeoutError
+        raise MutexTimeoutError("Cannot acquire a read lock on the key '%s' "
+                                "as it is locked by a writer" % self._key)
+
+    def write_lock(self, timeout=None, lease_time=None):
+        """Acquire an exclusive (write) lock, blocking until all readers
+           and any other writer have released the lock, or until
+           'timeout' seconds have passed. If we time out, then an
+           exception is raised. New readers are blocked while we are
+           waiting. The lock is held for a maximum of 'lease_time'
+           seconds.
+
+           Args:
+                timeout (int): Number of seconds to block
+                lease_time (int): Number of seconds to hold the lock
+           Returns:
+                None
+        """
+        (timeout, lease_time) = self._get_defaults(timeout, lease_time)
+        self._assert_unlocked()
+
+        from Acquire.ObjectStore import Mutex as _Mutex
+        from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
+
+        start = _time.monotonic()
+        endtime = start + timeout
+
+        # taking the writer mutex stops new readers. It is always
+        # locked in the object store, as that is where readers look
+        writer = _Mutex(key="%s/writer" % self._key, timeout=timeout,
+                        lease_time=lease_time, bucket=self._bucket,
+                        heartbeat=self._use_heartbeat,
+                        use_lock_service=False)
+
+        self._writer = writer
+
+        # now wait for the existing readers to drain
+        attempts = 0
+
+        while True:
+            attempts += 1
+            now = _get_datetime_now()
+            readers = self._get_reader_leases(now)
+
+            if len(readers) == 0:
+                return
+
+            if _time.monotonic() >= endtime:
+                break
+
+            first_end = min(end_lease for (_key, end_lease) in readers)
+            self._backoff(attempts, endtime,
+                          (first_end - now).total_seconds())
+
+        self._writer = None
+
+        try:
+            writer.fully_unlock()
+        except:
+            pass
+
+        from Acquire.ObjectStore import MutexTimeoutError
+        raise MutexTimeoutError(
+            "Cannot acquire a write lock on the key '%s' as it is still "
+            "held by %d reader(s)" % (self._key, len(readers)))
+
+    def unlock(self):
+        """Release the read or write lock. Does nothing if the lock is
+           not held. If the lock is released after the lease has
+           expired then this will raise a MutexTimeoutError
+
+           Returns:
+                None
+        """
+        writer = self._writer
+
+        if writer is not None:
+            self._writer = None
+            writer.fully_unlock()
+            return
+
+        if self._reader_key is None:
+            return
+
+        self._stop_heartbeat()
+
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+        expired = self.expired()
+
+        with self._heartbeat_lock:
+            reader_key = self._reader_key
+            self._reader_key = None
+
+        try:
+            _ObjectStore.delete_object(self._bucket, reader_key)
+        except:
+            pass
+
+        if expired:
+            from Acquire.ObjectStore import MutexTimeoutError
+            raise MutexTimeoutError("The lease on this lock expired before "
+                                    "this lock was unlocked!")
+
+    def _start_heartbeat(self):
+        """Start the thread that renews the lease of our read lock, if
+           this lock uses a heartbeat. Write locks are renewed by the
+           heartbeat of the writer Mutex
+        """
+        if not self._use_heartbeat:
+            return
+
+        from ._mutex import _heartbeat, _heartbeats_per_lease
+
+        stop = _threading.Event()
+        interval = self._held_lease_time / _heartbeats_per_lease
+
+        thread = _threading.Thread(target=_heartbeat,
+                                   args=(_weakref.ref(self), stop, interval),
+                                   name="rwmutex_heartbeat", daemon=True)
+        self._heartbeat = (thread, stop)
+        thread.start()
+
+    def _stop_heartbeat(self):
+        heartbeat = self._heartbeat
+        self._heartbeat = None
+
+        if heartbeat is None:
+            return
+
+        (thread, stop) = heartbeat
+        stop.set()
+
+        if thread is not _threading.current_thread():
+            thread.join()
+
+    def _renew(self):
+        """Called by the heartbeat thread to renew the lease of our
+           read lock, by registering a new lease and then removing the
+           old one. The lease is not renewed if it has already expired,
+           or if a writer is waiting for the lock, in which case the
+           heartbeat stops and the lock is dropped when the current
+           lease ends. This returns whether or not the lease was renewed
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
+
+        with self._heartbeat_lock:
+            old_key = self._reader_key
+
+            if old_key is None:
+                return False
+
+            now = _get_datetime_now()
+
+            if self._end_lease <= now:
+                # too late - a writer may already hold the lock
+                try:
+                    _ObjectStore.delete_object(self._bucket, old_key)
+                except:
+                    pass
+
+                return False
+
+            end_lease = now + \
+                _datetime.timedelta(seconds=self._held_lease_time)
+            reader_key = self._new_reader_key(end_lease)
+
+            try:
+                _ObjectStore.set_object(self._bucket, reader_key, b"")
+            except:
+                return False
+
+            # check again, in case a writer arrived while we were
+            # renewing (the same check as in read_lock). The writer
+            # waits for our current lease to end
+            writer = self._get_writer_lease()
+
+            if writer is not None and writer >= now:
+                try:
+                    _ObjectStore.delete_object(self._bucket, reader_key)
+                except:
+                    pass
+
+                return False
+
+            self._reader_key = reader_key
+            self._end_lease = end_lease
+
+        try:
+            _ObjectStore.delete_object(self._bucket, old_key)
+        except:
+            pass
+
+        return True
@@ -0,0 +1,366 @@
+
+import math as _math
+import random as _random
+import threading as _threading
+import time as _time
+
+from ._objstore_metrics import _get_bytes
+
+__all__ = ["SimulatedObjectStore"]
+
+# the category of each backend operation, used to look up the latency
+# distribution if there isn't one for the specific operation
+_categories = {"get_object": "read", "get_object_and_etag": "read",
+               "get_object_range": "read", "open_object": "read",
+               "get_size_and_checksum": "read",
+               "set_object": "write", "set_object_if_absent": "write",
+               "set_object_if_match": "write", "upload_part": "write",
+               "create_multipart_upload": "write",
+               "commit_multipart_upload": "write",
+               "abort_multipart_upload": "write",
+               "delete_object": "delete", "take_object": "delete",
+               "delete_object_if_match": "delete",
+               "claim_object": "write",
+               "delete_all_objects": "delete",
+               "get_all_object_names": "list",
+               "get_object_names_page": "list",
+               "list_children": "list",
+               "list_uploaded_parts": "list"}
+
+
+class SimulatedObjectStore:
+    """This wraps an object store backend so that it behaves more like
+       a remote cloud object store. Every operation is delayed by a
+       latency drawn from a configurable distribution, data is
+       transferred at a limited bandwidth, operations can randomly
+       fail with a throttling error, and new or deleted objects can
+       take a while to be reflected in listings.
+
+       Use this as the object store backend, e.g.
+
+       set_object_store_backend(SimulatedObjectStore.oci_like())
+
+       Latencies can be a number of seconds, a (min, max) tuple for a
+       uniform distribution, or a function that is passed a
+       random.Random and returns the latency. 'latency' can also be
+       a dictionary of these, keyed by operation name (e.g.
+       "get_object") or category ("read", "write", "delete" or "list"),
+       with "default" used for anything else
+    """
+    def __init__(self, backend=None, latency=None, bandwidth=None,
+                 throttle_rate=0.0, consistency_delay=0.0, seed=None):
+        if backend is None:
+            from ._memory_objstore import Memory_ObjectStore
+            backend = Memory_ObjectStore
+
+        if latency is None:
+            latency = {}
+        elif not isinstance(latency, dict):
+            latency = {"default": latency}
+
+        self._backend = backend
+        self._latency = latency
+        self._bandwidth = bandwidth
+        self._throttle_rate = float(throttle_rate)
+        self._consistency_delay = float(consistency_delay)
+
+        self._random = _random.Random(seed)
+        self._lock = _threading.Lock()
+
+        # keys that have recently been created or deleted, which are
+        # not yet reflected in listings
+        self._recent = {}
+
+        self._statistics = {}
+
+    @staticmethod
+    def lognormal(median, p99):
+        """Return a latency distribution that is log-normal, with the
+           passed median and 99th percentile (in seconds). This is a
+           good model of the latency of a cloud object store
+        """
+        mu = _math.log(median)
+        sigma = _math.log(p99 / median) / 2.326
+
+        def _sample(rng):
+            return rng.lognormvariate(mu, sigma)
+
+        return _sample
+
+    @staticmethod
+    def oci_like(backend=None, seed=None):
+        """Return a SimulatedObjectStore with latencies, bandwidth and
+           a throttling rate that are typical of OCI object storage
+           accessed from within the same region
+        """
+        L = SimulatedObjectStore.lognormal
+
+        return SimulatedObjectStore(
+                    backend=backend,
+                    latency={"read": L(0.020, 0.150),
+                             "write": L(0.045, 0.300),
+                             "delete": L(0.030, 0.200),
+                             "list": L(0.060, 0.400),
+                             "default": L(0.030, 0.200)},
+                    bandwidth=50 * 1024 * 1024,
+                    throttle_rate=0.001, seed=seed)
+
+    def get_statistics(self):
+        """Return a dictionary of the number of calls, the simulated
+           latency (in seconds) and the number of throttling errors
+           for each operation
+        """
+        with self._lock:
+            return {name: dict(stats)
+                    for (name, stats) in self._statistics.items()}
+
+    def reset_statistics(self):
+        """Reset all of the statistics to zero"""
+        with self._lock:
+            self._statistics = {}
+
+    def _get_latency(self, name):
+        """Return a latency (in seconds) for the operation 'name'"""
+        latency = self._latency.get(name, None)
+
+        if latency is None:
+            latency = self._latency.get(_categories.get(name, None), None)
+
+        if latency is None:
+            latency = self._latency.get("default", None)
+
+        if latency is None:
+            return 0.0
+        elif callable(latency):
+            with self._lock:
+                return max(0.0, latency(self._random))
+        elif isinstance(latency, tuple):
+            with self._lock:
+                return self._random.uniform(latency[0], latency[1])
+        else:
+            return float(latency)
+
+    def _get_transfer_time(self, nbytes):
+        """Return the time needed to transfer 'nbytes' of data"""
+        if self._bandwidth is None or nbytes == 0:
+            return 0.0
+        else:
+            return nbytes / float(self._bandwidth)
+
+    def _record(self, name, delay, throttled=False):
+        with self._lock:
+            stats = self._statistics.get(name, None)
+
+            if stats is None:
+                stats = {"calls": 0, "latency": 0.0, "throttled": 0}
+                self._statistics[name] = stats
+
+            stats["calls"] += 1
+            stats["latency"] += delay
+
+            if throttled:
+                stats["throttled"] += 1
+
+    def _call(self, name, *args, **kwargs):
+        """Call the backend function 'name' with the passed arguments,
+           simulating the latency, bandwidth and throttling of a
+           remote object store
+        """
+        delay = self._get_latency(name) + self._get_transfer_time(
+                        _get_bytes(args) + _get_bytes(kwargs.values()))
+
+        if self._throttle_rate > 0:
+            with self._lock:
+                throttled = self._random.random() < self._throttle_rate
+
+            if throttled:
+                self._record(name, delay, throttled=True)
+                _time.sleep(delay)
+
+                from Acquire.ObjectStore import ObjectStoreError
+                raise ObjectStoreError(
+                    "Simulated throttling of '%s': 429 TooManyRequests" %
+                    name)
+
+        _time.sleep(delay)
+        result = getattr(self._backend, name)(*args, **kwargs)
+
+        if isinstance(result, tuple):
+            transfer = self._get_transfer_time(_get_bytes(result))
+        else:
+            transfer = self._get_transfer_time(_get_bytes([result]))
+
+        if transfer > 0:
+            _time.sleep(transfer)
+
+        self._record(name, delay + transfer)
+
+        return result
+
+    def __getattr__(self, name):
+        """Wrap all of the other functions of the backend"""
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        function = getattr(self._backend, name)
+
+        if not callable(function):
+            return function
+
+        def _wrapped(*args, **kwargs):
+            return self._call(name, *args, **kwargs)
+
+        return _wrapped
+
+    # The functions below track created and deleted objects so that
+    # listings only see them once the consistency delay has passed
+
+    def _exists(self, bucket, key):
+        if self._consistency_delay <= 0:
+            return False
+
+        try:
+            self._backend.get_size_and_checksum(bucket, key)
+            return True
+        except Exception:
+            return False
+
+    def _track(self, bucket, key, created):
+        if self._consistency_delay <= 0:
+            return
+
+        from ._objstore_cache import _get_bucket_id
+
+        with self._lock:
+            self._recent[(_get_bucket_id(bucket), key)] = \
+                (_time.time() + self._consistency_delay, created)
+
+    def _filter_names(self, bucket, prefix, names, add_deleted=True):
+        """Remove recently created names from, and add recently deleted
+           names to, the passed listing of names that start with 'prefix'
+        """
+        if self._consistency_delay <= 0:
+            return names
+
+        from ._objstore_cache import _get_bucket_id
+
+        bucket_id = _get_bucket_id(bucket)
+        now = _time.time()
+
+        if prefix is None:
+            prefix = ""
+
+        hidden = set()
+        deleted = []
+
+        with self._lock:
+            for (key, (until, created)) in list(self._recent.items()):
+                if until < now:
+                    del self._recent[key]
+                elif key[0] == bucket_id and key[1].startswith(prefix):
+                    if created:
+                        hidden.add(key[1])
+                    else:
+                        deleted.append(key[1])
+
+        names = [name for name in names if name not in hidden]
+
+        if add_deleted and len(deleted) > 0:
+            names = sorted(set(names + deleted))
+
+        return names
+
+    def _set(self, name, bucket, key, *args):
+        exists = self._exists(bucket, key)
+        result = self._call(name, bucket, key, *args)
+
+        if (not exists) and (result is None or result is True):
+            self._track(bucket, key, created=True)
+
+        return result
+
+    def set_object(self, bucket, key, data):
+        return self._set("set_object", bucket, key, data)
+
+    def set_object_if_absent(self, bucket, key, data):
+        return self._set("set_object_if_absent", bucket, key, data)
+
+    def set_object_if_match(self, bucket, key, data, etag):
+        return self._set("set_object_if_match", bucket, key, data, etag)
+
+    def commit_multipart_upload(self, bucket, key, upload_id, parts):
+        return self._set("commit_multipart_upload", bucket, key,
+                         upload_id, parts)
+
+    def delete_object(self, bucket, key):
+        exists = self._exists(bucket, key)
+        self._call("delete_object", bucket, key)
+
+        if exists:
+            self._track(bucket, key, created=False)
+
+    def take_object(self, bucket, key):
+        data = self._call("take_object", bucket, key)
+        self._track(bucket, key, created=False)
+        return data
+
+    def delete_object_if_match(self, bucket, key, etag):
+        deleted = self._call("delete_object_if_match", bucket, key, etag)
+
+        if deleted:
+            self._track(bucket, key, created=False)
+
+        return deleted
+
+    def claim_object(self, bucket, src_key, dst_key):
+        data = self._call("claim_object", bucket, src_key, dst_key)
+
+        if data is not None:
+            self._track(bucket, src_key, created=False)
+            self._track(bucket, dst_key, created=True)
+
+        return data
+
+    def get_all_object_names(self, bucket, prefix=None,
+                             without_prefix=False):
+        names = self._call("get_all_object_names", bucket, prefix)
+        names = self._filter_names(bucket, prefix, names)
+
+        if without_prefix:
+            prefix_len = len(prefix)
+            stripped = []
+
+            for name in names:
+                name = name[prefix_len:]
+                while name.startswith("/"):
+                    name = name[1:]
+
+                if len(name) > 0:
+                    stripped.append(name)
+
+            names = stripped
+
+        return names
+
+    def get_object_names_page(self, bucket, prefix=None, start_after=None,
+                              limit=1000):
+        (names, token) = self._call("get_object_names_page", bucket,
+                                    prefix=prefix, start_after=start_after,
+                                    limit=limit)
+
+        # adding deleted names could break the ordering of the pages,
+        # so only recently created names are hidden
+        return (self._filter_names(bucket, prefix, names,
+                                   add_deleted=False), token)
+
+    def list_children(self, bucket, prefix=None, delimiter="/"):
+        (names, prefixes) = self._call("list_children", bucket,
+                                       prefix=prefix, delimiter=delimiter)
+
+        if prefix is None:
+            prefix = ""
+
+        names = [name for name in self._filter_names(bucket, prefix, names)
+                 if name.find(delimiter, len(prefix)) == -1]
+
+        return (names, prefixes)
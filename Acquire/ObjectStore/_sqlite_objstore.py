@@ -0,0 +1,986 @@
+
+import io as _io
+import os as _os
+import shutil as _shutil
+import datetime as _datetime
+import uuid as _uuid
+import threading as _threading
+
+from ._objstore_utils import _get_driver_details_from_par, \
+    _get_driver_details_from_data, _get_etag, _clean_key, _get_prefix_end
+
+__all__ = ["SQLite_ObjectStore"]
+
+# the name of the SQLite database file in each bucket directory
+_db_name = "objects.db"
+
+# the directory in each bucket that holds the sidecar blobs
+_blob_root = "blobs"
+
+# objects up to this size are stored inline in the database - larger
+# objects are stored as sidecar files, referenced from the database
+_max_inline_size = 64 * 1024
+
+# how long (in seconds) to wait for another process to release the
+# write lock on a database before giving up
+_busy_timeout = 60
+
+_schema = ["CREATE TABLE IF NOT EXISTS objects ("
+           "key TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+           "etag TEXT NOT NULL, data BLOB, blob TEXT) WITHOUT ROWID",
+           "CREATE TABLE IF NOT EXISTS uploads ("
+           "upload_id TEXT PRIMARY KEY, key TEXT NOT NULL)",
+           "CREATE TABLE IF NOT EXISTS parts ("
+           "upload_id TEXT NOT NULL, part_number INTEGER NOT NULL, "
+           "etag TEXT NOT NULL, size INTEGER NOT NULL, "
+           "blob TEXT NOT NULL, PRIMARY KEY (upload_id, part_number))"]
+
+# SQLite connections cannot be shared between threads (or across
+# a fork), so each thread in each process holds its own connections
+_local = _threading.local()
+
+
+def _get_range(prefix, start_after=None):
+    """Return the SQL WHERE clause and arguments that select all of the
+       keys that start with 'prefix' and come after 'start_after'
+    """
+    clauses = []
+    args = []
+
+    if prefix:
+        clauses.append("key >= ?")
+        args.append(prefix)
+
+        end = _get_prefix_end(prefix)
+
+        if end is not None:
+            clauses.append("key < ?")
+            args.append(end)
+
+    if start_after is not None:
+        clauses.append("key > ?")
+        args.append(start_after)
+
+    if len(clauses) == 0:
+        return ("", args)
+    else:
+        return ("WHERE %s" % " AND ".join(clauses), args)
+
+
+def _get_connection(bucket):
+    """Return the connection to the database of the passed bucket for
+       this thread, opening (and if needed creating) the database
+    """
+    pid = _os.getpid()
+
+    if getattr(_local, "pid", None) != pid:
+        # never reuse connections that were inherited over a fork
+        _local.pid = pid
+        _local.connections = {}
+
+    conn = _local.connections.get(bucket, None)
+
+    if conn is None:
+        import sqlite3 as _sqlite3
+
+        _os.makedirs(bucket, exist_ok=True)
+
+        conn = _sqlite3.connect(_os.path.join(bucket, _db_name),
+                                timeout=_busy_timeout,
+                                isolation_level=None)
+
+        # WAL lets readers in any process run alongside a writer
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+        for statement in _schema:
+            conn.execute(statement)
+
+        _local.connections[bucket] = conn
+
+    return conn
+
+
+def _close_connection(bucket):
+    """Close this thread's connection to the database of 'bucket'"""
+    connections = getattr(_local, "connections", {})
+    conn = connections.pop(bucket, None)
+
+    if conn is not None:
+        conn.close()
+
+
+class _Transaction:
+    """Context manager for a write transaction on a bucket. This takes
+       the write lock immediately, so that any reads made within the
+       transaction cannot be changed by another writer
+    """
+    def __init__(self, bucket):
+        self._conn = _get_connection(bucket)
+
+    def __enter__(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self._conn.execute("COMMIT")
+        else:
+            self._conn.execute("ROLLBACK")
+
+        return False
+
+
+def _get_blob_path(bucket, blob):
+    """Return the full path to the sidecar file 'blob' in 'bucket'"""
+    return _os.path.join(bucket, _blob_root, blob[0:2], blob)
+
+
+def _write_blob(bucket, data):
+    """Write 'data' into a new sidecar file in 'bucket', returning
+       the name of the blob. Blobs are never overwritten, so readers
+       never see a partially written blob
+    """
+    blob = _uuid.uuid4().hex
+    filename = _get_blob_path(bucket, blob)
+    _os.makedirs(_os.path.dirname(filename), exist_ok=True)
+
+    tmpname = "%s._tmp" % filename
+
+    with open(tmpname, "wb") as FILE:
+        if data is not None:
+            FILE.write(data)
+        FILE.flush()
+
+    _os.replace(tmpname, filename)
+
+    return blob
+
+
+def _remove_blob(bucket, blob):
+    """Remove the sidecar file 'blob' from 'bucket'"""
+    if blob is None:
+        return
+
+    try:
+        _os.remove(_get_blob_path(bucket, blob))
+    except FileNotFoundError:
+        pass
+
+
+def _no_object(key):
+    from Acquire.ObjectStore import ObjectStoreError
+    return ObjectStoreError("No object at key '%s'" % key)
+
+
+def _read_object(bucket, key, as_stream=False):
+    """Return the data (or a stream to the data if 'as_stream') and
+       etag of the object at 'key' in 'bucket'. This retries if the
+       sidecar blob is removed by a concurrent writer
+    """
+    conn = _get_connection(bucket)
+
+    for _attempt in range(0, 5):
+        row = conn.execute("SELECT etag, data, blob FROM objects "
+                           "WHERE key = ?", (key,)).fetchone()
+
+        if row is None:
+            raise _no_object(key)
+
+        (etag, data, blob) = row
+
+        if blob is None:
+            if data is None:
+                data = b""
+
+            if as_stream:
+                return (_io.BytesIO(data), etag)
+            else:
+                return (bytes(data), etag)
+
+        try:
+            FILE = open(_get_blob_path(bucket, blob), "rb")
+        except FileNotFoundError:
+            # the object was changed while we were reading it
+            continue
+
+        if as_stream:
+            return (FILE, etag)
+
+        with FILE:
+            return (FILE.read(), etag)
+
+    raise _no_object(key)
+
+
+def _set_row(conn, key, data, blob, etag, size):
+    """Insert or replace the row for 'key', returning the name of the
+       blob that was replaced (which the caller must remove once the
+       transaction has been committed)
+    """
+    row = conn.execute("SELECT blob FROM objects WHERE key = ?",
+                       (key,)).fetchone()
+
+    conn.execute("INSERT OR REPLACE INTO objects (key, size, etag, data, "
+                 "blob) VALUES (?, ?, ?, ?, ?)",
+                 (key, size, etag, data, blob))
+
+    if row is None:
+        return None
+    else:
+        return row[0]
+
+
+def _prepare_data(bucket, data):
+    """Return the (data, blob, etag, size) for the passed data, writing
+       it to a sidecar blob if it is too large to store inline
+    """
+    if data is None:
+        data = b""
+
+    etag = _get_etag(data)
+    size = len(data)
+
+    if size > _max_inline_size:
+        return (None, _write_blob(bucket, data), etag, size)
+    else:
+        return (bytes(data), None, etag, size)
+
+
+def _split_url(url):
+    """Split the passed 'sqlite://' PAR url into the bucket and key,
+       by finding the bucket directory that holds the database
+    """
+    parts = url[9:].split("/")
+
+    for i in range(len(parts), 0, -1):
+        bucket = "/".join(parts[0:i])
+
+        if _os.path.exists(_os.path.join(bucket, _db_name)):
+            return (bucket, "/".join(parts[i:]))
+
+    from Acquire.ObjectStore import ObjectStoreError
+    raise ObjectStoreError("There is no bucket for the URL '%s'" % url)
+
+
+class SQLite_ObjectStore:
+    """This is an object store that keeps each bucket as a single SQLite
+       database (in WAL mode, so that many processes can read while
+       one writes). Keys are held in a B-tree index, so prefix and
+       range listings, and deleting by prefix, are index scans. Small
+       objects are stored inline in the database, while large objects
+       are stored as sidecar files in the bucket directory
+    """
+    @staticmethod
+    def create_bucket(bucket, bucket_name, compartment=None):
+        """Create and return a new bucket in the object store called
+           'bucket_name', optionally placing it into the compartment
+           identified by 'compartment'. This will raise an
+           ObjectStoreError if this bucket already exists
+        """
+        bucket_name = str(bucket_name)
+
+        if compartment is not None:
+            if compartment.endswith("/"):
+                bucket = compartment
+            else:
+                bucket = "%s/" % compartment
+
+        full_name = _os.path.join(_os.path.split(bucket)[0], bucket_name)
+
+        if _os.path.exists(full_name):
+            from Acquire.ObjectStore import ObjectStoreError
+            raise ObjectStoreError(
+                "CANNOT CREATE NEW BUCKET '%s': EXISTS!" % bucket_name)
+
+        _os.makedirs(full_name)
+        _get_connection(full_name)
+
+        return full_name
+
+    @staticmethod
+    def get_bucket(bucket, bucket_name, compartment=None,
+                   create_if_needed=True):
+        """Find and return a new bucket in the object store called
+           'bucket_name', optionally placing it into the compartment
+           identified by 'compartment'. If 'create_if_needed' is True
+           then the bucket will be created if it doesn't exist. Otherwise,
+           if the bucket does not exist then an exception will be raised.
+        """
+        bucket_name = str(bucket_name)
+
+        if compartment is not None:
+            if compartment.endswith("/"):
+                bucket = compartment
+            else:
+                bucket = "%s/" % compartment
+
+        full_name = _os.path.join(_os.path.split(bucket)[0], bucket_name)
+
+        if not _os.path.exists(full_name):
+            if create_if_needed:
+                _os.makedirs(full_name, exist_ok=True)
+            else:
+                from Acquire.ObjectStore import ObjectStoreError
+                raise ObjectStoreError(
+                    "There is no bucket available called '%s' in "
+                    "compartment '%s'" % (bucket_name, compartment))
+
+        return full_name
+
+    @staticmethod
+    def get_bucket_name(bucket):
+        """Return the name of the passed bucket"""
+        return _os.path.split(bucket)[1]
+
+    @staticmethod
+    def is_bucket_empty(bucket):
+        """Return whether or not the passed bucket is empty"""
+        if not _os.path.exists(_os.path.join(bucket, _db_name)):
+            return True
+
+        conn = _get_connection(bucket)
+
+        for table in ["objects", "uploads"]:
+            if conn.execute("SELECT 1 FROM %s LIMIT 1" %
+                            table).fetchone() is not None:
+                return False
+
+        return True
+
+    @staticmethod
+    def delete_bucket(bucket, force=False):
+        """Delete the passed bucket. This should be used with caution.
+           Normally you can only delete a bucket if it is empty. If
+           'force' is True then it will remove all objects/pars from
+           the bucket first, and then delete the bucket. This
+           can cause a LOSS OF DATA!
+        """
+        is_empty = SQLite_ObjectStore.is_bucket_empty(bucket=bucket)
+
+        if not (is_empty or force):
+            raise PermissionError(
+                "You cannot delete the bucket %s as it is not empty" %
+                SQLite_ObjectStore.get_bucket_name(bucket=bucket))
+
+        _close_connection(bucket)
+        _shutil.rmtree(bucket, ignore_errors=True)
+
+    @staticmethod
+    def create_par(bucket, encrypt_key, key=None, readable=True,
+                   writeable=False, duration=3600, cleanup_function=None):
+        """Create a pre-authenticated request for the passed bucket and
+           key (if key is None then the request is for the entire bucket).
+           This will return a PAR object that will contain a URL that can
+           be used to access the object/bucket. If writeable is true, then
+           the URL will also allow the object/bucket to be written to.
+           PARs are time-limited. Set the lifetime in seconds by passing
+           in 'duration' (by default this is one hour). Note that you must
+           pass in a public key that will be used to encrypt this PAR. This is
+           necessary as the PAR grants access to anyone who can decrypt
+           the URL
+        """
+        from Acquire.Crypto import PublicKey as _PublicKey
+
+        if not isinstance(encrypt_key, _PublicKey):
+            from Acquire.Client import PARError
+            raise PARError(
+                "You must supply a valid PublicKey to encrypt the "
+                "returned PAR")
+
+        if key is not None:
+            key = _clean_key(key)
+
+            conn = _get_connection(bucket)
+            if conn.execute("SELECT 1 FROM objects WHERE key = ?",
+                            (key,)).fetchone() is None:
+                from Acquire.Client import PARError
+                raise PARError(
+                    "The object '%s' in bucket '%s' does not exist!" %
+                    (key, bucket))
+        elif not _os.path.exists(bucket):
+            from Acquire.Client import PARError
+            raise PARError("The bucket '%s' does not exist!" % bucket)
+
+        # make sure that the database exists so that the URL can be
+        # resolved back to this bucket
+        _get_connection(bucket)
+
+        url = "sqlite://%s" % bucket
+
+        if key:
+            url = "%s/%s" % (url, key)
+
+        # get the time this PAR was created
+        from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
+        created_datetime = _get_datetime_now()
+
+        # get the UTC datetime when this PAR should expire
+        expires_datetime = created_datetime + \
+            _datetime.timedelta(seconds=duration)
+
+        # mimic limitations of OCI - cannot have a bucket PAR with
+        # read permissions!
+        if (key is None) and readable:
+            from Acquire.Client import PARError
+            raise PARError(
+                "You cannot create a Bucket PAR that has read permissions "
+                "due to a limitation in the underlying platform")
+
+        from Acquire.ObjectStore import OSPar as _OSPar
+        from Acquire.ObjectStore import OSParRegistry as _OSParRegistry
+
+        url_checksum = _OSPar.checksum(url)
+
+        driver_details = {"driver": "sqlite_objstore",
+                          "bucket": bucket,
+                          "created_datetime": created_datetime}
+
+        par = _OSPar(url=url, key=key, encrypt_key=encrypt_key,
+                     expires_datetime=expires_datetime,
+                     is_readable=readable, is_writeable=writeable,
+                     driver_details=driver_details)
+
+        _OSParRegistry.register(par=par, url_checksum=url_checksum,
+                                details_function=_get_driver_details_from_par,
+                                cleanup_function=cleanup_function)
+
+        return par
+
+    @staticmethod
+    def close_par(par=None, par_uid=None, url_checksum=None):
+        """Close the passed PAR, which provides access to data in the
+           passed bucket
+        """
+        from Acquire.ObjectStore import OSParRegistry as _OSParRegistry
+
+        if par is None:
+            par = _OSParRegistry.get(
+                        par_uid=par_uid,
+                        url_checksum=url_checksum,
+                        details_function=_get_driver_details_from_data)
+
+        from Acquire.ObjectStore import OSPar as _OSPar
+        if not isinstance(par, _OSPar):
+            raise TypeError("The PAR must be of type OSPar")
+
+        if par.driver() != "sqlite_objstore":
+            raise ValueError("Cannot delete a PAR that was not created "
+                             "by the SQLite object store")
+
+        # close the PAR - this will trigger any close_function(s)
+        _OSParRegistry.close(par=par)
+
+    @staticmethod
+    def get_object(bucket, key):
+        """Return the binary data contained in the key 'key' in the
+           passed bucket"""
+        return _read_object(bucket, _clean_key(key))[0]
+
+    @staticmethod
+    def get_object_range(bucket, key, start, length=None):
+        """Return up to 'length' bytes (or all remaining bytes if
+           'length' is None) of the object at 'key' in the passed
+           bucket, starting from byte 'start'. Only the requested
+           bytes are read from large (sidecar) objects
+        """
+        with _read_object(bucket, _clean_key(key), as_stream=True)[0] \
+                as FILE:
+            FILE.seek(start)
+
+            if length is None:
+                return FILE.read()
+            else:
+                return FILE.read(length)
+
+    @staticmethod
+    def open_object(bucket, key):
+        """Open and return a read-only file-like object that streams
+           the binary data contained in the key 'key' in the passed
+           bucket
+        """
+        return _read_object(bucket, _clean_key(key), as_stream=True)[0]
+
+    @staticmethod
+    def get_object_and_etag(bucket, key):
+        """Return the binary data contained in the key 'key' in the
+           passed bucket, together with the entity tag (etag) of the
+           object. The etag can be passed to 'set_object_if_match'
+        """
+        return _read_object(bucket, _clean_key(key))
+
+    @staticmethod
+    def take_object(bucket, key):
+        """Take (delete) the object from the object store, returning
+           the object
+        """
+        key = _clean_key(key)
+
+        with _Transaction(bucket) as conn:
+            row = conn.execute("SELECT data, blob FROM objects "
+                               "WHERE key = ?", (key,)).fetchone()
+
+            if row is None:
+                raise _no_object(key)
+
+            (data, blob) = row
+
+            if blob is not None:
+                with open(_get_blob_path(bucket, blob), "rb") as FILE:
+                    data = FILE.read()
+            elif data is None:
+                data = b""
+
+            conn.execute("DELETE FROM objects WHERE key = ?", (key,))
+
+        _remove_blob(bucket, blob)
+
+        return bytes(data)
+
+    @staticmethod
+    def claim_object(bucket, src_key, dst_key):
+        """Atomically move the object at 'src_key' to 'dst_key', but
+           only if the object at 'src_key' exists and there is no
+           object at 'dst_key'. This returns the data of the claimed
+           object, or None if someone else claimed it first
+        """
+        src_key = _clean_key(src_key)
+        dst_key = _clean_key(dst_key)
+
+        with _Transaction(bucket) as conn:
+            row = conn.execute("SELECT data, blob FROM objects "
+                               "WHERE key = ?", (src_key,)).fetchone()
+
+            if row is None:
+                return None
+
+            if conn.execute("SELECT 1 FROM objects WHERE key = ?",
+                            (dst_key,)).fetchone() is not None:
+                return None
+
+            (data, blob) = row
+
+            if blob is not None:
+                with open(_get_blob_path(bucket, blob), "rb") as FILE:
+                    data = FILE.read()
+            elif data is None:
+                data = b""
+
+            # the blob (if any) moves with the row
+            conn.execute("UPDATE objects SET key = ? WHERE key = ?",
+                         (dst_key, src_key))
+
+        return bytes(data)
+
+    @staticmethod
+    def get_all_object_names(bucket, prefix=None, without_prefix=False):
+        """Returns the names of all objects in the passed bucket"""
+        (where, args) = _get_range(prefix)
+
+        conn = _get_connection(bucket)
+        rows = conn.execute("SELECT key FROM objects %s ORDER BY key" %
+                            where, args).fetchall()
+
+        if without_prefix:
+            prefix_len = len(prefix)
+
+        names = []
+
+        for (name,) in rows:
+            if without_prefix:
+                name = name[prefix_len:]
+                while name.startswith("/"):
+                    name = name[1:]
+
+            if len(name) > 0:
+                names.append(name)
+
+        return names
+
+    @staticmethod
+    def list_children(bucket, prefix=None, delimiter="/"):
+        """Return the names of the objects that are the direct
+           children of 'prefix' in the passed bucket, together with
+           the sub-prefixes (ending with 'delimiter') that contain
+           the deeper objects. Each sub-prefix costs a single index
+           seek, as the whole range of keys beneath it is skipped.
+           This returns the tuple of the sorted list of names and the
+           sorted list of prefixes
+        """
+        if prefix is None:
+            prefix = ""
+
+        conn = _get_connection(bucket)
+
+        names = []
+        prefixes = []
+        start = None
+
+        while True:
+            (where, args) = _get_range(prefix)
+
+            if start is not None:
+                where = "%s AND key >= ?" % where if where \
+                    else "WHERE key >= ?"
+                args.append(start)
+
+            rows = conn.execute("SELECT key FROM objects %s ORDER BY key "
+                                "LIMIT 1000" % where, args).fetchall()
+
+            for (name,) in rows:
+                idx = name.find(delimiter, len(prefix))
+
+                if idx == -1:
+                    names.append(name)
+                else:
+                    child = name[0:idx + len(delimiter)]
+                    prefixes.append(child)
+
+                    # skip over every key in this sub-prefix
+                    start = _get_prefix_end(child)
+                    break
+            else:
+                if len(rows) < 1000:
+                    break
+
+                # the smallest key after the last one in this batch
+                start = rows[-1][0] + "\x00"
+
+            if start is None:
+                break
+
+        return (names, prefixes)
+
+    @staticmethod
+    def get_object_names_page(bucket, prefix=None, start_after=None,
+                              limit=1000):
+        """Return a page of up to 'limit' object names from the passed
+           bucket that start with 'prefix', in lexicographic order,
+           starting after the name 'start_after'. This returns a tuple
+           of the list of names and the continuation token to pass
+           as 'start_after' to get the next page (None if there are
+           no more names)
+        """
+        (where, args) = _get_range(prefix, start_after)
+        args.append(limit + 1)
+
+        conn = _get_connection(bucket)
+        rows = conn.execute("SELECT key FROM objects %s ORDER BY key "
+                            "LIMIT ?" % where, args).fetchall()
+
+        names = [row[0] for row in rows[0:limit]]
+
+        if len(rows) > limit:
+            return (names, names[-1])
+        else:
+            return (names, None)
+
+    @staticmethod
+    def set_object(bucket, key, data):
+        """Set the value of 'key' in 'bucket' to binary 'data'"""
+        key = _clean_key(key)
+
+        (data, blob, etag, size) = _prepare_data(bucket, data)
+
+        try:
+            with _Transaction(bucket) as conn:
+                old_blob = _set_row(conn, key, data, blob, etag, size)
+        except:
+            _remove_blob(bucket, blob)
+            raise
+
+        _remove_blob(bucket, old_blob)
+
+    @staticmethod
+    def set_object_if_absent(bucket, key, data):
+        """Set the value of 'key' in 'bucket' to binary 'data' if (and
+           only if) there is no object already at this key. This is
+           atomic across all threads and processes. This returns
+           whether or not the object was set
+        """
+        key = _clean_key(key)
+
+        (data, blob, etag, size) = _prepare_data(bucket, data)
+
+        try:
+            with _Transaction(bucket) as conn:
+                cursor = conn.execute(
+                            "INSERT OR IGNORE INTO objects (key, size, "
+                            "etag, data, blob) VALUES (?, ?, ?, ?, ?)",
+                            (key, size, etag, data, blob))
+                is_set = (cursor.rowcount == 1)
+        except:
+            _remove_blob(bucket, blob)
+            raise
+
+        if not is_set:
+            _remove_blob(bucket, blob)
+
+        return is_set
+
+    @staticmethod
+    def set_object_if_match(bucket, key, data, etag):
+        """Set the value of 'key' in 'bucket' to binary 'data' if (and
+           only if) the entity tag of the current object at this key
+           is equal to 'etag'. This is atomic across all threads and
+           processes. This returns whether or not the object was set
+        """
+        key = _clean_key(key)
+
+        (data, blob, new_etag, size) = _prepare_data(bucket, data)
+        old_blob = None
+
+        try:
+            with _Transaction(bucket) as conn:
+                row = conn.execute("SELECT etag FROM objects WHERE key = ?",
+                                   (key,)).fetchone()
+
+                is_set = (row is not None and row[0] == etag)
+
+                if is_set:
+                    old_blob = _set_row(conn, key, data, blob,
+                                        new_etag, size)
+        except:
+            _remove_blob(bucket, blob)
+            raise
+
+        if is_set:
+            _remove_blob(bucket, old_blob)
+        else:
+            _remove_blob(bucket, blob)
+
+        return is_set
+
+    @staticmethod
+    def create_multipart_upload(bucket, key):
+        """Start a new multipart upload of the object at 'key' in the
+           passed bucket, returning the ID of the upload. The parts
+           are held as sidecar blobs until they are committed
+        """
+        upload_id = str(_uuid.uuid4())
+
+        with _Transaction(bucket) as conn:
+            conn.execute("INSERT INTO uploads (upload_id, key) "
+                         "VALUES (?, ?)", (upload_id, _clean_key(key)))
+
+        return upload_id
+
+    @staticmethod
+    def _assert_upload(conn, key, upload_id):
+        """Internal function that checks that 'upload_id' is a multipart
+           upload of 'key'
+        """
+        row = conn.execute("SELECT key FROM uploads WHERE upload_id = ?",
+                           (upload_id,)).fetchone()
+
+        if row is None or row[0] != key:
+            from Acquire.ObjectStore import ObjectStoreError
+            raise ObjectStoreError(
+                "There is no multipart upload '%s' for key '%s'" %
+                (upload_id, key))
+
+    @staticmethod
+    def upload_part(bucket, key, upload_id, part_number, data):
+        """Upload the binary 'data' as part 'part_number' (counting
+           from 1) of the multipart upload 'upload_id'. This returns
+           the etag of the uploaded part
+        """
+        key = _clean_key(key)
+
+        etag = _get_etag(data)
+        blob = _write_blob(bucket, data)
+        old_blob = None
+
+        try:
+            with _Transaction(bucket) as conn:
+                SQLite_ObjectStore._assert_upload(conn, key, upload_id)
+
+                row = conn.execute("SELECT blob FROM parts WHERE "
+                                   "upload_id = ? AND part_number = ?",
+                                   (upload_id, int(part_number))).fetchone()
+
+                if row is not None:
+                    old_blob = row[0]
+
+                conn.execute("INSERT OR REPLACE INTO parts (upload_id, "
+                             "part_number, etag, size, blob) "
+                             "VALUES (?, ?, ?, ?, ?)",
+                             (upload_id, int(part_number), etag,
+                              len(data), blob))
+        except:
+            _remove_blob(bucket, blob)
+            raise
+
+        _remove_blob(bucket, old_blob)
+
+        return etag
+
+    @staticmethod
+    def list_uploaded_parts(bucket, key, upload_id):
+        """Return the parts that have already been uploaded to the
+           multipart upload 'upload_id', as a dictionary mapping the
+           part number to a tuple of the etag, size and MD5 checksum
+           of each part
+        """
+        key = _clean_key(key)
+        conn = _get_connection(bucket)
+
+        SQLite_ObjectStore._assert_upload(conn, key, upload_id)
+
+        parts = {}
+
+        for (part_number, etag, size) in conn.execute(
+                "SELECT part_number, etag, size FROM parts "
+                "WHERE upload_id = ?", (upload_id,)).fetchall():
+            parts[part_number] = (etag, size, etag)
+
+        return parts
+
+    @staticmethod
+    def commit_multipart_upload(bucket, key, upload_id, parts):
+        """Commit the multipart upload 'upload_id', assembling the
+           passed 'parts' (a dictionary mapping part number to etag)
+           into the object at 'key'. The parts are assembled into a
+           new sidecar blob, which replaces the object in a single
+           transaction
+        """
+        import hashlib as _hashlib
+
+        key = _clean_key(key)
+        conn = _get_connection(bucket)
+
+        SQLite_ObjectStore._assert_upload(conn, key, upload_id)
+
+        uploaded = {}
+
+        for (part_number, etag, blob) in conn.execute(
+                "SELECT part_number, etag, blob FROM parts "
+                "WHERE upload_id = ?", (upload_id,)).fetchall():
+            uploaded[part_number] = (etag, blob)
+
+        for part_number in parts.keys():
+            if uploaded.get(part_number, (None,))[0] != parts[part_number]:
+                from Acquire.ObjectStore import ObjectStoreError
+                raise ObjectStoreError(
+                    "Cannot commit the multipart upload '%s' as "
+                    "part %d is missing or does not match" %
+                    (upload_id, part_number))
+
+        md5 = _hashlib.md5()
+        size = 0
+
+        blob = _write_blob(bucket, None)
+
+        try:
+            with open(_get_blob_path(bucket, blob), "wb") as FILE:
+                for part_number in sorted(parts.keys()):
+                    partname = _get_blob_path(bucket,
+                                              uploaded[part_number][1])
+
+                    with open(partname, "rb") as PART:
+                        data = PART.read()
+
+                    md5.update(data)
+                    size += len(data)
+                    FILE.write(data)
+
+            with _Transaction(bucket) as conn:
+                SQLite_ObjectStore._assert_upload(conn, key, upload_id)
+                old_blob = _set_row(conn, key, None, blob,
+                                    md5.hexdigest(), size)
+                conn.execute("DELETE FROM parts WHERE upload_id = ?",
+                             (upload_id,))
+                conn.execute("DELETE FROM uploads WHERE upload_id = ?",
+                             (upload_id,))
+        except:
+            _remove_blob(bucket, blob)
+            raise
+
+        _remove_blob(bucket, old_blob)
+
+        for (_etag, part_blob) in uploaded.values():
+            _remove_blob(bucket, part_blob)
+
+    @staticmethod
+    def abort_multipart_upload(bucket, key, upload_id):
+        """Abort the multipart upload 'upload_id', discarding any
+           parts that have been uploaded
+        """
+        with _Transaction(bucket) as conn:
+            blobs = [row[0] for row in conn.execute(
+                        "SELECT blob FROM parts WHERE upload_id = ?",
+                        (upload_id,)).fetchall()]
+            conn.execute("DELETE FROM parts WHERE upload_id = ?",
+                         (upload_id,))
+            conn.execute("DELETE FROM uploads WHERE upload_id = ?",
+                         (upload_id,))
+
+        for blob in blobs:
+            _remove_blob(bucket, blob)
+
+    @staticmethod
+    def delete_all_objects(bucket, prefix=None):
+        """Deletes all objects whose keys start with 'prefix' (or all
+           objects if 'prefix' is None). This is a single range delete
+           on the key index
+        """
+        (where, args) = _get_range(prefix)
+
+        with _Transaction(bucket) as conn:
+            blobs = [row[0] for row in conn.execute(
+                        "SELECT blob FROM objects %s" % where,
+                        args).fetchall() if row[0] is not None]
+            conn.execute("DELETE FROM objects %s" % where, args)
+
+        for blob in blobs:
+            _remove_blob(bucket, blob)
+
+    @staticmethod
+    def delete_object(bucket, key):
+        """Removes the object at 'key'"""
+        key = _clean_key(key)
+
+        with _Transaction(bucket) as conn:
+            row = conn.execute("SELECT blob FROM objects WHERE key = ?",
+                               (key,)).fetchone()
+            conn.execute("DELETE FROM objects WHERE key = ?", (key,))
+
+        if row is not None:
+            _remove_blob(bucket, row[0])
+
+    @staticmethod
+    def delete_object_if_match(bucket, key, etag):
+        """Remove the object at 'key' if (and only if) its entity tag
+           is equal to 'etag'. This is atomic across all threads and
+           processes. This returns whether or not the object was removed
+        """
+        key = _clean_key(key)
+
+        with _Transaction(bucket) as conn:
+            row = conn.execute("SELECT etag, blob FROM objects "
+                               "WHERE key = ?", (key,)).fetchone()
+
+            if row is None or row[0] != etag:
+                return False
+
+            conn.execute("DELETE FROM objects WHERE key = ?", (key,))
+
+        _remove_blob(bucket, row[1])
+
+        return True
+
+    @staticmethod
+    def get_size_and_checksum(bucket, key):
+        """Return the object size (in bytes) and checksum of the
+           object in the passed bucket at the specified key
+        """
+        key = _clean_key(key)
+        conn = _get_connection(bucket)
+
+        row = conn.execute("SELECT size, etag FROM objects WHERE key = ?",
+                           (key,)).fetchone()
+
+        if row is None:
+            raise _no_object(key)
+
+        return (row[0], row[1])
@@ -4,44 +4,244 @@ import shutil as _shutil
 import datetime as _datetime
 import uuid as _uuid
 import json as _json
-import glob as _glob
 import threading
 import uuid as _uuid
 
-_rlock = threading.RLock()
+try:
+    import fcntl as _fcntl
+except ImportError:
+    # advisory locking between processes is not available on Windows
+    _fcntl = None
+
+from ._objstore_utils import _get_driver_details_from_par, \
+    _get_driver_details_from_data, _get_etag
+
+# the number of stripes used to lock keys. Each key is locked by the
+# stripe that it hashes to, so operations on different keys rarely
+# contend. Within a process the stripes are threading locks - between
+# processes they are fcntl locks on one lock file per stripe
+_num_stripes = 64
+
+_stripes = [threading.RLock() for _i in range(0, _num_stripes)]
+
+# the directories holding the lock files for each bucket
+_lockdirs = {}
+
+# the directory within the bucket that holds in-progress multipart uploads
+_multipart_root = "._multipart"
 
 __all__ = ["Testing_ObjectStore"]
 
 
-def _get_driver_details_from_par(par):
-    from Acquire.ObjectStore import datetime_to_string \
-        as _datetime_to_string
+def _write_temp_file(filename, data):
+    """Write 'data' to a new, uniquely named temporary file that sits
+       in the same directory as 'filename' (creating the directory if
+       needed). The file is created with O_EXCL so it cannot clash with
+       any other writer. This returns the name of the temporary file,
+       which can then be atomically linked or renamed into place
+    """
+    dir = _os.path.dirname(filename)
+    _os.makedirs(dir, exist_ok=True)
+
+    tmpname = "%s.%s._tmp" % (filename, _uuid.uuid4())
+
+    fd = _os.open(tmpname, _os.O_CREAT | _os.O_EXCL | _os.O_WRONLY, 0o644)
+
+    try:
+        with _os.fdopen(fd, "wb") as FILE:
+            if data is not None:
+                FILE.write(data)
+            FILE.flush()
+    except:
+        _os.remove(tmpname)
+        raise
+
+    return tmpname
+
+
+def _split_prefix(bucket, prefix):
+    """Split the passed prefix into the directory in 'bucket' that
+       must be scanned, the key of that directory (with trailing "/")
+       and the start of the entries in that directory that match
+    """
+    if prefix is None:
+        prefix = ""
 
-    import copy as _copy
-    details = _copy.copy(par._driver_details)
+    (root, match) = _os.path.split(prefix)
 
-    if details is None:
-        return {}
+    if len(root) > 0:
+        return ("%s/%s" % (bucket, root), "%s/" % root, match)
     else:
-        # fix any non-string/number objects
-        details["created_datetime"] = _datetime_to_string(
-                                        details["created_datetime"])
+        return (bucket, "", match)
+
+
+def _scan_dir(dirpath, match=None):
+    """Return the (name, is_dir) of the objects (with the '._data'
+       removed) and the sub-directories in 'dirpath' that start
+       with 'match'. This uses a single 'os.scandir', so does not
+       need to stat each entry
+    """
+    children = []
+
+    try:
+        with _os.scandir(dirpath) as it:
+            for entry in it:
+                name = entry.name
+
+                if match and not name.startswith(match):
+                    continue
+
+                if name.endswith("._data"):
+                    children.append((name[0:-6], False))
+                elif name == _multipart_root:
+                    continue
+                elif entry.is_dir():
+                    children.append((name, True))
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+
+    return children
+
+
+def _iter_sorted_names(dirpath, root, match=None, start_after=None):
+    """Generator that lazily walks the directory 'dirpath' (which holds
+       the objects whose keys start with 'root'), yielding the object
+       names in lexicographic order. Only entries starting with 'match'
+       are considered, and only names after 'start_after' are yielded.
+       Whole sub-directories that sort before 'start_after' are skipped
+       without being walked
+    """
+    # sort directories as if they had a trailing "/" so that the
+    # walk yields keys in the same order as a cloud object store
+    children = []
+
+    for (entry, is_dir) in _scan_dir(dirpath, match):
+        if is_dir:
+            children.append(("%s/" % entry, True))
+        else:
+            children.append((entry, False))
+
+    children.sort()
+
+    for (child, is_dir) in children:
+        name = "%s%s" % (root, child)
+
+        if is_dir:
+            if start_after is not None and name < start_after and \
+                    not start_after.startswith(name):
+                # everything in this directory is before start_after
+                continue
+
+            for subname in _iter_sorted_names(
+                    _os.path.join(dirpath, child[0:-1]), name,
+                    start_after=start_after):
+                yield subname
+        else:
+            while name.endswith("/"):
+                name = name[0:-1]
+
+            if len(name) == 0:
+                continue
+
+            if start_after is None or name > start_after:
+                yield name
+
+
+def _get_stripe(bucket, key):
+    """Return the lock stripe for 'key' in 'bucket'. This must be the
+       same in every process, so cannot use the built-in hash
+    """
+    import zlib as _zlib
+    name = "%s/%s" % (_os.path.abspath(bucket), key)
+    return _zlib.crc32(name.encode("utf-8")) % _num_stripes
+
+
+def _get_lockfile(bucket, stripe):
+    """Return the name of the file used to lock 'stripe' of 'bucket'
+       between processes. These are kept outside the bucket, so that
+       they are never seen as objects
+    """
+    lockdir = _lockdirs.get(bucket, None)
+
+    if lockdir is None:
+        import hashlib as _hashlib
+        import tempfile as _tempfile
+
+        bucket_id = _hashlib.md5(
+                        _os.path.abspath(bucket).encode("utf-8")).hexdigest()
+
+        lockdir = _os.path.join(_tempfile.gettempdir(),
+                                "acquire_objstore_locks", bucket_id)
+        _os.makedirs(lockdir, exist_ok=True)
+        _lockdirs[bucket] = lockdir
+
+    return _os.path.join(lockdir, "%d.lock" % stripe)
+
+
+class _KeyLock:
+    """Context manager that holds the lock on a single key in a bucket,
+       across all threads in this process and (where fcntl is available)
+       across all processes. This is only needed by operations that
+       read and then change an object - all writes are atomic renames,
+       so readers never need to lock
+    """
+    def __init__(self, bucket, key):
+        stripe = _get_stripe(bucket, key)
+        self._lock = _stripes[stripe]
+        self._bucket = bucket
+        self._stripe = stripe
+        self._fd = None
+
+    def __enter__(self):
+        self._lock.acquire()
+
+        if _fcntl is not None:
+            try:
+                self._fd = _os.open(_get_lockfile(self._bucket, self._stripe),
+                                    _os.O_CREAT | _os.O_RDWR, 0o644)
+                _fcntl.flock(self._fd, _fcntl.LOCK_EX)
+            except:
+                if self._fd is not None:
+                    _os.close(self._fd)
+                    self._fd = None
 
-    return details
+                self._lock.release()
+                raise
 
+        return self
 
-def _get_driver_details_from_data(data):
-    from Acquire.ObjectStore import string_to_datetime \
-        as _string_to_datetime
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._fd is not None:
+            try:
+                _fcntl.flock(self._fd, _fcntl.LOCK_UN)
+            finally:
+                _os.close(self._fd)
+                self._fd = None
+
+        self._lock.release()
+
+        return False
+
+
+def _get_upload_dir(bucket, key, upload_id):
+    """Return the directory holding the parts of the multipart upload
+       'upload_id' of 'key', checking that this upload exists
+    """
+    upload_dir = "%s/%s/%s" % (bucket, _multipart_root, upload_id)
 
-    import copy as _copy
-    details = _copy.copy(data)
+    try:
+        with open("%s/key" % upload_dir, "r") as FILE:
+            upload_key = FILE.read()
+    except:
+        upload_key = None
 
-    if "created_datetime" in details:
-        details["created_datetime"] = _string_to_datetime(
-                                            details["created_datetime"])
+    if upload_key != key:
+        from Acquire.ObjectStore import ObjectStoreError
+        raise ObjectStoreError(
+            "There is no multipart upload '%s' for key '%s'" %
+            (upload_id, key))
 
-    return details
+    return upload_dir
 
 
 class Testing_ObjectStore:
@@ -132,8 +332,12 @@ class Testing_ObjectStore:
                     "You cannot delete the bucket %s as it is not empty" %
                     Testing_ObjectStore.get_bucket_name(bucket=bucket))
 
-        # the bucket is empty - delete it
-        _os.rmdir(bucket)
+        # the bucket is empty - delete it (the forced delete above
+        # may have already removed the directory)
+        if force:
+            _shutil.rmtree(bucket, ignore_errors=True)
+        else:
+            _os.rmdir(bucket)
 
     @staticmethod
     def create_par(bucket, encrypt_key, key=None, readable=True,
@@ -239,92 +443,389 @@ class Testing_ObjectStore:
         """Return the binary data contained in the key 'key' in the
            passed bucket"""
 
-        with _rlock:
-            filepath = "%s/%s._data" % (bucket, key)
-            if _os.path.exists(filepath):
-                return open(filepath, "rb").read()
-            else:
-                from Acquire.ObjectStore import ObjectStoreError
-                raise ObjectStoreError("No object at key '%s'" % key)
+        # writes atomically replace the file, so this always reads
+        # a complete object without needing a lock
+        filepath = "%s/%s._data" % (bucket, key)
+
+        try:
+            with open(filepath, "rb") as FILE:
+                return FILE.read()
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            from Acquire.ObjectStore import ObjectStoreError
+            raise ObjectStoreError("No object at key '%s'" % key)
+
+    @staticmethod
+    def get_object_range(bucket, key, start, length=None):
+        """Return up to 'length' bytes (or all remaining bytes if
+           'length' is None) of the object at 'key' in the passed
+           bucket, starting from byte 'start'
+        """
+        filepath = "%s/%s._data" % (bucket, key)
+
+        try:
+            with open(filepath, "rb") as FILE:
+                FILE.seek(start)
+
+                if length is None:
+                    return FILE.read()
+                else:
+                    return FILE.read(length)
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            from Acquire.ObjectStore import ObjectStoreError
+            raise ObjectStoreError("No object at key '%s'" % key)
+
+    @staticmethod
+    def open_object(bucket, key):
+        """Open and return a read-only file-like object that streams
+           the binary data contained in the key 'key' in the passed
+           bucket
+        """
+        filepath = "%s/%s._data" % (bucket, key)
+
+        try:
+            return open(filepath, "rb")
+        except FileNotFoundError:
+            from Acquire.ObjectStore import ObjectStoreError
+            raise ObjectStoreError("No object at key '%s'" % key)
+
+    @staticmethod
+    def get_object_and_etag(bucket, key):
+        """Return the binary data contained in the key 'key' in the
+           passed bucket, together with the entity tag (etag) of the
+           object. The etag can be passed to 'set_object_if_match'
+        """
+        data = Testing_ObjectStore.get_object(bucket, key)
+        return (data, _get_etag(data))
 
     @staticmethod
     def take_object(bucket, key):
         """Take (delete) the object from the object store, returning
            the object
         """
-        with _rlock:
-            filepath = "%s/%s._data" % (bucket, key)
-            if _os.path.exists(filepath):
-                data = open(filepath, "rb").read()
-                _os.remove(filepath)
-                return data
-            else:
+        filepath = "%s/%s._data" % (bucket, key)
+        tmpname = "%s.%s._tmp" % (filepath, _uuid.uuid4())
+
+        # renaming the object away is atomic, so only one taker can
+        # succeed, and there is no window where it can be read twice
+        with _KeyLock(bucket, key):
+            try:
+                _os.rename(filepath, tmpname)
+            except (FileNotFoundError, NotADirectoryError):
                 from Acquire.ObjectStore import ObjectStoreError
                 raise ObjectStoreError("No object at key '%s'" % key)
 
+        try:
+            with open(tmpname, "rb") as FILE:
+                return FILE.read()
+        finally:
+            _os.remove(tmpname)
+
     @staticmethod
-    def get_all_object_names(bucket, prefix=None, without_prefix=False):
-        """Returns the names of all objects in the passed bucket"""
+    def claim_object(bucket, src_key, dst_key):
+        """Atomically move the object at 'src_key' to 'dst_key', but
+           only if the object at 'src_key' exists and there is no
+           object at 'dst_key'. This returns the data of the claimed
+           object, or None if someone else claimed it first
+        """
+        src_path = "%s/%s._data" % (bucket, src_key)
+        dst_path = "%s/%s._data" % (bucket, dst_key)
+
+        if _os.path.exists(dst_path):
+            return None
+
+        tmpname = "%s.%s._tmp" % (src_path, _uuid.uuid4())
 
-        root = bucket
+        # renaming the object away is atomic, so only one claimer
+        # can succeed
+        with _KeyLock(bucket, src_key):
+            try:
+                _os.rename(src_path, tmpname)
+            except (FileNotFoundError, NotADirectoryError):
+                return None
+
+        try:
+            _os.makedirs(_os.path.dirname(dst_path), exist_ok=True)
 
-        if prefix is not None:
-            root = "%s/%s" % (bucket, prefix)
+            # hard-linking fails atomically if the destination exists
+            with _KeyLock(bucket, dst_key):
+                _os.link(tmpname, dst_path)
+        except FileExistsError:
+            # put the object back, as the destination has been taken
+            with _KeyLock(bucket, src_key):
+                _os.replace(tmpname, src_path)
+
+            return None
+
+        try:
+            with open(tmpname, "rb") as FILE:
+                return FILE.read()
+        finally:
+            _os.remove(tmpname)
 
-        root_len = len(bucket) + 1
+    @staticmethod
+    def get_all_object_names(bucket, prefix=None, without_prefix=False):
+        """Returns the names of all objects in the passed bucket"""
+        (dirpath, root, match) = _split_prefix(bucket, prefix)
 
         if without_prefix:
             prefix_len = len(prefix)
 
-        subdir_names = _glob.glob("%s*" % root)
-
         object_names = []
 
-        while True:
-            names = subdir_names
-            subdir_names = []
+        for name in _iter_sorted_names(dirpath, root, match=match):
+            if without_prefix:
+                name = name[prefix_len:]
+                while name.startswith("/"):
+                    name = name[1:]
 
-            for name in names:
-                if name.endswith("._data"):
-                    # remove the  ._data at the end
-                    name = name[root_len:-6]
-                    while name.endswith("/"):
-                        name = name[0:-1]
-
-                    if without_prefix:
-                        name = name[prefix_len:]
-                        while name.startswith("/"):
-                            name = name[1:]
-
-                    if len(name) > 0:
-                        object_names.append(name)
-                elif _os.path.isdir(name):
-                    subdir_names += _glob.glob("%s/*" % name)
-
-            if len(subdir_names) == 0:
-                break
+            if len(name) > 0:
+                object_names.append(name)
 
         return object_names
 
+    @staticmethod
+    def list_children(bucket, prefix=None, delimiter="/"):
+        """Return the names of the objects that are the direct
+           children of 'prefix' in the passed bucket, together with
+           the sub-prefixes (ending with 'delimiter') that contain
+           the deeper objects. This returns the tuple of the sorted
+           list of names and the sorted list of prefixes
+        """
+        if delimiter != "/":
+            # only "/" maps onto directories, so other delimiters
+            # have to be found by walking all of the names
+            if prefix is None:
+                prefix = ""
+
+            names = []
+            prefixes = []
+
+            for name in Testing_ObjectStore.get_all_object_names(
+                                                    bucket, prefix):
+                idx = name.find(delimiter, len(prefix))
+
+                if idx == -1:
+                    names.append(name)
+                else:
+                    child = name[0:idx + len(delimiter)]
+
+                    if len(prefixes) == 0 or prefixes[-1] != child:
+                        prefixes.append(child)
+
+            return (names, prefixes)
+
+        (dirpath, root, match) = _split_prefix(bucket, prefix)
+
+        names = []
+        prefixes = []
+
+        for (entry, is_dir) in _scan_dir(dirpath, match):
+            if is_dir:
+                subdir = _os.path.join(dirpath, entry)
+                child = "%s%s/" % (root, entry)
+
+                # only report directories that still hold objects
+                for _name in _iter_sorted_names(subdir, child):
+                    prefixes.append(child)
+                    break
+            elif len(entry) > 0:
+                names.append("%s%s" % (root, entry))
+
+        names.sort()
+        prefixes.sort()
+
+        return (names, prefixes)
+
+    @staticmethod
+    def get_object_names_page(bucket, prefix=None, start_after=None,
+                              limit=1000):
+        """Return a page of up to 'limit' object names from the passed
+           bucket that start with 'prefix', in lexicographic order,
+           starting after the name 'start_after'. This returns a tuple
+           of the list of names and the continuation token to pass
+           as 'start_after' to get the next page (None if there are
+           no more names)
+        """
+        (dirpath, root, match) = _split_prefix(bucket, prefix)
+
+        names = []
+        next_token = None
+
+        for name in _iter_sorted_names(dirpath, root, match=match,
+                                       start_after=start_after):
+            if len(names) == limit:
+                next_token = names[-1]
+                break
+
+            names.append(name)
+
+        return (names, next_token)
+
     @staticmethod
     def set_object(bucket, key, data):
         """Set the value of 'key' in 'bucket' to binary 'data'"""
 
         filename = "%s/%s._data" % (bucket, key)
 
-        with _rlock:
-            try:
-                with open(filename, 'wb') as FILE:
-                    if data is not None:
-                        FILE.write(data)
-                    FILE.flush()
-            except:
-                dir = "/".join(filename.split("/")[0:-1])
-                _os.makedirs(dir, exist_ok=True)
-                with open(filename, 'wb') as FILE:
-                    if data is not None:
-                        FILE.write(data)
-                    FILE.flush()
+        # write to a temporary file that is atomically renamed into
+        # place, so that readers never see a partially written object
+        tmpname = _write_temp_file(filename, data)
+
+        try:
+            with _KeyLock(bucket, key):
+                _os.replace(tmpname, filename)
+        except:
+            _os.remove(tmpname)
+            raise
+
+    @staticmethod
+    def set_object_if_absent(bucket, key, data):
+        """Set the value of 'key' in 'bucket' to binary 'data' if (and
+           only if) there is no object already at this key. This is
+           atomic - the data is written to a temporary file that is
+           hard-linked into place, which fails if the key already exists.
+           This returns whether or not the object was set
+        """
+        filename = "%s/%s._data" % (bucket, key)
+
+        tmpname = _write_temp_file(filename, data)
+
+        try:
+            _os.link(tmpname, filename)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            _os.remove(tmpname)
+
+    @staticmethod
+    def set_object_if_match(bucket, key, data, etag):
+        """Set the value of 'key' in 'bucket' to binary 'data' if (and
+           only if) the entity tag of the current object at this key
+           is equal to 'etag'. The new data is atomically renamed into
+           place. This returns whether or not the object was set
+        """
+        filename = "%s/%s._data" % (bucket, key)
+
+        tmpname = _write_temp_file(filename, data)
+
+        try:
+            with _KeyLock(bucket, key):
+                try:
+                    with open(filename, "rb") as FILE:
+                        old_data = FILE.read()
+                except FileNotFoundError:
+                    return False
+
+                if _get_etag(old_data) != etag:
+                    return False
+
+                _os.replace(tmpname, filename)
+                tmpname = None
+        finally:
+            if tmpname is not None:
+                _os.remove(tmpname)
+
+        return True
+
+    @staticmethod
+    def create_multipart_upload(bucket, key):
+        """Start a new multipart upload of the object at 'key' in the
+           passed bucket, returning the ID of the upload. The parts
+           are held as files in a directory until they are committed
+        """
+        upload_id = str(_uuid.uuid4())
+        upload_dir = "%s/%s/%s" % (bucket, _multipart_root, upload_id)
+        _os.makedirs(upload_dir)
+
+        with open("%s/key" % upload_dir, "w") as FILE:
+            FILE.write(key)
+
+        return upload_id
+
+    @staticmethod
+    def upload_part(bucket, key, upload_id, part_number, data):
+        """Upload the binary 'data' as part 'part_number' (counting
+           from 1) of the multipart upload 'upload_id'. This returns
+           the etag of the uploaded part
+        """
+        upload_dir = _get_upload_dir(bucket, key, upload_id)
+        filename = "%s/%d._part" % (upload_dir, int(part_number))
+
+        tmpname = _write_temp_file(filename, data)
+        _os.replace(tmpname, filename)
+
+        return _get_etag(data)
+
+    @staticmethod
+    def list_uploaded_parts(bucket, key, upload_id):
+        """Return the parts that have already been uploaded to the
+           multipart upload 'upload_id', as a dictionary mapping the
+           part number to a tuple of the etag, size and MD5 checksum
+           of each part
+        """
+        upload_dir = _get_upload_dir(bucket, key, upload_id)
+
+        parts = {}
+
+        for entry in _os.listdir(upload_dir):
+            if entry.endswith("._part"):
+                with open("%s/%s" % (upload_dir, entry), "rb") as FILE:
+                    data = FILE.read()
+
+                etag = _get_etag(data)
+                parts[int(entry[0:-6])] = (etag, len(data), etag)
+
+        return parts
+
+    @staticmethod
+    def commit_multipart_upload(bucket, key, upload_id, parts):
+        """Commit the multipart upload 'upload_id', assembling the
+           passed 'parts' (a dictionary mapping part number to etag)
+           into the object at 'key'. The parts are assembled into a
+           temporary file which is then atomically renamed into place
+        """
+        upload_dir = _get_upload_dir(bucket, key, upload_id)
+
+        filename = "%s/%s._data" % (bucket, key)
+        tmpname = _write_temp_file(filename, None)
+
+        try:
+            with open(tmpname, "wb") as FILE:
+                for part_number in sorted(parts.keys()):
+                    partname = "%s/%d._part" % (upload_dir, part_number)
+
+                    try:
+                        with open(partname, "rb") as PART:
+                            data = PART.read()
+                    except FileNotFoundError:
+                        data = None
+
+                    if data is None or \
+                            _get_etag(data) != parts[part_number]:
+                        from Acquire.ObjectStore import ObjectStoreError
+                        raise ObjectStoreError(
+                            "Cannot commit the multipart upload '%s' as "
+                            "part %d is missing or does not match" %
+                            (upload_id, part_number))
+
+                    FILE.write(data)
+
+            with _KeyLock(bucket, key):
+                _os.replace(tmpname, filename)
+        except:
+            _os.remove(tmpname)
+            raise
+
+        _shutil.rmtree(upload_dir, ignore_errors=True)
+
+    @staticmethod
+    def abort_multipart_upload(bucket, key, upload_id):
+        """Abort the multipart upload 'upload_id', discarding any
+           parts that have been uploaded
+        """
+        upload_dir = "%s/%s/%s" % (bucket, _multipart_root, upload_id)
+        _shutil.rmtree(upload_dir, ignore_errors=True)
 
     @staticmethod
     def delete_all_objects(bucket, prefix=None):
@@ -338,10 +839,33 @@ class Testing_ObjectStore:
     def delete_object(bucket, key):
         """Removes the object at 'key'"""
         try:
-            _os.remove("%s/%s._data" % (bucket, key))
+            with _KeyLock(bucket, key):
+                _os.remove("%s/%s._data" % (bucket, key))
         except:
             pass
 
+    @staticmethod
+    def delete_object_if_match(bucket, key, etag):
+        """Remove the object at 'key' if (and only if) its entity tag
+           is equal to 'etag'. This returns whether or not the object
+           was removed
+        """
+        filename = "%s/%s._data" % (bucket, key)
+
+        with _KeyLock(bucket, key):
+            try:
+                with open(filename, "rb") as FILE:
+                    data = FILE.read()
+            except (FileNotFoundError, NotADirectoryError):
+                return False
+
+            if _get_etag(data) != etag:
+                return False
+
+            _os.remove(filename)
+
+        return True
+
     @staticmethod
     def get_size_and_checksum(bucket, key):
         """Return the object size (in bytes) and checksum of the
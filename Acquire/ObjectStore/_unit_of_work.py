@@ -0,0 +1,364 @@
+
+import threading as _threading
+import weakref as _weakref
+
+__all__ = ["ObjectStoreUnitOfWork"]
+
+_lock = _threading.RLock()
+
+# each thread holds its own stack of active units of work. The unit
+# at the top is the one used by the request that the thread is
+# processing. Worker threads that are started on behalf of a request
+# run with the stack of that request (see '_bind')
+_local = _threading.local()
+
+# all of the live units of work in this process, so that a write
+# made by one request can be removed from the identity maps of others
+_all_units = _weakref.WeakSet()
+
+# objects larger than this are never held in the identity map
+_max_object_size = 1024 * 1024
+
+# the maximum number of bytes of object data held in each identity map
+_max_bytes = 16 * 1024 * 1024
+
+
+class _Unit:
+    """A single unit of work, holding the identity map of objects
+       that have been read, and the buffer of deferred writes
+       (in the order in which they must be flushed)
+    """
+    def __init__(self):
+        self.reads = {}
+        self.nbytes = 0
+        self.writes = {}
+
+
+def _get_units():
+    """Return the stack of units of work of this thread"""
+    try:
+        return _local.units
+    except AttributeError:
+        units = []
+        _local.units = units
+        return units
+
+
+def _bind(function):
+    """Return a wrapper of 'function' that runs it with the units of
+       work of the calling thread. This is used to run 'function'
+       in a worker thread on behalf of the current request
+    """
+    units = list(_get_units())
+
+    if len(units) == 0:
+        return function
+
+    def _run_bound(*args, **kwargs):
+        old_units = getattr(_local, "units", None)
+        _local.units = units
+
+        try:
+            return function(*args, **kwargs)
+        finally:
+            if old_units is None:
+                del _local.units
+            else:
+                _local.units = old_units
+
+    return _run_bound
+
+
+def _get_id(bucket, key):
+    from ._objstore_cache import _get_bucket_id
+    return (_get_bucket_id(bucket), key)
+
+
+def _matches(bucket_id, prefix, object_id):
+    if object_id[0] != bucket_id:
+        return False
+    elif prefix is None:
+        return True
+    else:
+        return object_id[1].startswith(prefix)
+
+
+def _get(bucket, key):
+    """Return the data for 'key' held by the current unit of work
+       (either a deferred write, or the result of an earlier read),
+       or None if there is no unit of work or the key is not held
+    """
+    units = _get_units()
+
+    if len(units) == 0:
+        return None
+
+    object_id = _get_id(bucket, key)
+
+    with _lock:
+        unit = units[-1]
+        pending = unit.writes.get(object_id, None)
+
+        if pending is not None:
+            return pending[2]
+
+        return unit.reads.get(object_id, None)
+
+
+def _put(bucket, key, data):
+    """Add the passed data that has just been read from 'key' to the
+       identity map of the current unit of work
+    """
+    units = _get_units()
+
+    if len(units) == 0 or len(data) > _max_object_size:
+        return
+
+    object_id = _get_id(bucket, key)
+
+    with _lock:
+        unit = units[-1]
+
+        if object_id in unit.reads or \
+                unit.nbytes + len(data) > _max_bytes:
+            return
+
+        unit.reads[object_id] = bytes(data)
+        unit.nbytes += len(data)
+
+
+def _defer(bucket, key, data):
+    """Buffer the write of 'data' to 'key' in the current unit of work.
+       This returns False if there is no unit of work, in which case
+       the data must be written immediately
+    """
+    units = _get_units()
+
+    if len(units) == 0:
+        return False
+
+    object_id = _get_id(bucket, key)
+
+    with _lock:
+        unit = units[-1]
+        data = bytes(data)
+
+        # move the key to the end, so that writes are flushed in the
+        # order of the last write to each key
+        unit.writes.pop(object_id, None)
+        unit.writes[object_id] = (bucket, key, data)
+
+        old = unit.reads.pop(object_id, None)
+
+        if old is not None:
+            unit.nbytes -= len(old)
+
+        return True
+
+
+def _invalidate(bucket, key=None, prefix=None):
+    """Remove 'key' (or all keys that start with 'prefix') from the
+       identity maps of all units of work (of all requests), and
+       discard any deferred writes to them in the current unit of
+       work, as they are about to be superseded
+    """
+    if len(_all_units) == 0:
+        return
+
+    from ._objstore_cache import _get_bucket_id
+    bucket_id = _get_bucket_id(bucket)
+    units = _get_units()
+
+    with _lock:
+        for unit in list(_all_units):
+            if key is not None:
+                object_ids = [(bucket_id, key)]
+            else:
+                object_ids = [object_id for object_id in unit.reads.keys()
+                              if _matches(bucket_id, prefix, object_id)]
+
+            for object_id in object_ids:
+                old = unit.reads.pop(object_id, None)
+
+                if old is not None:
+                    unit.nbytes -= len(old)
+
+        if len(units) == 0:
+            return
+
+        writes = units[-1].writes
+
+        if key is not None:
+            writes.pop((bucket_id, key), None)
+        else:
+            for object_id in list(writes.keys()):
+                if _matches(bucket_id, prefix, object_id):
+                    del writes[object_id]
+
+
+def _flush(unit, bucket_id=None, key=None, prefix=None):
+    """Write the deferred writes of 'unit' to the object store, in
+       order. If 'bucket_id' is passed, then only the writes to
+       'key' (or all keys that start with 'prefix') are flushed.
+       This returns the number of objects written
+    """
+    with _lock:
+        if len(unit.writes) == 0:
+            return 0
+
+        if bucket_id is None:
+            object_ids = list(unit.writes.keys())
+        elif key is not None:
+            object_ids = [(bucket_id, key)]
+        else:
+            object_ids = [object_id for object_id in unit.writes.keys()
+                          if _matches(bucket_id, prefix, object_id)]
+
+        writes = []
+
+        for object_id in object_ids:
+            write = unit.writes.pop(object_id, None)
+
+            if write is not None:
+                writes.append((object_id, write))
+
+    from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+    for (i, (object_id, (bucket, key, data))) in enumerate(writes):
+        try:
+            _ObjectStore.set_object(bucket, key, data)
+        except Exception as e:
+            # put back the writes that have not been made, keeping
+            # them in front of any that have been deferred since
+            with _lock:
+                remaining = dict(writes[i:])
+
+                for (object_id, write) in unit.writes.items():
+                    remaining.pop(object_id, None)
+                    remaining[object_id] = write
+
+                unit.writes = remaining
+
+            from Acquire.ObjectStore import ObjectStoreError
+            raise ObjectStoreError(
+                "Unable to flush the deferred write to key '%s': %s" %
+                (key, str(e)))
+
+    return len(writes)
+
+
+def _flush_pending(bucket, key=None, prefix=None):
+    """Flush any deferred writes to 'key' (or to all keys that start
+       with 'prefix') in the current unit of work, so that they are
+       visible to an operation that goes directly to the object store
+    """
+    units = _get_units()
+
+    if len(units) == 0:
+        return
+
+    from ._objstore_cache import _get_bucket_id
+
+    _flush(units[-1], bucket_id=_get_bucket_id(bucket), key=key,
+           prefix=prefix)
+
+
+class ObjectStoreUnitOfWork:
+    """This is a request-scoped unit of work for the ObjectStore.
+       While a unit of work is active, objects read through
+       ObjectStore.get_object are held in an identity map, so that
+       repeated reads of the same key are served from memory, and
+       writes that are made with 'defer=True' are buffered and
+       coalesced, and then flushed once (in the order of the last
+       write to each key) when the unit of work ends.
+
+       Writes that are not deferred (e.g. ledger writes) still go
+       straight to the object store. Any other operation on a key
+       that has a deferred write (e.g. a conditional write, a take
+       or a listing) first flushes that write, or discards it if
+       the operation replaces the object.
+
+       Acquiring a Mutex discards the identity map, so data that
+       is read while holding a lock is always fresh.
+
+       Units of work are started and ended by the service handler
+       around each request, and may be nested. Each thread has its
+       own units of work, so concurrent requests never share them.
+       Work done in worker threads on behalf of a request (e.g. the
+       parallel reads of ObjectStore.get_objects) uses the units of
+       work of that request
+    """
+    @staticmethod
+    def begin():
+        """Begin a new unit of work"""
+        unit = _Unit()
+
+        with _lock:
+            _all_units.add(unit)
+
+        _get_units().append(unit)
+
+    @staticmethod
+    def end(flush=True):
+        """End the current unit of work, flushing all of its deferred
+           writes (unless 'flush' is False, in which case they are
+           discarded). This returns the number of objects written
+        """
+        units = _get_units()
+
+        if len(units) == 0:
+            return 0
+
+        unit = units[-1]
+
+        try:
+            if flush:
+                return _flush(unit)
+            else:
+                return 0
+        finally:
+            units.remove(unit)
+
+            with _lock:
+                _all_units.discard(unit)
+
+    @staticmethod
+    def is_active():
+        """Return whether or not there is an active unit of work"""
+        return len(_get_units()) > 0
+
+    @staticmethod
+    def flush():
+        """Flush all of the deferred writes of the current unit
+           of work, returning the number of objects written
+        """
+        units = _get_units()
+
+        if len(units) == 0:
+            return 0
+
+        return _flush(units[-1])
+
+    @staticmethod
+    def clear_reads():
+        """Discard all of the objects held in the identity maps of the
+           current request, so that subsequent reads fetch fresh data
+           from the object store
+        """
+        with _lock:
+            for unit in _get_units():
+                unit.reads = {}
+                unit.nbytes = 0
+
+    @staticmethod
+    def get_num_deferred():
+        """Return the number of deferred writes in the current
+           unit of work
+        """
+        units = _get_units()
+
+        with _lock:
+            if len(units) == 0:
+                return 0
+            else:
+                return len(units[-1].writes)
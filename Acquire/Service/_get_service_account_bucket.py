@@ -78,9 +78,21 @@ def get_service_account_bucket(testing_dir=None):
     except:
         password = None
 
-        # we must be in testing mode...
-        from Acquire.ObjectStore import use_testing_object_store_backend as \
-            _use_testing_object_store_backend
+        # we must be in testing mode... The local object store is
+        # posix files unless OBJSTORE_BACKEND selects the SQLite
+        # or in-memory store
+        local_backend = _os.getenv("OBJSTORE_BACKEND", "").lower()
+
+        if local_backend == "sqlite":
+            from Acquire.ObjectStore import use_sqlite_object_store_backend \
+                as _use_testing_object_store_backend
+        elif local_backend == "memory":
+            from Acquire.ObjectStore import use_memory_object_store_backend \
+                as _use_testing_object_store_backend
+        else:
+            from Acquire.ObjectStore import \
+                use_testing_object_store_backend as \
+                _use_testing_object_store_backend
 
         # see if this is running in testing mode...
         global _current_testing_objstore
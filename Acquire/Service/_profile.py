@@ -6,12 +6,18 @@ if _os.getenv("PROFILE") == "1":
 
     def start_profile():
         import cProfile as _cProfile
+        from Acquire.ObjectStore import ObjectStoreMetrics \
+            as _ObjectStoreMetrics
+        _ObjectStoreMetrics.start_request()
         pr = _cProfile.Profile()
         pr.enable()
         return pr
 
     def end_profile(pr, results):
         pr.disable()
+        from Acquire.ObjectStore import ObjectStoreMetrics \
+            as _ObjectStoreMetrics
+        results["objstore_metrics"] = _ObjectStoreMetrics.end_request()
         import tempfile as _tempfile
         from Acquire.ObjectStore import bytes_to_string as _bytes_to_string
         t = _tempfile.mktemp()
@@ -624,6 +624,13 @@ class Service:
         else:
             return self._service_type == "storage"
 
+    def is_lock_service(self):
+        """Return whether or not this is a lock service"""
+        if self.is_null():
+            return False
+        else:
+            return self._service_type == "lock"
+
     def service_url(self, prefer_https=True):
         """Return the URL used to access this service. This includes
            the scheme, port etc. This is in contrast to the canonical
@@ -1378,6 +1385,9 @@ class Service:
             from Acquire.Accounting import AccountingService \
                                         as _AccountingService
             service = _AccountingService(service)
+        elif service.is_lock_service():
+            from Acquire.Lock import LockService as _LockService
+            service = _LockService(service)
 
         if verify_data:
             # the service was transmitted with a signature from both
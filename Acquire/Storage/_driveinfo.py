@@ -338,13 +338,16 @@ class DriveInfo:
         except:
             pass
 
-    def upload_chunk(self, file_uid, chunk_index, secret, chunk, checksum):
+    def upload_chunk(self, file_uid, chunk_index, secret, chunk, checksum,
+                     size=None):
         """Upload a chunk of the file with UID 'file_uid'. This is the
            chunk at index 'chunk_idx', which is set equal to 'chunk'
            (validated with 'checksum'). The passed secret is used to
            authenticate this upload. The secret should be the
            multi_md5 has of the shared secret with the concatenated
-           drive_uid, file_uid and chunk_index
+           drive_uid, file_uid and chunk_index. If supplied, 'size'
+           is the uncompressed size of the chunk, which is recorded
+           so that ranges of the file can be mapped onto chunks
         """
         from Acquire.ObjectStore import ObjectStore as _ObjectStore
         from Acquire.Service import get_service_account_bucket \
@@ -379,6 +382,9 @@ class DriveInfo:
                 "checksum": checksum,
                 "compression": "bz2"}
 
+        if size is not None:
+            meta["size"] = int(size)
+
         file_key = data["filekey"]
         chunk_index = int(chunk_index)
 
@@ -390,12 +396,15 @@ class DriveInfo:
         _ObjectStore.set_object_from_json(file_bucket, meta_key, meta)
         _ObjectStore.set_object(file_bucket, data_key, chunk)
 
-    def download_chunk(self, file_uid, downloader_uid, chunk_index, secret):
+    def download_chunk(self, file_uid, downloader_uid, chunk_index, secret,
+                       meta_only=False):
         """Download a chunk of the file with UID 'file_uid' at chunk
            index 'chunk_index'. This request is authenticated with
            the passed secret. The secret should be the
            multi_md5 has of the shared secret with the concatenated
-           drive_uid, file_uid and chunk_index
+           drive_uid, file_uid and chunk_index. If 'meta_only' is True
+           then only the metadata of the chunk is returned, e.g. so
+           that chunks can be skipped when reading a range of the file
         """
         from Acquire.ObjectStore import ObjectStore as _ObjectStore
         from Acquire.Service import get_service_account_bucket \
@@ -471,6 +480,9 @@ class DriveInfo:
             # we should be able to read this metadata...
             meta = _ObjectStore.get_object_from_json(file_bucket, meta_key)
 
+        if meta_only:
+            return (None, meta, num_chunks)
+
         chunk = _ObjectStore.get_object(file_bucket, data_key)
 
         return (chunk, meta, num_chunks)
@@ -756,6 +768,9 @@ class DriveInfo:
 
         metadata_bucket = self._get_metadata_bucket()
 
+        # length of the part of the key before the encoded filename
+        root_len = len("%s/%s/" % (_fileinfo_root, self._drive_uid))
+
         if filename is not None:
             if dir is not None:
                 filename = "%s/%s" % (dir, filename)
@@ -783,21 +798,24 @@ class DriveInfo:
             key = "%s/%s/%s" % (_fileinfo_root, self._drive_uid,
                                 encoded_dir)
 
-            all_names = _ObjectStore.get_all_object_names(metadata_bucket,
-                                                          key)
-
-            names = []
-
             dir = "%s/" % dir
 
-            for name in all_names:
-                decoded_name = _encoded_to_string(name.split("/")[-1])
+            # list the files next to the prefix in one go - encoded
+            # names can contain a "/", so these may be split across
+            # sub-prefixes, which must also be listed
+            (names, subprefixes) = _ObjectStore.list_children(
+                                                    metadata_bucket, key)
+
+            for subprefix in subprefixes:
+                names += _ObjectStore.get_all_object_names(metadata_bucket,
+                                                           subprefix)
 
-                if decoded_name.startswith(dir):
-                    names.append(name)
+            names = [name for name in sorted(names)
+                     if _encoded_to_string(
+                            name[root_len:]).startswith(dir)]
         else:
-            key = "%s/%s" % (_fileinfo_root, self._drive_uid)
-            names = _ObjectStore.get_all_object_names(metadata_bucket, key)
+            key = "%s/%s/" % (_fileinfo_root, self._drive_uid)
+            names = _ObjectStore.iter_object_names(metadata_bucket, key)
 
         files = []
 
@@ -822,7 +840,7 @@ class DriveInfo:
                     pass
         else:
             for name in names:
-                filename = _encoded_to_string(name.split("/")[-1])
+                filename = _encoded_to_string(name[root_len:])
                 files.append(_FileMeta(filename=filename))
 
         return files
@@ -1,4 +1,6 @@
 
+from Acquire.ObjectStore import ObjectStoreCache as _ObjectStoreCache
+
 __all__ = ["FileInfo", "VersionInfo"]
 
 _version_root = "storage/version"
@@ -7,6 +9,11 @@ _fileinfo_root = "storage/file"
 
 _file_root = "storage/file"
 
+# the data and metadata of each uploaded chunk are written once and
+# never changed, so can be cached without revalidation
+_ObjectStoreCache.add_immutable_prefix("%s/*/*/data/" % _file_root)
+_ObjectStoreCache.add_immutable_prefix("%s/*/*/meta/" % _file_root)
+
 
 class VersionInfo:
     """This class holds specific info about a version of a file"""
@@ -579,9 +586,10 @@ class FileInfo:
                         data=self._latest_version.to_data())
 
         # save the fileinfo itself
-        _ObjectStore.set_object_from_json(bucket=metadata_bucket,
-                                          key=self._fileinfo_key(),
-                                          data=self.to_data())
+        _ObjectStore.set_object_from_json(
+                        bucket=metadata_bucket, key=self._fileinfo_key(),
+                        data=self.to_data(),
+                        codec=_ObjectStore.get_record_codec("FileInfo"))
 
     @staticmethod
     def list_versions(drive, filename, identifiers=None,
@@ -610,11 +618,14 @@ class FileInfo:
         versions = []
 
         if include_metadata:
-            objs = _ObjectStore.get_all_objects_from_json(
+            # load the versions in parallel, processing each as it
+            # arrives. A version that can't be read raises an
+            # ObjectStoreError, rather than being left out
+            objs = _ObjectStore.iter_objects_from_json(
                                             bucket=metadata_bucket,
                                             prefix=version_root)
 
-            for data in objs.values():
+            for (_key, data) in objs:
                 version = VersionInfo.from_data(data)
                 filemeta = FileInfo._get_filemeta(filename=filename,
                                                   version=version,
@@ -62,17 +62,23 @@ class UserDrives:
 
         if drive_uid is None:
             # look for the top-level drives
-            names = _ObjectStore.get_all_object_names(
-                        bucket, "%s/%s" % (_drives_root, self._user_guid))
+            prefix = "%s/%s/" % (_drives_root, self._user_guid)
         else:
             # look for the subdrives
-            names = _ObjectStore.get_all_object_names(
-                        bucket, "%s/%s/%s" %
-                        (_subdrives_root, self._user_guid, drive_uid))
+            prefix = "%s/%s/%s/" % (_subdrives_root, self._user_guid,
+                                    drive_uid)
+
+        # the drives are the direct children of the prefix. Encoded
+        # names can contain a "/", so any sub-prefixes must also
+        # be searched
+        (names, subprefixes) = _ObjectStore.list_children(bucket, prefix)
+
+        for subprefix in subprefixes:
+            names += _ObjectStore.get_all_object_names(bucket, subprefix)
 
         drives = []
-        for name in names:
-            drive_name = _encoded_to_string(name.split("/")[-1])
+        for name in sorted(names):
+            drive_name = _encoded_to_string(name[len(prefix):])
             drives.append(_DriveMeta(name=drive_name, container=drive_uid))
 
         return drives
@@ -68,6 +68,9 @@ def _route_function(function, args, additional_functions=None):
     elif function == "admin/logout":
         from admin.logout import run as _logout
         return _logout(args)
+    elif function == "admin/metrics":
+        from admin.metrics import run as _metrics
+        return _metrics(args)
     elif function == "admin/refresh_keys":
         from admin.refresh_keys import run as _refresh_keys
         return _refresh_keys(args)
@@ -80,6 +83,9 @@ def _route_function(function, args, additional_functions=None):
     elif function == "admin/setup":
         from admin.setup import run as _setup
         return _setup(args)
+    elif function == "admin/sweep_pars":
+        from admin.sweep_pars import run as _sweep_pars
+        return _sweep_pars(args)
     elif function == "admin/trust_accounting_service":
         from admin.trust_accounting_service import run as \
             _trust_accounting_service
@@ -122,14 +128,28 @@ def _handle(function=None, additional_functions=None, args={}):
        """
 
     from Acquire.Service import start_profile, end_profile
+    from Acquire.ObjectStore import ObjectStoreUnitOfWork
 
     pr = start_profile()
 
     # if function != "warm":
     #     one_hot_spare()
 
-    result = _route_function(function, args, additional_functions)
+    # run the request within a unit of work, so that repeated reads
+    # are served from memory and deferred writes are flushed once.
+    # The deferred writes of a failed request are discarded
+    ObjectStoreUnitOfWork.begin()
 
+    try:
+        result = _route_function(function, args, additional_functions)
+    except:
+        ObjectStoreUnitOfWork.end(flush=False)
+        raise
+
+    ObjectStoreUnitOfWork.end()
+
+    # the profile is ended after the flush, so that the deferred
+    # writes are counted in the request metrics
     end_profile(pr, result)
 
     return result
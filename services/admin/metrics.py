@@ -0,0 +1,39 @@
+
+from Acquire.Service import get_this_service
+from Acquire.Identity import Authorisation
+from Acquire.ObjectStore import ObjectStoreMetrics, Mutex
+
+
+def run(args):
+    """Call this function to return the object store metrics
+       (number of calls, errors, time taken, bytes transferred and
+       latency histograms per operation and per prefix family),
+       plus the mutex contention statistics per key family,
+       collected by this service since it started, or since
+       they were last reset
+
+       Args:
+            args (dict): contains authorisation details, and optionally
+            'reset' to reset the metrics after they have been read
+       Returns:
+            dict: containing the metrics
+    """
+    try:
+        authorisation = Authorisation.from_data(args["authorisation"])
+    except:
+        raise PermissionError(
+            "Only an authorised admin can read the metrics")
+
+    service = get_this_service(need_private_access=True)
+    service.assert_admin_authorised(
+            authorisation, "metrics %s" % service.uid())
+
+    return_value = {}
+    return_value["metrics"] = ObjectStoreMetrics.get_metrics()
+    return_value["mutexes"] = Mutex.get_statistics()
+
+    if args.get("reset", False):
+        ObjectStoreMetrics.reset_metrics()
+        Mutex.reset_statistics()
+
+    return return_value
@@ -0,0 +1,45 @@
+
+from Acquire.Service import get_this_service
+from Acquire.Identity import Authorisation
+from Acquire.ObjectStore import OSParRegistry
+
+
+def run(args):
+    """Call this function to close all of the PARs registered with
+       this service that have expired, running their cleanup functions.
+       This can be called from a periodic trigger, and is safe to
+       call on several instances at once
+
+       Args:
+            args (dict): contains authorisation details, and optionally
+            'batch_size' (number of PARs closed in parallel in each
+            batch) and 'max_batches' (maximum number of batches to sweep)
+       Returns:
+            dict: containing the number of PARs closed, failed, etc.
+            and whether or not all expired PARs were swept
+    """
+    try:
+        authorisation = Authorisation.from_data(args["authorisation"])
+    except:
+        raise PermissionError(
+            "Only an authorised admin can sweep the expired PARs")
+
+    service = get_this_service(need_private_access=True)
+    service.assert_admin_authorised(
+            authorisation, "sweep_pars %s" % service.uid())
+
+    errors = {}
+
+    result = OSParRegistry.sweep_expired(
+                    batch_size=args.get("batch_size", 100),
+                    max_batches=args.get("max_batches", None),
+                    errors=errors)
+
+    if result is not None:
+        result["errors"] = {uid: str(error)
+                            for (uid, error) in errors.items()}
+
+    return_value = {}
+    return_value["swept"] = result
+
+    return return_value
@@ -0,0 +1,24 @@
+from Acquire.Lock import get_lock_manager
+
+
+def run(args):
+    """Call this function to acquire the lease on a key, waiting
+       in the queue for the key for up to 'wait' seconds
+    """
+
+    key = args["key"]
+    owner = args["owner"]
+
+    try:
+        lease_time = args["lease_time"]
+    except:
+        lease_time = None
+
+    try:
+        wait = args["wait"]
+    except:
+        wait = None
+
+    manager = get_lock_manager(single_instance=True)
+    return manager.acquire(key=key, owner=owner,
+                           lease_time=lease_time, wait=wait)
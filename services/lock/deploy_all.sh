@@ -0,0 +1,3 @@
+#!/bin/bash
+export FN_REGISTRY=chryswoods
+fn --verbose deploy --local --all
@@ -0,0 +1,11 @@
+from Acquire.Lock import get_lock_manager
+
+
+def run(args):
+    """Call this function to release the lease on a key"""
+
+    key = args["key"]
+    owner = args["owner"]
+
+    manager = get_lock_manager(single_instance=True)
+    return manager.release(key=key, owner=owner)
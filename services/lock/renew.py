@@ -0,0 +1,16 @@
+from Acquire.Lock import get_lock_manager
+
+
+def run(args):
+    """Call this function to renew the lease on a key"""
+
+    key = args["key"]
+    owner = args["owner"]
+
+    try:
+        lease_time = args["lease_time"]
+    except:
+        lease_time = None
+
+    manager = get_lock_manager(single_instance=True)
+    return manager.renew(key=key, owner=owner, lease_time=lease_time)
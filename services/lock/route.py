@@ -0,0 +1,29 @@
+
+def lock_functions(function, args):
+    """This function routes calls to sub-functions, thereby allowing
+       a single lock function to stay hot for longer (and so keep
+       its leases in memory)
+    """
+    if function in ["acquire", "release", "renew"]:
+        # only services that we trust can lock keys
+        from Acquire.Lock import verify_lock_request as _verify_lock_request
+        args = _verify_lock_request(function, args)
+
+    if function == "acquire":
+        from lock.acquire import run as _acquire
+        return _acquire(args)
+    elif function == "release":
+        from lock.release import run as _release
+        return _release(args)
+    elif function == "renew":
+        from lock.renew import run as _renew
+        return _renew(args)
+    else:
+        from admin.handler import MissingFunctionError
+        raise MissingFunctionError()
+
+
+if __name__ == "__main__":
+    import fdk
+    from admin.handler import create_async_handler
+    fdk.handle(create_async_handler(lock_functions))
@@ -13,6 +13,7 @@ def run(args):
     file_uid = str(args["file_uid"])
     chunk_idx = int(args["chunk_index"])
     secret = str(args["secret"])
+    meta_only = bool(args.get("meta_only", False))
 
     drive = DriveInfo(drive_uid=drive_uid)
 
@@ -20,7 +21,8 @@ def run(args):
         (data, meta, num_chunks) = drive.download_chunk(file_uid=file_uid,
                                                         downloader_uid=uid,
                                                         chunk_index=chunk_idx,
-                                                        secret=secret)
+                                                        secret=secret,
+                                                        meta_only=meta_only)
     except IndexError:
         data = None
         meta = None
@@ -12,10 +12,12 @@ def run(args):
     secret = str(args["secret"])
     data = string_to_bytes(args["data"])
     checksum = str(args["checksum"])
+    size = args.get("size", None)
 
     drive = DriveInfo(drive_uid=drive_uid)
 
     drive.upload_chunk(file_uid=file_uid, chunk_index=chunk_idx,
-                       secret=secret, chunk=data, checksum=checksum)
+                       secret=secret, chunk=data, checksum=checksum,
+                       size=size)
 
     return True
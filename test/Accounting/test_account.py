@@ -2,6 +2,7 @@
 import pytest
 import random
 import datetime
+import threading
 
 from Acquire.Accounting import Account, Transaction, TransactionRecord, \
                                Accounts, Ledger, Receipt, Refund, \
@@ -15,7 +16,7 @@ from Acquire.Service import get_service_account_bucket, \
 
 from Acquire.Crypto import PrivateKey, get_private_key
 
-from Acquire.ObjectStore import get_datetime_now
+from Acquire.ObjectStore import get_datetime_now, MutexSet
 
 account1_overdraft_limit = 1500000
 account2_overdraft_limit = 2500000
@@ -32,6 +33,28 @@ def assert_packable(obj):
     assert(obj == new_obj)
 
 
+def run_with_accounts_locked(function, accounts):
+    """Run 'function' in a thread while the mutexes on 'accounts' are
+       held, checking that it waits for them, and return its result
+    """
+    mutexes = MutexSet([account._mutex_key() for account in accounts])
+    result = {}
+
+    thread = threading.Thread(
+                target=lambda: result.update(value=function()))
+    thread.start()
+    thread.join(0.5)
+
+    try:
+        assert(thread.is_alive())
+    finally:
+        mutexes.fully_unlock()
+
+    thread.join()
+
+    return result["value"]
+
+
 @pytest.fixture(scope="session")
 def bucket(tmpdir_factory):
     try:
@@ -199,7 +222,9 @@ def test_transactions(random_transaction, bucket):
     assert(refund.credit_note() == credit_note)
     assert_packable(refund)
 
-    rrecords = Ledger.refund(refund)
+    # the refund must wait for the mutexes on both accounts
+    rrecords = run_with_accounts_locked(lambda: Ledger.refund(refund),
+                                        [account1, account2])
 
     assert(len(rrecords) == 1)
     rrecord = rrecords[0]
@@ -314,7 +339,8 @@ def test_pending_transactions(random_transaction):
     assert(receipt.credit_note() == credit_note)
     assert_packable(receipt)
 
-    rrecords = Ledger.receipt(receipt)
+    rrecords = run_with_accounts_locked(lambda: Ledger.receipt(receipt),
+                                        [account1, account2])
 
     assert(len(rrecords) == 1)
     rrecord = rrecords[0]
@@ -345,3 +371,78 @@ def test_pending_transactions(random_transaction):
     assert(starting_balance2.balance() + value == ending_balance2.balance())
     assert(starting_balance2.liability() == ending_balance2.liability())
     assert(starting_balance1.receivable() == ending_balance1.receivable())
+
+
+def test_balance_checkpoint(account1, account2, bucket, monkeypatch):
+    import datetime as _datetime
+    from Acquire.ObjectStore import ObjectStore
+
+    transaction = Transaction(create_decimal(5), "checkpoint transaction")
+
+    authorisation = Authorisation(resource=transaction.fingerprint(),
+                                  testing_key=testing_key,
+                                  testing_user_guid=account1.group_name())
+
+    push_is_running_service()
+
+    try:
+        starting_balance = account1.balance()
+
+        Ledger.perform(transaction=transaction,
+                       debit_account=account1,
+                       credit_account=account2,
+                       authorisation=authorisation,
+                       is_provisional=False,
+                       bucket=bucket)
+
+        # the balance is found from the checkpoint, without searching
+        # through the balance keys
+        def _no_search(*args, **kwargs):
+            raise AssertionError("The balance keys should not be searched")
+
+        later = get_datetime_now() + _datetime.timedelta(hours=2)
+
+        with monkeypatch.context() as m:
+            m.setattr(Account, "_find_last_balance_key", _no_search)
+            account = Account(uid=account1.uid(), bucket=bucket)
+            assert(account.balance(now=later) ==
+                   starting_balance - transaction)
+
+        (key, balance) = account._get_checkpoint(bucket)
+        assert(key == account._get_balance_key(now=later))
+        assert(balance == starting_balance - transaction)
+
+        # the checkpoint is only ever moved forward
+        account._update_checkpoint(
+            hourly_key=account._get_balance_key(now=get_datetime_now()),
+            hourly_balance=Balance(), bucket=bucket)
+        assert(account._get_checkpoint(bucket)[0] == key)
+
+        # if the checkpoint is lost then the balance keys are searched,
+        # and the checkpoint is restored
+        ObjectStore.delete_object(bucket, account._checkpoint_key())
+        assert(account._get_checkpoint(bucket) == (None, None))
+
+        even_later = later + _datetime.timedelta(hours=1)
+        account = Account(uid=account1.uid(), bucket=bucket)
+        assert(account.balance(now=even_later) ==
+               starting_balance - transaction)
+        assert(account._get_checkpoint(bucket)[0] ==
+               account._get_balance_key(now=even_later))
+
+        # a checkpoint that can't be read is repaired
+        ObjectStore.set_object(bucket, account._checkpoint_key(),
+                               b"not a checkpoint")
+        assert(account._get_checkpoint(bucket) == (None, None))
+
+        latest = even_later + _datetime.timedelta(hours=1)
+        account = Account(uid=account1.uid(), bucket=bucket)
+        assert(account.balance(now=latest) ==
+               starting_balance - transaction)
+        assert(account._get_checkpoint(bucket)[0] ==
+               account._get_balance_key(now=latest))
+    except:
+        pop_is_running_service()
+        raise
+
+    pop_is_running_service()
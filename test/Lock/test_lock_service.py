@@ -0,0 +1,351 @@
+
+from Acquire.Lock import LockManager, LocalLockService, LockServiceError, \
+    sign_lock_request
+from Acquire.ObjectStore import Mutex, MutexSet, MutexTimeoutError, \
+    ObjectStore
+from Acquire.Service import get_service_account_bucket, \
+    push_is_running_service, pop_is_running_service
+
+import Acquire.Service
+
+import json
+import pytest
+import threading
+import time
+
+
+@pytest.fixture(scope="session")
+def bucket(tmpdir_factory):
+    d = tmpdir_factory.mktemp("objstore")
+    push_is_running_service()
+    bucket = get_service_account_bucket(str(d))
+    pop_is_running_service()
+    return bucket
+
+
+@pytest.fixture
+def local_lock_service():
+    service = LocalLockService(LockManager())
+    Mutex.set_lock_service(service)
+    yield service
+    Mutex.set_lock_service(None)
+
+
+class BrokenLockService:
+    def acquire(self, key, owner, lease_time=None, wait=None):
+        raise ConnectionError("The lock service is down")
+
+
+class SigningService:
+    """Stand-in for a Service that 'signs' data without keys"""
+    def __init__(self, uid):
+        self._uid = uid
+
+    def uid(self):
+        return self._uid
+
+    def sign_data(self, data):
+        return {"service_uid": self._uid, "signed_data": json.dumps(data)}
+
+    def verify_data(self, data):
+        assert(data["service_uid"] == self._uid)
+        return json.loads(data["signed_data"])
+
+
+@pytest.fixture
+def trusted_services(monkeypatch):
+    services = {"alice": SigningService("alice"),
+                "bob": SigningService("bob")}
+    caller = []
+
+    def _get_this_service(need_private_access=False):
+        return caller[0]
+
+    def _get_trusted_service(service_uid=None, autofetch=True):
+        assert(not autofetch)
+        return services[service_uid]
+
+    monkeypatch.setattr(Acquire.Service, "get_this_service",
+                        _get_this_service)
+    monkeypatch.setattr(Acquire.Service, "get_trusted_service",
+                        _get_trusted_service)
+
+    def _call(uid, function, args):
+        caller[:] = [SigningService(uid)]
+        return sign_lock_request(function, args)
+
+    return _call
+
+
+def test_lock_manager():
+    manager = LockManager()
+
+    r = manager.acquire("a", "alice", lease_time=0.2)
+    assert(r["acquired"])
+    token = r["token"]
+
+    # someone else can't get the lease until it expires
+    r = manager.acquire("a", "bob", lease_time=1)
+    assert(not r["acquired"])
+    assert(r["seconds_remaining"] > 0)
+
+    # re-acquiring renews the lease, keeping the token
+    assert(manager.acquire("a", "alice")["token"] == token)
+    assert(manager.renew("a", "alice", lease_time=0.2)["renewed"])
+    assert(not manager.renew("a", "bob")["renewed"])
+
+    # waiting takes the lease once it has expired, with a new token
+    r = manager.acquire("a", "bob", lease_time=1, wait=2)
+    assert(r["acquired"])
+    assert(r["stolen"])
+    assert(r["token"] > token)
+
+    assert(not manager.renew("a", "alice")["renewed"])
+    assert(not manager.release("a", "alice")["released"])
+
+    # waiters are given the lease in the order in which they queued
+    order = []
+
+    def _wait(owner):
+        r = manager.acquire("a", owner, wait=5)
+        assert(r["acquired"])
+        order.append(owner)
+        manager.release("a", owner)
+
+    threads = []
+
+    for owner in ["carol", "dave", "eve"]:
+        thread = threading.Thread(target=_wait, args=(owner,))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.05)
+
+    r = manager.release("a", "bob")
+    assert(r["released"])
+    assert(not r["expired"])
+
+    for thread in threads:
+        thread.join()
+
+    assert(order == ["carol", "dave", "eve"])
+    assert(len(manager._leases) == 0)
+    assert(len(manager._queues) == 0)
+
+    with pytest.raises(LockServiceError):
+        manager.acquire("a", "alice", lease_time=0)
+
+
+def test_lock_manager_single_instance(bucket):
+    push_is_running_service()
+
+    try:
+        m1 = LockManager(bucket=bucket)
+        m2 = LockManager(bucket=bucket)
+        m1.require_single_instance()
+        m2.require_single_instance()
+
+        assert(m1.acquire("a", "alice", lease_time=1)["acquired"])
+
+        # the second instance can't grant leases while the first runs
+        with pytest.raises(LockServiceError):
+            m2.acquire("a", "bob")
+
+        # leases longer than the registration extend it
+        assert(m1.renew("a", "alice", lease_time=120)["renewed"])
+        assert(m1._instance.seconds_remaining_on_lease() > 100)
+
+        # an instance that doesn't require this isn't checked
+        assert(LockManager(bucket=bucket).acquire("a", "bob")["acquired"])
+
+        m1._instance.fully_unlock()
+
+        assert(m2.acquire("b", "bob")["acquired"])
+
+        with pytest.raises(LockServiceError):
+            m1.renew("a", "alice")
+
+        m2._instance.fully_unlock()
+    except:
+        pop_is_running_service()
+        raise
+
+    pop_is_running_service()
+
+
+def test_lock_service_functions(trusted_services):
+    from lock.route import lock_functions
+
+    push_is_running_service()
+
+    try:
+        # unsigned calls, and calls from untrusted services, are rejected
+        with pytest.raises(LockServiceError):
+            lock_functions("acquire", {"key": "route", "owner": "alice"})
+
+        with pytest.raises(LockServiceError):
+            lock_functions("acquire", trusted_services(
+                "eve", "acquire", {"key": "route", "owner": "eve"}))
+
+        # as are calls signed for a different function
+        with pytest.raises(LockServiceError):
+            lock_functions("release", trusted_services(
+                "alice", "acquire", {"key": "route", "owner": "alice"}))
+
+        r = lock_functions("acquire", trusted_services(
+                "alice", "acquire", {"key": "route", "owner": "alice",
+                                     "lease_time": 5}))
+        assert(r["acquired"])
+
+        r = lock_functions("acquire", trusted_services(
+                "bob", "acquire", {"key": "route", "owner": "bob"}))
+        assert(not r["acquired"])
+
+        # the owner is bound to the calling service, so bob can't
+        # release alice's lease, even if he knows her secret
+        r = lock_functions("release", trusted_services(
+                "bob", "release", {"key": "route", "owner": "alice"}))
+        assert(not r["released"])
+
+        r = lock_functions("renew", trusted_services(
+                "alice", "renew", {"key": "route", "owner": "alice"}))
+        assert(r["renewed"])
+
+        r = lock_functions("release", trusted_services(
+                "alice", "release", {"key": "route", "owner": "alice"}))
+        assert(r["released"])
+    except:
+        pop_is_running_service()
+        raise
+
+    pop_is_running_service()
+
+
+def test_mutex_lock_service(bucket, local_lock_service):
+    push_is_running_service()
+
+    try:
+        Mutex.reset_statistics()
+
+        m = Mutex("Lock/mutex/a", lease_time=5, bucket=bucket)
+        assert(m.is_locked())
+        token = m.fencing_token()
+        assert(token is not None)
+
+        # the lease is only held by the service, not in the object store
+        assert(ObjectStore.get_all_object_names(bucket, "mutexes/Lock") ==
+               [])
+
+        with pytest.raises(MutexTimeoutError):
+            Mutex("Lock/mutex/a", timeout=0.2)
+
+        m.lock()
+        assert(m.fencing_token() == token)
+        m.unlock()
+        assert(m.is_locked())
+        m.unlock()
+        assert(not m.is_locked())
+        assert(m.fencing_token() is None)
+
+        m2 = Mutex("Lock/mutex/a")
+        assert(m2.fencing_token() > token)
+        m2.unlock()
+
+        # the heartbeat renews the lease in the service
+        m = Mutex("Lock/mutex/b", lease_time=0.3, heartbeat=True)
+        time.sleep(1.0)
+        assert(m.is_locked())
+
+        with pytest.raises(MutexTimeoutError):
+            Mutex("Lock/mutex/b", timeout=0.2)
+
+        m.unlock()
+
+        # a waiter is queued and given the lease when it is released
+        m = Mutex("Lock/mutex/c")
+        threading.Timer(0.2, m.unlock).start()
+        m2 = Mutex("Lock/mutex/c", timeout=5)
+        assert(m2.is_locked())
+        m2.unlock()
+
+        ms = MutexSet(["Lock/mutex/d", "Lock/mutex/e"])
+        assert(ms.is_locked())
+        ms.unlock()
+
+        stats = Mutex.get_statistics()["Lock/mutex"]
+        assert(stats["timeouts"] == 2)
+        assert(stats["renewals"] >= 2)
+        assert(stats["service_errors"] == 0)
+    except:
+        pop_is_running_service()
+        raise
+
+    pop_is_running_service()
+
+
+def test_mutex_lock_service_down(bucket):
+    push_is_running_service()
+
+    try:
+        Mutex.reset_statistics()
+        Mutex.set_lock_service(BrokenLockService())
+
+        # the mutex fails closed, retrying until it times out
+        with pytest.raises(MutexTimeoutError):
+            Mutex("Lock/down/a", timeout=0.5, bucket=bucket)
+
+        m = Mutex("Lock/down/a", bucket=bucket, acquire=False)
+        assert(not m.try_lock())
+        assert(not m.is_locked())
+
+        # and is never locked in the object store instead
+        assert(ObjectStore.get_all_object_names(
+                        bucket, "mutexes/Lock/down") == [])
+
+        stats = Mutex.get_statistics()["Lock/down"]
+        assert(stats["service_errors"] >= 2)
+        assert(stats["acquired"] == 0)
+    except:
+        Mutex.set_lock_service(None)
+        pop_is_running_service()
+        raise
+
+    Mutex.set_lock_service(None)
+    pop_is_running_service()
+
+
+def test_mutex_lock_service_not_found(bucket, monkeypatch):
+    import Acquire.ObjectStore._mutex
+
+    def _get_trusted_service(service_url=None, service_type=None):
+        raise ConnectionError("Cannot look up '%s'" % service_url)
+
+    monkeypatch.setattr(Acquire.Service, "get_trusted_service",
+                        _get_trusted_service)
+    monkeypatch.setenv("LOCK_SERVICE", "https://example.com/t/lock")
+    monkeypatch.setattr(Acquire.ObjectStore._mutex,
+                        "_lock_service_is_set", False)
+
+    push_is_running_service()
+
+    try:
+        Mutex.reset_statistics()
+
+        # the named service can't be found, so the mutex must not be
+        # locked in the object store instead
+        with pytest.raises(MutexTimeoutError):
+            Mutex("Lock/notfound/a", timeout=0.5, bucket=bucket)
+
+        assert(ObjectStore.get_all_object_names(
+                        bucket, "mutexes/Lock/notfound") == [])
+
+        stats = Mutex.get_statistics()["Lock/notfound"]
+        assert(stats["service_errors"] >= 1)
+        assert(stats["acquired"] == 0)
+
+        # the service is looked up again on the next attempt
+        assert(not Acquire.ObjectStore._mutex._lock_service_is_set)
+    except:
+        pop_is_running_service()
+        raise
+
+    pop_is_running_service()
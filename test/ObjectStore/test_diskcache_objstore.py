@@ -0,0 +1,168 @@
+
+import glob
+import os
+import pytest
+import time
+
+from Acquire.ObjectStore import ObjectStoreError, DiskCacheObjectStore
+from Acquire.ObjectStore._memory_objstore import Memory_ObjectStore
+
+
+@pytest.fixture
+def bucket():
+    b = Memory_ObjectStore.create_bucket("/memory/root", str(time.time()))
+    yield b
+    Memory_ObjectStore.delete_bucket(b, force=True)
+
+
+def test_diskcache_objstore(bucket, tmpdir):
+    directory = str(tmpdir.mkdir("cache"))
+    prefixes = {"hot/": "write-through", "hot/around/": "write-around"}
+
+    store = DiskCacheObjectStore(Memory_ObjectStore, directory=directory,
+                                 prefixes=prefixes)
+
+    store.set_object(bucket, "hot/a", b"a")
+    store.set_object(bucket, "hot/around/b", b"b")
+    store.set_object(bucket, "cold/c", b"c")
+
+    # only the write-through key is cached by the write
+    assert(store.get_statistics()["stores"] == 1)
+
+    assert(store.get_object(bucket, "hot/a") == b"a")
+    assert(store.get_object(bucket, "hot/around/b") == b"b")
+    assert(store.get_object(bucket, "hot/around/b") == b"b")
+    assert(store.get_object(bucket, "cold/c") == b"c")
+
+    stats = store.get_statistics()
+    assert(stats["hits"] == 2)
+    assert(stats["misses"] == 1)
+
+    # the cache is shared with other processes using the same directory
+    other = DiskCacheObjectStore(Memory_ObjectStore, directory=directory,
+                                 prefixes=prefixes)
+
+    Memory_ObjectStore.set_object(bucket, "hot/a", b"changed")
+    assert(other.get_object(bucket, "hot/a") == b"a")
+    assert(other.get_object_range(bucket, "hot/a", 0, 10) == b"a")
+    assert(other.open_object(bucket, "hot/a").read() == b"a")
+    assert(other.get_statistics()["hits"] == 3)
+
+    # compare-and-swap always sees the latest version, and refreshes
+    # the cache
+    (data, etag) = other.get_object_and_etag(bucket, "hot/a")
+    assert(data == b"changed")
+    assert(store.get_object(bucket, "hot/a") == b"changed")
+
+    assert(other.set_object_if_match(bucket, "hot/a", b"new", etag))
+    assert(store.get_object(bucket, "hot/a") == b"new")
+
+    # write-around removes the key from the cache
+    store.set_object(bucket, "hot/around/b", b"b2")
+    assert(other.get_object(bucket, "hot/around/b") == b"b2")
+
+    store.delete_object(bucket, "hot/a")
+
+    with pytest.raises(ObjectStoreError):
+        other.get_object(bucket, "hot/a")
+
+    # other functions are passed through to the backend
+    assert(store.get_all_object_names(bucket, "hot") ==
+           ["hot/around/b"])
+
+    with pytest.raises(ObjectStoreError):
+        DiskCacheObjectStore(Memory_ObjectStore, directory=directory,
+                             prefixes={"hot/": "write-back"})
+
+
+def test_diskcache_default_prefixes(bucket, tmpdir):
+    directory = str(tmpdir.mkdir("cache"))
+
+    store = DiskCacheObjectStore(Memory_ObjectStore, directory=directory)
+
+    # the current service key is mutable, so is never cached...
+    store.set_object(bucket, "_service_key", b"old")
+    Memory_ObjectStore.set_object(bucket, "_service_key", b"rotated")
+    assert(store.get_object(bucket, "_service_key") == b"rotated")
+
+    # ...while old keys are immutable, so are
+    store.set_object(bucket, "_service_key/oldkeys/2019", b"keys")
+    assert(store.get_object(bucket, "_service_key/oldkeys/2019") ==
+           b"keys")
+
+    stats = store.get_statistics()
+    assert(stats["stores"] == 1)
+    assert(stats["hits"] == 1)
+
+
+def test_diskcache_validation(bucket, tmpdir):
+    directory = str(tmpdir.mkdir("cache"))
+
+    store = DiskCacheObjectStore(Memory_ObjectStore, directory=directory,
+                                 prefixes={"": "write-through"})
+
+    store.set_object(bucket, "a", b"hello")
+    store.set_object(bucket, "b", b"hello")
+
+    # the objects are content-addressed, so identical data is shared
+    objects = glob.glob(os.path.join(directory, "objects", "*", "*"))
+    assert(len(objects) == 1)
+
+    with open(objects[0], "wb") as FILE:
+        FILE.write(b"jello")
+
+    # the corrupted object is detected and re-read from the backend
+    assert(store.get_object(bucket, "a") == b"hello")
+    assert(store.get_statistics()["invalid"] == 1)
+    assert(store.get_object(bucket, "a") == b"hello")
+    assert(store.get_statistics()["hits"] == 1)
+
+    # entries older than max_age are revalidated against the backend
+    checked = DiskCacheObjectStore(Memory_ObjectStore, directory=directory,
+                                   prefixes={"": "write-through"},
+                                   max_age=0)
+
+    time.sleep(0.01)
+    assert(checked.get_object(bucket, "a") == b"hello")
+    assert(checked.get_statistics()["hits"] == 1)
+
+    Memory_ObjectStore.set_object(bucket, "a", b"world")
+    time.sleep(0.01)
+    assert(checked.get_object(bucket, "a") == b"world")
+    assert(checked.get_statistics()["misses"] == 1)
+
+
+def test_diskcache_eviction(bucket, tmpdir):
+    directory = str(tmpdir.mkdir("cache"))
+
+    store = DiskCacheObjectStore(Memory_ObjectStore, directory=directory,
+                                 prefixes={"": "write-through"},
+                                 max_size=1000)
+
+    for i in range(5):
+        store.set_object(bucket, "key%d" % i, bytes([i]) * 300)
+        time.sleep(0.01)
+
+        if i == 2:
+            # using key0 makes key1 and key2 the least recently used
+            assert(store.get_object(bucket, "key0") == bytes([0]) * 300)
+
+    store.evict()
+
+    objects = glob.glob(os.path.join(directory, "objects", "*", "*"))
+    assert(sum(os.path.getsize(f) for f in objects) <= 1000)
+
+    # key1 and key2 were evicted
+    store.reset_statistics()
+    assert(store.get_object(bucket, "key0") == bytes([0]) * 300)
+    assert(store.get_object(bucket, "key4") == bytes([4]) * 300)
+    assert(store.get_object(bucket, "key1") == bytes([1]) * 300)
+
+    stats = store.get_statistics()
+    assert(stats["hits"] == 2)
+    assert(stats["misses"] == 1)
+
+    # objects larger than the cache are never cached
+    store.set_object(bucket, "big", b"x" * 2000)
+    assert(store.get_object(bucket, "big") == b"x" * 2000)
+    assert(store.get_statistics()["misses"] == 2)
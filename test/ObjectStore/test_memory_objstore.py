@@ -0,0 +1,115 @@
+
+import pytest
+import time
+
+from Acquire.ObjectStore import ObjectStoreError, SimulatedObjectStore
+from Acquire.ObjectStore._memory_objstore import Memory_ObjectStore
+
+
+@pytest.fixture
+def bucket():
+    b = Memory_ObjectStore.create_bucket("/memory/root", str(time.time()))
+    yield b
+    Memory_ObjectStore.delete_bucket(b, force=True)
+
+
+def test_memory_objstore(bucket):
+    assert(Memory_ObjectStore.is_bucket_empty(bucket))
+
+    keys = ["tree/a", "tree/a/b", "tree/a/c/d", "tree/b0", "tree/b/e",
+            "tree/c", "tree-other/f"]
+
+    for key in keys:
+        Memory_ObjectStore.set_object(bucket, key, key.encode())
+
+    assert(Memory_ObjectStore.get_object(bucket, "tree//a/b") ==
+           b"tree/a/b")
+    assert(Memory_ObjectStore.get_object_range(bucket, "tree/a/b",
+                                               2, 3) == b"ee/")
+    assert(Memory_ObjectStore.get_object_range(bucket, "tree/a/b",
+                                               5) == b"a/b")
+
+    names = Memory_ObjectStore.get_all_object_names(bucket, "tree/")
+    assert(names == sorted(keys[0:6]))
+
+    (page, token) = Memory_ObjectStore.get_object_names_page(
+                                            bucket, "tree/", limit=4)
+    assert(page == sorted(keys[0:6])[0:4])
+
+    (page, token) = Memory_ObjectStore.get_object_names_page(
+                                            bucket, "tree/",
+                                            start_after=token, limit=4)
+    assert(page == sorted(keys[0:6])[4:])
+    assert(token is None)
+
+    (names, prefixes) = Memory_ObjectStore.list_children(bucket, "tree/")
+    assert(names == ["tree/a", "tree/b0", "tree/c"])
+    assert(prefixes == ["tree/a/", "tree/b/"])
+
+    assert(not Memory_ObjectStore.set_object_if_absent(bucket, "tree/a",
+                                                       b"x"))
+    (data, etag) = Memory_ObjectStore.get_object_and_etag(bucket, "tree/a")
+    assert(Memory_ObjectStore.set_object_if_match(bucket, "tree/a",
+                                                  b"x", etag))
+    assert(not Memory_ObjectStore.set_object_if_match(bucket, "tree/a",
+                                                      b"y", etag))
+
+    assert(not Memory_ObjectStore.claim_object(bucket, "tree/a", "tree/c"))
+    assert(Memory_ObjectStore.claim_object(bucket, "tree/a",
+                                           "tree/z") == b"x")
+    assert(Memory_ObjectStore.claim_object(bucket, "tree/a",
+                                           "tree/y") is None)
+    (data, etag) = Memory_ObjectStore.get_object_and_etag(bucket, "tree/z")
+    assert(not Memory_ObjectStore.delete_object_if_match(bucket, "tree/z",
+                                                         "wrong"))
+    assert(Memory_ObjectStore.delete_object_if_match(bucket, "tree/z",
+                                                     etag))
+    Memory_ObjectStore.set_object(bucket, "tree/a", b"x")
+
+    assert(Memory_ObjectStore.take_object(bucket, "tree/a") == b"x")
+
+    with pytest.raises(ObjectStoreError):
+        Memory_ObjectStore.get_object(bucket, "tree/a")
+
+    Memory_ObjectStore.delete_all_objects(bucket, "tree/")
+    assert(Memory_ObjectStore.get_all_object_names(bucket) ==
+           ["tree-other/f"])
+
+
+def test_simulated_objstore(bucket):
+    store = SimulatedObjectStore(latency={"read": 0.01, "default": 0},
+                                 bandwidth=1024 * 1024, seed=42)
+
+    store.set_object(bucket, "key", b"x" * 10240)
+
+    start = time.time()
+    assert(store.get_object(bucket, "key") == b"x" * 10240)
+    assert(time.time() - start >= 0.01)
+
+    stats = store.get_statistics()
+    assert(stats["get_object"]["calls"] == 1)
+    assert(stats["get_object"]["latency"] >= 0.01)
+    assert(stats["set_object"]["calls"] == 1)
+
+    throttled = SimulatedObjectStore(throttle_rate=1.0)
+
+    with pytest.raises(ObjectStoreError):
+        throttled.get_object(bucket, "key")
+
+    assert(throttled.get_statistics()["get_object"]["throttled"] == 1)
+
+    lagging = SimulatedObjectStore(consistency_delay=0.2)
+
+    lagging.set_object(bucket, "new", b"new")
+    lagging.delete_object(bucket, "key")
+
+    # reads are consistent, but listings lag behind
+    assert(lagging.get_object(bucket, "new") == b"new")
+    assert(lagging.get_all_object_names(bucket) == ["key"])
+
+    time.sleep(0.25)
+    assert(lagging.get_all_object_names(bucket) == ["new"])
+
+    latency = SimulatedObjectStore.lognormal(0.02, 0.2)
+    store = SimulatedObjectStore.oci_like(seed=1)
+    assert(latency(store._random) > 0)
@@ -1,5 +1,6 @@
 
-from Acquire.ObjectStore import Mutex, MutexTimeoutError
+from Acquire.ObjectStore import Mutex, MutexSet, MutexTimeoutError, \
+    ReadWriteMutex
 from Acquire.Service import get_service_account_bucket, \
     push_is_running_service, pop_is_running_service
 
@@ -86,4 +87,170 @@ def test_mutex(bucket):
         pop_is_running_service()
         raise
 
-    pop_is_running_service()
\ No newline at end of file
+    pop_is_running_service()
+
+
+def test_mutex_heartbeat(bucket):
+    push_is_running_service()
+
+    try:
+        Mutex.reset_statistics()
+
+        m = Mutex("ObjectStore/heartbeat/a", lease_time=0.3, heartbeat=True)
+
+        # the heartbeat keeps renewing the short lease
+        time.sleep(1.0)
+        assert(m.is_locked())
+        assert(not m.expired())
+
+        with pytest.raises(MutexTimeoutError):
+            Mutex("ObjectStore/heartbeat/a", timeout=0.3)
+
+        m.unlock()
+        assert(not m.is_locked())
+
+        # without a heartbeat, the expired lease is stolen
+        m = Mutex("ObjectStore/heartbeat/b", lease_time=0.1)
+        time.sleep(0.2)
+
+        m2 = Mutex("ObjectStore/heartbeat/b")
+        assert(m2.is_locked())
+        m2.unlock()
+
+        with pytest.raises(MutexTimeoutError):
+            m.unlock()
+
+        stats = Mutex.get_statistics()["ObjectStore/heartbeat"]
+
+        assert(stats["acquired"] == 3)
+        assert(stats["timeouts"] == 1)
+        assert(stats["steals"] == 1)
+        assert(stats["renewals"] >= 2)
+        assert(stats["lost"] == 0)
+        assert(stats["attempts"] > 4)
+        assert(stats["wait_seconds"] >= 0.3)
+    except:
+        pop_is_running_service()
+        raise
+
+    pop_is_running_service()
+
+
+def test_mutexset(bucket):
+    push_is_running_service()
+
+    try:
+        keys = ["ObjectStore/set/c", "ObjectStore/set/a", "ObjectStore/set/b"]
+
+        s = MutexSet(keys + ["ObjectStore/set/a"])
+
+        # the keys are de-duplicated and locked in canonical order
+        assert(s.keys() == ["mutexes/ObjectStore/set/a",
+                            "mutexes/ObjectStore/set/b",
+                            "mutexes/ObjectStore/set/c"])
+        assert(s.is_locked())
+
+        with pytest.raises(MutexTimeoutError):
+            Mutex("ObjectStore/set/b", timeout=0.1)
+
+        s.unlock()
+        assert(not s.is_locked())
+
+        # all or nothing - if one key is held then none are locked
+        m = Mutex("ObjectStore/set/b")
+
+        with pytest.raises(MutexTimeoutError):
+            MutexSet(keys, timeout=0.2)
+
+        m2 = Mutex("ObjectStore/set/a", timeout=0.1)
+        m3 = Mutex("ObjectStore/set/c", timeout=0.1)
+        m2.unlock()
+        m3.unlock()
+
+        # wait for the held key to be released
+        m.unlock()
+        m = Mutex("ObjectStore/set/b", lease_time=0.2)
+
+        s = MutexSet(keys, timeout=2)
+        assert(s.is_locked())
+        assert(not m.is_locked())
+        s.fully_unlock()
+        assert(not s.is_locked())
+    except:
+        pop_is_running_service()
+        raise
+
+    pop_is_running_service()
+
+
+def test_readwritemutex(bucket):
+    push_is_running_service()
+
+    try:
+        key = "ObjectStore/rwmutex"
+
+        r1 = ReadWriteMutex(key)
+        r2 = ReadWriteMutex(key)
+        w = ReadWriteMutex(key, timeout=0.3)
+
+        # many readers can hold the lock at once
+        with r1.reading():
+            with r2.reading():
+                assert(r1.is_read_locked())
+                assert(r2.is_read_locked())
+                assert(not r1.is_write_locked())
+
+                # but they block writers
+                with pytest.raises(MutexTimeoutError):
+                    w.write_lock()
+
+                assert(not w.is_locked())
+
+        assert(not r1.is_locked())
+
+        with w.writing():
+            assert(w.is_write_locked())
+
+            # the writer blocks new readers and other writers
+            with pytest.raises(MutexTimeoutError):
+                r1.read_lock(timeout=0.2)
+
+            with pytest.raises(MutexTimeoutError):
+                ReadWriteMutex(key).write_lock(timeout=0.2)
+
+        # the lease of a reader that never unlocks expires
+        r1.read_lock(lease_time=0.2)
+        time.sleep(0.3)
+
+        with w.writing():
+            assert(w.is_write_locked())
+
+        with pytest.raises(MutexTimeoutError):
+            r1.unlock()
+
+        # a heartbeat keeps a short read lease alive
+        r = ReadWriteMutex(key, lease_time=0.3, heartbeat=True)
+
+        with r.reading():
+            time.sleep(0.8)
+            assert(r.is_read_locked())
+
+        with w.writing():
+            assert(not r.is_locked())
+
+        # but a waiting writer stops the lease being renewed, so the
+        # writer gets the lock once the current lease has ended
+        r.read_lock()
+        time.sleep(0.5)
+        assert(r.is_read_locked())
+
+        with ReadWriteMutex(key, timeout=2).writing():
+            assert(not r.is_read_locked())
+
+        with pytest.raises(MutexTimeoutError):
+            r.unlock()
+    except:
+        pop_is_running_service()
+        raise
+
+    pop_is_running_service()
@@ -1,7 +1,11 @@
 
+import importlib.util
+import json
 import pytest
 
-from Acquire.ObjectStore import ObjectStore, ObjectStoreError
+from Acquire.ObjectStore import ObjectStore, ObjectStoreError, \
+    ObjectStoreCache, ObjectStoreMetrics, ObjectStoreUnitOfWork, Mutex, \
+    AsyncObjectStore
 from Acquire.Service import get_service_account_bucket, \
     push_is_running_service, pop_is_running_service, \
     is_running_service
@@ -95,3 +99,831 @@ def test_objstore(bucket):
     test_value2 = ObjectStore.get_string_object(new_bucket2, test_key)
 
     assert(test_value == test_value2)
+
+
+def test_conditional_set(bucket):
+    key = "conditional/object"
+
+    assert(ObjectStore.set_object_if_absent(bucket, key, b"first"))
+    assert(not ObjectStore.set_object_if_absent(bucket, key, b"second"))
+    assert(ObjectStore.get_object(bucket, key) == b"first")
+
+    (data, etag) = ObjectStore.get_object_and_etag(bucket, key)
+    assert(data == b"first")
+
+    assert(ObjectStore.set_object_if_match(bucket, key, b"third", etag))
+    assert(ObjectStore.get_object(bucket, key) == b"third")
+
+    # the etag is now stale, so the swap must fail
+    assert(not ObjectStore.set_object_if_match(bucket, key, b"fourth", etag))
+    assert(ObjectStore.get_object(bucket, key) == b"third")
+
+    assert(not ObjectStore.set_object_if_match(bucket, "conditional/none",
+                                               b"fifth", etag))
+
+    value = ObjectStore.set_ins_string_object(bucket, "conditional/ins",
+                                              "hello")
+    assert(value == "hello")
+    value = ObjectStore.set_ins_string_object(bucket, "conditional/ins",
+                                              "world")
+    assert(value == "hello")
+
+    names = ObjectStore.get_all_object_names(bucket, "conditional")
+    assert(len(names) == 2)
+
+
+def test_conditional_set_json(bucket):
+    key = "conditional_json/object"
+
+    assert(ObjectStore.set_object_from_json_if_absent(bucket, key, [1]))
+    assert(not ObjectStore.set_object_from_json_if_absent(bucket, key, [2]))
+
+    (data, etag) = ObjectStore.get_object_from_json_and_etag(bucket, key)
+    assert(data == [1])
+
+    assert(ObjectStore.set_object_from_json_if_match(bucket, key,
+                                                     {"a": 3}, etag))
+    assert(not ObjectStore.set_object_from_json_if_match(bucket, key,
+                                                         {"a": 4}, etag))
+    assert(ObjectStore.get_object_from_json(bucket, key) == {"a": 3})
+
+    # an object that can't be decoded can still be replaced
+    ObjectStore.set_object(bucket, key, b"\x01not json")
+    (data, etag) = ObjectStore.get_object_from_json_and_etag(bucket, key)
+    assert(data is None)
+
+    assert(ObjectStore.set_object_from_json_if_match(bucket, key, [5], etag))
+    assert(ObjectStore.get_object_from_json(bucket, key) == [5])
+
+
+def test_iter_object_names(bucket):
+    keys = ["paged/a", "paged/a/b", "paged/a-c", "paged/b/c/d",
+            "paged/b0", "paged/c"]
+
+    for key in reversed(keys):
+        ObjectStore.set_string_object(bucket, key, key)
+
+    names = list(ObjectStore.iter_object_names(bucket, "paged/",
+                                               page_size=2))
+    assert(names == sorted(keys))
+
+    (page, token) = ObjectStore.get_object_names_page(bucket, "paged/",
+                                                      page_size=4)
+    assert(page == sorted(keys)[0:4])
+    assert(token == page[-1])
+
+    (page, token) = ObjectStore.get_object_names_page(bucket, "paged/",
+                                                      start_after=token,
+                                                      page_size=4)
+    assert(page == sorted(keys)[4:])
+    assert(token is None)
+
+    names = list(ObjectStore.iter_object_names(bucket, "paged/",
+                                               start_after="paged/a/b",
+                                               page_size=1))
+    assert(names == sorted(keys)[3:])
+
+    names = list(ObjectStore.iter_object_names(bucket, "paged/b",
+                                               without_prefix=True))
+    assert(names == ["c/d", "0"])
+
+
+def test_list_children(bucket):
+    keys = ["tree/a", "tree/a/b", "tree/a/c/d", "tree/b0", "tree/b/e",
+            "tree/c", "tree-other/f"]
+
+    for key in keys:
+        ObjectStore.set_string_object(bucket, key, key)
+
+    (names, prefixes) = ObjectStore.list_children(bucket, "tree/")
+    assert(names == ["tree/a", "tree/b0", "tree/c"])
+    assert(prefixes == ["tree/a/", "tree/b/"])
+
+    (names, prefixes) = ObjectStore.list_children(bucket, "tree/a/")
+    assert(names == ["tree/a/b"])
+    assert(prefixes == ["tree/a/c/"])
+
+    (names, prefixes) = ObjectStore.list_children(bucket, "tree/b")
+    assert(names == ["tree/b0"])
+    assert(prefixes == ["tree/b/"])
+
+    (names, prefixes) = ObjectStore.list_children(bucket, "tree/a/",
+                                                  delimiter="c/")
+    assert(names == ["tree/a/b"])
+    assert(prefixes == ["tree/a/c/"])
+
+    # directories that no longer hold any objects are not reported
+    ObjectStore.delete_object(bucket, "tree/b/e")
+    (names, prefixes) = ObjectStore.list_children(bucket, "tree/")
+    assert(prefixes == ["tree/a/"])
+
+    (names, prefixes) = ObjectStore.list_children(bucket, "missing/")
+    assert(names == [])
+    assert(prefixes == [])
+
+
+def _increment(bucket, key, n):
+    from Acquire.ObjectStore._testing_objstore import Testing_ObjectStore
+
+    for _i in range(0, n):
+        while True:
+            (data, etag) = Testing_ObjectStore.get_object_and_etag(bucket,
+                                                                   key)
+            if Testing_ObjectStore.set_object_if_match(
+                    bucket, key, str(int(data) + 1).encode(), etag):
+                break
+
+
+def test_concurrent_access(bucket):
+    import threading
+    import multiprocessing
+
+    key = "concurrent/counter"
+    ObjectStore.set_string_object(bucket, key, "0")
+
+    threads = [threading.Thread(target=_increment, args=(bucket, key, 20))
+               for _i in range(0, 4)]
+
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=_increment, args=(bucket, key, 20))
+                 for _i in range(0, 2)]
+
+    # replace a large object while reading it - a reader must only
+    # ever see a complete object
+    big = ["a" * 100000, "b" * 200000]
+    ObjectStore.set_string_object(bucket, "concurrent/big", big[0])
+
+    def _write_big():
+        for i in range(0, 50):
+            ObjectStore.set_string_object(bucket, "concurrent/big",
+                                          big[i % 2])
+
+    threads.append(threading.Thread(target=_write_big))
+
+    for worker in threads + processes:
+        worker.start()
+
+    while threads[-1].is_alive():
+        assert(ObjectStore.get_string_object(bucket, "concurrent/big")
+               in big)
+
+    for worker in threads + processes:
+        worker.join()
+
+    for process in processes:
+        assert(process.exitcode == 0)
+
+    assert(ObjectStore.get_string_object(bucket, key) == "120")
+
+    ObjectStore.delete_all_objects(bucket, "concurrent")
+
+
+def test_claim_object(bucket):
+    import threading
+
+    ObjectStore.set_object_from_json(bucket, "claim/pending/a", {"a": 1})
+
+    assert(ObjectStore.claim_object_from_json(
+                bucket, "claim/pending/a", "claim/running/a") == {"a": 1})
+    assert(ObjectStore.get_all_object_names(bucket, "claim/pending") == [])
+    assert(ObjectStore.get_object_from_json(
+                bucket, "claim/running/a") == {"a": 1})
+
+    # the source has gone, so it cannot be claimed again
+    assert(ObjectStore.claim_object(
+                bucket, "claim/pending/a", "claim/running/b") is None)
+
+    # a claim must not replace an existing destination
+    ObjectStore.set_string_object(bucket, "claim/pending/b", "b")
+    ObjectStore.set_string_object(bucket, "claim/running/b", "old")
+    assert(ObjectStore.claim_object(
+                bucket, "claim/pending/b", "claim/running/b") is None)
+    assert(ObjectStore.get_string_object(bucket, "claim/pending/b") == "b")
+    assert(ObjectStore.get_string_object(bucket, "claim/running/b") == "old")
+
+    # deletes conditional on the etag
+    etag = ObjectStore.get_object_and_etag(bucket, "claim/pending/b")[1]
+    assert(not ObjectStore.delete_object_if_match(
+                bucket, "claim/pending/b", etag + "x"))
+    assert(ObjectStore.get_string_object(bucket, "claim/pending/b") == "b")
+    assert(ObjectStore.delete_object_if_match(
+                bucket, "claim/pending/b", etag))
+    assert(not ObjectStore.delete_object_if_match(
+                bucket, "claim/pending/b", etag))
+
+    # lots of workers competing for the same jobs must claim (or take)
+    # each job exactly once
+    keys = ["claim/jobs/%03d" % i for i in range(0, 20)]
+
+    for key in keys:
+        ObjectStore.set_string_object(bucket, key, key)
+
+    claimed = []
+
+    def _claim(worker):
+        for key in keys:
+            if worker % 2 == 0:
+                dst_key = key.replace("jobs", "worker%d" % worker)
+                data = ObjectStore.claim_object(bucket, key, dst_key)
+            else:
+                try:
+                    data = ObjectStore.take_object(bucket, key)
+                except ObjectStoreError:
+                    data = None
+
+            if data is not None:
+                claimed.append(data)
+
+    threads = [threading.Thread(target=_claim, args=(i,))
+               for i in range(0, 6)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert(sorted([x.decode("utf-8") for x in claimed]) == keys)
+    assert(ObjectStore.get_all_object_names(bucket, "claim/jobs") == [])
+
+    ObjectStore.delete_all_objects(bucket, "claim")
+
+
+def test_bulk_get(bucket):
+    keys = ["bulk/%03d" % i for i in range(0, 50)]
+
+    for key in keys:
+        ObjectStore.set_object_from_json(bucket, key, {"key": key})
+
+    # deliberately ask for the keys out of order
+    request = list(reversed(keys))
+    objects = ObjectStore.get_objects(bucket, request, max_workers=4)
+    assert(list(objects.keys()) == request)
+
+    for key in request:
+        assert(objects[key] == ('{"key": "%s"}' % key).encode("utf-8"))
+
+    with pytest.raises(ObjectStoreError):
+        ObjectStore.get_objects(bucket, keys + ["bulk/missing"])
+
+    errors = {}
+    objects = ObjectStore.get_objects(bucket, ["bulk/missing"] + keys,
+                                      errors=errors)
+    assert(list(objects.keys()) == keys)
+    assert(list(errors.keys()) == ["bulk/missing"])
+
+    ObjectStore.set_string_object(bucket, "bulk/not_json", "{{")
+
+    errors = {}
+    results = list(ObjectStore.iter_objects_from_json(bucket, prefix="bulk/",
+                                                      max_workers=3,
+                                                      errors=errors))
+    assert([key for (key, _data) in results] == keys)
+    assert([data["key"] for (_key, data) in results] == keys)
+    assert(list(errors.keys()) == ["bulk/not_json"])
+
+    objects = ObjectStore.get_all_objects(bucket, prefix="bulk/")
+    assert(len(objects) == len(keys) + 1)
+
+
+def test_bulk_delete(bucket):
+    purge = ObjectStore.get_bucket(bucket, "purge_bucket")
+
+    keys = ["purge/%03d" % i for i in range(0, 40)]
+    keys += ["purge/keep/%03d" % i for i in range(0, 5)]
+    keys += ["other/%03d" % i for i in range(0, 5)]
+
+    for key in keys:
+        ObjectStore.set_string_object(purge, key, key)
+
+    assert(ObjectStore.delete_objects(purge, keys[0:5], max_workers=3) == 5)
+    assert(ObjectStore.get_all_object_names(purge, "purge/")[0] ==
+           "purge/005")
+
+    # resume a purge that was interrupted after "purge/019"
+    progress = {"deleted": 15, "last_key": "purge/019"}
+    ObjectStore.purge_prefix(purge, "purge/", keep_prefixes="purge/keep/",
+                             max_workers=4, progress=progress)
+    assert(progress["complete"])
+    assert(progress["deleted"] == 35)
+    assert(progress["last_key"] == "purge/keep/004")
+
+    names = ObjectStore.get_all_object_names(purge)
+    assert(names == ["other/%03d" % i for i in range(0, 5)] +
+                    ["purge/%03d" % i for i in range(5, 20)] +
+                    ["purge/keep/%03d" % i for i in range(0, 5)])
+
+    ObjectStore.clear_all_except(purge, ["purge/keep/"])
+    assert(ObjectStore.get_all_object_names(purge) == keys[40:45])
+
+    ObjectStore.delete_bucket(purge, force=True)
+
+
+def test_async_objstore(bucket):
+    import asyncio
+    import time
+
+    keys = ["async/%03d" % i for i in range(0, 20)]
+
+    async def _write_and_read():
+        await asyncio.gather(*[AsyncObjectStore.set_object_from_json(
+                                            bucket, key, {"key": key})
+                               for key in keys])
+
+        names = [name async for name in AsyncObjectStore.iter_object_names(
+                                            bucket, "async/", page_size=7)]
+        assert(names == keys)
+
+        objects = await AsyncObjectStore.gather_objects(
+                                bucket, list(reversed(keys)) + ["async/x"],
+                                from_json=True, max_concurrency=4,
+                                errors={})
+        assert(objects == [{"key": key} for key in reversed(keys)] + [None])
+
+        with pytest.raises(ObjectStoreError):
+            await AsyncObjectStore.gather_objects(bucket, ["async/x"])
+
+        errors = {}
+        objects = await AsyncObjectStore.get_objects(
+                                bucket, keys[0:2] + ["async/x"],
+                                errors=errors)
+        assert(list(objects.keys()) == keys[0:2])
+        assert(list(errors.keys()) == ["async/x"])
+
+        await AsyncObjectStore.set_string_object(bucket, "async/s", "hello")
+        assert(await AsyncObjectStore.get_string_object(
+                                bucket, "async/s") == "hello")
+
+        # blocking calls must overlap rather than block the event loop
+        start = time.time()
+        await asyncio.gather(*[AsyncObjectStore.run(time.sleep, 0.2)
+                               for _i in range(0, 8)])
+        assert(time.time() - start < 1.0)
+
+        assert(await AsyncObjectStore.delete_objects(
+                                bucket, keys + ["async/s"]) == 21)
+        assert(await AsyncObjectStore.get_all_object_names(
+                                bucket, "async/") == [])
+
+    asyncio.run(_write_and_read())
+
+
+def test_objstore_metrics(bucket):
+    ObjectStoreMetrics.start_request()
+
+    for i in range(0, 5):
+        ObjectStore.set_object(bucket, "metrics/files/%d" % i, b"x" * 100)
+
+    for name in ObjectStore.get_all_object_names(bucket, "metrics/files/"):
+        ObjectStore.get_object(bucket, name)
+
+    ObjectStore.take_object(bucket, "metrics/files/0")
+
+    with pytest.raises(ObjectStoreError):
+        ObjectStore.get_object(bucket, "metrics/files/0")
+
+    ObjectStore.delete_all_objects(bucket, "metrics/")
+
+    request = ObjectStoreMetrics.end_request()
+    assert(ObjectStoreMetrics.end_request() is None)
+
+    operations = request["operations"]
+    assert(operations["set"]["calls"] == 5)
+    assert(operations["set"]["bytes_in"] == 500)
+    assert(operations["get"]["calls"] == 6)
+    assert(operations["get"]["errors"] == 1)
+    assert(operations["get"]["bytes_out"] == 500)
+    assert(operations["take"]["bytes_out"] == 100)
+    assert(operations["list"]["calls"] == 1)
+    assert(operations["delete"]["calls"] == 1)
+    assert(sum(operations["get"]["histogram"]) == 6)
+    assert(len(operations["get"]["histogram"]) ==
+           len(request["latency_buckets"]) + 1)
+
+    families = request["families"]
+    assert(families["metrics/files"]["get"]["calls"] == 6)
+    assert(families["metrics/files"]["list"]["calls"] == 1)
+    assert(families["metrics"]["delete"]["calls"] == 1)
+
+    # the process-wide metrics include everything
+    metrics = ObjectStoreMetrics.get_metrics()
+    assert(metrics["operations"]["set"]["calls"] >= 5)
+
+    ObjectStoreMetrics.reset_metrics()
+    assert(ObjectStoreMetrics.get_metrics()["operations"] == {})
+
+
+def test_request_metrics_threads(bucket):
+    import threading
+
+    ObjectStore.set_string_object(bucket, "request_metrics/a", "a")
+
+    ObjectStoreMetrics.start_request()
+
+    # other requests (threads) are counted separately...
+    other = []
+
+    def _other_request():
+        other.append(ObjectStoreMetrics.end_request())
+        ObjectStoreMetrics.start_request()
+        ObjectStore.get_object(bucket, "request_metrics/a")
+        other.append(ObjectStoreMetrics.end_request())
+
+    thread = threading.Thread(target=_other_request)
+    thread.start()
+    thread.join()
+
+    assert(other[0] is None)
+    assert(other[1]["operations"]["get"]["calls"] == 1)
+
+    # ...while worker threads count against this request
+    ObjectStore.get_objects(bucket, ["request_metrics/a"] * 3)
+
+    request = ObjectStoreMetrics.end_request()
+    assert(request["operations"]["get"]["calls"] == 3)
+
+    ObjectStore.delete_all_objects(bucket, "request_metrics/")
+
+
+def test_unit_of_work(bucket):
+    def backend():
+        # used to read and write behind the back of the unit of work
+        from Acquire.ObjectStore import _objstore
+        return _objstore._objstore_backend
+
+    ObjectStore.set_string_object(bucket, "uow/read", "original")
+
+    ObjectStoreUnitOfWork.begin()
+
+    try:
+        assert(ObjectStoreUnitOfWork.is_active())
+
+        ObjectStoreMetrics.start_request()
+
+        for i in range(0, 3):
+            assert(ObjectStore.get_string_object(bucket, "uow/read") ==
+                   "original")
+
+        # repeated reads are served from the identity map
+        request = ObjectStoreMetrics.end_request()
+        assert(request["operations"]["get"]["calls"] == 1)
+
+        # deferred writes are coalesced and are visible to reads...
+        for i in range(0, 4):
+            ObjectStore.set_string_object(bucket, "uow/b", str(i),
+                                          defer=True)
+
+        ObjectStore.set_string_object(bucket, "uow/a", "a", defer=True)
+        ObjectStore.set_string_object(bucket, "uow/b", "b", defer=True)
+        assert(ObjectStoreUnitOfWork.get_num_deferred() == 2)
+        assert(ObjectStore.get_string_object(bucket, "uow/b") == "b")
+
+        # ...but are not written until the end of the unit of work
+        with pytest.raises(ObjectStoreError):
+            backend().get_object(bucket, "uow/b")
+
+        # immediate writes go straight through, replacing deferred writes
+        ObjectStore.set_string_object(bucket, "uow/c", "c", defer=True)
+        ObjectStore.set_string_object(bucket, "uow/c", "now")
+        assert(ObjectStoreUnitOfWork.get_num_deferred() == 2)
+
+        # operations that bypass the identity map see deferred writes
+        (data, _etag) = ObjectStore.get_object_and_etag(bucket, "uow/a")
+        assert(data == b"a")
+        assert(ObjectStoreUnitOfWork.get_num_deferred() == 1)
+
+        # acquiring a mutex makes sure that subsequent reads see
+        # changes made by other processes
+        backend().set_object(bucket, "uow/read", b"changed")
+        assert(ObjectStore.get_string_object(bucket, "uow/read") ==
+               "original")
+        mutex = Mutex("uow", bucket=bucket)
+        assert(ObjectStore.get_string_object(bucket, "uow/read") ==
+               "changed")
+        mutex.unlock()
+    finally:
+        assert(ObjectStoreUnitOfWork.end() == 1)
+
+    assert(not ObjectStoreUnitOfWork.is_active())
+    assert(ObjectStore.get_string_object(bucket, "uow/b") == "b")
+    assert(ObjectStore.get_string_object(bucket, "uow/c") == "now")
+
+    ObjectStore.delete_all_objects(bucket, "uow/")
+
+
+def test_unit_of_work_threads(bucket):
+    import threading
+
+    ObjectStore.set_string_object(bucket, "uow_threads/a", "a")
+
+    ObjectStoreUnitOfWork.begin()
+
+    try:
+        ObjectStore.set_string_object(bucket, "uow_threads/b", "b",
+                                      defer=True)
+
+        # another request (thread) has its own unit of work, which
+        # can't see or end ours
+        seen = []
+
+        def _other_request():
+            seen.append(ObjectStoreUnitOfWork.is_active())
+            ObjectStoreUnitOfWork.begin()
+            seen.append(ObjectStoreUnitOfWork.get_num_deferred())
+            ObjectStoreUnitOfWork.end()
+            seen.append(ObjectStoreUnitOfWork.end())
+
+        thread = threading.Thread(target=_other_request)
+        thread.start()
+        thread.join()
+
+        assert(seen == [False, 0, 0])
+        assert(ObjectStoreUnitOfWork.get_num_deferred() == 1)
+
+        # worker threads act on behalf of this request
+        objects = ObjectStore.get_objects(bucket, ["uow_threads/a",
+                                                   "uow_threads/b"])
+        assert(objects["uow_threads/b"] == b"b")
+
+        ObjectStoreMetrics.start_request()
+        assert(ObjectStore.get_string_object(bucket, "uow_threads/a") ==
+               "a")
+        request = ObjectStoreMetrics.end_request()
+        assert("get" not in request["operations"])
+    finally:
+        assert(ObjectStoreUnitOfWork.end(flush=False) == 0)
+
+    # the discarded write was never made
+    with pytest.raises(ObjectStoreError):
+        ObjectStore.get_object(bucket, "uow_threads/b")
+
+    ObjectStore.delete_all_objects(bucket, "uow_threads/")
+
+
+def test_codecs(bucket):
+    data = {"name": "codec", "values": [1, 2.5, None, True]}
+
+    # the default codec writes plain json, as before
+    ObjectStore.set_object_from_json(bucket, "codec/json", data)
+    assert(ObjectStore.get_object(bucket, "codec/json") ==
+           json.dumps(data).encode("utf-8"))
+
+    assert("json" in ObjectStore.get_codecs())
+
+    for codec in ObjectStore.get_codecs():
+        key = "codec/%s" % codec
+        ObjectStore.set_object_from_json(bucket, key, data, codec=codec)
+        assert(ObjectStore.get_object_from_json(bucket, key) == data)
+
+    if importlib.util.find_spec("msgpack") is not None:
+        raw = ObjectStore.get_object(bucket, "codec/msgpack")
+        assert(raw[0:1] == b"\x01")
+    else:
+        # unavailable codecs fall back to json
+        ObjectStore.set_object_from_json(bucket, "codec/msgpack", data,
+                                         codec="msgpack")
+        assert(ObjectStore.get_object(bucket, "codec/msgpack") ==
+               json.dumps(data).encode("utf-8"))
+
+    # the codec is detected from the header when reading
+    def _encode(obj):
+        return json.dumps(obj).encode("utf-8")[::-1]
+
+    def _decode(raw):
+        return json.loads(bytes(raw)[::-1].decode("utf-8"))
+
+    ObjectStore.register_codec("reversed", _encode, _decode, header=b"\x7f")
+    ObjectStore.set_object_from_json(bucket, "codec/reversed", data,
+                                     codec="reversed")
+    assert(ObjectStore.get_object(bucket, "codec/reversed")[0:1] == b"\x7f")
+    assert(ObjectStore.get_object_from_json(bucket, "codec/reversed") ==
+           data)
+    assert(ObjectStore.get_all_objects_from_json(bucket, "codec/reversed") ==
+           {"codec/reversed": data})
+    assert(ObjectStore.take_object_from_json(bucket, "codec/reversed") ==
+           data)
+
+    with pytest.raises(ObjectStoreError):
+        ObjectStore.register_codec("invalid", _encode, _decode, header=b"{")
+
+    with pytest.raises(ObjectStoreError):
+        ObjectStore.set_object_from_json(bucket, "codec/x", data,
+                                         codec="missing")
+
+    assert(ObjectStore.get_record_codec("LineItem") is None)
+    ObjectStore.set_record_codec("LineItem", "reversed")
+    assert(ObjectStore.get_record_codec("LineItem") == "reversed")
+    ObjectStore.set_record_codec("LineItem", None)
+    assert(ObjectStore.get_record_codec("LineItem") is None)
+
+    ObjectStore.delete_all_objects(bucket, "codec/")
+
+
+def test_compression(bucket):
+    records = [{"name": "record %d" % i, "value": "%.6f" % (i * 0.1),
+                "description": "a typical, repetitive record"}
+               for i in range(0, 400)]
+
+    # existing, uncompressed objects can still be read
+    ObjectStore.set_object_from_json(bucket, "compress/old", records[0])
+
+    try:
+        ObjectStore.set_compression("compress/", algorithm="zlib")
+        ObjectStore.set_compression("compress/zstd/", bucket=bucket,
+                                    algorithm="zstd")
+        ObjectStore.set_compression("compress/none/", algorithm=None)
+
+        for prefix in ["zlib", "zstd", "none"]:
+            key = "compress/%s/records" % prefix
+            ObjectStore.set_object_from_json(bucket, key, records)
+            assert(ObjectStore.get_object_from_json(bucket, key) == records)
+
+        raw = json.dumps(records).encode("utf-8")
+        zlib_data = ObjectStore.get_object(bucket, "compress/zlib/records")
+        assert(zlib_data[0:3] == b"\x1fCz")
+        assert(len(zlib_data) < len(raw))
+
+        # small objects are not compressed
+        ObjectStore.set_object_from_json(bucket, "compress/zlib/small", 1)
+        assert(ObjectStore.get_object(bucket, "compress/zlib/small") == b"1")
+
+        assert(ObjectStore.get_object(bucket, "compress/none/records") ==
+               raw)
+        assert(ObjectStore.get_object_from_json(bucket, "compress/old") ==
+               records[0])
+
+        with pytest.raises(ObjectStoreError):
+            ObjectStore.set_compression("compress/", algorithm="lzma")
+
+        if importlib.util.find_spec("zstandard") is None:
+            # zstd falls back to zlib
+            assert(ObjectStore.get_object(
+                        bucket, "compress/zstd/records")[0:3] == b"\x1fCz")
+            return
+
+        assert(ObjectStore.get_object(
+                    bucket, "compress/zstd/records")[0:3] == b"\x1fCs")
+
+        dictionary = ObjectStore.train_compression_dictionary(
+                                        "TestRecord", records, size=4096)
+
+        ObjectStore.set_compression("compress/dict/", algorithm="zstd",
+                                    dictionary="TestRecord")
+        ObjectStore.set_object_from_json(bucket, "compress/dict/record",
+                                         records[1])
+        assert(ObjectStore.get_object_from_json(
+                    bucket, "compress/dict/record") == records[1])
+
+        # objects compressed with a dictionary can be read once the
+        # dictionary is loaded again
+        ObjectStore.set_compression_dictionary("TestRecord", dictionary)
+        assert(ObjectStore.get_object_from_json(
+                    bucket, "compress/dict/record") == records[1])
+    finally:
+        ObjectStore.clear_compression()
+        ObjectStore.delete_all_objects(bucket, "compress/")
+
+
+def test_objstore_cache(bucket):
+    ObjectStoreCache.add_immutable_prefix("cached/*/fixed/")
+
+    assert(ObjectStoreCache.is_immutable("cached/abc/fixed/1"))
+    assert(not ObjectStoreCache.is_immutable("cached/abc/def/fixed/1"))
+    assert(not ObjectStoreCache.is_immutable("cached/abc/other/1"))
+
+    ObjectStoreCache.clear()
+    ObjectStoreCache.reset_statistics()
+
+    key = "cached/abc/fixed/1"
+    ObjectStore.set_string_object(bucket, key, "immutable")
+
+    assert(ObjectStore.get_string_object(bucket, key) == "immutable")
+    assert(ObjectStore.get_string_object(bucket, key) == "immutable")
+
+    stats = ObjectStoreCache.get_statistics()
+    assert(stats["misses"] == 1)
+    assert(stats["hits"] == 1)
+    assert(stats["objects"] == 1)
+
+    # writing through the ObjectStore must invalidate the cache
+    ObjectStore.set_string_object(bucket, key, "changed")
+    assert(ObjectStore.get_string_object(bucket, key) == "changed")
+
+    ObjectStore.delete_object(bucket, key)
+
+    with pytest.raises(ObjectStoreError):
+        ObjectStore.get_object(bucket, key)
+
+    # mutable objects are not cached unless requested
+    key = "cached/abc/other/1"
+    ObjectStore.set_string_object(bucket, key, "mutable")
+    ObjectStore.get_object(bucket, key)
+    assert(ObjectStoreCache.get_statistics()["objects"] == 0)
+
+    try:
+        ObjectStoreCache.configure(cache_mutable=True)
+
+        assert(ObjectStore.get_string_object(bucket, key) == "mutable")
+        assert(ObjectStore.get_string_object(bucket, key) == "mutable")
+        assert(ObjectStoreCache.get_statistics()["revalidations"] == 1)
+
+        # simulate another process changing the object behind our back
+        from Acquire.ObjectStore._testing_objstore import Testing_ObjectStore
+        Testing_ObjectStore.set_object(bucket, key, b"updated")
+
+        assert(ObjectStore.get_string_object(bucket, key) == "updated")
+        assert(ObjectStoreCache.get_statistics()["stale"] == 1)
+    finally:
+        ObjectStoreCache.configure(cache_mutable=False)
+
+
+def test_streaming_reads(bucket, tmpdir):
+    import os
+
+    data = os.urandom(3 * 1024 * 1024 + 17)
+    ObjectStore.set_object(bucket, "stream/large", data)
+
+    with ObjectStore.open_object(bucket, "stream/large") as reader:
+        assert(reader.read(100) == data[0:100])
+        assert(reader.read() == data[100:])
+
+    buffer = bytearray(len(data) + 10)
+    nbytes = ObjectStore.get_object_into(bucket, "stream/large", buffer)
+    assert(nbytes == len(data))
+    assert(buffer[0:nbytes] == data)
+
+    with pytest.raises(ObjectStoreError):
+        ObjectStore.get_object_into(bucket, "stream/large", bytearray(10))
+
+    filename = str(tmpdir.join("stream_large"))
+    ObjectStore.get_object_as_file(bucket, "stream/large", filename)
+
+    with open(filename, "rb") as FILE:
+        assert(FILE.read() == data)
+
+    with pytest.raises(ObjectStoreError):
+        ObjectStore.open_object(bucket, "stream/missing")
+
+    # ranged reads only return the requested bytes
+    start = 2 * 1024 * 1024 - 5
+    assert(ObjectStore.get_object_range(bucket, "stream/large",
+                                        start, 10) == data[start:start + 10])
+    assert(ObjectStore.get_object_range(bucket, "stream/large",
+                                        len(data) - 7) == data[-7:])
+    assert(ObjectStore.get_object_range(bucket, "stream/large",
+                                        len(data), 10) == b"")
+
+    with pytest.raises(ObjectStoreError):
+        ObjectStore.get_object_range(bucket, "stream/large", -1, 10)
+
+    with pytest.raises(ObjectStoreError):
+        ObjectStore.get_object_range(bucket, "stream/missing", 0, 10)
+
+
+def test_multipart_upload(bucket, tmpdir):
+    import os
+
+    data = os.urandom(10 * 1000 + 7)
+    filename = str(tmpdir.join("multipart_upload"))
+
+    with open(filename, "wb") as FILE:
+        FILE.write(data)
+
+    ObjectStore.set_object_from_file(bucket, "multipart/simple", filename,
+                                     part_size=1000, max_workers=3)
+    assert(ObjectStore.get_object(bucket, "multipart/simple") == data)
+
+    # simulate a previous, interrupted upload that sent some parts
+    upload_id = ObjectStore.create_multipart_upload(bucket,
+                                                    "multipart/resumed")
+    ObjectStore.upload_part(bucket, "multipart/resumed", upload_id,
+                            2, data[1000:2000])
+    ObjectStore.upload_part(bucket, "multipart/resumed", upload_id,
+                            5, b"corrupted")
+
+    parts = ObjectStore.list_uploaded_parts(bucket, "multipart/resumed",
+                                            upload_id)
+    assert(sorted(parts.keys()) == [2, 5])
+    assert(parts[2][1] == 1000)
+
+    # uncommitted uploads are not visible as objects
+    assert(ObjectStore.get_all_object_names(bucket, "multipart/") ==
+           ["multipart/simple"])
+
+    ObjectStore.set_object_from_file(bucket, "multipart/resumed", filename,
+                                     part_size=1000, upload_id=upload_id)
+    assert(ObjectStore.get_object(bucket, "multipart/resumed") == data)
+
+    upload_id = ObjectStore.create_multipart_upload(bucket,
+                                                    "multipart/aborted")
+    ObjectStore.upload_part(bucket, "multipart/aborted", upload_id,
+                            1, b"aborted")
+    ObjectStore.abort_multipart_upload(bucket, "multipart/aborted",
+                                       upload_id)
+
+    with pytest.raises(ObjectStoreError):
+        ObjectStore.list_uploaded_parts(bucket, "multipart/aborted",
+                                        upload_id)
+
+    assert(sorted(ObjectStore.get_all_object_names(bucket, "multipart/")) ==
+           ["multipart/resumed", "multipart/simple"])
@@ -55,6 +55,11 @@ def test_par(bucket):
 
     assert(val == value)
 
+    data = value.encode("utf-8")
+    assert(par.read(privkey).read_range(3, 5) == data[3:8])
+    assert(par.read(privkey).read_range(4) == data[4:])
+    assert(par.read(privkey).read_range(len(data) + 1, 5) == b"")
+
     value = "∆˚¬#  #ª ƒ∆ ¬¬¬˚¬∂ß ˚¬ ¬¬¬ßßß"
 
     with pytest.raises(PARPermissionsError):
@@ -110,3 +115,94 @@ def test_par(bucket):
         value = par.read(privkey).get_string_object()
 
         assert(keyvals[key] == value)
+
+
+_cleaned = []
+
+
+def _cleanup_par(par, fail=False):
+    if fail:
+        raise ValueError("Cleanup failed")
+
+    _cleaned.append(par.uid())
+
+
+def test_sweep_expired_pars(bucket):
+    import threading
+    from Acquire.ObjectStore import OSParRegistry, Function
+
+    privkey = get_private_key()
+    pubkey = privkey.public_key()
+
+    push_is_running_service()
+
+    try:
+        # PARs are registered in the service account bucket
+        service_bucket = get_service_account_bucket()
+        registry = "registry/pars"
+        ObjectStore.delete_all_objects(service_bucket, registry)
+
+        pars = [ObjectStore.create_par(bucket, encrypt_key=pubkey,
+                                       readable=False, writeable=True,
+                                       duration=60,
+                                       cleanup_function=_cleanup_par)
+                for _i in range(0, 10)]
+
+        # nothing has expired yet
+        result = OSParRegistry.sweep_expired(batch_size=3)
+        assert(result["closed"] == 0)
+        assert(result["complete"])
+
+        # a sweeper that died after claiming this PAR...
+        expire = ObjectStore.get_all_object_names(
+                                    service_bucket, "%s/expire/" % registry)
+        stale = expire[0].replace("/expire/",
+                                  "/sweeping/2000-01-01T00:00:00/")
+        ObjectStore.claim_object(service_bucket, expire[0], stale)
+
+        # ...an index entry for a PAR that was already closed...
+        ObjectStore.set_object_from_json(
+                service_bucket,
+                "%s/expire/2000-01-01T00:00:00/missing" % registry,
+                "missing")
+
+        # ...and a PAR whose cleanup fails
+        failing = ObjectStore.create_par(
+                        bucket, encrypt_key=pubkey, readable=False,
+                        writeable=True, duration=60,
+                        cleanup_function=Function(_cleanup_par, fail=True))
+
+        future = datetime.datetime.now() + datetime.timedelta(hours=1)
+
+        # sweep in small batches from several instances at once
+        results = []
+        errors = {}
+
+        def _sweep():
+            results.append(OSParRegistry.sweep_expired(
+                                    now=future, batch_size=3,
+                                    max_workers=2, errors=errors))
+
+        threads = [threading.Thread(target=_sweep) for _i in range(0, 3)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        assert(sorted(_cleaned) == sorted([par.uid() for par in pars]))
+        assert(sum([r["closed"] for r in results]) == 10)
+        assert(sum([r["dangling"] for r in results]) == 1)
+        assert(sum([r["failed"] for r in results]) == 1)
+        assert(sum([r["recovered"] for r in results]) == 1)
+        assert(list(errors.keys()) == [failing.uid()])
+
+        assert(ObjectStore.get_all_object_names(service_bucket,
+                                                registry) == [])
+
+        result = OSParRegistry.sweep_expired(now=future, max_batches=1)
+        assert(result["closed"] == 0)
+        assert(result["complete"])
+    finally:
+        pop_is_running_service()
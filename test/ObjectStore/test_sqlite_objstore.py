@@ -0,0 +1,167 @@
+
+import pytest
+import multiprocessing
+
+from Acquire.ObjectStore import ObjectStoreError
+from Acquire.ObjectStore._sqlite_objstore import SQLite_ObjectStore
+
+
+@pytest.fixture(scope="module")
+def bucket(tmpdir_factory):
+    d = tmpdir_factory.mktemp("sqlite_objstore")
+    return SQLite_ObjectStore.get_bucket(str(d), "test_bucket")
+
+
+def _set_objects(bucket, prefix, n):
+    for i in range(0, n):
+        SQLite_ObjectStore.set_object(bucket, "%s/%04d" % (prefix, i),
+                                      ("%s %d" % (prefix, i)).encode())
+
+
+def test_sqlite_objstore(bucket):
+    assert(SQLite_ObjectStore.is_bucket_empty(bucket))
+
+    small = b"small object"
+    large = b"x" * (256 * 1024)
+
+    SQLite_ObjectStore.set_object(bucket, "small", small)
+    SQLite_ObjectStore.set_object(bucket, "dir//large", large)
+
+    assert(not SQLite_ObjectStore.is_bucket_empty(bucket))
+    assert(SQLite_ObjectStore.get_object(bucket, "small") == small)
+    assert(SQLite_ObjectStore.get_object(bucket, "dir/large") == large)
+
+    with SQLite_ObjectStore.open_object(bucket, "dir/large") as reader:
+        assert(reader.read() == large)
+
+    assert(SQLite_ObjectStore.get_object_range(bucket, "small",
+                                               6, 3) == small[6:9])
+    assert(SQLite_ObjectStore.get_object_range(bucket, "dir/large",
+                                               1000, 10) == b"x" * 10)
+    assert(SQLite_ObjectStore.get_object_range(
+                bucket, "dir/large", len(large) - 4) == b"x" * 4)
+
+    (size, checksum) = SQLite_ObjectStore.get_size_and_checksum(
+                                                    bucket, "dir/large")
+    assert(size == len(large))
+
+    (data, etag) = SQLite_ObjectStore.get_object_and_etag(bucket,
+                                                          "dir/large")
+    assert(etag == checksum)
+
+    # replacing a large object with a small one removes the blob
+    SQLite_ObjectStore.set_object(bucket, "dir/large", small)
+    assert(SQLite_ObjectStore.get_object(bucket, "dir/large") == small)
+
+    assert(not SQLite_ObjectStore.set_object_if_absent(bucket, "small",
+                                                       large))
+    assert(SQLite_ObjectStore.set_object_if_absent(bucket, "new", large))
+    assert(not SQLite_ObjectStore.set_object_if_match(bucket, "new",
+                                                      small, "wrong"))
+    (data, etag) = SQLite_ObjectStore.get_object_and_etag(bucket, "new")
+    assert(SQLite_ObjectStore.set_object_if_match(bucket, "new",
+                                                  small, etag))
+
+    assert(SQLite_ObjectStore.claim_object(bucket, "new", "small") is None)
+    assert(SQLite_ObjectStore.claim_object(bucket, "new",
+                                           "claimed") == small)
+    assert(SQLite_ObjectStore.claim_object(bucket, "new",
+                                           "other") is None)
+    assert(not SQLite_ObjectStore.delete_object_if_match(bucket, "claimed",
+                                                         "wrong"))
+    (data, etag) = SQLite_ObjectStore.get_object_and_etag(bucket, "claimed")
+    assert(SQLite_ObjectStore.delete_object_if_match(bucket, "claimed",
+                                                     etag))
+    SQLite_ObjectStore.set_object(bucket, "new", small)
+
+    assert(SQLite_ObjectStore.take_object(bucket, "new") == small)
+
+    with pytest.raises(ObjectStoreError):
+        SQLite_ObjectStore.get_object(bucket, "new")
+
+    upload_id = SQLite_ObjectStore.create_multipart_upload(bucket, "multi")
+    etags = {}
+    etags[2] = SQLite_ObjectStore.upload_part(bucket, "multi", upload_id,
+                                              2, b"world")
+    etags[1] = SQLite_ObjectStore.upload_part(bucket, "multi", upload_id,
+                                              1, b"hello ")
+
+    parts = SQLite_ObjectStore.list_uploaded_parts(bucket, "multi",
+                                                   upload_id)
+    assert(sorted(parts.keys()) == [1, 2])
+
+    SQLite_ObjectStore.commit_multipart_upload(bucket, "multi",
+                                               upload_id, etags)
+    assert(SQLite_ObjectStore.get_object(bucket, "multi") ==
+           b"hello world")
+
+    SQLite_ObjectStore.delete_object(bucket, "multi")
+    SQLite_ObjectStore.delete_object(bucket, "small")
+    SQLite_ObjectStore.delete_object(bucket, "dir/large")
+
+    assert(SQLite_ObjectStore.is_bucket_empty(bucket))
+
+
+def test_sqlite_listing(bucket):
+    keys = ["tree/a", "tree/a/b", "tree/a/c/d", "tree/b0", "tree/b/e",
+            "tree/c", "tree-other/f"]
+
+    for key in keys:
+        SQLite_ObjectStore.set_object(bucket, key, key.encode())
+
+    names = SQLite_ObjectStore.get_all_object_names(bucket, "tree/")
+    assert(names == sorted(keys[0:6]))
+
+    names = SQLite_ObjectStore.get_all_object_names(bucket, "tree/b",
+                                                    without_prefix=True)
+    assert(names == ["e", "0"])
+
+    (page, token) = SQLite_ObjectStore.get_object_names_page(
+                                                bucket, "tree/", limit=4)
+    assert(page == sorted(keys[0:6])[0:4])
+
+    (page, token) = SQLite_ObjectStore.get_object_names_page(
+                                                bucket, "tree/",
+                                                start_after=token, limit=4)
+    assert(page == sorted(keys[0:6])[4:])
+    assert(token is None)
+
+    (names, prefixes) = SQLite_ObjectStore.list_children(bucket, "tree/")
+    assert(names == ["tree/a", "tree/b0", "tree/c"])
+    assert(prefixes == ["tree/a/", "tree/b/"])
+
+    SQLite_ObjectStore.delete_all_objects(bucket, "tree/a")
+    names = SQLite_ObjectStore.get_all_object_names(bucket)
+    assert(names == ["tree-other/f", "tree/b/e", "tree/b0", "tree/c"])
+
+    SQLite_ObjectStore.delete_all_objects(bucket)
+    assert(SQLite_ObjectStore.is_bucket_empty(bucket))
+
+
+def test_sqlite_multiprocess(bucket):
+    ctx = multiprocessing.get_context("spawn")
+
+    processes = [ctx.Process(target=_set_objects,
+                             args=(bucket, "proc%d" % i, 50))
+                 for i in range(0, 4)]
+
+    for process in processes:
+        process.start()
+
+    # read while the other processes are writing
+    while any(process.is_alive() for process in processes):
+        for name in SQLite_ObjectStore.get_all_object_names(bucket):
+            SQLite_ObjectStore.get_object(bucket, name)
+
+    for process in processes:
+        process.join()
+        assert(process.exitcode == 0)
+
+    for i in range(0, 4):
+        names = SQLite_ObjectStore.get_all_object_names(bucket,
+                                                        "proc%d/" % i)
+        assert(len(names) == 50)
+        assert(SQLite_ObjectStore.get_object(bucket, names[-1]) ==
+               ("proc%d 49" % i).encode())
+
+    SQLite_ObjectStore.delete_bucket(bucket, force=True)
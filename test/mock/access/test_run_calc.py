@@ -4,6 +4,10 @@ from Acquire.Identity import Authorisation
 from Acquire.Client import Account, deposit, Cheque, Service, \
                            Drive, StorageCreds
 from Acquire.Compute import Cluster
+from Acquire.ObjectStore import ObjectStore
+from Acquire.Service import get_service_account_bucket, \
+                            push_testing_objstore, pop_testing_objstore, \
+                            push_is_running_service, pop_is_running_service
 
 import pytest
 
@@ -90,3 +94,74 @@ def test_run_calc(aaai_services, authenticated_user):
     print(pending_uids)
 
     #assert(False)
+
+
+def _get_worksheets(aaai_services):
+    """Return the data of all of the WorkSheets saved by the access
+       service, indexed by UID
+    """
+    push_testing_objstore(aaai_services["_services"]["access"])
+    push_is_running_service()
+
+    try:
+        bucket = get_service_account_bucket()
+        worksheets = ObjectStore.get_all_objects_from_json(bucket,
+                                                           "worksheet/")
+    finally:
+        pop_is_running_service()
+        pop_testing_objstore()
+
+    return {data["uid"]: data for data in worksheets.values()}
+
+
+def test_run_calc_submit_fails(aaai_services, authenticated_user,
+                               monkeypatch):
+    user = authenticated_user
+
+    account = Account(user=user, account_name="deposits",
+                      accounting_url="accounting")
+
+    if account.balance() < 50.0:
+        deposit(user, 100.0, "Adding money to the account",
+                accounting_url="accounting")
+
+    creds = StorageCreds(user=user, service_url="storage")
+    drive = Drive(name="sim_fails", creds=creds, autocreate=True)
+    location = drive.upload(_testdata()).location()
+
+    r = RunRequest(image="docker://test_image:latest", input=location)
+
+    cheque = Cheque.write(account=account, recipient_url="access",
+                          resource=r.fingerprint(), max_spend=50.0)
+
+    args = {"request": r.to_data(),
+            "authorisation": Authorisation(
+                                user=user,
+                                resource=r.fingerprint()).to_data(),
+            "cheque": cheque.to_data()}
+
+    def _submit_job(args):
+        raise ConnectionError("The compute service is down")
+
+    monkeypatch.setattr("compute.submit_job.run", _submit_job)
+
+    before = _get_worksheets(aaai_services)
+
+    # a successful execute logs out the cached access service user, so
+    # make sure that a freshly logged-in user is used
+    import Acquire.Service._service
+    Acquire.Service._service._cache_service_user.clear()
+
+    with pytest.raises(Exception):
+        Service("access").call_function("run_calculation", args)
+
+    # the request failed, but everything done before the submission
+    # must still be recorded in the saved WorkSheet
+    worksheets = [data for (uid, data) in
+                  _get_worksheets(aaai_services).items()
+                  if uid not in before]
+
+    assert(len(worksheets) == 1)
+    assert(worksheets[0]["status"] == "submitting")
+    assert(worksheets[0]["output_location"] is not None)
+    assert(worksheets[0]["credit_notes"] is not None)
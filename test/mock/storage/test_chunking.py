@@ -54,3 +54,13 @@ def test_chunking(authenticated_user, tempdir):
 
     assert(lines[0] == "This is some text\n")
     assert(lines[1] == "Here is some more!\n")
+
+    # read ranges that start in, and span across, different chunks
+    data = b"This is some text\nHere is some more!\n"
+    f = drive.list_files(filename="test_chunking.py")[0].open()
+
+    assert(f.read_range(5, 7) == data[5:12])
+    assert(f.read_range(15, 12) == data[15:27])
+    assert(f.read_range(20) == data[20:])
+    assert(f.read_range(30, 100) == data[30:])
+    assert(f.read_range(100, 10) == b"")
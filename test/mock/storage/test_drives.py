@@ -151,6 +151,11 @@ def test_drives(authenticated_user, tempdir):
 
     assert(data1 == data2)
 
+    # read part of the file
+    f = new_filemeta.open()
+    assert(f.read_range(10, 100) == data2[10:110])
+    assert(f.read_range(len(data2) - 5) == data2[-5:])
+
     # try to upload a file with path to the drive
     filemeta = drive.upload(filename=__file__,
                             uploaded_name="/test/one/../two/test.py")
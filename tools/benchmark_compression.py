@@ -0,0 +1,171 @@
+"""
+Benchmark the transparent compression of json objects in the ObjectStore.
+
+This writes and reads typical FileInfo and TransactionRecord payloads
+through the ObjectStore facade (using the in-memory backend) with
+compression disabled, with zlib, with zstd and with zstd using a
+dictionary trained for each record type. It reports the mean stored
+size of each object, the time to write and read it, and the time
+that would be needed to transfer it at the passed bandwidth, e.g.
+
+python tools/benchmark_compression.py --count 2000 --bandwidth 50
+"""
+
+import argparse
+import base64
+import datetime
+import os
+import random
+import time
+import uuid
+
+from Acquire.ObjectStore import ObjectStore, set_object_store_backend
+from Acquire.ObjectStore._memory_objstore import Memory_ObjectStore
+
+
+def _b64(nbytes):
+    return base64.b64encode(os.urandom(nbytes)).decode("utf-8")
+
+
+def _datetime(rng):
+    d = datetime.datetime(2019, 1, 1) + \
+        datetime.timedelta(seconds=rng.randint(0, 365 * 86400))
+    return d.isoformat() + "+00:00"
+
+
+def _authorisation(rng):
+    return {"user_uid": str(uuid.uuid4()),
+            "session_uid": str(uuid.uuid4()),
+            "identity_url": "https://fn.acquire-aaai.com/t/identity",
+            "identity_uid": "a0-a1",
+            "uid": str(uuid.uuid4()),
+            "signature": _b64(256),
+            "siguid": _b64(256),
+            "is_testing": False}
+
+
+def _transaction_record(rng):
+    """Return a payload with the structure of TransactionRecord.to_data"""
+    value = "%.6f" % (rng.random() * 100)
+    when = _datetime(rng)
+    debit_uid = "%s/%s" % (when, str(uuid.uuid4())[0:8])
+
+    return {"debit_note": {"transaction": {"value": value,
+                                           "description": "Payment for "
+                                           "storage of %d bytes" %
+                                           rng.randint(0, 10**9)},
+                           "account_uid": str(uuid.uuid4()),
+                           "authorisation": _authorisation(rng),
+                           "is_provisional": False,
+                           "datetime": when,
+                           "uid": debit_uid},
+            "credit_note": {"account_uid": str(uuid.uuid4()),
+                            "debit_account_uid": str(uuid.uuid4()),
+                            "uid": "%s/%s" % (when, str(uuid.uuid4())[0:8]),
+                            "debit_note_uid": debit_uid,
+                            "datetime": when,
+                            "value": value,
+                            "is_provisional": False},
+            "transaction_state": "DIRECT"}
+
+
+def _file_info(rng):
+    """Return a payload with the structure of FileInfo.to_data"""
+    user_guid = "%s@a0-a1" % str(uuid.uuid4())
+
+    return {"filename": "data/run_%04d/output_%d.dat" %
+                        (rng.randint(0, 9999), rng.randint(0, 99)),
+            "latest_version": {"filesize": rng.randint(0, 10**9),
+                               "checksum": "%032x" % rng.getrandbits(128),
+                               "file_uid": "%s/%s" % (_datetime(rng),
+                                                      str(uuid.uuid4())[0:8]),
+                               "user_guid": user_guid,
+                               "nchunks": rng.randint(1, 100),
+                               "aclrules": {"default_rule": "inherit",
+                                            "rules": {user_guid:
+                                                      {"is_owner": True,
+                                                       "is_readable": True,
+                                                       "is_writeable": True,
+                                                       "is_executable": False
+                                                       }}},
+                               "compression": "bz2"}}
+
+
+def _benchmark(bucket, name, payloads, bandwidth):
+    keys = ["%s/%06d" % (name, i) for i in range(0, len(payloads))]
+
+    start = time.perf_counter()
+    for (key, payload) in zip(keys, payloads):
+        ObjectStore.set_object_from_json(bucket, key, payload)
+    write_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for (key, payload) in zip(keys, payloads):
+        assert(ObjectStore.get_object_from_json(bucket, key) == payload)
+    read_time = time.perf_counter() - start
+
+    nbytes = 0
+    for key in keys:
+        nbytes += ObjectStore.get_size_and_checksum(bucket, key)[0]
+
+    n = float(len(keys))
+    return (nbytes / n, 1e6 * write_time / n, 1e6 * read_time / n,
+            1e6 * (nbytes / n) / (bandwidth * 1024 * 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+                description="Benchmark compression of stored objects")
+    parser.add_argument("--count", type=int, default=1000,
+                        help="Number of objects of each type")
+    parser.add_argument("--bandwidth", type=float, default=50.0,
+                        help="Bandwidth to the object store in MB/s")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    set_object_store_backend(Memory_ObjectStore)
+
+    record_types = {"TransactionRecord": _transaction_record,
+                    "FileInfo": _file_info}
+
+    configs = [("none", None, None), ("zlib", "zlib", None),
+               ("zstd", "zstd", None), ("zstd+dict", "zstd", True)]
+
+    print("%-18s %-10s %10s %10s %10s %12s" %
+          ("record", "compression", "bytes", "write/us", "read/us",
+           "transfer/us"))
+
+    for (record_type, generate) in record_types.items():
+        # train on different payloads to those that are benchmarked
+        samples = [generate(rng) for _ in range(0, 500)]
+        payloads = [generate(rng) for _ in range(0, args.count)]
+
+        for (config, algorithm, use_dictionary) in configs:
+            bucket = Memory_ObjectStore.create_bucket(
+                            "/benchmark", "%s_%s" % (record_type, config))
+
+            dictionary = None
+
+            if use_dictionary:
+                try:
+                    ObjectStore.train_compression_dictionary(
+                                                    record_type, samples)
+                    dictionary = record_type
+                except Exception as e:
+                    print("Skipping %s: %s" % (config, e))
+                    continue
+
+            ObjectStore.set_compression(bucket=bucket, algorithm=algorithm,
+                                        dictionary=dictionary)
+
+            (nbytes, write, read, transfer) = _benchmark(
+                                bucket, record_type, payloads,
+                                args.bandwidth)
+
+            print("%-18s %-10s %10.1f %10.1f %10.1f %12.1f" %
+                  (record_type, config, nbytes, write, read, transfer))
+
+
+if __name__ == "__main__":
+    main()